@@ -166,6 +166,11 @@ data_collector = DataCollector()
 risk_manager = RiskManager()
 backtest_engine = BacktestEngine()
 
+@app.teardown_appcontext
+def remove_db_session(exception=None):
+    """请求结束时释放当前线程的数据库会话"""
+    db_manager.remove_session()
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -424,6 +429,26 @@ def get_system_status():
     except Exception as e:
         return jsonify({'success': False, 'message': f'获取系统状态失败: {str(e)}'})
 
+@app.route('/api/network/metrics')
+def get_network_metrics():
+    """获取网络重试、熔断和限流统计"""
+    try:
+        from backend.network_config import binance_network_config
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'endpoints': binance_network_config.get_metrics(),
+                'rate_limit': {
+                    mode: client_manager.get_rate_limiter(mode).get_stats()
+                    for mode in ('SPOT', 'FUTURES')
+                }
+            }
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'获取网络统计失败: {str(e)}'})
+
 # ========== 现货策略管理API端点 ==========
 
 @app.route('/api/strategies/list')
@@ -2150,6 +2175,9 @@ def broadcast_updates():
             socketio.emit('trades_update', trade_data)
             socketio.emit('futures_trades_update', futures_trade_data)
             
+            # 结束本轮读取事务，避免长期持有旧快照
+            db_manager.remove_session()
+            
             socketio.sleep(5)  # 每5秒更新一次
         except Exception as e:
             print(f"广播更新错误: {e}")
@@ -2274,4 +2302,10 @@ if __name__ == '__main__':
     update_thread.daemon = True
     update_thread.start()
     
+    # 用户数据流推送的订单更新直接转发给前端，不等待下一轮广播
+    for mode, event_name in (('SPOT', 'order_update'), ('FUTURES', 'futures_order_update')):
+        user_stream = client_manager.get_user_data_stream(mode)
+        if user_stream:
+            user_stream.add_order_listener(lambda order, name=event_name: socketio.emit(name, order))
+    
     socketio.run(app, debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+异步币安客户端
+基于aiohttp的长连接池（HTTP keep-alive + DNS缓存），接口与BinanceClient保持一致，
+可在事件循环中并发发起大量请求而不需要为每个调用占用一个线程
+"""
+
+import asyncio
+import hashlib
+import hmac
+import logging
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlencode
+
+import aiohttp
+import pandas as pd
+
+from config.config import Config
+from backend.binance_client import BinanceClient
+from backend.order_executor import new_client_order_id
+from backend.symbol_metadata import format_decimal
+from backend.rate_limiter import RateLimiter, get_rate_limiter, estimate_weight, method_priority
+from backend.network_config import binance_network_config
+
+# 各交易模式的REST地址
+BASE_URLS = {
+    ('SPOT', False): 'https://api.binance.com',
+    ('SPOT', True): 'https://testnet.binance.vision',
+    ('FUTURES', False): 'https://fapi.binance.com',
+    ('FUTURES', True): 'https://testnet.binancefuture.com',
+}
+
+# 接口路径（现货, 合约）及对应的python-binance方法名（用于估算权重）
+ENDPOINTS = {
+    'klines': (('/api/v3/klines', 'get_klines'), ('/fapi/v1/klines', 'futures_klines')),
+    'ticker_price': (('/api/v3/ticker/price', 'get_symbol_ticker'),
+                     ('/fapi/v1/ticker/price', 'futures_symbol_ticker')),
+    'depth': (('/api/v3/depth', 'get_order_book'), ('/fapi/v1/depth', 'futures_order_book')),
+    'account': (('/api/v3/account', 'get_account'), ('/fapi/v2/account', 'futures_account')),
+    'order': (('/api/v3/order', 'create_order'), ('/fapi/v1/order', 'futures_create_order')),
+    'order_status': (('/api/v3/order', 'get_order'), ('/fapi/v1/order', 'futures_get_order')),
+    'position_risk': (None, ('/fapi/v2/positionRisk', 'futures_position_information')),
+    'position_mode': (None, ('/fapi/v1/positionSide/dual', 'futures_get_position_mode')),
+}
+
+
+class AsyncBinanceAPIException(Exception):
+    """异步客户端的API错误"""
+    
+    def __init__(self, status_code: int, code: int = 0, message: str = ''):
+        self.status_code = status_code
+        self.code = code
+        self.message = message
+        super().__init__(f"APIError(status={status_code}, code={code}): {message}")
+
+
+class AsyncBinanceServerError(AsyncBinanceAPIException):
+    """服务端错误（5xx），可以重试"""
+
+
+# 异步请求中需要重试的异常
+RETRYABLE_ASYNC_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, OSError, AsyncBinanceServerError)
+
+
+class AsyncBinanceClient:
+    """异步币安客户端"""
+    
+    def __init__(self, trading_mode: str = 'SPOT', base_url: str = None,
+                 api_key: str = None, api_secret: str = None,
+                 rate_limiter: RateLimiter = None,
+                 precision_client: Optional[BinanceClient] = None):
+        """
+        Args:
+            trading_mode: 'SPOT' 现货交易, 'FUTURES' 合约交易
+            base_url: REST地址，默认按交易模式和测试网配置选择（测试时可指向本地模拟服务）
+            rate_limiter: 请求权重限流器，默认与同步客户端共享
+            precision_client: 用于下单前调整数量/价格精度的同步客户端（可选）
+        """
+        self.config = Config()
+        self.trading_mode = trading_mode.upper()
+        self.logger = logging.getLogger(__name__)
+        
+        self.base_url = (base_url or BASE_URLS[(self.trading_mode, self.config.BINANCE_TESTNET)]).rstrip('/')
+        
+        if self.trading_mode == 'FUTURES' and self.config.BINANCE_TESTNET:
+            default_key = self.config.BINANCE_API_KEY_FUTURES
+            default_secret = self.config.BINANCE_SECRET_KEY_FUTURES
+        else:
+            default_key = self.config.BINANCE_API_KEY
+            default_secret = self.config.BINANCE_SECRET_KEY
+        self.api_key = api_key if api_key is not None else default_key
+        self.api_secret = api_secret if api_secret is not None else default_secret
+        
+        self.rate_limiter = rate_limiter or get_rate_limiter(self.trading_mode)
+        self.precision_client = precision_client
+        
+        # aiohttp会话绑定事件循环，每个循环一个会话（连接池）
+        self._sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+        self._position_mode = None
+    
+    # ---------- 连接管理 ----------
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取当前事件循环的共享会话"""
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.config.ASYNC_HTTP_POOL_SIZE,
+                limit_per_host=self.config.ASYNC_HTTP_POOL_SIZE,
+                ttl_dns_cache=self.config.ASYNC_HTTP_DNS_CACHE_TTL,
+                keepalive_timeout=self.config.ASYNC_HTTP_KEEPALIVE
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.config.ASYNC_HTTP_TIMEOUT),
+                headers={'X-MBX-APIKEY': self.api_key} if self.api_key else None
+            )
+            self._sessions[loop] = session
+        return session
+    
+    async def close(self):
+        """关闭当前事件循环的会话"""
+        loop = asyncio.get_running_loop()
+        session = self._sessions.pop(loop, None)
+        if session is not None and not session.closed:
+            await session.close()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+        return False
+    
+    # ---------- 请求 ----------
+    
+    def _endpoint(self, name: str):
+        spot, futures = ENDPOINTS[name]
+        endpoint = futures if self.trading_mode == 'FUTURES' else spot
+        if endpoint is None:
+            raise ValueError(f"{self.trading_mode} 不支持接口 {name}")
+        return endpoint
+    
+    def _sign(self, params: Dict) -> Dict:
+        params = dict(params)
+        params['timestamp'] = int(time.time() * 1000)
+        params.setdefault('recvWindow', 60000)
+        query = urlencode(params)
+        params['signature'] = hmac.new(
+            self.api_secret.encode('utf-8'), query.encode('utf-8'), hashlib.sha256
+        ).hexdigest()
+        return params
+    
+    async def _request(self, http_method: str, name: str, params: Dict = None,
+                       signed: bool = False, priority: int = None):
+        """
+        发送请求，网络错误和5xx按接口熔断和时间预算重试
+        
+        每次尝试前在超时之外获取限流额度，本地限流等待或418/429暂停不会被当作接口超时
+        """
+        _, method = self._endpoint(name)
+        params = {k: v for k, v in (params or {}).items() if v is not None}
+        weight = estimate_weight(method, params)
+        priority = method_priority(method) if priority is None else priority
+        return await binance_network_config.retry_async(
+            self._send, http_method, name, params, signed,
+            endpoint=f"async_{name}", retry_on=RETRYABLE_ASYNC_ERRORS,
+            before_attempt=lambda: self.rate_limiter.acquire_async(weight, priority)
+        )
+    
+    async def _send(self, http_method: str, name: str, params: Dict, signed: bool = False):
+        """发送单次请求（签名、校准权重），返回解析后的JSON；限流额度由_request获取"""
+        path, _ = self._endpoint(name)
+        
+        if signed:
+            params = self._sign(params)
+        
+        session = self._get_session()
+        async with session.request(http_method, f"{self.base_url}{path}", params=params) as response:
+            self.rate_limiter.update_from_headers(response.headers)
+            
+            try:
+                data = await response.json(content_type=None)
+            except Exception:
+                data = {'msg': await response.text()}
+            
+            if response.status >= 400:
+                if response.status in (418, 429):
+                    retry_after = response.headers.get('Retry-After')
+                    self.rate_limiter.on_rate_limit_error(
+                        response.status, float(retry_after) if retry_after else None
+                    )
+                code = data.get('code', 0) if isinstance(data, dict) else 0
+                message = data.get('msg', '') if isinstance(data, dict) else str(data)
+                if response.status >= 500:
+                    raise AsyncBinanceServerError(response.status, code, message)
+                raise AsyncBinanceAPIException(response.status, code, message)
+            
+            return data
+    
+    # ---------- 行情 ----------
+    
+    async def get_klines(self, symbol, interval='1h', limit=500, start_ms=None, end_ms=None) -> pd.DataFrame:
+        """获取K线数据"""
+        try:
+            klines = await self._request('GET', 'klines', {
+                'symbol': symbol,
+                'interval': interval,
+                'limit': limit,
+                'startTime': start_ms,
+                'endTime': end_ms
+            })
+            return BinanceClient._klines_to_dataframe(klines)
+        except Exception as e:
+            self.logger.error(f"获取K线数据失败: {e}")
+            return pd.DataFrame()
+    
+    async def get_ticker_price(self, symbol) -> Optional[float]:
+        """获取当前价格"""
+        try:
+            ticker = await self._request('GET', 'ticker_price', {'symbol': symbol})
+            if ticker:
+                return float(ticker['price'])
+            return None
+        except Exception as e:
+            self.logger.error(f"获取价格失败: {e}")
+            return None
+    
+    async def get_ticker_prices(self, symbols: List[str]) -> Dict[str, float]:
+        """并发获取多个交易对的价格"""
+        prices = await asyncio.gather(*[self.get_ticker_price(symbol) for symbol in symbols])
+        return {symbol: price for symbol, price in zip(symbols, prices) if price is not None}
+    
+    async def get_order_book(self, symbol, limit=100) -> Optional[Dict]:
+        """获取订单簿"""
+        try:
+            return await self._request('GET', 'depth', {'symbol': symbol, 'limit': limit})
+        except Exception as e:
+            self.logger.error(f"获取订单簿失败: {e}")
+            return None
+    
+    # ---------- 账户 ----------
+    
+    async def get_positions(self) -> List[Dict]:
+        """获取合约持仓（只返回有持仓的交易对）"""
+        if self.trading_mode != 'FUTURES':
+            self.logger.warning("只有合约交易支持持仓查询")
+            return []
+        
+        try:
+            positions = await self._request('GET', 'position_risk', signed=True)
+            return [pos for pos in positions if float(pos['positionAmt']) != 0]
+        except Exception as e:
+            self.logger.error(f"获取持仓失败: {e}")
+            return []
+    
+    async def get_account_balance(self) -> Optional[Dict]:
+        """获取账户余额详情（格式与BinanceClient.get_account_balance一致）"""
+        try:
+            account = await self._request('GET', 'account', signed=True)
+            if self.trading_mode == 'FUTURES':
+                return {
+                    'totalWalletBalance': float(account['totalWalletBalance']),
+                    'totalUnrealizedProfit': float(account['totalUnrealizedProfit']),
+                    'totalMarginBalance': float(account['totalMarginBalance']),
+                    'totalPositionInitialMargin': float(account['totalPositionInitialMargin']),
+                    'totalOpenOrderInitialMargin': float(account['totalOpenOrderInitialMargin']),
+                    'availableBalance': float(account['availableBalance']),
+                    'maxWithdrawAmount': float(account['maxWithdrawAmount']),
+                    'assets': account['assets'],
+                    'positions': account['positions']
+                }
+            
+            balances = [
+                balance for balance in account['balances']
+                if float(balance['free']) > 0 or float(balance['locked']) > 0
+            ]
+            return {
+                'totalAssetOfBtc': float(account.get('totalAssetOfBtc', 0)),
+                'balances': balances
+            }
+        except Exception as e:
+            self.logger.error(f"获取账户余额失败: {e}")
+            return None
+    
+    async def get_position_mode(self) -> Optional[bool]:
+        """获取持仓模式（True为双向持仓），结果缓存"""
+        if self.trading_mode != 'FUTURES':
+            return None
+        if self._position_mode is None:
+            try:
+                result = await self._request('GET', 'position_mode', signed=True)
+                self._position_mode = bool(result.get('dualSidePosition'))
+            except Exception as e:
+                self.logger.error(f"获取持仓模式失败: {e}")
+                return None
+        return self._position_mode
+    
+    # ---------- 交易 ----------
+    
+    async def place_order(self, symbol, side, quantity, order_type='MARKET', price=None,
+                          position_side='BOTH', reduce_only=False, client_order_id=None):
+        """
+        下单（参数与BinanceClient.place_order一致）
+        
+        超时重试会重复提交POST /order，未指定client_order_id时生成一个，
+        保证重试时交易所按newClientOrderId去重，不会重复下单
+        """
+        client_order_id = client_order_id or new_client_order_id()
+        try:
+            # 使用同步客户端缓存的交易规则调整精度
+            if self.precision_client is not None:
+                symbol_info = self.precision_client.get_symbol_meta(symbol)
+                if symbol_info:
+                    quantity = self.precision_client._adjust_quantity_precision(quantity, symbol_info)
+                    if price and order_type == 'LIMIT':
+                        price = self.precision_client._adjust_price_precision(price, symbol_info)
+                quantity_text, price_text = self.precision_client.format_order_values(symbol, quantity, price)
+            else:
+                quantity_text = format_decimal(quantity)
+                price_text = format_decimal(price) if price else None
+            
+            params = {
+                'symbol': symbol,
+                'side': side,
+                'type': order_type,
+                'quantity': quantity_text,
+                'newClientOrderId': client_order_id
+            }
+            if order_type == 'LIMIT':
+                params['price'] = price_text
+                params['timeInForce'] = 'GTC'
+            
+            if self.trading_mode == 'FUTURES':
+                position_mode = await self.get_position_mode()
+                if position_mode and position_side == 'BOTH':
+                    position_side = 'LONG' if side == 'BUY' else 'SHORT'
+                if position_mode and position_side:
+                    params['positionSide'] = position_side
+                if reduce_only:
+                    params['reduceOnly'] = 'true'
+            
+            self.logger.info(f"下单: {symbol} {side} {quantity} @ {price if price else 'MARKET'}")
+            try:
+                order = await self._request('POST', 'order', params, signed=True)
+            except AsyncBinanceAPIException as e:
+                if 'duplicate' not in e.message.lower():
+                    raise
+                # 超时的那次请求实际已到达交易所，重试被按newClientOrderId拒绝，查询已下的订单
+                self.logger.warning(f"订单 {client_order_id} 已提交过，查询订单状态")
+                order = await self._request('GET', 'order_status', {
+                    'symbol': symbol, 'origClientOrderId': client_order_id
+                }, signed=True)
+            
+            if order:
+                self.logger.info(f"订单成功: {order.get('orderId', 'N/A')}")
+            return order
+        
+        except Exception as e:
+            self.logger.error(f"下单失败: {e}")
+            return None
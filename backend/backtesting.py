@@ -7,6 +7,7 @@ from dataclasses import dataclass
 import matplotlib.pyplot as plt
 import seaborn as sns
 from backend.data_collector import DataCollector
+from backend.fill_models import FillModel, create_fill_model
 
 @dataclass
 class BacktestResult:
@@ -28,23 +29,44 @@ class BacktestResult:
 class BacktestEngine:
     """回测引擎"""
     
-    def __init__(self, initial_capital: float = 10000.0, commission: float = 0.001):
+    def __init__(self, initial_capital: float = 10000.0, commission: float = 0.001,
+                 fill_model: FillModel = None):
+        """
+        Args:
+            fill_model: 成交模型（见 backend.fill_models），默认按 BACKTEST_FILL_MODEL 配置创建
+        """
+        from config.config import Config
         self.initial_capital = initial_capital
         self.commission = commission  # 手续费率
+        self.fill_model = fill_model or create_fill_model(Config().BACKTEST_FILL_MODEL)
         self.data_collector = DataCollector()
         self.logger = logging.getLogger(__name__)
     
-    def run_backtest(self, strategy, symbol: str, start_date: str, end_date: str, 
-                    interval: str = '1h') -> BacktestResult:
-        """运行回测"""
+    def run_backtest(self, strategy, symbol: str, start_date: str = None, end_date: str = None, 
+                    interval: str = '1h', data: pd.DataFrame = None, trade_start: int = 0) -> BacktestResult:
+        """
+        运行回测
+        
+        Args:
+            data: 可选，已计算技术指标的K线（如参数优化时缓存的数据切片），给定时不再读取数据库
+            trade_start: 从第几根K线开始交易和统计，之前的K线只作为指标预热数据
+        """
         try:
-            # 获取历史数据
-            data = self._get_historical_data(symbol, start_date, end_date, interval)
-            if data.empty:
-                raise ValueError("无法获取历史数据")
-            
-            # 计算技术指标
-            data = self.data_collector.calculate_technical_indicators(data, symbol)
+            if data is None:
+                # 获取历史数据
+                data = self._get_historical_data(symbol, start_date, end_date, interval)
+                if data.empty:
+                    raise ValueError("无法获取历史数据")
+                
+                # 计算技术指标
+                data = self.data_collector.calculate_technical_indicators(data, symbol)
+            elif data.empty:
+                raise ValueError("回测数据为空")
+            if not 0 <= trade_start < len(data):
+                raise ValueError(f"trade_start超出数据范围: {trade_start}")
+            self.fill_model.prepare(
+                symbol, data.iloc[trade_start]['timestamp'], data.iloc[-1]['timestamp'], interval
+            )
             
             # 初始化回测状态
             capital = self.initial_capital
@@ -54,10 +76,11 @@ class BacktestEngine:
             equity_curve = []
             
             # 遍历历史数据进行回测
-            for i in range(len(data)):
+            for i in range(trade_start, len(data)):
                 current_data = data.iloc[:i+1]
-                current_price = data.iloc[i]['close']
-                current_time = data.iloc[i]['timestamp']
+                bar = data.iloc[i]
+                current_price = bar['close']
+                current_time = bar['timestamp']
                 
                 # 跳过数据不足的情况
                 min_data_required = getattr(strategy, 'min_training_samples', 50)
@@ -72,27 +95,29 @@ class BacktestEngine:
                 if signal == 'BUY' and position <= 0:
                     # 买入信号
                     if position < 0:  # 先平空仓
-                        profit = (entry_price - current_price) * abs(position)
-                        capital += profit - (abs(position) * current_price * self.commission)
+                        exit_price = self._fill_price('BUY', abs(position), bar)
+                        profit, cash_flow = self._close_position(position, entry_price, exit_price)
+                        capital += cash_flow
                         trades.append({
                             'timestamp': current_time,
                             'action': 'COVER',
-                            'price': current_price,
+                            'price': exit_price,
                             'quantity': abs(position),
                             'profit': profit,
                             'capital': capital
                         })
+                        position = 0
                     
                     # 开多仓
                     position_size = strategy.calculate_position_size(current_price, capital)
                     if position_size > 0:
                         position = position_size
-                        entry_price = current_price
-                        capital -= position * current_price * (1 + self.commission)
+                        entry_price = self._fill_price('BUY', position_size, bar)
+                        capital -= position * entry_price * (1 + self.commission)
                         trades.append({
                             'timestamp': current_time,
                             'action': 'BUY',
-                            'price': current_price,
+                            'price': entry_price,
                             'quantity': position,
                             'profit': 0,
                             'capital': capital
@@ -101,28 +126,30 @@ class BacktestEngine:
                 elif signal == 'SELL' and position >= 0:
                     # 卖出信号
                     if position > 0:  # 先平多仓
-                        profit = (current_price - entry_price) * position
-                        capital += profit + (position * current_price * (1 - self.commission))
+                        exit_price = self._fill_price('SELL', position, bar)
+                        profit, cash_flow = self._close_position(position, entry_price, exit_price)
+                        capital += cash_flow
                         trades.append({
                             'timestamp': current_time,
                             'action': 'SELL',
-                            'price': current_price,
+                            'price': exit_price,
                             'quantity': position,
                             'profit': profit,
                             'capital': capital
                         })
+                        position = 0
                     
                     # 开空仓（如果策略支持）
                     if hasattr(strategy, 'allow_short') and strategy.allow_short:
                         position_size = strategy.calculate_position_size(current_price, capital)
                         if position_size > 0:
                             position = -position_size
-                            entry_price = current_price
-                            capital += position_size * current_price * (1 - self.commission)
+                            entry_price = self._fill_price('SELL', position_size, bar)
+                            capital += position_size * entry_price * (1 - self.commission)
                             trades.append({
                                 'timestamp': current_time,
                                 'action': 'SHORT',
-                                'price': current_price,
+                                'price': entry_price,
                                 'quantity': position_size,
                                 'profit': 0,
                                 'capital': capital
@@ -131,12 +158,13 @@ class BacktestEngine:
                 # 检查止损止盈
                 if position != 0:
                     if strategy.should_stop_loss(current_price):
-                        profit = self._close_position(position, entry_price, current_price)
-                        capital += profit
+                        exit_price = self._fill_price('SELL' if position > 0 else 'BUY', abs(position), bar)
+                        profit, cash_flow = self._close_position(position, entry_price, exit_price)
+                        capital += cash_flow
                         trades.append({
                             'timestamp': current_time,
                             'action': 'STOP_LOSS',
-                            'price': current_price,
+                            'price': exit_price,
                             'quantity': abs(position),
                             'profit': profit,
                             'capital': capital
@@ -144,31 +172,29 @@ class BacktestEngine:
                         position = 0
                     
                     elif strategy.should_take_profit(current_price):
-                        profit = self._close_position(position, entry_price, current_price)
-                        capital += profit
+                        exit_price = self._fill_price('SELL' if position > 0 else 'BUY', abs(position), bar)
+                        profit, cash_flow = self._close_position(position, entry_price, exit_price)
+                        capital += cash_flow
                         trades.append({
                             'timestamp': current_time,
                             'action': 'TAKE_PROFIT',
-                            'price': current_price,
+                            'price': exit_price,
                             'quantity': abs(position),
                             'profit': profit,
                             'capital': capital
                         })
                         position = 0
                 
-                # 计算当前权益
-                current_equity = capital
-                if position != 0:
-                    unrealized_pnl = self._calculate_unrealized_pnl(position, entry_price, current_price)
-                    current_equity += unrealized_pnl
+                # 计算当前权益：现金 + 持仓市值（空仓持仓为负，开空收到的资金已计入现金）
+                current_equity = capital + position * current_price
                 
                 equity_curve.append(current_equity)
             
             # 最后平仓
             if position != 0:
-                final_price = data.iloc[-1]['close']
-                profit = self._close_position(position, entry_price, final_price)
-                capital += profit
+                final_price = self._fill_price('SELL' if position > 0 else 'BUY', abs(position), data.iloc[-1])
+                profit, cash_flow = self._close_position(position, entry_price, final_price)
+                capital += cash_flow
                 trades.append({
                     'timestamp': data.iloc[-1]['timestamp'],
                     'action': 'FINAL_CLOSE',
@@ -180,7 +206,7 @@ class BacktestEngine:
             
             # 计算回测结果
             result = self._calculate_backtest_metrics(
-                equity_curve, trades, data.iloc[0]['timestamp'], data.iloc[-1]['timestamp']
+                equity_curve, trades, data.iloc[trade_start]['timestamp'], data.iloc[-1]['timestamp']
             )
             
             return result
@@ -195,8 +221,13 @@ class BacktestEngine:
         try:
             self.logger.info(f"获取历史数据: {symbol}, {start_date} 到 {end_date}, 间隔: {interval}")
             
-            # 方法1: 先尝试从数据库获取
-            data = self.data_collector.get_market_data(symbol, interval, limit=10000)
+            # 方法1: 先按时间范围从数据库读取，范围内没有数据时再读取最近的数据
+            data = self.data_collector.get_market_data(
+                symbol, interval, limit=None,
+                start=pd.to_datetime(start_date), end=pd.to_datetime(end_date)
+            )
+            if data.empty:
+                data = self.data_collector.get_market_data(symbol, interval, limit=10000)
             self.logger.info(f"从数据库获取到 {len(data)} 条数据")
             
             # 方法2: 如果数据库没有数据，从API获取
@@ -303,23 +334,29 @@ class BacktestEngine:
             self.logger.error(f"错误详情: {traceback.format_exc()}")
             return pd.DataFrame()
     
-    def _close_position(self, position: float, entry_price: float, current_price: float) -> float:
-        """平仓计算"""
-        if position > 0:  # 多仓
-            profit = (current_price - entry_price) * position
-            total_value = position * current_price * (1 - self.commission)
-        else:  # 空仓
-            profit = (entry_price - current_price) * abs(position)
-            total_value = abs(position) * current_price * (1 + self.commission)
-        
-        return profit + total_value
+    def _fill_price(self, side: str, quantity: float, bar) -> float:
+        """按成交模型计算当前K线上的成交价（传入K线开盘时间，成交模型按收盘时间查找订单簿）"""
+        return self.fill_model.fill_price(
+            side, quantity, bar['close'], bar.get('volume'), bar['timestamp']
+        )
     
-    def _calculate_unrealized_pnl(self, position: float, entry_price: float, current_price: float) -> float:
-        """计算未实现盈亏"""
+    def _close_position(self, position: float, entry_price: float, current_price: float) -> Tuple[float, float]:
+        """
+        平仓计算
+        
+        Returns:
+            (盈亏（扣除平仓手续费）, 现金变动)：平多收回卖出所得，平空支付买回成本
+        """
+        quantity = abs(position)
+        fee = quantity * current_price * self.commission
         if position > 0:  # 多仓
-            return (current_price - entry_price) * position
+            profit = (current_price - entry_price) * quantity - fee
+            cash_flow = quantity * current_price - fee
         else:  # 空仓
-            return (entry_price - current_price) * abs(position)
+            profit = (entry_price - current_price) * quantity - fee
+            cash_flow = -quantity * current_price - fee
+        
+        return profit, cash_flow
     
     def _calculate_backtest_metrics(self, equity_curve: List[float], trades: List[Dict],
                                   start_date: datetime, end_date: datetime) -> BacktestResult:
@@ -408,6 +445,7 @@ class BacktestEngine:
 交易对: {symbol}
 初始资金: ${self.initial_capital:,.2f}
 手续费率: {self.commission:.3%}
+成交模型: {self.fill_model.describe()}
 
 === 收益指标 ===
 总收益率: {result.total_return:.2%}
@@ -1,15 +1,39 @@
 import json
 import os
-from decimal import Decimal, getcontext
+from decimal import Decimal, ROUND_DOWN, getcontext
 from binance.client import Client
 from binance.exceptions import BinanceAPIException
+from binance.helpers import convert_ts_str, interval_to_milliseconds
 import pandas as pd
 import logging
-from typing import Dict, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Union
 from config.config import Config
 from backend.network_config import binance_network_config
+from backend.rate_limiter import get_rate_limiter, estimate_weight, method_priority
+from backend.symbol_metadata import SymbolMeta, format_decimal, build_symbol_meta, build_symbol_index, save_symbol_index, load_symbol_index
+from backend.order_executor import new_client_order_id
 import time
 
+# 合约批量下单接口每次最多5个订单
+FUTURES_BATCH_ORDER_SIZE = 5
+
+# python-binance 会把全部关键字参数编码进请求并自行签名（添加timestamp、recvWindow）的接口，
+# 额外传入签名参数会在请求中重复出现（-1101）
+SELF_SIGNED_APIS = ('futures_place_batch_order',)
+SIGNING_PARAMS = ('timestamp', 'recvWindow', 'signature')
+
+
+def check_unique_params(method: str, params: Dict) -> None:
+    """检查发出的请求参数中签名参数不会重复，违反时抛出ValueError"""
+    if method in SELF_SIGNED_APIS:
+        duplicated = [key for key in SIGNING_PARAMS if key in params]
+        for order in params.get('batchOrders') or []:
+            if isinstance(order, dict):
+                duplicated += [key for key in SIGNING_PARAMS if key in order]
+        if duplicated:
+            raise ValueError(f"{method} 请求参数重复: {sorted(set(duplicated))}")
+
 class BinanceClient:
     def __init__(self, trading_mode='SPOT'):
         """
@@ -63,10 +87,31 @@ class BinanceClient:
         self.logger = logging.getLogger(__name__)
         self.logger.info(f"币安客户端初始化完成，交易模式: {self.trading_mode}")
         
+        # 进程内共享的请求权重限流器
+        self.rate_limiter = get_rate_limiter(self.trading_mode)
+        # 每个HTTP响应在发出请求的线程里校准权重，不读共享的client.response
+        self.client.session.hooks['response'].append(self._on_http_response)
+        
         # 缓存exchange info
         self._exchange_info_cache = None
         self._exchange_info_cache_time = 0
         self._cache_duration = 3600  # 1小时缓存
+        self._local_exchange_info = None
+        self._local_exchange_info_mtime = None
+        
+        # 交易对元数据索引（交易所信息刷新时重建，并保存到磁盘）
+        self._symbol_index: Dict[str, SymbolMeta] = None
+        self._symbol_index_time = 0
+        self._symbol_index_source = None
+        self._symbol_info_by_name: Dict[str, Dict] = {}
+        self._position_mode = None  # 持仓模式缓存（True为双向持仓）
+        self.account_state = None  # 用户数据流维护的本地账户状态（见attach_account_state）
+        self._account_state_health_check = None
+        # 测试网和主网的交易对与过滤器不同，缓存文件按环境区分
+        environment = 'testnet' if self.config.BINANCE_TESTNET else 'live'
+        self._symbol_index_path = os.path.join(
+            self.config.SYMBOL_META_CACHE_DIR, f"symbol_meta_{self.trading_mode.lower()}_{environment}.json"
+        )
         
         # 验证API连接
         self._verify_connection()
@@ -76,11 +121,11 @@ class BinanceClient:
         try:
             if self.trading_mode == 'FUTURES':
                 # 验证合约API连接
-                account = self.client.futures_account()
+                account = self.throttled_call(self.client.futures_account)
                 self.logger.info("合约API连接验证成功")
             else:
                 # 验证现货API连接
-                account = self.client.get_account()
+                account = self.throttled_call(self.client.get_account)
                 self.logger.info("现货API连接验证成功")
         except BinanceAPIException as e:
             self.logger.error(f"API连接验证失败: {e}")
@@ -93,6 +138,36 @@ class BinanceClient:
         except Exception as e:
             self.logger.error(f"API连接验证异常: {e}")
     
+    def throttled_call(self, api_func, *args, priority: int = None, **kwargs):
+        """
+        经过权重限流的API调用
+        
+        调用前按接口权重获取额度（响应头由_on_http_response逐个请求校准），
+        遇到429/418时通知限流器暂停请求；异常原样抛出
+        """
+        method = getattr(api_func, '__name__', '')
+        weight = estimate_weight(method, kwargs)
+        if priority is None:
+            priority = method_priority(method)
+        
+        self.rate_limiter.acquire(weight, priority)
+        try:
+            result = api_func(*args, **kwargs)
+        except BinanceAPIException as e:
+            if e.status_code in (418, 429):
+                retry_after = None
+                headers = getattr(getattr(e, 'response', None), 'headers', None)
+                if headers and headers.get('Retry-After'):
+                    retry_after = float(headers.get('Retry-After'))
+                self.rate_limiter.on_rate_limit_error(e.status_code, retry_after)
+            raise
+        return result
+    
+    def _on_http_response(self, response, *args, **kwargs):
+        """requests响应钩子：用本次响应的头校准已用权重"""
+        self.rate_limiter.update_from_headers(response.headers)
+        return response
+    
     def _safe_api_call(self, api_func, *args, **kwargs):
         """安全的API调用，带重试机制"""
         def api_wrapper():
@@ -103,7 +178,7 @@ class BinanceClient:
                 signed_apis = [
                     'get_account', 'get_asset_balance', 'get_open_orders', 
                     'cancel_order', 'order_market', 'order_limit',
-                    'futures_account', 'futures_position_information',
+                    'futures_account', 'futures_position_information', 'futures_symbol_config',
                     'futures_change_leverage', 'futures_change_margin_type',
                     'futures_change_position_mode', 'futures_create_order',
                     'futures_get_open_orders', 'futures_cancel_order',
@@ -116,8 +191,13 @@ class BinanceClient:
                     'futures_symbol_ticker', 'get_exchange_info'
                 ]
                 
+                # 由python-binance自行签名的接口不添加签名参数
+                if func_name in SELF_SIGNED_APIS:
+                    for key in SIGNING_PARAMS:
+                        kwargs.pop(key, None)
+                    check_unique_params(func_name, kwargs)
                 # 只对需要签名的API添加参数
-                if any(api_name in func_name for api_name in signed_apis):
+                elif any(api_name in func_name for api_name in signed_apis):
                     if 'timestamp' not in kwargs:
                         kwargs['timestamp'] = int(time.time() * 1000)
                     if 'recvWindow' not in kwargs:
@@ -126,10 +206,12 @@ class BinanceClient:
                 elif any(api_name in func_name for api_name in public_apis):
                     pass  # 不添加任何参数
             
-            return api_func(*args, **kwargs)
+            return self.throttled_call(api_func, *args, **kwargs)
         
         try:
-            return binance_network_config.retry_with_backoff(api_wrapper)
+            return binance_network_config.retry_with_backoff(
+                api_wrapper, endpoint=getattr(api_func, '__name__', None)
+            )
         except Exception as e:
             self.logger.error(f"API调用失败: {e}")
             return None
@@ -142,8 +224,39 @@ class BinanceClient:
             self.logger.error(f"获取账户信息失败: {e}")
             return None
     
+    def attach_account_state(self, account_state, health_check: Callable[[], bool] = None):
+        """
+        接入用户数据流维护的账户状态，之后余额和持仓查询直接读取本地状态
+        
+        Args:
+            health_check: 用户数据流是否健康（已连接且listenKey有效），不健康时回退到REST
+        """
+        self.account_state = account_state
+        self._account_state_health_check = health_check
+    
+    def _live_account_state(self, balances: bool = False):
+        """
+        用户数据流在线时返回本地账户状态，否则返回None（回退到REST）
+        
+        Args:
+            balances: 是否读取余额；合约下单后可用余额在REST刷新前不可信
+        """
+        state = self.account_state
+        if state is None or not state.ready:
+            return None
+        if balances and state.margin_stale:
+            return None
+        health_check = self._account_state_health_check
+        if health_check is not None and not health_check():
+            return None
+        return state
+    
     def get_balance(self, asset='USDT'):
         """获取指定资产余额"""
+        state = self._live_account_state(balances=True)
+        if state is not None:
+            return state.get_balance(asset)
+        
         try:
             if self.trading_mode == 'FUTURES':
                 # 合约账户余额
@@ -165,94 +278,134 @@ class BinanceClient:
         """获取K线数据"""
         try:
             # 直接调用，不使用_safe_api_call，因为这是公开API
-            klines = self.client.get_klines(
+            klines = self.throttled_call(
+                self.client.get_klines,
                 symbol=symbol,
                 interval=interval,
                 limit=limit
             )
             
-            if not klines:
-                return pd.DataFrame()
+            return self._klines_to_dataframe(klines)
             
-            # 转换为DataFrame
-            df = pd.DataFrame(klines, columns=[
-                'timestamp', 'open', 'high', 'low', 'close', 'volume',
-                'close_time', 'quote_asset_volume', 'number_of_trades',
-                'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
-            ])
+        except BinanceAPIException as e:
+            self.logger.error(f"获取K线数据失败: {e}")
+            return pd.DataFrame()
+    
+    def get_historical_klines(self, symbol, interval, start_str, end_str=None, limit=1000):
+        """
+        获取历史K线数据
+        
+        逐页请求get_klines，每页单独经过限流器扣减权重
+        """
+        try:
+            start_ms = convert_ts_str(start_str)
+            end_ms = convert_ts_str(end_str) if end_str else None
+            step = interval_to_milliseconds(interval)
             
-            # 转换数据类型
-            numeric_columns = ['open', 'high', 'low', 'close', 'volume']
-            for col in numeric_columns:
-                df[col] = pd.to_numeric(df[col])
+            klines = []
+            while True:
+                kwargs = {
+                    'symbol': symbol,
+                    'interval': interval,
+                    'startTime': start_ms,
+                    'limit': limit
+                }
+                if end_ms is not None:
+                    kwargs['endTime'] = end_ms
+                
+                # 直接调用，不使用_safe_api_call，因为这是公开API
+                page = self.throttled_call(self.client.get_klines, **kwargs)
+                klines.extend(page)
+                if len(page) < limit or step is None:
+                    break
+                start_ms = page[-1][0] + step
+                if end_ms is not None and start_ms > end_ms:
+                    break
             
-            df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-            return df
+            return self._klines_to_dataframe(klines)
             
         except BinanceAPIException as e:
-            self.logger.error(f"获取K线数据失败: {e}")
+            self.logger.error(f"获取历史K线数据失败: {e}")
             return pd.DataFrame()
     
-    def get_historical_klines(self, symbol, interval, start_str, end_str=None, limit=1000):
-        """获取历史K线数据"""
+    def get_klines_range(self, symbol, interval, start_ms, end_ms=None, limit=1000):
+        """
+        按毫秒时间范围获取一页K线数据（单次请求，最多limit条）
+        
+        用于增量补数据，调用方负责分页；请求失败时返回None，与交易所确实没有数据（空DataFrame）区分
+        """
         try:
             kwargs = {
                 'symbol': symbol,
                 'interval': interval,
-                'start_str': start_str,
+                'startTime': int(start_ms),
                 'limit': limit
             }
-            if end_str:
-                kwargs['end_str'] = end_str
-            
-            # 直接调用，不使用_safe_api_call，因为这是公开API
-            klines = self.client.get_historical_klines(**kwargs)
-            
-            if not klines:
-                return pd.DataFrame()
-            
-            # 转换为DataFrame
-            df = pd.DataFrame(klines, columns=[
-                'timestamp', 'open', 'high', 'low', 'close', 'volume',
-                'close_time', 'quote_asset_volume', 'number_of_trades',
-                'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
-            ])
+            if end_ms is not None:
+                kwargs['endTime'] = int(end_ms)
             
-            # 转换数据类型
-            numeric_columns = ['open', 'high', 'low', 'close', 'volume']
-            for col in numeric_columns:
-                df[col] = pd.to_numeric(df[col])
-            
-            df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-            return df
+            klines = self.throttled_call(self.client.get_klines, **kwargs)
+            return self._klines_to_dataframe(klines)
             
         except BinanceAPIException as e:
-            self.logger.error(f"获取历史K线数据失败: {e}")
+            self.logger.error(f"获取K线数据失败: {e}")
+            return None
+    
+    @staticmethod
+    def _klines_to_dataframe(klines) -> pd.DataFrame:
+        """将K线原始数组转换为DataFrame"""
+        if not klines:
             return pd.DataFrame()
+        
+        df = pd.DataFrame(klines, columns=[
+            'timestamp', 'open', 'high', 'low', 'close', 'volume',
+            'close_time', 'quote_asset_volume', 'number_of_trades',
+            'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
+        ])
+        
+        # 转换数据类型
+        numeric_columns = ['open', 'high', 'low', 'close', 'volume', 'quote_asset_volume']
+        for col in numeric_columns:
+            df[col] = pd.to_numeric(df[col])
+        
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+        return df
     
     def _is_valid_symbol(self, symbol: str) -> bool:
         """检查交易对是否有效"""
         try:
-            exchange_info = self.get_exchange_info()
-            
-            if exchange_info:
-                for s in exchange_info['symbols']:
-                    if s['symbol'] == symbol and s['status'] == 'TRADING':
-                        return True
-            return False
+            meta = self.get_symbol_meta(symbol)
+            return meta is not None and meta.is_trading
         except Exception as e:
             self.logger.error(f"检查交易对有效性失败: {e}")
             return False
     
+    def get_ticker_prices(self, symbols=None) -> Dict[str, float]:
+        """一次请求获取全部交易对的最新价格（可按symbols过滤）"""
+        try:
+            if self.trading_mode == 'FUTURES':
+                tickers = self.throttled_call(self.client.futures_symbol_ticker)
+            else:
+                tickers = self.throttled_call(self.client.get_symbol_ticker)
+            
+            wanted = set(symbols) if symbols else None
+            return {
+                t['symbol']: float(t['price'])
+                for t in tickers or [] if wanted is None or t['symbol'] in wanted
+            }
+        except Exception as e:
+            self.logger.error(f"批量获取价格失败: {e}")
+            return {}
+    
     def get_ticker_price(self, symbol):
         """获取当前价格"""
         try:
             if self.trading_mode == 'FUTURES':
                 # 直接调用，不使用_safe_api_call，因为这是公开API
-                ticker = self.client.futures_symbol_ticker(symbol=symbol)
+                ticker = self.throttled_call(self.client.futures_symbol_ticker, symbol=symbol)
             else:
                 # 直接调用，不使用_safe_api_call，因为这是公开API
-                ticker = self.client.get_symbol_ticker(symbol=symbol)
+                ticker = self.throttled_call(self.client.get_symbol_ticker, symbol=symbol)
             
             if ticker:
                 return float(ticker['price'])
@@ -261,27 +414,39 @@ class BinanceClient:
             self.logger.error(f"获取价格失败: {e}")
             return None
     
-    def get_position_mode(self):
-        """获取当前持仓模式"""
+    def get_position_mode(self, refresh: bool = False):
+        """获取当前持仓模式（结果缓存，设置持仓模式时更新）"""
         if self.trading_mode != 'FUTURES':
             return None
         
+        if self._position_mode is not None and not refresh:
+            return self._position_mode
+        
         try:
-            # 获取账户信息
-            account_info = self._safe_api_call(self.client.futures_account)
-            if account_info and 'dualSidePosition' in account_info:
-                return account_info['dualSidePosition']
+            if hasattr(self.client, 'futures_get_position_mode'):
+                result = self._safe_api_call(self.client.futures_get_position_mode)
+            else:
+                # 旧版本客户端从账户信息中读取
+                result = self._safe_api_call(self.client.futures_account)
+            if result and 'dualSidePosition' in result:
+                self._position_mode = bool(result['dualSidePosition'])
+                return self._position_mode
             return None
         except Exception as e:
             self.logger.error(f"获取持仓模式失败: {e}")
             return None
 
     def place_order(self, symbol, side, quantity, order_type='MARKET', price=None, 
-                   leverage=None, position_side='BOTH', reduce_only=False):
-        """下单"""
+                   leverage=None, position_side='BOTH', reduce_only=False, client_order_id=None):
+        """
+        下单
+        
+        Args:
+            client_order_id: 客户端订单ID（newClientOrderId），重复提交同一ID不会产生重复订单
+        """
         try:
-            # 获取交易对信息以确定精度
-            symbol_info = self._get_symbol_info(symbol)
+            # 获取交易对元数据以确定精度
+            symbol_info = self.get_symbol_meta(symbol)
             if symbol_info:
                 # 调整数量精度 - 这会自动确保数量符合LOT_SIZE要求
                 quantity = self._adjust_quantity_precision(quantity, symbol_info)
@@ -297,72 +462,29 @@ class BinanceClient:
                 if leverage:
                     self.set_leverage(symbol, leverage)
                 
-                # 检查持仓模式并调整position_side
-                position_mode = self.get_position_mode()
-                if position_mode is not None:
-                    if not position_mode:  # 单向持仓模式
-                        # 单向持仓模式下，不需要指定positionSide
-                        position_side = None
-                    else:  # 双向持仓模式
-                        # 双向持仓模式下，需要指定LONG或SHORT
-                        if position_side == 'BOTH':
-                            # 根据交易方向确定持仓方向
-                            position_side = 'LONG' if side == 'BUY' else 'SHORT'
-                
-                if order_type == 'MARKET':
-                    # 构建订单参数
-                    order_params = {
-                        'symbol': symbol,
-                        'side': side,
-                        'type': 'MARKET',
-                        'quantity': str(quantity)
-                    }
-                    
-                    # 只在双向持仓模式下添加positionSide
-                    if position_side and position_side != 'BOTH':
-                        order_params['positionSide'] = position_side
-                    
-                    # 只在需要时添加reduceOnly参数
-                    if reduce_only:
-                        order_params['reduceOnly'] = True
-                    
-                    order = self._safe_api_call(self.client.futures_create_order, **order_params)
-                else:
-                    # 构建限价单参数
-                    order_params = {
-                        'symbol': symbol,
-                        'side': side,
-                        'type': 'LIMIT',
-                        'quantity': str(quantity),
-                        'price': price,
-                        'timeInForce': 'GTC'
-                    }
-                    
-                    # 只在双向持仓模式下添加positionSide
-                    if position_side and position_side != 'BOTH':
-                        order_params['positionSide'] = position_side
-                    
-                    # 只在需要时添加reduceOnly参数
-                    if reduce_only:
-                        order_params['reduceOnly'] = True
-                    
-                    order = self._safe_api_call(self.client.futures_create_order, **order_params)
+                order_params = self._futures_order_params(
+                    symbol, side, quantity, order_type, price, position_side, reduce_only, client_order_id
+                )
+                order = self._safe_api_call(self.client.futures_create_order, **order_params)
             else:
                 # 现货交易
+                quantity_text, price_text = self.format_order_values(symbol, quantity, price)
                 if order_type == 'MARKET':
                     order = self._safe_api_call(
                         self.client.order_market,
                         symbol=symbol,
                         side=side,
-                        quantity=str(quantity)
+                        quantity=quantity_text,
+                        **({'newClientOrderId': client_order_id} if client_order_id else {})
                     )
                 else:
                     order = self._safe_api_call(
                         self.client.order_limit,
                         symbol=symbol,
                         side=side,
-                        quantity=str(quantity),
-                        price=str(price) if price else None
+                        quantity=quantity_text,
+                        price=price_text,
+                        **({'newClientOrderId': client_order_id} if client_order_id else {})
                     )
             
             if order:
@@ -384,6 +506,123 @@ class BinanceClient:
             self.logger.error(f"下单异常: {e}")
             return None
     
+    def format_order_values(self, symbol, quantity, price=None):
+        """
+        把数量和价格转为下单用的定点小数字符串
+        
+        按步长/最小价格变动的小数位输出，str(float)对很小的数会产生1e-05这样的科学计数法
+        
+        Returns:
+            (数量字符串, 价格字符串或None)
+        """
+        meta = self.get_symbol_meta(symbol)
+        quantity_text = format_decimal(quantity, meta.quantity_precision if meta and meta.step_size else None)
+        price_text = None
+        if price:
+            price_text = format_decimal(price, meta.price_precision if meta and meta.tick_size else None)
+        return quantity_text, price_text
+    
+    def _futures_order_params(self, symbol, side, quantity, order_type='MARKET', price=None,
+                              position_side='BOTH', reduce_only=False, client_order_id=None) -> Dict:
+        """构建合约下单参数（数量和价格需已调整精度）"""
+        # 检查持仓模式并调整position_side
+        position_mode = self.get_position_mode()
+        if position_mode is not None:
+            if not position_mode:  # 单向持仓模式
+                # 单向持仓模式下，不需要指定positionSide
+                position_side = None
+            else:  # 双向持仓模式
+                # 双向持仓模式下，需要指定LONG或SHORT
+                if position_side == 'BOTH':
+                    # 根据交易方向确定持仓方向
+                    position_side = 'LONG' if side == 'BUY' else 'SHORT'
+        
+        quantity_text, price_text = self.format_order_values(symbol, quantity, price)
+        order_params = {
+            'symbol': symbol,
+            'side': side,
+            'type': 'MARKET' if order_type == 'MARKET' else 'LIMIT',
+            'quantity': quantity_text
+        }
+        if order_type != 'MARKET':
+            order_params['price'] = price_text
+            order_params['timeInForce'] = 'GTC'
+        
+        # 只在双向持仓模式下添加positionSide
+        if position_side and position_side != 'BOTH':
+            order_params['positionSide'] = position_side
+        
+        # 只在需要时添加reduceOnly参数
+        if reduce_only:
+            order_params['reduceOnly'] = True
+        
+        if client_order_id:
+            order_params['newClientOrderId'] = client_order_id
+        
+        return order_params
+    
+    def place_batch_orders(self, orders: List[Dict]) -> List[Optional[Dict]]:
+        """
+        批量下单
+        
+        合约使用批量下单接口（每次最多5个订单），现货并发提交。
+        每个订单都带客户端订单ID，网络重试不会重复下单
+        
+        Args:
+            orders: 每项为place_order的关键字参数（symbol、side、quantity等）
+            
+        Returns:
+            与orders顺序一致的订单结果，失败的订单为None
+        """
+        if not orders:
+            return []
+        
+        orders = [{**o, 'client_order_id': o.get('client_order_id') or new_client_order_id()} for o in orders]
+        
+        if self.trading_mode != 'FUTURES':
+            with ThreadPoolExecutor(max_workers=min(len(orders), self.config.STARTUP_WORKERS)) as executor:
+                return list(executor.map(lambda o: self.place_order(**o), orders))
+        
+        results = []
+        for start in range(0, len(orders), FUTURES_BATCH_ORDER_SIZE):
+            chunk = orders[start:start + FUTURES_BATCH_ORDER_SIZE]
+            batch = []
+            for o in chunk:
+                if o.get('leverage'):
+                    self.set_leverage(o['symbol'], o['leverage'])
+                
+                quantity, price = o['quantity'], o.get('price')
+                symbol_info = self.get_symbol_meta(o['symbol'])
+                if symbol_info:
+                    quantity = self._adjust_quantity_precision(quantity, symbol_info)
+                    if price and o.get('order_type', 'MARKET') == 'LIMIT':
+                        price = self._adjust_price_precision(price, symbol_info)
+                
+                params = self._futures_order_params(
+                    o['symbol'], o['side'], quantity, o.get('order_type', 'MARKET'), price,
+                    o.get('position_side', 'BOTH'), o.get('reduce_only', False), o['client_order_id']
+                )
+                # 批量接口的订单参数需全部为字符串
+                batch.append({k: ('true' if v is True else str(v)) for k, v in params.items()})
+            
+            try:
+                responses = self._safe_api_call(self.client.futures_place_batch_order, batchOrders=batch) or []
+            except Exception as e:
+                self.logger.error(f"批量下单失败: {e}")
+                responses = []
+            
+            for i, o in enumerate(chunk):
+                response = responses[i] if i < len(responses) else None
+                if response and 'orderId' in response:
+                    self.logger.info(f"订单成功: {o['symbol']} {o['side']} {response['orderId']}")
+                    results.append(response)
+                else:
+                    error = response.get('msg') if isinstance(response, dict) else '无响应'
+                    self.logger.error(f"批量下单失败 {o['symbol']} {o['side']}: {error}")
+                    results.append(None)
+        
+        return results
+    
     def get_exchange_info(self):
         """获取交易所信息 - 优先从本地文件读取"""
         try:
@@ -391,8 +630,15 @@ class BinanceClient:
             local_file_path = 'exchangeInfo.json'
             if os.path.exists(local_file_path):
                 try:
+                    # 文件未变化时直接使用已解析的内容
+                    mtime = os.path.getmtime(local_file_path)
+                    if self._local_exchange_info is not None and mtime == self._local_exchange_info_mtime:
+                        return self._local_exchange_info
+                    
                     with open(local_file_path, 'r', encoding='utf-8') as f:
                         exchange_info = json.load(f)
+                    self._local_exchange_info = exchange_info
+                    self._local_exchange_info_mtime = mtime
                     self.logger.info("从本地文件读取交易所信息成功")
                     return exchange_info
                 except Exception as e:
@@ -405,11 +651,11 @@ class BinanceClient:
             
             # 从API获取
             if hasattr(self.client, 'get_exchange_info'):
-                exchange_info = self.client.get_exchange_info()
+                exchange_info = self.throttled_call(self.client.get_exchange_info)
             elif hasattr(self.client, 'get_exchange_information'):
-                exchange_info = self.client.get_exchange_information()
+                exchange_info = self.throttled_call(self.client.get_exchange_information)
             else:
-                exchange_info = self.client.get_exchange_info()
+                exchange_info = self.throttled_call(self.client.get_exchange_info)
             
             # 缓存结果
             self._exchange_info_cache = exchange_info
@@ -425,26 +671,8 @@ class BinanceClient:
     def get_round_count(self, symbol):
         """获取交易对的数量精度位数 - 基于LOT_SIZE的stepSize"""
         try:
-            exchange_info = self.get_exchange_info()
-            if not exchange_info or 'symbols' not in exchange_info:
-                return 6  # 默认精度
-            
-            for symbol_info in exchange_info['symbols']:
-                if symbol_info['symbol'] == symbol:
-                    filters = symbol_info['filters']
-                    for filter_info in filters:
-                        if filter_info['filterType'] == 'LOT_SIZE':
-                            step_size = filter_info['stepSize']
-                            # 计算小数位数
-                            step_str = str(step_size)
-                            if '.' in step_str:
-                                decimal_part = step_str.split('.')[-1]
-                                return len(decimal_part)
-                            else:
-                                return 0
-            
-            return 6  # 默认精度
-            
+            meta = self.get_symbol_meta(symbol)
+            return meta.quantity_precision if meta else 6  # 默认精度
         except Exception as e:
             self.logger.error(f"获取数量精度位数失败: {e}")
             return 6
@@ -452,40 +680,66 @@ class BinanceClient:
     def get_price_precision(self, symbol):
         """获取交易对的价格精度位数 - 基于PRICE_FILTER的tickSize"""
         try:
-            exchange_info = self.get_exchange_info()
-            if not exchange_info or 'symbols' not in exchange_info:
-                return 2  # 默认精度
-            
-            for symbol_info in exchange_info['symbols']:
-                if symbol_info['symbol'] == symbol:
-                    filters = symbol_info['filters']
-                    for filter_info in filters:
-                        if filter_info['filterType'] == 'PRICE_FILTER':
-                            tick_size = filter_info['tickSize']
-                            # 计算小数位数
-                            tick_str = str(tick_size)
-                            if '.' in tick_str:
-                                decimal_part = tick_str.split('.')[-1]
-                                return len(decimal_part)
-                            else:
-                                return 0
-            
-            return 2  # 默认精度
-            
+            meta = self.get_symbol_meta(symbol)
+            return meta.price_precision if meta else 2  # 默认精度
         except Exception as e:
             self.logger.error(f"获取价格精度位数失败: {e}")
             return 2
 
+    def get_symbol_meta(self, symbol) -> Optional[SymbolMeta]:
+        """获取交易对元数据（字典查找）"""
+        return self._get_symbol_index().get(symbol)
+    
+    def _get_symbol_index(self) -> Dict[str, SymbolMeta]:
+        """
+        获取交易对元数据索引
+        
+        首次使用时优先加载磁盘缓存；过期后从交易所信息重建并写回磁盘
+        """
+        now = time.time()
+        if self._symbol_index is None:
+            loaded = load_symbol_index(self._symbol_index_path)
+            if loaded:
+                self._symbol_index, self._symbol_index_time = loaded
+        
+        if self._symbol_index is not None and now - self._symbol_index_time < self._cache_duration:
+            return self._symbol_index
+        
+        exchange_info = self.get_exchange_info()
+        if exchange_info and exchange_info is not self._symbol_index_source:
+            self._rebuild_symbol_index(exchange_info)
+        self._symbol_index_time = now
+        
+        if self._symbol_index is None:
+            self._symbol_index = {}
+        return self._symbol_index
+    
+    def _rebuild_symbol_index(self, exchange_info):
+        """根据交易所信息重建索引并保存到磁盘"""
+        self._symbol_index = build_symbol_index(exchange_info)
+        self._symbol_info_by_name = {s['symbol']: s for s in exchange_info.get('symbols', [])}
+        self._symbol_index_source = exchange_info
+        try:
+            save_symbol_index(self._symbol_index, self._symbol_index_path)
+        except Exception as e:
+            self.logger.warning(f"保存交易对元数据缓存失败: {e}")
+        self.logger.info(f"交易对元数据索引已更新: {len(self._symbol_index)} 个交易对")
+    
+    def _resolve_symbol_meta(self, symbol_info) -> Optional[SymbolMeta]:
+        """symbol_info可以是SymbolMeta或exchange_info中的原始字典"""
+        if symbol_info is None or isinstance(symbol_info, SymbolMeta):
+            return symbol_info
+        return self.get_symbol_meta(symbol_info['symbol']) or build_symbol_meta(symbol_info)
+
     def _get_symbol_info(self, symbol):
-        """获取交易对信息"""
+        """获取交易对原始信息（exchange_info中的字典）"""
         try:
-            exchange_info = self.get_exchange_info()
-            
-            if exchange_info:
-                for s in exchange_info['symbols']:
-                    if s['symbol'] == symbol:
-                        return s
-            return None
+            if symbol not in self._symbol_info_by_name:
+                exchange_info = self.get_exchange_info()
+                if exchange_info and exchange_info is not self._symbol_index_source:
+                    self._rebuild_symbol_index(exchange_info)
+                    self._symbol_index_time = time.time()
+            return self._symbol_info_by_name.get(symbol)
         except Exception as e:
             self.logger.error(f"获取交易对信息失败: {e}")
             return None
@@ -493,54 +747,35 @@ class BinanceClient:
     def _adjust_quantity_precision(self, quantity, symbol_info):
         """调整数量精度 - 确保符合LOT_SIZE过滤器要求"""
         try:
-            # 获取LOT_SIZE过滤器
-            for f in symbol_info['filters']:
-                if f['filterType'] == 'LOT_SIZE':
-                    step_size = float(f['stepSize'])
-                    min_qty = float(f['minQty'])
-                    max_qty = float(f.get('maxQty', float('inf')))
-                    
-                    # 确保数量在有效范围内
-                    if quantity < min_qty:
-                        quantity = min_qty
-                    elif quantity > max_qty:
-                        quantity = max_qty
-                    
-                    # 计算步长精度位数
-                    step_precision = self._get_step_precision(step_size)
-                    
-                    # 将数量调整到最接近的有效步长
-                    # 使用Decimal进行精确计算
-                    from decimal import Decimal, ROUND_DOWN
-                    
-                    # 将step_size转换为Decimal以确保精度
-                    step_decimal = Decimal(str(step_size))
-                    quantity_decimal = Decimal(str(quantity))
-                    
-                    # 计算有多少个完整的步长
-                    steps = quantity_decimal / step_decimal
-                    # 向下取整到最近的步长
-                    valid_steps = steps.quantize(Decimal('1'), rounding=ROUND_DOWN)
-                    # 计算有效的数量
-                    adjusted_quantity = valid_steps * step_decimal
-                    
-                    # 确保不小于最小值
-                    min_qty_decimal = Decimal(str(min_qty))
-                    if adjusted_quantity < min_qty_decimal:
-                        adjusted_quantity = min_qty_decimal
-                    
-                    # 转换为float并格式化到正确精度
-                    result_quantity = float(adjusted_quantity)
-                    
-                    # 使用字符串格式化确保精度正确
-                    precise_quantity_str = "{:0.0{}f}".format(result_quantity, step_precision)
-                    final_quantity = float(precise_quantity_str)
-                    
-                    self.logger.info(f"数量精度调整: {quantity:.8f} -> {final_quantity:.8f} (步长: {step_size}, 精度: {step_precision})")
-                    return final_quantity
+            meta = self._resolve_symbol_meta(symbol_info)
+            if meta is None or not meta.step_size:
+                # 如果没有找到过滤器，使用默认精度
+                return round(quantity, 6)
             
-            # 如果没有找到过滤器，使用默认精度
-            return round(quantity, 6)
+            step_size = meta.step_size
+            step_precision = meta.quantity_precision
+            
+            # 确保数量在有效范围内
+            if quantity < meta.min_qty:
+                quantity = meta.min_qty
+            elif quantity > meta.max_qty:
+                quantity = meta.max_qty
+            
+            # 使用Decimal向下取整到最近的步长
+            step_decimal = Decimal(str(step_size))
+            valid_steps = (Decimal(str(quantity)) / step_decimal).quantize(Decimal('1'), rounding=ROUND_DOWN)
+            adjusted_quantity = valid_steps * step_decimal
+            
+            # 确保不小于最小值
+            min_qty_decimal = Decimal(str(meta.min_qty))
+            if adjusted_quantity < min_qty_decimal:
+                adjusted_quantity = min_qty_decimal
+            
+            # 使用字符串格式化确保精度正确
+            final_quantity = float("{:0.0{}f}".format(float(adjusted_quantity), step_precision))
+            
+            self.logger.info(f"数量精度调整: {quantity:.8f} -> {final_quantity:.8f} (步长: {step_size}, 精度: {step_precision})")
+            return final_quantity
             
         except Exception as e:
             self.logger.error(f"调整数量精度失败: {e}")
@@ -572,43 +807,33 @@ class BinanceClient:
     def _validate_quantity(self, quantity, symbol_info):
         """验证数量是否符合LOT_SIZE过滤器要求"""
         try:
-            for f in symbol_info['filters']:
-                if f['filterType'] == 'LOT_SIZE':
-                    step_size = float(f['stepSize'])
-                    min_qty = float(f['minQty'])
-                    max_qty = float(f.get('maxQty', float('inf')))
-                    
-                    # 检查数量范围
-                    if quantity < min_qty:
-                        return {
-                            'valid': False,
-                            'message': f"数量 {quantity} 小于最小值 {min_qty}"
-                        }
-                    
-                    if quantity > max_qty:
-                        return {
-                            'valid': False,
-                            'message': f"数量 {quantity} 大于最大值 {max_qty}"
-                        }
-                    
-                    # 检查是否符合步长要求
-                    from decimal import Decimal
-                    step_decimal = Decimal(str(step_size))
-                    quantity_decimal = Decimal(str(quantity))
-                    
-                    # 计算余数
-                    remainder = quantity_decimal % step_decimal
-                    
-                    if remainder != 0:
-                        return {
-                            'valid': False,
-                            'message': f"数量 {quantity} 不符合步长 {step_size} 的要求，余数: {remainder}"
-                        }
-                    
-                    return {'valid': True, 'message': '数量验证通过'}
+            meta = self._resolve_symbol_meta(symbol_info)
+            if meta is None or not meta.step_size:
+                # 如果没有找到LOT_SIZE过滤器，认为有效
+                return {'valid': True, 'message': '未找到LOT_SIZE过滤器'}
             
-            # 如果没有找到LOT_SIZE过滤器，认为有效
-            return {'valid': True, 'message': '未找到LOT_SIZE过滤器'}
+            # 检查数量范围
+            if quantity < meta.min_qty:
+                return {
+                    'valid': False,
+                    'message': f"数量 {quantity} 小于最小值 {meta.min_qty}"
+                }
+            
+            if quantity > meta.max_qty:
+                return {
+                    'valid': False,
+                    'message': f"数量 {quantity} 大于最大值 {meta.max_qty}"
+                }
+            
+            # 检查是否符合步长要求
+            remainder = Decimal(str(quantity)) % Decimal(str(meta.step_size))
+            if remainder != 0:
+                return {
+                    'valid': False,
+                    'message': f"数量 {quantity} 不符合步长 {meta.step_size} 的要求，余数: {remainder}"
+                }
+            
+            return {'valid': True, 'message': '数量验证通过'}
             
         except Exception as e:
             self.logger.error(f"数量验证失败: {e}")
@@ -617,12 +842,11 @@ class BinanceClient:
     def _adjust_price_precision(self, price, symbol_info):
         """调整价格精度 - 使用PRICE_FILTER的tickSize"""
         try:
-            # 获取价格精度位数
-            precision = self.get_price_precision(symbol_info['symbol'])
+            meta = self._resolve_symbol_meta(symbol_info)
+            precision = meta.price_precision if meta else 2
             
             # 使用字符串格式化确保精度正确
-            precise_price_str = "{:0.0{}f}".format(price, precision)
-            formatted_price = float(precise_price_str)
+            formatted_price = float("{:0.0{}f}".format(price, precision))
             
             self.logger.info(f"价格精度调整: {price:.8f} -> {formatted_price:.8f} (精度: {precision})")
             return formatted_price
@@ -642,6 +866,28 @@ class BinanceClient:
             self.logger.error(f"获取订单失败: {e}")
             return []
     
+    def get_order(self, symbol, order_id=None, client_order_id=None):
+        """
+        查询订单
+        
+        Returns:
+            订单信息；订单不存在时返回None，其他错误抛出异常（调用方据此区分"未下单"和"状态未知"）
+        """
+        params = {'symbol': symbol}
+        if order_id is not None:
+            params['orderId'] = order_id
+        if client_order_id is not None:
+            params['origClientOrderId'] = client_order_id
+        
+        api_func = self.client.futures_get_order if self.trading_mode == 'FUTURES' else self.client.get_order
+        try:
+            return self.throttled_call(api_func, **params)
+        except BinanceAPIException as e:
+            # -2013: Order does not exist
+            if e.code == -2013 or 'does not exist' in str(e):
+                return None
+            raise
+    
     def cancel_order(self, symbol, order_id):
         """取消订单"""
         try:
@@ -655,35 +901,82 @@ class BinanceClient:
     
     # ========== 合约交易专用方法 ==========
     
+    def get_position_settings(self) -> Dict[str, Dict]:
+        """
+        一次请求获取所有交易对的杠杆和保证金模式（/fapi/v1/symbolConfig）
+        
+        positionRisk v3 不再返回leverage和marginType，不能用持仓信息推断；
+        接口没有返回的字段为None，调用方按未知处理（会重新设置）
+        
+        Returns:
+            {symbol: {'leverage': int或None, 'margin_type': 'ISOLATED'/'CROSSED'或None}}
+        """
+        if self.trading_mode != 'FUTURES':
+            return {}
+        
+        try:
+            configs = self._safe_api_call(self.client.futures_symbol_config)
+            return {config['symbol']: self._parse_symbol_config(config) for config in configs or []}
+        except BinanceAPIException as e:
+            self.logger.error(f"获取合约设置失败: {e}")
+            return {}
+    
+    def _get_symbol_config(self, symbol: str) -> Optional[Dict]:
+        """单个交易对的杠杆和保证金模式，查询失败时返回None"""
+        configs = self._safe_api_call(self.client.futures_symbol_config, symbol=symbol)
+        for config in configs or []:
+            if config.get('symbol') == symbol:
+                return self._parse_symbol_config(config)
+        return None
+    
+    @classmethod
+    def _parse_symbol_config(cls, config: Dict) -> Dict:
+        leverage = config.get('leverage')
+        margin_type = config.get('marginType')
+        return {
+            'leverage': int(leverage) if leverage is not None else None,
+            'margin_type': cls._normalize_margin_type(margin_type) if margin_type else None
+        }
+    
+    @staticmethod
+    def _normalize_margin_type(margin_type: str) -> str:
+        """持仓信息返回isolated/cross，统一为下单接口使用的ISOLATED/CROSSED"""
+        margin_type = (margin_type or '').upper()
+        return 'CROSSED' if margin_type == 'CROSS' else margin_type
+    
     def get_leverage(self, symbol: str):
         """获取当前杠杆倍数"""
         if self.trading_mode != 'FUTURES':
             return None
         
         try:
-            positions = self._safe_api_call(self.client.futures_position_information, symbol=symbol)
-            if positions and len(positions) > 0:
-                return int(positions[0].get('leverage', 1))
-            return None
+            config = self._get_symbol_config(symbol)
+            return config['leverage'] if config else None
         except BinanceAPIException as e:
             self.logger.error(f"获取杠杆倍数失败: {e}")
             return None
 
-    def set_leverage(self, symbol: str, leverage: int):
-        """设置杠杆倍数"""
+    def set_leverage(self, symbol: str, leverage: int, current_leverage: int = None):
+        """
+        设置杠杆倍数
+        
+        Args:
+            current_leverage: 已知的当前杠杆（来自get_position_settings），为None时查询
+        """
         if self.trading_mode != 'FUTURES':
             self.logger.warning("只有合约交易支持杠杆设置")
             return None
         
         # 先检查当前杠杆倍数
-        current_leverage = self.get_leverage(symbol)
+        if current_leverage is None:
+            current_leverage = self.get_leverage(symbol)
         if current_leverage == leverage:
             # 已经是目标杠杆，无需设置
             return True
         
         try:
             # 直接调用API，不使用_safe_api_call来避免错误日志
-            result = self.client.futures_change_leverage(symbol=symbol, leverage=leverage)
+            result = self.throttled_call(self.client.futures_change_leverage, symbol=symbol, leverage=leverage)
             self.logger.info(f"设置杠杆 {symbol}: {leverage}x")
             return result
         except BinanceAPIException as e:
@@ -701,29 +994,33 @@ class BinanceClient:
             return None
         
         try:
-            positions = self._safe_api_call(self.client.futures_position_information, symbol=symbol)
-            if positions and len(positions) > 0:
-                return positions[0].get('marginType', 'CROSSED')
-            return None
+            config = self._get_symbol_config(symbol)
+            return config['margin_type'] if config else None
         except BinanceAPIException as e:
             self.logger.error(f"获取保证金模式失败: {e}")
             return None
 
-    def set_margin_type(self, symbol: str, margin_type: str = 'ISOLATED'):
-        """设置保证金模式"""
+    def set_margin_type(self, symbol: str, margin_type: str = 'ISOLATED', current_margin_type: str = None):
+        """
+        设置保证金模式
+        
+        Args:
+            current_margin_type: 已知的当前保证金模式（来自get_position_settings），为None时查询
+        """
         if self.trading_mode != 'FUTURES':
             self.logger.warning("只有合约交易支持保证金模式设置")
             return None
         
         # 先检查当前保证金模式
-        current_margin_type = self.get_margin_type(symbol)
+        if current_margin_type is None:
+            current_margin_type = self.get_margin_type(symbol)
         if current_margin_type == margin_type:
             # 已经是目标模式，无需设置
             return True
         
         try:
             # 直接调用API，不使用_safe_api_call来避免错误日志
-            result = self.client.futures_change_margin_type(symbol=symbol, marginType=margin_type)
+            result = self.throttled_call(self.client.futures_change_margin_type, symbol=symbol, marginType=margin_type)
             self.logger.info(f"设置保证金模式 {symbol}: {margin_type}")
             return result
         except BinanceAPIException as e:
@@ -740,6 +1037,10 @@ class BinanceClient:
             self.logger.warning("只有合约交易支持持仓查询")
             return []
         
+        state = self._live_account_state()
+        if state is not None:
+            return state.get_positions()
+        
         try:
             positions = self._safe_api_call(self.client.futures_position_information)
             # 只返回有持仓的交易对
@@ -754,6 +1055,10 @@ class BinanceClient:
     
     def get_account_balance(self):
         """获取账户余额详情"""
+        state = self._live_account_state(balances=True)
+        if state is not None:
+            return state.get_account_balance()
+        
         try:
             if self.trading_mode == 'FUTURES':
                 account = self._safe_api_call(self.client.futures_account)
@@ -838,15 +1143,21 @@ class BinanceClient:
             self.logger.warning("只有合约交易支持持仓模式设置")
             return None
         
+        # 已经是目标模式时无需设置
+        if self._position_mode is not None and self._position_mode == dual_side_position:
+            return True
+        
         try:
             # 直接调用API，不使用_safe_api_call来避免错误日志
-            result = self.client.futures_change_position_mode(dualSidePosition=dual_side_position)
+            result = self.throttled_call(self.client.futures_change_position_mode, dualSidePosition=dual_side_position)
+            self._position_mode = dual_side_position
             mode = "双向持仓" if dual_side_position else "单向持仓"
             self.logger.info(f"设置持仓模式: {mode}")
             return result
         except BinanceAPIException as e:
             if "No need to change position side" in str(e):
                 # 静默处理，不记录日志，因为这是正常情况
+                self._position_mode = dual_side_position
                 return True
             else:
                 self.logger.error(f"设置持仓模式失败: {e}")
@@ -6,12 +6,22 @@
 import logging
 from typing import Dict, Optional
 from backend.binance_client import BinanceClient
+from backend.rate_limiter import RateLimiter, get_rate_limiter
+from backend.async_binance_client import AsyncBinanceClient
+from backend.user_data_stream import UserDataStream
+from backend.order_book import OrderBookManager
+from config.config import Config
 
 class ClientManager:
     """客户端管理器 - 单例模式"""
     
     _instance = None
     _clients: Dict[str, BinanceClient] = {}
+    _async_clients: Dict[str, AsyncBinanceClient] = {}
+    _user_streams: Dict[str, UserDataStream] = {}
+    _order_books: Dict[str, OrderBookManager] = {}
+    # 注册了离线客户端（回放）的交易模式，不建立推送连接
+    _offline_modes: set = set()
     
     def __new__(cls):
         if cls._instance is None:
@@ -45,6 +55,19 @@ class ClientManager:
             self.logger.error(f"创建{trading_mode}客户端失败: {e}")
             raise
     
+    def register_client(self, trading_mode: str, client, offline: bool = True):
+        """
+        注册外部创建的客户端（如回放用的模拟客户端），之后get_client返回该实例
+        
+        Args:
+            offline: 为True时该模式不启动用户数据流和订单簿推送
+        """
+        trading_mode = trading_mode.upper()
+        self._clients[trading_mode] = client
+        if offline:
+            self._offline_modes.add(trading_mode)
+        self.logger.info(f"已注册{trading_mode}客户端: {client.__class__.__name__}")
+    
     def get_spot_client(self) -> BinanceClient:
         """获取现货客户端"""
         return self.get_client('SPOT')
@@ -53,9 +76,92 @@ class ClientManager:
         """获取合约客户端"""
         return self.get_client('FUTURES')
     
+    def get_async_client(self, trading_mode: str = 'SPOT') -> AsyncBinanceClient:
+        """
+        获取异步客户端实例（共享连接池和限流器）
+        
+        下单精度调整复用同步客户端缓存的交易规则
+        """
+        trading_mode = trading_mode.upper()
+        
+        if trading_mode in self._async_clients:
+            return self._async_clients[trading_mode]
+        
+        try:
+            precision_client = self.get_client(trading_mode)
+        except Exception:
+            precision_client = None
+        
+        client = AsyncBinanceClient(trading_mode=trading_mode, precision_client=precision_client)
+        self._async_clients[trading_mode] = client
+        self.logger.info(f"创建新的{trading_mode}异步客户端实例")
+        return client
+    
+    def get_rate_limiter(self, trading_mode: str = 'SPOT') -> RateLimiter:
+        """获取共享的请求权重限流器（同一交易模式的所有客户端共用）"""
+        return get_rate_limiter(trading_mode)
+    
+    def get_user_data_stream(self, trading_mode: str = 'SPOT') -> Optional[UserDataStream]:
+        """
+        获取并启动用户数据流，启动后同步客户端的余额和持仓查询改为读取本地状态
+        
+        Returns:
+            UserDataStream实例；未启用或启动失败时返回None（继续使用REST轮询）
+        """
+        trading_mode = trading_mode.upper()
+        
+        if trading_mode in self._user_streams:
+            return self._user_streams[trading_mode]
+        
+        if not Config().USER_DATA_STREAM_ENABLED or trading_mode in self._offline_modes:
+            return None
+        
+        try:
+            client = self.get_client(trading_mode)
+            stream = UserDataStream(client)
+            if not stream.start():
+                return None
+            client.attach_account_state(stream.state, stream.is_healthy)
+            self._user_streams[trading_mode] = stream
+            return stream
+        except Exception as e:
+            self.logger.error(f"启动{trading_mode}用户数据流失败: {e}")
+            return None
+    
+    def get_order_book_manager(self, trading_mode: str = 'SPOT') -> Optional[OrderBookManager]:
+        """
+        获取本地订单簿管理器（调用track()后才建立推送连接）
+        
+        Returns:
+            OrderBookManager实例；未启用时返回None
+        """
+        trading_mode = trading_mode.upper()
+        
+        if trading_mode in self._order_books:
+            return self._order_books[trading_mode]
+        
+        if not Config().ORDER_BOOK_STREAM_ENABLED or trading_mode in self._offline_modes:
+            return None
+        
+        try:
+            manager = OrderBookManager(self.get_client(trading_mode))
+            self._order_books[trading_mode] = manager
+            return manager
+        except Exception as e:
+            self.logger.error(f"创建{trading_mode}订单簿管理器失败: {e}")
+            return None
+    
     def clear_clients(self):
         """清除所有客户端实例"""
+        for stream in self._user_streams.values():
+            stream.stop()
+        self._user_streams.clear()
+        for manager in self._order_books.values():
+            manager.stop()
+        self._order_books.clear()
         self._clients.clear()
+        self._async_clients.clear()
+        self._offline_modes.clear()
         self.logger.info("已清除所有客户端实例")
     
     def get_client_info(self) -> Dict[str, str]:
@@ -64,7 +170,9 @@ class ClientManager:
         for mode, client in self._clients.items():
             info[mode] = {
                 'trading_mode': client.trading_mode,
-                'initialized': True
+                'initialized': True,
+                'rate_limit': client.rate_limiter.get_stats(),
+                'user_stream': mode in self._user_streams and self._user_streams[mode].is_healthy()
             }
         return info
 
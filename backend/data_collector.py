@@ -2,13 +2,15 @@ import asyncio
 import aiohttp
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import logging
 from typing import Dict, List, Optional
 from backend.binance_client import BinanceClient
 from backend.database import DatabaseManager
-from backend.network_config import binance_network_config
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Boolean
+from backend.market_data_store import create_bar_store, bars_from_dataframe
+from backend.orderbook_archive import create_orderbook_archive
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, Text, Boolean, Index, select, insert
+from sqlalchemy.sql.expression import type_coerce
 from sqlalchemy.ext.declarative import declarative_base
 import json
 import time
@@ -30,6 +32,10 @@ class MarketData(Base):
     quote_volume = Column(Float, nullable=False)
     trades_count = Column(Integer, default=0)
     interval = Column(String(10), nullable=False)  # 1m, 5m, 1h, 1d等
+    
+    __table_args__ = (
+        Index('ix_market_data_symbol_interval_ts', 'symbol', 'interval', 'timestamp'),
+    )
 
 class OrderBookData(Base):
     """订单簿数据表"""
@@ -64,6 +70,87 @@ class TechnicalIndicators(Base):
     bb_lower = Column(Float)  # 布林带下轨
     atr = Column(Float)     # 平均真实波幅
     volume_sma = Column(Float)  # 成交量移动平均
+    
+    __table_args__ = (
+        Index('ix_technical_indicators_symbol_ts', 'symbol', 'timestamp'),
+    )
+
+class CheckedKlineRange(Base):
+    """已向交易所确认过的K线区间（区间内仍缺失的K线交易所也没有，如上市前、停机维护）"""
+    __tablename__ = 'kline_checked_ranges'
+    
+    id = Column(Integer, primary_key=True)
+    symbol = Column(String(20), nullable=False)
+    interval = Column(String(10), nullable=False)
+    start_ms = Column(BigInteger, nullable=False)  # 区间内第一根K线开盘时间（毫秒）
+    end_ms = Column(BigInteger, nullable=False)    # 区间内最后一根K线开盘时间（毫秒）
+    checked_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('ix_kline_checked_ranges_symbol_interval', 'symbol', 'interval', 'start_ms'),
+    )
+
+# 列式读取的字段映射 (DataFrame列名, ORM列)
+MARKET_DATA_COLUMNS = [
+    ('open', MarketData.open_price),
+    ('high', MarketData.high_price),
+    ('low', MarketData.low_price),
+    ('close', MarketData.close_price),
+    ('volume', MarketData.volume),
+    ('quote_volume', MarketData.quote_volume),
+    ('trades_count', MarketData.trades_count),
+]
+
+INDICATOR_COLUMNS = [
+    (name, getattr(TechnicalIndicators, name)) for name in [
+        'sma_10', 'sma_20', 'sma_50', 'ema_12', 'ema_26', 'rsi_14',
+        'macd', 'macd_signal', 'macd_histogram',
+        'bb_upper', 'bb_middle', 'bb_lower', 'atr', 'volume_sma'
+    ]
+]
+
+# 固定长度K线周期对应的毫秒数
+INTERVAL_MS = {
+    '1m': 60_000, '3m': 180_000, '5m': 300_000, '15m': 900_000, '30m': 1_800_000,
+    '1h': 3_600_000, '2h': 7_200_000, '4h': 14_400_000, '6h': 21_600_000,
+    '8h': 28_800_000, '12h': 43_200_000, '1d': 86_400_000, '3d': 259_200_000,
+    '1w': 604_800_000,
+}
+
+
+class BackfillBudget:
+    """
+    历史数据补齐的请求预算
+    
+    限制同时进行的请求数，并按每分钟请求数均匀放行请求
+    """
+    
+    def __init__(self, concurrency: int = None, requests_per_minute: int = None):
+        from config.config import Config
+        config = Config()
+        self.concurrency = concurrency or config.BACKFILL_CONCURRENCY
+        self.requests_per_minute = requests_per_minute or config.BACKFILL_REQUESTS_PER_MINUTE
+        self._interval = 60.0 / max(self.requests_per_minute, 1)
+        self._semaphore = None
+        self._next_slot = 0.0
+    
+    async def __aenter__(self):
+        # 信号量需要在运行中的事件循环里创建
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        await self._semaphore.acquire()
+        
+        now = time.monotonic()
+        wait = self._next_slot - now
+        self._next_slot = max(now, self._next_slot) + self._interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        self._semaphore.release()
+        return False
+
 
 class DataCollector:
     """数据收集器"""
@@ -72,75 +159,65 @@ class DataCollector:
         # 使用客户端管理器避免重复初始化
         from backend.client_manager import client_manager
         self.binance_client = client_manager.get_spot_client()
+        # 实时收集使用异步客户端，在事件循环内并发请求
+        self.async_client = client_manager.get_async_client('SPOT')
+        # 本地订单簿（首次收集某交易对时开始跟踪）
+        self.order_books = client_manager.get_order_book_manager('SPOT')
         self.db_manager = DatabaseManager()
         self.logger = logging.getLogger(__name__)
         
         # 创建新表
         Base.metadata.create_all(self.db_manager.engine)
+        # 已存在的表不会自动补建索引，这里单独检查创建
+        for table in (MarketData.__table__, TechnicalIndicators.__table__, CheckedKlineRange.__table__):
+            for index in table.indexes:
+                index.create(self.db_manager.engine, checkfirst=True)
+        
+        # K线存储后端（MARKET_DATA_BACKEND=sql时为None，使用market_data表）
+        self.bar_store = create_bar_store()
+        # 订单簿快照归档（未启用时写入orderbook_data表）
+        self.orderbook_archive = create_orderbook_archive()
         
     async def collect_historical_data(self, symbol: str, interval: str = '1h', 
-                                    days: int = 30, start_date: str = None) -> pd.DataFrame:
-        """收集历史数据"""
+                                    days: int = 30, start_date: str = None,
+                                    budget: 'BackfillBudget' = None) -> pd.DataFrame:
+        """
+        收集历史数据（增量补齐）
+        
+        先根据已存储的数据计算缺失的时间段，只下载缺口，每页数据直接批量写入存储，
+        最后返回整个时间范围内的数据
+        
+        Args:
+            budget: 请求预算，多个交易对共享同一预算时由调用方传入
+        """
         try:
-            # 计算开始时间
+            # 计算开始时间（币安K线时间为UTC）
             if start_date:
                 start_time = pd.to_datetime(start_date)
             else:
-                start_time = datetime.now() - timedelta(days=days)
+                start_time = pd.Timestamp(datetime.utcnow()) - timedelta(days=days)
             
-            end_time = datetime.now()
+            end_time = pd.Timestamp(datetime.utcnow())
             
             print(f"    收集数据从 {start_time.strftime('%Y-%m-%d')} 到 {end_time.strftime('%Y-%m-%d')}...")
             
-            # 分批次获取数据（每次最多1000条）
-            all_data = []
-            current_start = start_time
-            
-            while current_start < end_time:
-                # 计算当前批次的结束时间（每次获取约1000条记录）
-                if interval == '1h':
-                    batch_end = min(current_start + timedelta(days=42), end_time)  # 42天约1000小时
-                elif interval == '1d':
-                    batch_end = min(current_start + timedelta(days=1000), end_time)
-                else:
-                    batch_end = min(current_start + timedelta(days=30), end_time)
-                
-                print(f"      获取批次: {current_start.strftime('%Y-%m-%d')} 到 {batch_end.strftime('%Y-%m-%d')}")
-                
-                # 获取当前批次的数据
-                klines = self.binance_client.get_historical_klines(
-                    symbol=symbol,
-                    interval=interval,
-                    start_str=current_start.strftime('%Y-%m-%d'),
-                    end_str=batch_end.strftime('%Y-%m-%d'),
-                    limit=1000
-                )
-                
-                if not klines.empty:
-                    all_data.append(klines)
-                    print(f"      获得 {len(klines)} 条记录")
-                else:
-                    print(f"      该时间段无数据")
+            gaps = self.plan_backfill(symbol, interval, start_time, end_time)
+            if gaps:
+                missing = sum(count for _, _, count in gaps)
+                print(f"      发现 {len(gaps)} 个缺口，共缺少约 {missing} 条记录")
                 
-                # 移动到下一个批次
-                current_start = batch_end
-                
-                # 避免API限制，添加短暂延迟
-                await asyncio.sleep(0.1)
-            
-            if not all_data:
-                return pd.DataFrame()
-            
-            # 合并所有数据
-            df = pd.concat(all_data, ignore_index=True)
-            
-            # 去重并排序
-            df = df.drop_duplicates(subset=['timestamp']).sort_values('timestamp')
-            
-            print(f"    总共获得 {len(df)} 条记录")
+                budget = budget or BackfillBudget()
+                pages = [page for gap in gaps for page in self._split_gap(gap, interval)]
+                results = await asyncio.gather(*[
+                    self._backfill_page(symbol, interval, page_start, page_end, budget)
+                    for page_start, page_end in pages
+                ])
+                print(f"      下载 {len(pages)} 页，新增 {sum(results)} 条记录")
+            else:
+                print("      数据已完整，无需下载")
             
-            # 保存数据到数据库
-            await self._store_market_data(df, symbol, interval)
+            df = self.get_market_data(symbol, interval, limit=None, start=start_time, end=end_time)
+            print(f"    总共 {len(df)} 条记录")
             
             return df
             
@@ -148,14 +225,157 @@ class DataCollector:
             self.logger.error(f"收集历史数据失败: {e}")
             return pd.DataFrame()
     
-    async def collect_orderbook_data(self, symbol: str, limit: int = 100) -> Dict:
-        """收集订单簿数据"""
+    async def backfill_symbols(self, symbols: List[str], intervals: List[str] = None,
+                               days: int = 30) -> Dict[str, Dict[str, int]]:
+        """
+        并发补齐多个交易对的历史数据，所有请求共享同一个并发和频率预算
+        
+        Args:
+            intervals: K线周期列表，默认只补齐1h
+        
+        Returns:
+            {symbol: {interval: 记录条数}}
+        """
+        intervals = intervals or ['1h']
+        budget = BackfillBudget()
+        
+        async def backfill_one(symbol: str, interval: str):
+            df = await self.collect_historical_data(symbol, interval, days, budget=budget)
+            return symbol, interval, len(df)
+        
+        results = await asyncio.gather(*[
+            backfill_one(symbol, interval) for symbol in symbols for interval in intervals
+        ])
+        
+        summary = {}
+        for symbol, interval, count in results:
+            summary.setdefault(symbol, {})[interval] = count
+        return summary
+    
+    def plan_backfill(self, symbol: str, interval: str, start_time, end_time) -> List[tuple]:
+        """
+        计算时间范围内缺失的K线区间
+        
+        Returns:
+            [(起始毫秒, 结束毫秒, 缺失条数)]，只包含已收盘的K线
+        """
+        start_ms = int(pd.Timestamp(start_time).value // 1_000_000)
+        end_ms = int(pd.Timestamp(end_time).value // 1_000_000)
+        step = INTERVAL_MS.get(interval)
+        
+        if step is None:
+            # 非固定长度周期（如1M）无法计算网格，整段下载
+            return [(start_ms, end_ms, 0)]
+        
+        # 期望的K线开盘时间网格：从start向上取整到最后一根已收盘K线
+        first_open = -(-start_ms // step) * step
+        last_open = (end_ms // step) * step - step
+        if last_open < first_open:
+            return []
+        expected = np.arange(first_open, last_open + step, step, dtype=np.int64)
+        
+        stored = self._get_stored_timestamps(symbol, interval, first_open, last_open)
+        missing = expected[~np.isin(expected, stored)]
+        # 已确认交易所没有数据的K线不再重复请求
+        for checked_start, checked_end in self._get_checked_ranges(symbol, interval, first_open, last_open):
+            missing = missing[(missing < checked_start) | (missing > checked_end)]
+        if len(missing) == 0:
+            return []
+        
+        # 连续缺失的K线合并为一个区间
+        breaks = np.flatnonzero(np.diff(missing) != step) + 1
+        gaps = []
+        for run in np.split(missing, breaks):
+            gaps.append((int(run[0]), int(run[-1]), len(run)))
+        return gaps
+    
+    def _get_stored_timestamps(self, symbol: str, interval: str, start_ms: int, end_ms: int) -> np.ndarray:
+        """获取已存储K线的开盘时间（毫秒）"""
+        if self.bar_store is not None:
+            bars = self.bar_store.read_arrays(
+                symbol, interval,
+                start=pd.to_datetime(start_ms, unit='ms'), end=pd.to_datetime(end_ms, unit='ms')
+            )
+            return np.asarray(bars['timestamp'], dtype=np.int64)
+        
+        stmt = select(type_coerce(MarketData.timestamp, String)).where(
+            MarketData.symbol == symbol,
+            MarketData.interval == interval,
+            MarketData.timestamp >= pd.to_datetime(start_ms, unit='ms').to_pydatetime(),
+            MarketData.timestamp <= pd.to_datetime(end_ms, unit='ms').to_pydatetime()
+        )
+        values = self.db_manager.session.execute(stmt).scalars().all()
+        if not values:
+            return np.zeros(0, dtype=np.int64)
+        return pd.to_datetime(np.asarray(values)).values.astype('datetime64[ms]').astype(np.int64)
+    
+    def _get_checked_ranges(self, symbol: str, interval: str, start_ms: int, end_ms: int) -> List[tuple]:
+        """获取与时间范围重叠的已确认区间 [(起始毫秒, 结束毫秒)]"""
+        stmt = select(CheckedKlineRange.start_ms, CheckedKlineRange.end_ms).where(
+            CheckedKlineRange.symbol == symbol,
+            CheckedKlineRange.interval == interval,
+            CheckedKlineRange.start_ms <= end_ms,
+            CheckedKlineRange.end_ms >= start_ms
+        )
+        return [tuple(row) for row in self.db_manager.session.execute(stmt).all()]
+    
+    def _mark_checked(self, symbol: str, interval: str, start_ms: int, end_ms: int):
+        """记录已向交易所确认过的区间"""
+        with self.db_manager.session_scope() as session:
+            session.add(CheckedKlineRange(symbol=symbol, interval=interval,
+                                          start_ms=int(start_ms), end_ms=int(end_ms)))
+    
+    @staticmethod
+    def _split_gap(gap: tuple, interval: str, page_size: int = 1000) -> List[tuple]:
+        """将缺口按每页page_size条拆分成请求区间"""
+        gap_start, gap_end, _ = gap
+        step = INTERVAL_MS.get(interval)
+        if step is None:
+            return [(gap_start, gap_end)]
+        
+        pages = []
+        page_start = gap_start
+        while page_start <= gap_end:
+            page_end = min(page_start + step * (page_size - 1), gap_end)
+            pages.append((page_start, page_end))
+            page_start = page_end + step
+        return pages
+    
+    async def _backfill_page(self, symbol: str, interval: str, start_ms: int, end_ms: int,
+                             budget: 'BackfillBudget') -> int:
+        """下载一页K线并立即写入存储，返回新增条数"""
         try:
-            # 使用安全的API调用
-            def get_orderbook():
-                return self.binance_client.client.get_order_book(symbol=symbol, limit=limit)
+            async with budget:
+                loop = asyncio.get_event_loop()
+                klines = await loop.run_in_executor(
+                    None, self.binance_client.get_klines_range, symbol, interval, start_ms, end_ms
+                )
+            
+            # None表示请求失败，下次补齐时重试
+            if klines is None:
+                return 0
+            inserted = self._bulk_store_market_data(klines, symbol, interval)
             
-            orderbook = binance_network_config.retry_with_backoff(get_orderbook)
+            # 整页已收盘足够久时，交易所返回的就是全部数据，区间内剩余的缺口记为已确认
+            step = INTERVAL_MS.get(interval)
+            if step is not None and end_ms + 2 * step <= time.time() * 1000:
+                self._mark_checked(symbol, interval, start_ms, end_ms)
+            return inserted
+            
+        except Exception as e:
+            self.logger.error(f"补齐K线失败 {symbol}-{interval} {start_ms}-{end_ms}: {e}")
+            return 0
+    
+    async def collect_orderbook_data(self, symbol: str, limit: int = 100) -> Dict:
+        """收集订单簿数据（本地订单簿已同步时直接导出，否则请求REST快照）"""
+        try:
+            book = self.order_books.get_book(symbol) if self.order_books else None
+            if book is not None:
+                orderbook = book.snapshot(limit)
+            else:
+                orderbook = await self.async_client.get_order_book(symbol, limit=limit)
+                if self.order_books:
+                    self.order_books.track([symbol])
             
             if not orderbook:
                 return {}
@@ -164,9 +384,26 @@ class DataCollector:
             bid_depth = sum(float(bid[1]) for bid in orderbook['bids'][:10])
             ask_depth = sum(float(ask[1]) for ask in orderbook['asks'][:10])
             
+            # 快照时间统一为UTC：优先使用交易所的事件/撮合时间（合约快照和本地订单簿有，现货REST快照没有）
+            exchange_ms = int(orderbook.get('E') or orderbook.get('T') or 0)
+            if exchange_ms:
+                timestamp = datetime.fromtimestamp(exchange_ms / 1000, timezone.utc).replace(tzinfo=None)
+            else:
+                timestamp = datetime.now(timezone.utc).replace(tzinfo=None)
+            if self.orderbook_archive is not None:
+                self.orderbook_archive.write_snapshot(symbol, timestamp, orderbook['bids'], orderbook['asks'])
+                return {
+                    'symbol': symbol,
+                    'timestamp': timestamp,
+                    'bids': orderbook['bids'],
+                    'asks': orderbook['asks'],
+                    'bid_depth': bid_depth,
+                    'ask_depth': ask_depth
+                }
+            
             orderbook_data = {
                 'symbol': symbol,
-                'timestamp': datetime.now(),
+                'timestamp': timestamp,
                 'bids': json.dumps(orderbook['bids']),
                 'asks': json.dumps(orderbook['asks']),
                 'bid_depth': bid_depth,
@@ -174,9 +411,8 @@ class DataCollector:
             }
             
             # 存储到数据库
-            orderbook_record = OrderBookData(**orderbook_data)
-            self.db_manager.session.add(orderbook_record)
-            self.db_manager.session.commit()
+            with self.db_manager.session_scope() as session:
+                session.add(OrderBookData(**orderbook_data))
             
             return orderbook_data
             
@@ -184,49 +420,104 @@ class DataCollector:
             self.logger.error(f"收集订单簿数据失败: {e}")
             return {}
     
-    async def _store_market_data(self, df: pd.DataFrame, symbol: str, interval: str):
-        """存储市场数据到数据库"""
+    def migrate_orderbook_table(self, batch_size: int = 1000, delete_rows: bool = True) -> int:
+        """
+        把orderbook_data表中的JSON快照迁移到归档
+        
+        Args:
+            delete_rows: 迁移后删除表中的记录（之后需VACUUM才能缩小数据库文件）
+        
+        Returns:
+            迁移的快照数
+        """
+        if self.orderbook_archive is None:
+            self.logger.warning("未启用订单簿归档，跳过迁移")
+            return 0
+        
+        migrated = 0
+        last_id = 0
         try:
-            print(f"    正在保存 {len(df)} 条数据到数据库...")
-            
-            # 批量处理以提高性能
-            batch_size = 100
-            for i in range(0, len(df), batch_size):
-                batch_df = df.iloc[i:i+batch_size]
-                
-                for _, row in batch_df.iterrows():
-                    market_data = MarketData(
-                        symbol=symbol,
-                        timestamp=row['timestamp'],
-                        open_price=row['open'],
-                        high_price=row['high'],
-                        low_price=row['low'],
-                        close_price=row['close'],
-                        volume=row['volume'],
-                        quote_volume=row.get('quote_volume', 0),
-                        trades_count=row.get('trades_count', 0),
-                        interval=interval
-                    )
+            while True:
+                with self.db_manager.session_scope() as session:
+                    rows = session.query(OrderBookData).filter(
+                        OrderBookData.id > last_id
+                    ).order_by(OrderBookData.id).limit(batch_size).all()
+                    if not rows:
+                        break
                     
-                    # 检查是否已存在
-                    existing = self.db_manager.session.query(MarketData).filter_by(
-                        symbol=symbol,
-                        timestamp=market_data.timestamp,
-                        interval=interval
-                    ).first()
+                    for row in rows:
+                        self.orderbook_archive.write_snapshot(
+                            row.symbol, row.timestamp, json.loads(row.bids), json.loads(row.asks)
+                        )
+                    last_id = rows[-1].id
+                    migrated += len(rows)
                     
-                    if not existing:
-                        self.db_manager.session.add(market_data)
-                
-                # 批量提交
-                self.db_manager.session.commit()
-                
-            print(f"    ✅ 数据保存完成")
+                    if delete_rows:
+                        session.query(OrderBookData).filter(OrderBookData.id <= last_id).delete(
+                            synchronize_session=False
+                        )
+            
+            self.orderbook_archive.compact()
+            self.logger.info(f"订单簿快照迁移完成: {migrated} 条")
+            
+        except Exception as e:
+            self.logger.error(f"迁移订单簿快照失败: {e}")
+        
+        return migrated
+    
+    async def _store_market_data(self, df: pd.DataFrame, symbol: str, interval: str):
+        """存储市场数据到数据库"""
+        try:
+            print(f"    正在保存 {len(df)} 条数据...")
+            inserted = self._bulk_store_market_data(df, symbol, interval)
+            print(f"    ✅ 数据保存完成，新增 {inserted} 条")
                     
         except Exception as e:
             self.logger.error(f"存储市场数据失败: {e}")
             print(f"    ❌ 数据保存失败: {e}")
-            self.db_manager.session.rollback()
+    
+    def _bulk_store_market_data(self, df: pd.DataFrame, symbol: str, interval: str) -> int:
+        """批量写入K线（跳过已存在的时间戳），返回新增条数"""
+        if df is None or df.empty:
+            return 0
+        
+        # 使用列式存储时直接写入分区文件
+        if self.bar_store is not None:
+            return self.bar_store.write_bars(symbol, interval, df)
+        
+        bars = bars_from_dataframe(df)
+        if len(bars) == 0:
+            return 0
+        
+        # 一次查询出该范围内已存在的时间戳
+        existing = self._get_stored_timestamps(
+            symbol, interval, int(bars['timestamp'][0]), int(bars['timestamp'][-1])
+        )
+        bars = bars[~np.isin(bars['timestamp'], existing)]
+        if len(bars) == 0:
+            return 0
+        
+        timestamps = pd.to_datetime(bars['timestamp'], unit='ms').to_pydatetime()
+        records = [
+            {
+                'symbol': symbol,
+                'interval': interval,
+                'timestamp': ts,
+                'open_price': float(bar['open']),
+                'high_price': float(bar['high']),
+                'low_price': float(bar['low']),
+                'close_price': float(bar['close']),
+                'volume': float(bar['volume']),
+                'quote_volume': float(bar['quote_volume']),
+                'trades_count': int(bar['trades_count'])
+            }
+            for ts, bar in zip(timestamps, bars)
+        ]
+        
+        with self.db_manager.session_scope() as session:
+            session.execute(insert(MarketData), records)
+        
+        return len(records)
     
     def calculate_technical_indicators(self, df: pd.DataFrame, symbol: str) -> pd.DataFrame:
         """计算技术指标"""
@@ -455,10 +746,11 @@ class DataCollector:
     async def collect_latest_data(self, symbol: str, interval: str):
         """收集最新数据"""
         try:
-            # 使用更新后的get_klines方法
-            klines_df = self.binance_client.get_klines(symbol, interval, 1)
+            klines_df = await self.async_client.get_klines(symbol, interval, 1)
             
-            if len(klines_df) > 0:
+            if len(klines_df) > 0 and self.bar_store is not None:
+                self.bar_store.write_bars(symbol, interval, klines_df)
+            elif len(klines_df) > 0:
                 kline = klines_df.iloc[0]
                 market_data = MarketData(
                     symbol=symbol,
@@ -487,70 +779,89 @@ class DataCollector:
         except Exception as e:
             self.logger.error(f"收集最新数据失败 {symbol}-{interval}: {e}")
     
-    def get_market_data(self, symbol: str, interval: str = '1h', limit: int = 100) -> pd.DataFrame:
-        """从数据库获取市场数据"""
+    def get_market_data(self, symbol: str, interval: str = '1h', limit: int = 100,
+                        start=None, end=None) -> pd.DataFrame:
+        """
+        从数据库获取市场数据
+        
+        Args:
+            limit: 最多返回的条数；只给limit时返回最新的limit条，None表示不限制
+            start/end: 时间范围（包含端点），给定start时从start开始向后读取
+        
+        Returns:
+            按时间升序排列的DataFrame，价格列为float64，trades_count为int64
+        """
         try:
-            query = self.db_manager.session.query(MarketData).filter_by(
-                symbol=symbol,
-                interval=interval
-            ).order_by(MarketData.timestamp.desc()).limit(limit)
-            
-            data = []
-            for record in query:
-                data.append({
-                    'timestamp': record.timestamp,
-                    'open': record.open_price,
-                    'high': record.high_price,
-                    'low': record.low_price,
-                    'close': record.close_price,
-                    'volume': record.volume,
-                    'quote_volume': record.quote_volume,
-                    'trades_count': record.trades_count
-                })
-            
-            df = pd.DataFrame(data)
-            if len(df) > 0:
-                df = df.sort_values('timestamp').reset_index(drop=True)
-            
-            return df
+            if self.bar_store is not None:
+                return self.bar_store.read_bars(symbol, interval, start=start, end=end, limit=limit)
+            
+            stmt = select(
+                type_coerce(MarketData.timestamp, String),
+                *[column for _, column in MARKET_DATA_COLUMNS]
+            ).where(
+                MarketData.symbol == symbol,
+                MarketData.interval == interval
+            )
+            rows = self._execute_range_query(stmt, MarketData.timestamp, limit, start, end)
+            
+            return self._rows_to_frame(
+                rows, [name for name, _ in MARKET_DATA_COLUMNS], int_columns=('trades_count',)
+            )
             
         except Exception as e:
             self.logger.error(f"获取市场数据失败: {e}")
             return pd.DataFrame()
     
-    def get_technical_indicators(self, symbol: str, limit: int = 100) -> pd.DataFrame:
-        """从数据库获取技术指标数据"""
+    def get_technical_indicators(self, symbol: str, limit: int = 100,
+                                 start=None, end=None) -> pd.DataFrame:
+        """从数据库获取技术指标数据（按时间升序）"""
         try:
-            query = self.db_manager.session.query(TechnicalIndicators).filter_by(
-                symbol=symbol
-            ).order_by(TechnicalIndicators.timestamp.desc()).limit(limit)
-            
-            data = []
-            for record in query:
-                data.append({
-                    'timestamp': record.timestamp,
-                    'sma_10': record.sma_10,
-                    'sma_20': record.sma_20,
-                    'sma_50': record.sma_50,
-                    'ema_12': record.ema_12,
-                    'ema_26': record.ema_26,
-                    'rsi_14': record.rsi_14,
-                    'macd': record.macd,
-                    'macd_signal': record.macd_signal,
-                    'macd_histogram': record.macd_histogram,
-                    'bb_upper': record.bb_upper,
-                    'bb_middle': record.bb_middle,
-                    'bb_lower': record.bb_lower,
-                    'atr': record.atr,
-                    'volume_sma': record.volume_sma
-                })
-            
-            df = pd.DataFrame(data)
-            if len(df) > 0:
-                df = df.sort_values('timestamp').reset_index(drop=True)
+            stmt = select(
+                type_coerce(TechnicalIndicators.timestamp, String),
+                *[column for _, column in INDICATOR_COLUMNS]
+            ).where(
+                TechnicalIndicators.symbol == symbol
+            )
+            rows = self._execute_range_query(stmt, TechnicalIndicators.timestamp, limit, start, end)
             
-            return df
+            return self._rows_to_frame(rows, [name for name, _ in INDICATOR_COLUMNS])
             
         except Exception as e:
             self.logger.error(f"获取技术指标数据失败: {e}")
-            return pd.DataFrame()
\ No newline at end of file
+            return pd.DataFrame()
+    
+    def _execute_range_query(self, stmt, timestamp_column, limit, start, end) -> list:
+        """执行带时间范围的查询，返回按时间升序排列的原始行"""
+        if start is not None:
+            stmt = stmt.where(timestamp_column >= pd.Timestamp(start).to_pydatetime())
+        if end is not None:
+            stmt = stmt.where(timestamp_column <= pd.Timestamp(end).to_pydatetime())
+        
+        if start is None and limit:
+            # 只给limit时取最新的limit条，再在内存中翻转为升序
+            stmt = stmt.order_by(timestamp_column.desc()).limit(limit)
+            rows = self.db_manager.session.execute(stmt).all()
+            rows.reverse()
+            return rows
+        
+        stmt = stmt.order_by(timestamp_column.asc())
+        if limit:
+            stmt = stmt.limit(limit)
+        return self.db_manager.session.execute(stmt).all()
+    
+    @staticmethod
+    def _rows_to_frame(rows: list, value_columns: List[str], int_columns=()) -> pd.DataFrame:
+        """将 (timestamp, 数值列...) 行按列转换为DataFrame，避免逐行构造字典"""
+        columns = ['timestamp'] + value_columns
+        if not rows:
+            return pd.DataFrame(columns=columns)
+        
+        raw_columns = list(zip(*rows))
+        data = {'timestamp': pd.to_datetime(np.asarray(raw_columns[0]))}
+        for name, values in zip(value_columns, raw_columns[1:]):
+            array = np.asarray(values, dtype=np.float64)
+            if name in int_columns:
+                array = np.nan_to_num(array).astype(np.int64)
+            data[name] = array
+        
+        return pd.DataFrame(data, columns=columns)
@@ -1,11 +1,96 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean
+import threading
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event, Column, Integer, String, Float, DateTime, Date, Boolean
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import QueuePool
 from datetime import datetime
 from config.config import Config
 
 Base = declarative_base()
 
+# 进程级共享的数据库引擎和线程会话（按DATABASE_URL区分）
+_engines = {}
+_scoped_sessions = {}
+_engine_lock = threading.Lock()
+
+# 记录时间戳使用的时钟（返回UTC的naive datetime），回放时替换为模拟时钟
+_clock = None
+
+def utcnow():
+    """当前UTC时间；设置了时钟时返回时钟时间"""
+    return _clock() if _clock is not None else datetime.utcnow()
+
+def set_clock(clock=None):
+    """设置记录时间戳使用的时钟，None恢复为系统时间"""
+    global _clock
+    _clock = clock
+
+def _configure_sqlite(engine, busy_timeout_ms):
+    """为SQLite连接启用WAL模式和busy_timeout"""
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+
+def get_engine(database_url=None):
+    """获取进程级共享的数据库引擎"""
+    config = Config()
+    database_url = database_url or config.DATABASE_URL
+    
+    with _engine_lock:
+        engine = _engines.get(database_url)
+        if engine is not None:
+            return engine
+        
+        engine_kwargs = {'pool_pre_ping': True}
+        is_sqlite = database_url.startswith('sqlite')
+        is_memory = is_sqlite and (database_url in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in database_url)
+        
+        if is_sqlite:
+            # 允许跨线程使用连接，由连接池保证同一时刻只有一个线程持有连接
+            engine_kwargs['connect_args'] = {
+                'check_same_thread': False,
+                'timeout': config.DB_BUSY_TIMEOUT_MS / 1000
+            }
+        
+        if not is_memory:
+            engine_kwargs.update({
+                'poolclass': QueuePool,
+                'pool_size': config.DB_POOL_SIZE,
+                'max_overflow': config.DB_MAX_OVERFLOW,
+                'pool_timeout': config.DB_POOL_TIMEOUT,
+                'pool_recycle': config.DB_POOL_RECYCLE
+            })
+        
+        engine = create_engine(database_url, **engine_kwargs)
+        if is_sqlite and not is_memory:
+            _configure_sqlite(engine, config.DB_BUSY_TIMEOUT_MS)
+        
+        Base.metadata.create_all(engine)
+        _engines[database_url] = engine
+        _scoped_sessions[database_url] = scoped_session(sessionmaker(bind=engine))
+        return engine
+
+def dispose_engine(database_url):
+    """关闭并移除某个数据库的共享引擎和会话（回放等临时数据库用完后调用）"""
+    with _engine_lock:
+        sessions = _scoped_sessions.pop(database_url, None)
+        engine = _engines.pop(database_url, None)
+    if sessions is not None:
+        sessions.remove()
+    if engine is not None:
+        engine.dispose()
+
+def get_scoped_session(database_url=None):
+    """获取线程隔离的会话注册表（scoped_session）"""
+    database_url = database_url or Config().DATABASE_URL
+    get_engine(database_url)
+    return _scoped_sessions[database_url]
+
 class Trade(Base):
     __tablename__ = 'trades'
     
@@ -14,7 +99,7 @@ class Trade(Base):
     side = Column(String(10), nullable=False)  # BUY/SELL
     quantity = Column(Float, nullable=False)
     price = Column(Float, nullable=False)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, default=utcnow)
     strategy = Column(String(50))
     profit_loss = Column(Float, default=0.0)
     status = Column(String(20), default='FILLED')
@@ -28,7 +113,7 @@ class Position(Base):
     avg_price = Column(Float, nullable=False)
     current_price = Column(Float, nullable=False)
     unrealized_pnl = Column(Float, default=0.0)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, default=utcnow)
 
 class Strategy(Base):
     __tablename__ = 'strategies'
@@ -38,18 +123,59 @@ class Strategy(Base):
     symbol = Column(String(20), nullable=False)
     parameters = Column(String(500))  # JSON格式的参数
     is_active = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=utcnow)
     total_trades = Column(Integer, default=0)
     win_rate = Column(Float, default=0.0)
     total_pnl = Column(Float, default=0.0)
 
+class EquitySnapshot(Base):
+    """权益快照表 - 每个交易循环写入一次"""
+    __tablename__ = 'equity_snapshots'
+    
+    id = Column(Integer, primary_key=True)
+    timestamp = Column(DateTime, nullable=False, index=True, default=utcnow)
+    total_value = Column(Float, nullable=False)  # 总资产价值
+    cash_balance = Column(Float, default=0.0)  # 现金余额
+    positions_value = Column(Float, default=0.0)  # 持仓市值
+    unrealized_pnl = Column(Float, default=0.0)  # 未实现盈亏
+
+class DailyEquity(Base):
+    """每日权益汇总表 - 由权益快照滚动更新"""
+    __tablename__ = 'daily_equity'
+    
+    id = Column(Integer, primary_key=True)
+    date = Column(Date, nullable=False, unique=True, index=True)
+    open_value = Column(Float, nullable=False)  # 当日首个快照价值
+    high_value = Column(Float, nullable=False)
+    low_value = Column(Float, nullable=False)
+    close_value = Column(Float, nullable=False)  # 当日最新快照价值
+    peak_value = Column(Float, nullable=False)  # 截至当日的历史最高权益
+    snapshot_count = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=utcnow)
+
 class DatabaseManager:
-    def __init__(self):
+    def __init__(self, database_url=None):
         self.config = Config()
-        self.engine = create_engine(self.config.DATABASE_URL)
-        Base.metadata.create_all(self.engine)
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
+        self.database_url = database_url or self.config.DATABASE_URL
+        # 共享进程级引擎和连接池
+        self.engine = get_engine(self.database_url)
+        # scoped_session按线程提供独立会话，交易线程、数据收集线程和广播线程互不干扰
+        self.session = get_scoped_session(self.database_url)
+    
+    @contextmanager
+    def session_scope(self):
+        """工作单元：成功时提交，异常时回滚"""
+        session = self.session()
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+    
+    def remove_session(self):
+        """释放当前线程的会话（线程退出前调用）"""
+        self.session.remove()
     
     def add_trade(self, symbol, side, quantity, price, strategy=None, profit_loss=0.0):
         """添加交易记录"""
@@ -73,7 +199,7 @@ class DatabaseManager:
             position.avg_price = avg_price
             position.current_price = current_price
             position.unrealized_pnl = (current_price - avg_price) * quantity
-            position.timestamp = datetime.utcnow()
+            position.timestamp = utcnow()
         else:
             position = Position(
                 symbol=symbol,
@@ -110,4 +236,73 @@ class DatabaseManager:
             'win_rate': win_rate,
             'total_pnl': total_pnl,
             'avg_pnl': total_pnl / total_trades if total_trades > 0 else 0
-        }
\ No newline at end of file
+        }
+    
+    def record_equity_snapshot(self, total_value, cash_balance=0.0, positions_value=0.0,
+                               unrealized_pnl=0.0, timestamp=None):
+        """记录权益快照并更新每日汇总"""
+        timestamp = timestamp or utcnow()
+        snapshot = EquitySnapshot(
+            timestamp=timestamp,
+            total_value=total_value,
+            cash_balance=cash_balance,
+            positions_value=positions_value,
+            unrealized_pnl=unrealized_pnl
+        )
+        
+        with self.session_scope() as session:
+            session.add(snapshot)
+            
+            # 滚动更新当日汇总，只读取当日和前一条汇总记录
+            day = timestamp.date()
+            daily = session.query(DailyEquity).filter_by(date=day).first()
+            if daily:
+                daily.high_value = max(daily.high_value, total_value)
+                daily.low_value = min(daily.low_value, total_value)
+                daily.close_value = total_value
+                daily.peak_value = max(daily.peak_value, total_value)
+                daily.snapshot_count += 1
+                daily.updated_at = timestamp
+            else:
+                previous = session.query(DailyEquity).filter(
+                    DailyEquity.date < day
+                ).order_by(DailyEquity.date.desc()).first()
+                previous_peak = previous.peak_value if previous else total_value
+                daily = DailyEquity(
+                    date=day,
+                    open_value=total_value,
+                    high_value=total_value,
+                    low_value=total_value,
+                    close_value=total_value,
+                    peak_value=max(previous_peak, total_value),
+                    snapshot_count=1,
+                    updated_at=timestamp
+                )
+                session.add(daily)
+        
+        return snapshot
+    
+    def get_equity_snapshots(self, start=None, end=None, limit=None):
+        """按时间范围获取权益快照（升序）"""
+        query = self.session.query(EquitySnapshot)
+        if start is not None:
+            query = query.filter(EquitySnapshot.timestamp >= start)
+        if end is not None:
+            query = query.filter(EquitySnapshot.timestamp <= end)
+        if limit:
+            snapshots = query.order_by(EquitySnapshot.timestamp.desc()).limit(limit).all()
+            return list(reversed(snapshots))
+        return query.order_by(EquitySnapshot.timestamp).all()
+    
+    def get_daily_equity(self, days=100, end_date=None):
+        """获取最近N天的每日权益汇总（升序）"""
+        query = self.session.query(DailyEquity)
+        if end_date is not None:
+            query = query.filter(DailyEquity.date <= end_date)
+        rows = query.order_by(DailyEquity.date.desc()).limit(days).all()
+        return list(reversed(rows))
+    
+    def get_daily_equity_for(self, day=None):
+        """获取指定日期的权益汇总，默认当天（UTC）"""
+        day = day or utcnow().date()
+        return self.session.query(DailyEquity).filter_by(date=day).first()
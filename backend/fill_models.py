@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+回测成交模型
+决定回测中订单的成交价格：收盘价成交、固定基点滑点、按成交量占比的冲击成本，
+以及回放已归档的订单簿快照计算吃单冲击。所有模型都支持批量（向量化）计算
+"""
+
+import logging
+from typing import Dict, Optional
+import numpy as np
+import pandas as pd
+
+BUY_SIDES = ('BUY', 'COVER')
+
+
+def _side_sign(side: str) -> int:
+    """买入为+1（价格向上滑），卖出为-1"""
+    return 1 if side.upper() in BUY_SIDES else -1
+
+
+def _to_epoch_ms(timestamp) -> Optional[int]:
+    """时间转换为UTC毫秒时间戳（无时区的时间按UTC处理，与K线和订单簿归档一致）"""
+    if timestamp is None:
+        return None
+    return int(to_utc_ms(timestamp)[0])
+
+
+def to_utc_ms(timestamps) -> np.ndarray:
+    """批量把时间转换为UTC毫秒时间戳；带时区的先转换到UTC，与datetime64的存储单位无关"""
+    index = pd.DatetimeIndex(np.atleast_1d(timestamps))
+    if index.tz is not None:
+        index = index.tz_convert('UTC').tz_localize(None)
+    return index.as_unit('ms').asi8
+
+
+def interval_ms(interval: str = None) -> int:
+    """K线周期的毫秒数（'1m'、'1h'、'1d'、'1w'等），无法解析时返回0"""
+    if not interval:
+        return 0
+    try:
+        return int(pd.Timedelta(interval).value // 1_000_000)
+    except ValueError:
+        return 0
+
+
+class FillModel:
+    """成交模型基类：以K线收盘价成交（无滑点）"""
+    
+    name = 'close'
+    # K线周期（毫秒）：订单时间为K线开盘时间，按收盘价成交时实际成交时刻为开盘时间 + 周期
+    bar_interval_ms = 0
+    
+    def prepare(self, symbol: str, start=None, end=None, interval: str = None):
+        """回测开始前调用，可在此预加载数据"""
+        self.bar_interval_ms = interval_ms(interval)
+    
+    def fill_prices(self, sides: np.ndarray, quantities: np.ndarray, prices: np.ndarray,
+                    volumes: np.ndarray = None, timestamps: np.ndarray = None) -> np.ndarray:
+        """
+        批量计算成交价
+        
+        Args:
+            sides: +1 买入 / -1 卖出
+            quantities: 成交数量
+            prices: 参考价格（K线收盘价）
+            volumes: K线成交量
+            timestamps: K线开盘时间（UTC毫秒时间戳）
+        """
+        return np.asarray(prices, dtype=np.float64)
+    
+    def fill_price(self, side: str, quantity: float, price: float, volume: float = None,
+                   timestamp=None) -> float:
+        """计算单笔订单成交价"""
+        ts = _to_epoch_ms(timestamp)
+        return float(self.fill_prices(
+            np.array([_side_sign(side)]),
+            np.array([quantity], dtype=np.float64),
+            np.array([price], dtype=np.float64),
+            None if volume is None else np.array([volume], dtype=np.float64),
+            None if ts is None else np.array([ts], dtype='<i8')
+        )[0])
+    
+    def describe(self) -> str:
+        return self.name
+
+
+class FixedBpsFillModel(FillModel):
+    """固定滑点：成交价 = 收盘价 ×（1 ± bps/10000）"""
+    
+    name = 'fixed_bps'
+    
+    def __init__(self, bps: float = 5.0):
+        self.bps = bps
+    
+    def fill_prices(self, sides, quantities, prices, volumes=None, timestamps=None) -> np.ndarray:
+        prices = np.asarray(prices, dtype=np.float64)
+        return prices * (1 + np.asarray(sides) * self.bps / 10000)
+    
+    def describe(self) -> str:
+        return f"{self.name}({self.bps}bps)"
+
+
+class VolumeParticipationFillModel(FillModel):
+    """
+    按成交量占比计算冲击成本（平方根模型）
+    
+    滑点 = 半个价差 + impact_coef × sqrt(订单数量 / K线成交量)，
+    占比超过max_participation时按max_participation计算并记录警告
+    """
+    
+    name = 'volume_participation'
+    
+    def __init__(self, half_spread_bps: float = 2.0, impact_coef: float = 0.1,
+                 max_participation: float = 0.25):
+        self.half_spread_bps = half_spread_bps
+        self.impact_coef = impact_coef
+        self.max_participation = max_participation
+        self.logger = logging.getLogger(__name__)
+    
+    def fill_prices(self, sides, quantities, prices, volumes=None, timestamps=None) -> np.ndarray:
+        prices = np.asarray(prices, dtype=np.float64)
+        slippage = np.full(len(prices), self.half_spread_bps / 10000)
+        
+        if volumes is not None:
+            volumes = np.asarray(volumes, dtype=np.float64)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                participation = np.where(volumes > 0, np.asarray(quantities) / volumes, self.max_participation)
+            if np.any(participation > self.max_participation):
+                self.logger.warning(f"订单数量超过K线成交量的{self.max_participation:.0%}，成交价可能失真")
+            participation = np.clip(participation, 0, self.max_participation)
+            slippage = slippage + self.impact_coef * np.sqrt(participation)
+        
+        return prices * (1 + np.asarray(sides) * slippage)
+    
+    def describe(self) -> str:
+        return f"{self.name}(spread={self.half_spread_bps}bps, k={self.impact_coef})"
+
+
+class OrderBookReplayFillModel(FillModel):
+    """
+    订单簿回放：用成交时刻（K线收盘时间）之前最近的订单簿快照计算吃单均价相对中间价的冲击，
+    再把该比例应用到K线收盘价上；没有可用快照时使用fallback模型
+    """
+    
+    name = 'orderbook'
+    
+    def __init__(self, archive=None, max_staleness_seconds: float = 300,
+                 fallback: FillModel = None):
+        """
+        Args:
+            archive: OrderBookArchive实例，默认按配置创建
+            max_staleness_seconds: 快照与订单时间的最大间隔
+            fallback: 无可用快照时的成交模型
+        """
+        if archive is None:
+            from backend.orderbook_archive import create_orderbook_archive
+            archive = create_orderbook_archive()
+        self.archive = archive
+        self.max_staleness_ms = int(max_staleness_seconds * 1000)
+        self.fallback = fallback or FixedBpsFillModel()
+        self.logger = logging.getLogger(__name__)
+        self._snapshots: Dict[str, np.ndarray] = None
+    
+    def prepare(self, symbol: str, start=None, end=None, interval: str = None):
+        """一次性加载回测区间内的订单簿快照"""
+        super().prepare(symbol, start, end, interval)
+        self._snapshots = None
+        if self.archive is None:
+            return
+        # 往前多读一段，保证第一根K线也能找到快照；最后一根K线在其收盘时间成交
+        if start is not None:
+            start = pd.Timestamp(_to_epoch_ms(start) - self.max_staleness_ms, unit='ms')
+        if end is not None:
+            end = pd.Timestamp(_to_epoch_ms(end) + self.bar_interval_ms, unit='ms')
+        data = self.archive.read_range(symbol, start, end)
+        if len(data['timestamp']):
+            self._snapshots = data
+            self.logger.info(f"加载 {symbol} 订单簿快照 {len(data['timestamp'])} 个用于成交模拟")
+        else:
+            self.logger.warning(f"{symbol} 没有订单簿快照，使用 {self.fallback.describe()} 成交模型")
+    
+    def fill_prices(self, sides, quantities, prices, volumes=None, timestamps=None) -> np.ndarray:
+        prices = np.asarray(prices, dtype=np.float64)
+        result = np.array(self.fallback.fill_prices(sides, quantities, prices, volumes, timestamps), dtype=np.float64)
+        if self._snapshots is None or timestamps is None:
+            return result
+        
+        snapshots = self._snapshots
+        # 按收盘价成交，查找K线收盘时刻的订单簿
+        timestamps = np.asarray(timestamps, dtype='<i8') + self.bar_interval_ms
+        index = np.searchsorted(snapshots['timestamp'], timestamps, side='right') - 1
+        valid = (index >= 0)
+        valid[valid] &= timestamps[valid] - snapshots['timestamp'][index[valid]] <= self.max_staleness_ms
+        if not valid.any():
+            return result
+        
+        rows = index[valid]
+        sides = np.broadcast_to(np.asarray(sides), prices.shape)[valid]
+        quantities = np.asarray(quantities, dtype=np.float64)[valid]
+        
+        best_bid = snapshots['bid_prices'][rows, 0]
+        best_ask = snapshots['ask_prices'][rows, 0]
+        mid = (best_bid + best_ask) / 2
+        
+        # 买入吃卖盘，卖出吃买盘
+        buy = sides > 0
+        level_prices = np.where(buy[:, None], snapshots['ask_prices'][rows], snapshots['bid_prices'][rows])
+        level_qtys = np.nan_to_num(np.where(buy[:, None], snapshots['ask_qtys'][rows], snapshots['bid_qtys'][rows]))
+        level_prices = np.nan_to_num(level_prices)
+        
+        cum_qty = np.cumsum(level_qtys, axis=1)
+        prev_qty = cum_qty - level_qtys
+        # 每档实际成交数量
+        take = np.clip(quantities[:, None] - prev_qty, 0, level_qtys)
+        filled = take.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            vwap = (take * level_prices).sum(axis=1) / filled
+            impact = vwap / mid
+        
+        # 快照深度不足的部分按最后一档价格成交（保守估计）
+        shortfall = quantities - filled
+        last_price = level_prices[np.arange(len(rows)), np.maximum((level_qtys > 0).sum(axis=1) - 1, 0)]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            impact = np.where(
+                shortfall > 1e-12,
+                ((take * level_prices).sum(axis=1) + shortfall * last_price) / quantities / mid,
+                impact
+            )
+        
+        usable = np.isfinite(impact) & (mid > 0)
+        replay = result[valid]
+        replay[usable] = prices[valid][usable] * impact[usable]
+        result[valid] = replay
+        return result
+    
+    def describe(self) -> str:
+        return f"{self.name}(fallback={self.fallback.describe()})"
+
+
+FILL_MODELS = {
+    'close': FillModel,
+    'fixed_bps': FixedBpsFillModel,
+    'volume_participation': VolumeParticipationFillModel,
+    'orderbook': OrderBookReplayFillModel,
+}
+
+
+def create_fill_model(name: str = 'close', **kwargs) -> FillModel:
+    """
+    按名称创建成交模型
+    
+    Args:
+        name: 'close'（默认，收盘价成交）、'fixed_bps'、'volume_participation' 或 'orderbook'
+        kwargs: 传给模型构造函数的参数
+    """
+    model_class = FILL_MODELS.get((name or 'close').lower())
+    if model_class is None:
+        raise ValueError(f"不支持的成交模型: {name}")
+    return model_class(**kwargs)
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+MA交叉策略参数网格扫描
+一次回测 short_window × long_window 的整个参数网格：所有窗口的均线用累积和一次算出，
+金叉/死叉信号在 (K线, 参数组合) 矩阵上广播计算，成交模拟按K线循环、在所有参数组合上向量化。
+交易规则、成交价和指标计算与 BacktestEngine.run_backtest 逐根回测MA策略一致
+"""
+
+import logging
+from typing import Dict, List
+import numpy as np
+import pandas as pd
+from backend.fill_models import FillModel, create_fill_model, to_utc_ms
+
+
+class MAGridSweep:
+    """MA交叉策略的向量化网格回测"""
+    
+    def __init__(self, initial_capital: float = 10000.0, commission: float = 0.001,
+                 fill_model: FillModel = None, min_data_required: int = 50, chunk_size: int = 2048):
+        """
+        Args:
+            fill_model: 成交模型，默认按 BACKTEST_FILL_MODEL 配置创建
+            min_data_required: 开始交易前需要的K线数（与BacktestEngine的默认值一致）
+            chunk_size: 计算信号时每次处理的参数组合数（限制中间矩阵的内存）
+        """
+        if fill_model is None:
+            from config.config import Config
+            fill_model = create_fill_model(Config().BACKTEST_FILL_MODEL)
+        self.initial_capital = initial_capital
+        self.commission = commission
+        self.fill_model = fill_model
+        self.min_data_required = min_data_required
+        self.chunk_size = chunk_size
+        self.logger = logging.getLogger(__name__)
+    
+    @staticmethod
+    def moving_averages(close: np.ndarray, windows: List[int]) -> np.ndarray:
+        """
+        用累积和一次算出多个窗口的简单移动平均（与pandas rolling的结果可能相差末位精度）
+        
+        Returns:
+            (K线数, 窗口数) 的矩阵，不足窗口长度的位置为NaN
+        """
+        close = np.asarray(close, dtype=np.float64)
+        n = len(close)
+        # 减去首个价格再累加，降低累积和的量级以减少浮点误差
+        base = close[0] if n else 0.0
+        cumsum = np.concatenate(([0.0], np.cumsum(close - base)))
+        
+        averages = np.full((n, len(windows)), np.nan)
+        for j, window in enumerate(windows):
+            if 0 < window <= n:
+                averages[window - 1:, j] = (cumsum[window:] - cumsum[:-window]) / window + base
+        return averages
+    
+    def crossover_signals(self, averages: np.ndarray, short_index: np.ndarray,
+                          long_index: np.ndarray) -> np.ndarray:
+        """
+        所有参数组合的交叉信号矩阵（1金叉买入 / -1死叉卖出 / 0持有）
+        
+        均线不足窗口长度时为NaN，比较结果为False，因此前long_window-1根K线没有信号
+        """
+        n_bars = averages.shape[0]
+        signals = np.zeros((n_bars, len(short_index)), dtype=np.int8)
+        if n_bars < 2:
+            return signals
+        
+        for start in range(0, len(short_index), self.chunk_size):
+            chunk = slice(start, start + self.chunk_size)
+            # short - long 的符号与 short 和 long 的大小关系一致
+            diff = averages[:, short_index[chunk]] - averages[:, long_index[chunk]]
+            prev, curr = diff[:-1], diff[1:]
+            with np.errstate(invalid='ignore'):
+                golden = (prev <= 0) & (curr > 0)
+                death = (prev >= 0) & (curr < 0)
+            signals[1:, chunk] = golden.astype(np.int8) - death.astype(np.int8)
+        return signals
+    
+    def run(self, data: pd.DataFrame, short_windows: List[int], long_windows: List[int],
+            position_size: float = 0.1, symbol: str = None, trade_start: int = 0,
+            interval: str = '1h') -> pd.DataFrame:
+        """
+        回测所有 (short_window, long_window) 组合
+        
+        Args:
+            data: 按时间升序的K线，至少包含timestamp和close列
+            position_size: 每次开仓使用的资金比例
+            symbol: 交易对（供成交模型预加载数据）
+            trade_start: 从第几根K线开始交易和统计，之前的K线只用于计算均线
+            interval: K线周期（成交模型按K线收盘时间查找订单簿）
+        
+        Returns:
+            每个参数组合一行：short_window、long_window 及与 StrategyOptimizer 相同口径的指标
+        """
+        pairs = [(s, l) for s in short_windows for l in long_windows]
+        if data.empty or not pairs:
+            return pd.DataFrame()
+        if not 0 <= trade_start < len(data):
+            raise ValueError(f"trade_start超出数据范围: {trade_start}")
+        
+        windows = sorted({w for pair in pairs for w in pair})
+        column = {w: j for j, w in enumerate(windows)}
+        short_index = np.array([column[s] for s, _ in pairs])
+        long_index = np.array([column[l] for _, l in pairs])
+        
+        close = data['close'].to_numpy(dtype=np.float64)
+        volume = data['volume'].to_numpy(dtype=np.float64) if 'volume' in data.columns else None
+        timestamps = to_utc_ms(data['timestamp'])
+        
+        self.fill_model.prepare(symbol, data.iloc[trade_start]['timestamp'], data.iloc[-1]['timestamp'], interval)
+        averages = self.moving_averages(close, windows)
+        signals = self.crossover_signals(averages, short_index, long_index)
+        stats = self._simulate(signals, close, volume, timestamps, position_size, trade_start)
+        
+        days = (pd.Timestamp(data.iloc[-1]['timestamp']) - pd.Timestamp(data.iloc[trade_start]['timestamp'])).days
+        metrics = self._metrics(stats, days)
+        result = pd.DataFrame({
+            'short_window': [s for s, _ in pairs],
+            'long_window': [l for _, l in pairs],
+        })
+        for name, values in metrics.items():
+            result[name] = values
+        return result
+    
+    def _fill(self, side: int, quantities: np.ndarray, price: float, volume, timestamp) -> np.ndarray:
+        """同一根K线上一批订单的成交价"""
+        n = len(quantities)
+        return self.fill_model.fill_prices(
+            np.full(n, side),
+            quantities,
+            np.full(n, price),
+            None if volume is None else np.full(n, volume),
+            np.full(n, timestamp, dtype='<i8')
+        )
+    
+    def _simulate(self, signals: np.ndarray, close: np.ndarray, volume, timestamps: np.ndarray,
+                  position_size: float, trade_start: int = 0) -> Dict[str, np.ndarray]:
+        """
+        按K线循环、在所有参数组合上同时模拟交易
+        
+        与BacktestEngine一致：只做多；开仓扣除 数量×成交价×(1+手续费)，平仓收回 数量×成交价×(1-手续费)，
+        记录的盈亏扣除平仓手续费；权益 = 资金 + 持仓市值。BacktestEngine不更新策略持仓，止损止盈不会触发，这里同样不检查。
+        权益统计（收益率均值方差、最大回撤）在循环中在线计算，不保存 K线数×参数组合数 的权益矩阵
+        """
+        n_bars, n_pairs = signals.shape
+        commission = self.commission
+        warmup = self.min_data_required - 1
+        
+        capital = np.full(n_pairs, self.initial_capital)
+        position = np.zeros(n_pairs)
+        entry_price = np.zeros(n_pairs)
+        
+        # 交易统计：所有交易记录数（含开仓）、盈利/亏损笔数和金额
+        n_trades = np.zeros(n_pairs, dtype=np.int64)
+        n_wins = np.zeros(n_pairs, dtype=np.int64)
+        gross_profit = np.zeros(n_pairs)
+        gross_loss = np.zeros(n_pairs)
+        
+        def record(index, profit):
+            n_trades[index] += 1
+            n_wins[index] += profit > 0
+            gross_profit[index] += np.where(profit > 0, profit, 0.0)
+            gross_loss[index] -= np.where(profit < 0, profit, 0.0)
+        
+        # 权益统计（Welford算法计算收益率方差）
+        prev_equity = capital.copy()
+        peak = capital.copy()
+        max_drawdown = np.zeros(n_pairs)
+        return_count = np.zeros(n_pairs)
+        return_mean = np.zeros(n_pairs)
+        return_m2 = np.zeros(n_pairs)
+        
+        for t in range(trade_start, n_bars):
+            price = close[t]
+            bar_volume = None if volume is None else volume[t]
+            
+            if t >= warmup:
+                signal = signals[t]
+                
+                # 金叉且空仓：开多
+                index = np.flatnonzero((signal == 1) & (position <= 0))
+                if len(index):
+                    quantity = capital[index] * position_size / price
+                    index, quantity = index[quantity > 0], quantity[quantity > 0]
+                    if len(index):
+                        fill = self._fill(1, quantity, price, bar_volume, timestamps[t])
+                        position[index] = quantity
+                        entry_price[index] = fill
+                        capital[index] -= quantity * fill * (1 + commission)
+                        record(index, np.zeros(len(index)))
+                
+                # 死叉且持多：平仓
+                index = np.flatnonzero((signal == -1) & (position > 0))
+                if len(index):
+                    quantity = position[index]
+                    fill = self._fill(-1, quantity, price, bar_volume, timestamps[t])
+                    profit = (fill - entry_price[index]) * quantity - quantity * fill * commission
+                    capital[index] += quantity * fill * (1 - commission)
+                    position[index] = 0
+                    record(index, profit)
+            
+            equity = capital + price * position
+            
+            if t > trade_start:
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    returns = equity / prev_equity - 1
+                valid = ~np.isnan(returns)
+                return_count += valid
+                delta = np.where(valid, returns - return_mean, 0.0)
+                return_mean += np.where(valid, delta / np.maximum(return_count, 1), 0.0)
+                return_m2 += np.where(valid, delta * (returns - return_mean), 0.0)
+            
+            peak = np.fmax(peak, equity)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                max_drawdown = np.fmin(max_drawdown, (equity - peak) / peak)
+            prev_equity = equity
+        
+        last_equity = prev_equity
+        
+        # 最后平仓（与BacktestEngine一致：只计入交易统计，不计入权益曲线）
+        index = np.flatnonzero(position > 0)
+        if len(index):
+            quantity = position[index]
+            fill = self._fill(-1, quantity, close[-1], None if volume is None else volume[-1], timestamps[-1])
+            profit = (fill - entry_price[index]) * quantity - quantity * fill * commission
+            capital[index] += quantity * fill * (1 - commission)
+            record(index, profit)
+        
+        with np.errstate(invalid='ignore'):
+            variance = np.where(return_count > 1, return_m2 / (return_count - 1), np.nan)
+        return {
+            'last_equity': last_equity,
+            'max_drawdown': max_drawdown,
+            'volatility': np.sqrt(variance) * np.sqrt(252),
+            'n_trades': n_trades,
+            'n_wins': n_wins,
+            'gross_profit': gross_profit,
+            'gross_loss': gross_loss,
+        }
+    
+    def _metrics(self, stats: Dict[str, np.ndarray], days: int) -> Dict[str, np.ndarray]:
+        """按 BacktestEngine._calculate_backtest_metrics 和 StrategyOptimizer._calculate_metrics 的口径计算指标"""
+        total_return = (stats['last_equity'] - self.initial_capital) / self.initial_capital
+        
+        if days > 0:
+            with np.errstate(invalid='ignore', over='ignore'):
+                annual_return = (1 + total_return) ** (365 / days) - 1
+            annual_return = np.where(np.abs(annual_return) > 10, total_return * (365 / days), annual_return)
+            # 负收益率开方得到NaN时，BacktestEngine的max/min限制结果为-0.99
+            annual_return = np.where(np.isnan(annual_return), -0.99, np.clip(annual_return, -0.99, 9.99))
+        else:
+            annual_return = np.zeros_like(total_return)
+        
+        volatility = stats['volatility']
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sharpe_ratio = np.where(volatility > 0, (annual_return - 0.02) / volatility, 0.0)
+        
+        n_trades = stats['n_trades']
+        gross_profit, gross_loss = stats['gross_profit'], stats['gross_loss']
+        with np.errstate(invalid='ignore', divide='ignore'):
+            win_rate = np.where(n_trades > 0, stats['n_wins'] / np.maximum(n_trades, 1), 0.0)
+            profit_factor = np.where(
+                gross_loss > 0, gross_profit / gross_loss, np.where(gross_profit > 0, 999.99, 0.0)
+            )
+        
+        # 没有交易时StrategyOptimizer所有指标记为0
+        traded = n_trades > 0
+        return {
+            'total_return': np.where(traded, total_return * 100, 0.0),
+            'sharpe_ratio': np.where(traded, sharpe_ratio, 0.0),
+            'max_drawdown': np.where(traded, stats['max_drawdown'] * 100, 0.0),
+            'win_rate': np.where(traded, win_rate * 100, 0.0),
+            'profit_factor': np.where(traded, profit_factor, 0.0),
+            'total_trades': n_trades,
+            'avg_trade_duration': np.where(traded, 1.0, 0.0),
+        }
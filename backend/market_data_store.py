@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+列式K线存储模块
+按 (symbol, interval, 月份) 分区保存K线，支持内存映射的NumPy文件和Parquet两种格式，
+可替代SQLite中逐行存储的 market_data 表
+"""
+
+import os
+import time
+import logging
+from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+# 分区文件中的K线结构（时间戳为毫秒）
+BAR_DTYPE = np.dtype([
+    ('timestamp', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+    ('quote_volume', '<f8'),
+    ('trades_count', '<i8'),
+])
+
+BAR_FIELDS = list(BAR_DTYPE.names)
+
+# 输入DataFrame中可能出现的列名别名
+_COLUMN_ALIASES = {
+    'quote_volume': ['quote_volume', 'quote_asset_volume'],
+    'trades_count': ['trades_count', 'number_of_trades'],
+}
+
+
+def _to_epoch_ms(value) -> Optional[int]:
+    """将时间转换为毫秒时间戳"""
+    if value is None:
+        return None
+    return int(pd.Timestamp(value).value // 1_000_000)
+
+
+def bars_from_dataframe(df: pd.DataFrame) -> np.ndarray:
+    """将K线DataFrame转换为结构化数组（按时间升序、去重）"""
+    bars = np.zeros(len(df), dtype=BAR_DTYPE)
+    if len(df) == 0:
+        return bars
+    
+    timestamps = pd.to_datetime(df['timestamp'])
+    bars['timestamp'] = timestamps.values.astype('datetime64[ms]').astype('<i8')
+    for field in ('open', 'high', 'low', 'close', 'volume'):
+        bars[field] = pd.to_numeric(df[field], errors='coerce').fillna(0).values
+    for field, aliases in _COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in df.columns:
+                bars[field] = pd.to_numeric(df[alias], errors='coerce').fillna(0).values
+                break
+    
+    return _dedupe_sorted(bars)
+
+
+def bars_to_dataframe(bars: np.ndarray) -> pd.DataFrame:
+    """将结构化数组转换为K线DataFrame"""
+    if len(bars) == 0:
+        return pd.DataFrame(columns=BAR_FIELDS)
+    
+    data = {'timestamp': pd.to_datetime(bars['timestamp'], unit='ms')}
+    for field in BAR_FIELDS[1:]:
+        data[field] = bars[field]
+    return pd.DataFrame(data)
+
+
+def _dedupe_sorted(bars: np.ndarray) -> np.ndarray:
+    """按时间戳排序并去重（保留最后写入的记录）"""
+    if len(bars) == 0:
+        return bars
+    # 稳定排序后倒序取唯一值，保证同一时间戳保留最后一条
+    order = np.argsort(bars['timestamp'], kind='stable')
+    bars = bars[order]
+    reversed_ts = bars['timestamp'][::-1]
+    _, first_idx = np.unique(reversed_ts, return_index=True)
+    keep = len(bars) - 1 - first_idx
+    return bars[np.sort(keep)]
+
+
+class ColumnarBarStore(ABC):
+    """列式K线存储基类 - 每个 (symbol, interval, 月份) 一个分区"""
+    
+    file_suffix = ''
+    
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+        self.logger = logging.getLogger(__name__)
+        os.makedirs(self.root_dir, exist_ok=True)
+    
+    # ---------- 子类实现 ----------
+    
+    @abstractmethod
+    def _read_partition(self, path: str, mmap: bool = True) -> np.ndarray:
+        """读取整个分区（升序、去重）"""
+    
+    @abstractmethod
+    def _write_partition(self, path: str, bars: np.ndarray):
+        """用bars整体替换分区"""
+    
+    def _merge_partition(self, path: str, bars: np.ndarray) -> int:
+        """把一个月的K线合并进分区，返回新增条数；默认读出整个分区合并后重写"""
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._write_partition(path, bars)
+            return len(bars)
+        
+        existing = np.array(self._read_partition(path, mmap=False))
+        inserted = int((~np.isin(bars['timestamp'], existing['timestamp'])).sum())
+        self._write_partition(path, _dedupe_sorted(np.concatenate([existing, bars])))
+        return inserted
+    
+    # ---------- 分区管理 ----------
+    
+    def _partition_dir(self, symbol: str, interval: str) -> str:
+        return os.path.join(self.root_dir, symbol.upper(), interval)
+    
+    def _partition_path(self, symbol: str, interval: str, month_key: str) -> str:
+        return os.path.join(self._partition_dir(symbol, interval), f"{month_key}{self.file_suffix}")
+    
+    def _list_partitions(self, symbol: str, interval: str, start_ms: int = None,
+                         end_ms: int = None) -> List[Tuple[str, str]]:
+        """列出时间范围内的分区 (month_key, path)，按月份升序"""
+        directory = self._partition_dir(symbol, interval)
+        if not os.path.isdir(directory):
+            return []
+        
+        start_key = self._month_key(start_ms) if start_ms is not None else None
+        end_key = self._month_key(end_ms) if end_ms is not None else None
+        
+        partitions = []
+        for name in os.listdir(directory):
+            if not name.endswith(self.file_suffix):
+                continue
+            month_key = name[:-len(self.file_suffix)]
+            if start_key and month_key < start_key:
+                continue
+            if end_key and month_key > end_key:
+                continue
+            partitions.append((month_key, os.path.join(directory, name)))
+        
+        return sorted(partitions)
+    
+    @staticmethod
+    def _month_key(epoch_ms: int) -> str:
+        return str(np.datetime64(int(epoch_ms), 'ms').astype('datetime64[M]'))
+    
+    # ---------- 读写接口 ----------
+    
+    def write_bars(self, symbol: str, interval: str, df: pd.DataFrame) -> int:
+        """写入K线，按月份合并到分区文件，返回新增条数"""
+        bars = bars_from_dataframe(df)
+        if len(bars) == 0:
+            return 0
+        
+        months = bars['timestamp'].astype('datetime64[ms]').astype('datetime64[M]')
+        inserted = 0
+        for month in np.unique(months):
+            path = self._partition_path(symbol, interval, str(month))
+            inserted += self._merge_partition(path, bars[months == month])
+        
+        return inserted
+    
+    def read_arrays(self, symbol: str, interval: str, start=None, end=None,
+                    limit: int = None) -> np.ndarray:
+        """
+        读取结构化K线数组（升序）
+        
+        单个分区内的范围读取直接返回内存映射视图，不复制数据
+        """
+        start_ms = _to_epoch_ms(start)
+        end_ms = _to_epoch_ms(end)
+        partitions = self._list_partitions(symbol, interval, start_ms, end_ms)
+        if not partitions:
+            return np.zeros(0, dtype=BAR_DTYPE)
+        
+        # 只有limit时从最新分区往前读，读够即停
+        if limit and start_ms is None:
+            partitions = list(reversed(partitions))
+        
+        chunks = []
+        total = 0
+        for _, path in partitions:
+            bars = self._read_partition(path, mmap=True)
+            ts = bars['timestamp']
+            lo = np.searchsorted(ts, start_ms, side='left') if start_ms is not None else 0
+            hi = np.searchsorted(ts, end_ms, side='right') if end_ms is not None else len(bars)
+            if hi > lo:
+                chunks.append(bars[lo:hi])
+                total += hi - lo
+            if limit and total >= limit:
+                break
+        
+        if not chunks:
+            return np.zeros(0, dtype=BAR_DTYPE)
+        
+        if limit and start_ms is None:
+            chunks = list(reversed(chunks))
+        
+        bars = chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+        if limit:
+            bars = bars[-limit:] if start_ms is None else bars[:limit]
+        return bars
+    
+    def read_bars(self, symbol: str, interval: str, start=None, end=None,
+                  limit: int = None) -> pd.DataFrame:
+        """读取K线DataFrame（升序），列与 DataCollector.get_market_data 一致"""
+        return bars_to_dataframe(self.read_arrays(symbol, interval, start, end, limit))
+    
+    def get_time_bounds(self, symbol: str, interval: str) -> Optional[Tuple[pd.Timestamp, pd.Timestamp]]:
+        """获取已存储数据的时间范围"""
+        partitions = self._list_partitions(symbol, interval)
+        if not partitions:
+            return None
+        first = self._read_partition(partitions[0][1], mmap=True)
+        last = self._read_partition(partitions[-1][1], mmap=True)
+        if len(first) == 0 or len(last) == 0:
+            return None
+        return (pd.to_datetime(int(first['timestamp'][0]), unit='ms'),
+                pd.to_datetime(int(last['timestamp'][-1]), unit='ms'))
+
+
+class NpyBarStore(ColumnarBarStore):
+    """内存映射NumPy分区存储"""
+    
+    file_suffix = '.npy'
+    
+    def _read_partition(self, path: str, mmap: bool = True) -> np.ndarray:
+        return np.load(path, mmap_mode='r' if mmap else None, allow_pickle=False)
+    
+    def _write_partition(self, path: str, bars: np.ndarray):
+        # 先写临时文件再替换，避免读到写了一半的分区
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(bars, dtype=BAR_DTYPE), allow_pickle=False)
+        os.replace(tmp_path, path)
+
+
+class ParquetBarStore(ColumnarBarStore):
+    """
+    Parquet分区存储（需要pyarrow）
+    
+    每个月份分区是一个目录，追加写入时只把新数据写成一个part文件，不重写已有数据；
+    part文件超过 max_parts 个时合并成一个。读取时按写入顺序合并去重（同一时间戳保留最后写入的记录）
+    """
+    
+    file_suffix = '.parquet'
+    part_suffix = '.part.parquet'
+    
+    def __init__(self, root_dir: str, max_parts: int = 32):
+        try:
+            import pyarrow  # noqa: F401
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise ImportError("Parquet存储需要安装pyarrow: pip install pyarrow")
+        super().__init__(root_dir)
+        self.max_parts = max_parts
+    
+    def _part_files(self, path: str) -> List[str]:
+        """分区的part文件，按写入顺序排列；旧版本写出的单文件分区视为只有一个part"""
+        if os.path.isfile(path):
+            return [path]
+        if not os.path.isdir(path):
+            return []
+        return [os.path.join(path, name) for name in sorted(os.listdir(path))
+                if name.endswith(self.part_suffix)]
+    
+    def _read_part(self, part: str, columns: List[str] = None, mmap: bool = True) -> np.ndarray:
+        import pyarrow.parquet as pq
+        columns = columns or BAR_FIELDS
+        table = pq.read_table(part, columns=columns, memory_map=mmap)
+        bars = np.zeros(table.num_rows, dtype=BAR_DTYPE)
+        for field in columns:
+            bars[field] = table.column(field).to_numpy()
+        return bars
+    
+    def _write_part(self, directory: str, bars: np.ndarray) -> str:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.table({field: bars[field] for field in BAR_FIELDS})
+        # 纳秒时间戳作为文件名，按名称排序即写入顺序；临时文件不带part后缀，读取时会被忽略
+        part = os.path.join(directory, f"{time.time_ns():020d}{self.part_suffix}")
+        tmp_path = f"{part}.tmp"
+        pq.write_table(table, tmp_path, compression='zstd')
+        os.replace(tmp_path, part)
+        return part
+    
+    def _read_partition(self, path: str, mmap: bool = True) -> np.ndarray:
+        parts = [self._read_part(part, mmap=mmap) for part in self._part_files(path)]
+        if not parts:
+            return np.zeros(0, dtype=BAR_DTYPE)
+        if len(parts) == 1:
+            return parts[0]
+        return _dedupe_sorted(np.concatenate(parts))
+    
+    def _write_partition(self, path: str, bars: np.ndarray):
+        """写入一个新part后删除其余part（合并/替换分区）"""
+        old_parts = self._part_files(path)
+        if os.path.isfile(path):
+            # 旧版本的单文件分区转换为目录
+            legacy_path = f"{path}.legacy"
+            os.replace(path, legacy_path)
+            old_parts = [legacy_path]
+        os.makedirs(path, exist_ok=True)
+        self._write_part(path, bars)
+        for part in old_parts:
+            os.remove(part)
+    
+    def _merge_partition(self, path: str, bars: np.ndarray) -> int:
+        parts = self._part_files(path)
+        if not parts or os.path.isfile(path):
+            existing = self._read_partition(path, mmap=False)
+            inserted = int((~np.isin(bars['timestamp'], existing['timestamp'])).sum())
+            self._write_partition(path, _dedupe_sorted(np.concatenate([existing, bars])))
+            return inserted
+        
+        # 只读时间戳列判断新增条数，新数据单独写成一个part
+        existing_ts = np.concatenate([
+            self._read_part(part, columns=['timestamp'])['timestamp'] for part in parts
+        ])
+        inserted = int((~np.isin(bars['timestamp'], existing_ts)).sum())
+        self._write_part(path, bars)
+        
+        if len(parts) + 1 > self.max_parts:
+            self._write_partition(path, self._read_partition(path, mmap=False))
+        return inserted
+
+
+BAR_STORE_BACKENDS = {
+    'npy': NpyBarStore,
+    'parquet': ParquetBarStore,
+}
+
+
+def create_bar_store(backend: str = None, root_dir: str = None) -> Optional[ColumnarBarStore]:
+    """
+    根据配置创建K线存储
+    
+    Args:
+        backend: 'sql'（默认，使用market_data表）、'npy' 或 'parquet'
+        root_dir: 列式存储根目录
+    
+    Returns:
+        列式存储实例；使用SQL存储时返回None
+    """
+    from config.config import Config
+    config = Config()
+    backend = (backend or config.MARKET_DATA_BACKEND or 'sql').lower()
+    if backend == 'sql':
+        return None
+    
+    store_class = BAR_STORE_BACKENDS.get(backend)
+    if store_class is None:
+        raise ValueError(f"不支持的K线存储类型: {backend}")
+    return store_class(root_dir or config.MARKET_DATA_DIR)
@@ -5,8 +5,11 @@
 """
 
 import requests
+import asyncio
+import threading
 import time
 import logging
+from typing import Dict
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from urllib3.exceptions import SSLError, ProxyError, ReadTimeoutError
@@ -15,6 +18,99 @@ import socket
 import random
 import urllib3
 
+# 可重试的网络异常
+RETRYABLE_ERRORS = (requests.exceptions.RequestException,
+                    SSLError, ProxyError, ReadTimeoutError,
+                    socket.error, ssl.SSLError)
+
+
+def is_service_response(error: Exception) -> bool:
+    """
+    异常是否来自服务端的正常应答（4xx参数校验、权限、限流等），说明服务本身可用
+
+    BinanceAPIException 带 status_code，aiohttp 的 ClientResponseError 带 status
+    """
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(error, 'status', None)
+    return isinstance(status, int) and 400 <= status < 500
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开，请求被直接拒绝"""
+    
+    def __init__(self, endpoint: str, retry_in: float):
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+        super().__init__(f"{endpoint} 熔断中，{retry_in:.1f}秒后重试")
+
+
+class CircuitBreaker:
+    """
+    单个接口的熔断器
+    
+    连续失败达到阈值后打开，期间请求直接失败；冷却结束后进入半开状态，
+    只放行一个探测请求，成功则关闭，失败则重新打开
+    """
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+    
+    def allow_request(self) -> float:
+        """是否放行请求，放行返回0，否则返回距离下次探测的秒数"""
+        return self.acquire()[0]
+    
+    def acquire(self):
+        """
+        申请放行请求
+        
+        Returns:
+            (距离下次探测的秒数，放行时为0, 本次请求是否为半开状态的探测请求)
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return 0.0, False
+            
+            retry_in = self.opened_at + self.recovery_timeout - time.monotonic()
+            if self.state == self.OPEN and retry_in <= 0:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return 0.0, True
+            return max(retry_in, 0.1), False
+    
+    def release_probe(self):
+        """探测请求结束但没有记录成功或失败（如非网络异常）时释放，允许下一个探测"""
+        with self._lock:
+            self._probe_in_flight = False
+    
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+    
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+
 class NetworkConfig:
     """网络配置类"""
     
@@ -25,6 +121,17 @@ class NetworkConfig:
         self.max_retries = 8  # 增加重试次数
         self.backoff_factor = 0.3  # 减少退避因子，更快重试
         self.status_forcelist = [500, 502, 503, 504, 429, 408]
+        self.max_backoff = 8.0  # 单次退避上限（秒）
+        
+        # 每次调用的总时间预算（秒），超出后不再重试，直接失败
+        self.deadline = 15.0
+        
+        # 熔断配置
+        self.breaker_failure_threshold = 5  # 连续失败次数阈值
+        self.breaker_recovery_timeout = 30.0  # 熔断冷却时间（秒）
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._metrics: Dict[str, Dict] = {}
+        self._state_lock = threading.Lock()
         
         # 超时配置 - 更宽松的设置
         self.connect_timeout = 15
@@ -148,33 +255,186 @@ class NetworkConfig:
             self.logger.error(f"{operation} 未知网络错误: {error_msg}")
             return "UNKNOWN_ERROR"
     
-    def retry_with_backoff(self, func, *args, **kwargs):
-        """带退避的重试机制 - 改进版本"""
+    def get_breaker(self, endpoint: str) -> CircuitBreaker:
+        """获取接口对应的熔断器"""
+        with self._state_lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = CircuitBreaker(self.breaker_failure_threshold, self.breaker_recovery_timeout)
+                self._breakers[endpoint] = breaker
+                self._metrics[endpoint] = {
+                    'calls': 0,
+                    'successes': 0,
+                    'failures': 0,
+                    'retries': 0,
+                    'rejected': 0,
+                    'deadline_exceeded': 0,
+                    'total_latency': 0.0,
+                }
+            return breaker
+    
+    def _record(self, endpoint: str, **increments):
+        with self._state_lock:
+            metrics = self._metrics[endpoint]
+            for key, value in increments.items():
+                metrics[key] += value
+    
+    def _next_wait(self, attempt: int, started: float, deadline: float):
+        """计算下一次重试前的等待时间，超出时间预算返回None"""
+        wait_time = min(self.backoff_factor * (2 ** attempt), self.max_backoff) + random.uniform(0, 0.5)
+        if time.monotonic() + wait_time - started >= deadline:
+            return None
+        return wait_time
+    
+    def _before_call(self, endpoint: str, breaker: CircuitBreaker) -> bool:
+        """放行检查，被熔断时抛出CircuitOpenError；返回本次是否为探测请求"""
+        retry_in, is_probe = breaker.acquire()
+        if retry_in > 0:
+            self._record(endpoint, rejected=1)
+            raise CircuitOpenError(endpoint, retry_in)
+        self._record(endpoint, calls=1)
+        return is_probe
+    
+    def _on_other_error(self, endpoint: str, breaker: CircuitBreaker, error: Exception, latency: float):
+        """不重试的异常：服务端正常应答的错误（如4xx）说明服务可用，关闭熔断器"""
+        if is_service_response(error):
+            breaker.record_success()
+            self._record(endpoint, successes=1, total_latency=latency)
+    
+    def retry_with_backoff(self, func, *args, endpoint: str = None, deadline: float = None, **kwargs):
+        """
+        带退避和熔断的重试机制
+        
+        Args:
+            endpoint: 熔断和统计使用的接口名，默认取函数名
+            deadline: 本次调用的总时间预算（秒），默认 self.deadline
+        
+        Raises:
+            CircuitOpenError: 接口处于熔断状态
+        """
+        endpoint = endpoint or getattr(func, '__name__', 'unknown')
+        deadline = deadline if deadline is not None else self.deadline
+        breaker = self.get_breaker(endpoint)
+        is_probe = self._before_call(endpoint, breaker)
+        
+        started = time.monotonic()
         last_error = None
         
-        for attempt in range(self.max_retries):
-            try:
-                # 添加随机延迟以避免同时请求
-                if attempt > 0:
-                    jitter = random.uniform(0.1, 0.5)
-                    time.sleep(jitter)
-                
-                return func(*args, **kwargs)
-            except (requests.exceptions.RequestException, 
-                   SSLError, ProxyError, ReadTimeoutError,
-                   socket.error, ssl.SSLError) as e:
-                last_error = e
-                error_type = self.handle_network_error(e)
-                
-                if attempt < self.max_retries - 1:
-                    # 指数退避 + 随机抖动
-                    wait_time = self.backoff_factor * (2 ** attempt) + random.uniform(0, 1)
+        try:
+            for attempt in range(self.max_retries):
+                call_started = time.monotonic()
+                try:
+                    result = func(*args, **kwargs)
+                    breaker.record_success()
+                    self._record(endpoint, successes=1, total_latency=time.monotonic() - call_started)
+                    return result
+                except RETRYABLE_ERRORS as e:
+                    last_error = e
+                    self.handle_network_error(e)
+                    breaker.record_failure()
+                    self._record(endpoint, failures=1, total_latency=time.monotonic() - call_started)
+                    
+                    if attempt >= self.max_retries - 1 or breaker.state == CircuitBreaker.OPEN:
+                        break
+                    wait_time = self._next_wait(attempt, started, deadline)
+                    if wait_time is None:
+                        self._record(endpoint, deadline_exceeded=1)
+                        self.logger.warning(f"{endpoint} 超出时间预算{deadline}秒，停止重试")
+                        break
+                    
                     self.logger.info(f"第{attempt + 1}次重试失败，等待{wait_time:.1f}秒后重试...")
+                    self._record(endpoint, retries=1)
                     time.sleep(wait_time)
-                else:
-                    self.logger.error(f"重试{self.max_retries}次后仍然失败")
+                except Exception as e:
+                    self._on_other_error(endpoint, breaker, e, time.monotonic() - call_started)
+                    raise
+        finally:
+            # 探测请求无论以何种方式结束都要释放，避免熔断器一直停在半开状态
+            if is_probe:
+                breaker.release_probe()
         
+        self.logger.error(f"{endpoint} 重试后仍然失败")
         raise last_error
+    
+    async def retry_async(self, coro_func, *args, endpoint: str = None, deadline: float = None,
+                          retry_on: tuple = None, before_attempt=None, **kwargs):
+        """
+        retry_with_backoff 的异步版本，退避等待使用 asyncio.sleep，不阻塞事件循环
+        
+        Args:
+            coro_func: 返回协程的函数
+            retry_on: 需要重试的异常类型，默认网络异常和超时
+            before_attempt: 每次尝试前等待的协程函数（如本地限流），等待时间不计入超时和时间预算
+        """
+        endpoint = endpoint or getattr(coro_func, '__name__', 'unknown')
+        deadline = deadline if deadline is not None else self.deadline
+        retry_on = retry_on or (RETRYABLE_ERRORS + (asyncio.TimeoutError,))
+        breaker = self.get_breaker(endpoint)
+        is_probe = self._before_call(endpoint, breaker)
+        
+        started = time.monotonic()
+        last_error = None
+        
+        try:
+            for attempt in range(self.max_retries):
+                if before_attempt is not None:
+                    wait_started = time.monotonic()
+                    await before_attempt()
+                    started += time.monotonic() - wait_started
+                call_started = time.monotonic()
+                try:
+                    result = await asyncio.wait_for(
+                        coro_func(*args, **kwargs),
+                        timeout=max(deadline - (call_started - started), 0.1)
+                    )
+                    breaker.record_success()
+                    self._record(endpoint, successes=1, total_latency=time.monotonic() - call_started)
+                    return result
+                except retry_on as e:
+                    last_error = e
+                    self.handle_network_error(e, endpoint)
+                    breaker.record_failure()
+                    self._record(endpoint, failures=1, total_latency=time.monotonic() - call_started)
+                    
+                    if attempt >= self.max_retries - 1 or breaker.state == CircuitBreaker.OPEN:
+                        break
+                    wait_time = self._next_wait(attempt, started, deadline)
+                    if wait_time is None:
+                        self._record(endpoint, deadline_exceeded=1)
+                        self.logger.warning(f"{endpoint} 超出时间预算{deadline}秒，停止重试")
+                        break
+                    
+                    self._record(endpoint, retries=1)
+                    await asyncio.sleep(wait_time)
+                except Exception as e:
+                    self._on_other_error(endpoint, breaker, e, time.monotonic() - call_started)
+                    raise
+        finally:
+            # 探测请求无论以何种方式结束（包括任务被取消）都要释放
+            if is_probe:
+                breaker.release_probe()
+        
+        self.logger.error(f"{endpoint} 重试后仍然失败")
+        raise last_error
+    
+    def get_metrics(self) -> Dict[str, Dict]:
+        """获取各接口的重试和熔断统计"""
+        with self._state_lock:
+            items = list(self._metrics.items())
+            breakers = dict(self._breakers)
+        
+        metrics = {}
+        for endpoint, values in items:
+            breaker = breakers[endpoint]
+            completed = values['successes'] + values['failures']
+            metrics[endpoint] = {
+                **values,
+                'total_latency': round(values['total_latency'], 3),
+                'avg_latency': round(values['total_latency'] / completed, 3) if completed else 0.0,
+                'circuit_state': breaker.state,
+                'consecutive_failures': breaker.consecutive_failures,
+            }
+        return metrics
 
 class BinanceNetworkConfig(NetworkConfig):
     """币安网络配置类"""
@@ -184,6 +444,7 @@ class BinanceNetworkConfig(NetworkConfig):
         
         # 币安特定的配置 - 更宽松的设置
         self.max_retries = 5  # 币安API重试次数
+        self.deadline = 20.0  # 单次调用总时间预算（秒）
         self.connect_timeout = 20
         self.read_timeout = 90
         
@@ -0,0 +1,549 @@
+#!/usr/bin/env python3
+"""
+本地订单簿模块
+用REST快照初始化，按深度增量推送（diff depth）更新，校验更新ID连续性；
+买卖盘用有序NumPy数组保存，价差、深度和滑点估算都在本地计算，不再请求订单簿接口
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import websocket
+except ImportError:
+    websocket = None
+
+from config.config import Config
+
+# 组合流地址（后接 streams=xxx@depth@100ms/...）
+DEPTH_STREAM_URLS = {
+    ('SPOT', False): 'wss://stream.binance.com:9443/stream?streams=',
+    ('SPOT', True): 'wss://testnet.binance.vision/stream?streams=',
+    ('FUTURES', False): 'wss://fstream.binance.com/stream?streams=',
+    ('FUTURES', True): 'wss://stream.binancefuture.com/stream?streams=',
+}
+
+# 未同步时每个交易对最多缓存的增量事件数（快照迟迟拿不到时丢弃最早的事件）
+MAX_BUFFERED_EVENTS = 1000
+# 录制文件的刷盘间隔（秒）和最多积压的未刷盘记录数
+RECORD_FLUSH_INTERVAL = 1.0
+RECORD_MAX_PENDING = 1000
+
+_EMPTY = np.empty(0, dtype=np.float64)
+
+
+def _to_arrays(levels) -> Tuple[np.ndarray, np.ndarray]:
+    """[[price, qty], ...]（字符串或数字）转换为价格、数量数组"""
+    if not levels:
+        return _EMPTY, _EMPTY
+    data = np.asarray(levels, dtype=np.float64).reshape(-1, 2)
+    return data[:, 0], data[:, 1]
+
+
+def _merge_levels(prices: np.ndarray, qtys: np.ndarray,
+                  update_prices: np.ndarray, update_qtys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """把增量合并到按价格升序的档位中（增量优先，数量为0的档位删除）"""
+    if len(update_prices) == 0:
+        return prices, qtys
+    # 增量放在前面，np.unique取首次出现的位置，即增量覆盖旧值
+    all_prices = np.concatenate([update_prices[::-1], prices])
+    all_qtys = np.concatenate([update_qtys[::-1], qtys])
+    merged_prices, index = np.unique(all_prices, return_index=True)
+    merged_qtys = all_qtys[index]
+    keep = merged_qtys > 0
+    return merged_prices[keep], merged_qtys[keep]
+
+
+class OrderBookOutOfSync(Exception):
+    """增量更新ID不连续，需要重新获取快照"""
+    pass
+
+
+class LocalOrderBook:
+    """
+    单个交易对的本地订单簿
+    
+    买卖盘都按价格升序保存：最优买价为bids的最后一个，最优卖价为asks的第一个
+    """
+    
+    def __init__(self, symbol: str, futures: bool = False, max_levels: int = 1000):
+        self.symbol = symbol
+        self.futures = futures
+        self.max_levels = max_levels
+        self.last_update_id = 0
+        self.last_event_time = 0
+        self.synced = False
+        self.updates_applied = 0
+        
+        self._bid_prices, self._bid_qtys = _EMPTY, _EMPTY
+        self._ask_prices, self._ask_qtys = _EMPTY, _EMPTY
+        self._first_event = True
+        self._lock = threading.Lock()
+    
+    # ---------- 维护 ----------
+    
+    def load_snapshot(self, snapshot: Dict):
+        """用REST订单簿快照初始化（需包含lastUpdateId）"""
+        bid_prices, bid_qtys = _to_arrays(snapshot.get('bids'))
+        ask_prices, ask_qtys = _to_arrays(snapshot.get('asks'))
+        bid_order, ask_order = np.argsort(bid_prices), np.argsort(ask_prices)
+        with self._lock:
+            self._bid_prices, self._bid_qtys = bid_prices[bid_order], bid_qtys[bid_order]
+            self._ask_prices, self._ask_qtys = ask_prices[ask_order], ask_qtys[ask_order]
+            self.last_update_id = int(snapshot['lastUpdateId'])
+            self.last_event_time = int(snapshot.get('E', snapshot.get('T', 0)) or 0)
+            self._first_event = True
+            self.synced = True
+    
+    def apply_diff(self, event: Dict) -> bool:
+        """
+        应用一条深度增量推送
+        
+        Returns:
+            True表示已应用，False表示事件早于快照被丢弃
+        
+        Raises:
+            OrderBookOutOfSync: 更新ID不连续（调用方需重新获取快照）
+        """
+        first_id, final_id = int(event['U']), int(event['u'])
+        
+        with self._lock:
+            if not self.synced:
+                raise OrderBookOutOfSync(f"{self.symbol} 订单簿尚未同步")
+            
+            if self.futures:
+                # 合约：丢弃 u < lastUpdateId；首条需满足 U <= lastUpdateId <= u，之后 pu 等于上一条的 u
+                if final_id < self.last_update_id:
+                    return False
+                if self._first_event:
+                    valid = first_id <= self.last_update_id <= final_id
+                else:
+                    valid = int(event.get('pu', -1)) == self.last_update_id
+            else:
+                # 现货：丢弃 u <= lastUpdateId；首条需满足 U <= lastUpdateId+1 <= u，之后 U 等于上一条的 u+1
+                if final_id <= self.last_update_id:
+                    return False
+                if self._first_event:
+                    valid = first_id <= self.last_update_id + 1 <= final_id
+                else:
+                    valid = first_id == self.last_update_id + 1
+            
+            if not valid:
+                self.synced = False
+                raise OrderBookOutOfSync(
+                    f"{self.symbol} 增量更新不连续: 本地 {self.last_update_id}, 推送 U={first_id} u={final_id}"
+                )
+            
+            bid_prices, bid_qtys = _to_arrays(event.get('b'))
+            ask_prices, ask_qtys = _to_arrays(event.get('a'))
+            bids = _merge_levels(self._bid_prices, self._bid_qtys, bid_prices, bid_qtys)
+            asks = _merge_levels(self._ask_prices, self._ask_qtys, ask_prices, ask_qtys)
+            
+            # 只保留最靠近盘口的max_levels档
+            self._bid_prices, self._bid_qtys = bids[0][-self.max_levels:], bids[1][-self.max_levels:]
+            self._ask_prices, self._ask_qtys = asks[0][:self.max_levels], asks[1][:self.max_levels]
+            
+            self.last_update_id = final_id
+            self.last_event_time = int(event.get('E', 0) or 0)
+            self._first_event = False
+            self.updates_applied += 1
+        return True
+    
+    # ---------- 查询 ----------
+    
+    def _sides(self):
+        with self._lock:
+            return self._bid_prices, self._bid_qtys, self._ask_prices, self._ask_qtys
+    
+    def best_bid(self) -> Optional[float]:
+        bid_prices = self._sides()[0]
+        return float(bid_prices[-1]) if len(bid_prices) else None
+    
+    def best_ask(self) -> Optional[float]:
+        ask_prices = self._sides()[2]
+        return float(ask_prices[0]) if len(ask_prices) else None
+    
+    def mid_price(self) -> Optional[float]:
+        bid, ask = self.best_bid(), self.best_ask()
+        if bid is None or ask is None:
+            return None
+        return (bid + ask) / 2
+    
+    def spread(self) -> Optional[float]:
+        bid, ask = self.best_bid(), self.best_ask()
+        if bid is None or ask is None:
+            return None
+        return ask - bid
+    
+    def spread_percent(self) -> Optional[float]:
+        """价差占买一价的百分比"""
+        bid, ask = self.best_bid(), self.best_ask()
+        if not bid or ask is None:
+            return None
+        return (ask - bid) / bid * 100
+    
+    def depth_within(self, percent: float) -> Dict[str, float]:
+        """
+        中间价上下percent%范围内的挂单量
+        
+        Args:
+            percent: 百分比，如 1.0 表示 ±1%
+        """
+        bid_prices, bid_qtys, ask_prices, ask_qtys = self._sides()
+        result = {'bid_qty': 0.0, 'ask_qty': 0.0, 'bid_notional': 0.0, 'ask_notional': 0.0}
+        if not len(bid_prices) or not len(ask_prices):
+            return result
+        
+        mid = (bid_prices[-1] + ask_prices[0]) / 2
+        bid_start = np.searchsorted(bid_prices, mid * (1 - percent / 100), side='left')
+        ask_end = np.searchsorted(ask_prices, mid * (1 + percent / 100), side='right')
+        
+        result['bid_qty'] = float(bid_qtys[bid_start:].sum())
+        result['ask_qty'] = float(ask_qtys[:ask_end].sum())
+        result['bid_notional'] = float(np.dot(bid_prices[bid_start:], bid_qtys[bid_start:]))
+        result['ask_notional'] = float(np.dot(ask_prices[:ask_end], ask_qtys[:ask_end]))
+        return result
+    
+    def estimate_slippage(self, side: str, quantity: float) -> Dict:
+        """
+        估算市价单吃单的成交均价和滑点
+        
+        Returns:
+            {'avg_price', 'filled_qty', 'complete', 'slippage_bps'}，slippage_bps相对中间价、正数表示不利
+        """
+        bid_prices, bid_qtys, ask_prices, ask_qtys = self._sides()
+        if side.upper() == 'BUY':
+            prices, qtys = ask_prices, ask_qtys
+        else:
+            prices, qtys = bid_prices[::-1], bid_qtys[::-1]
+        
+        result = {'avg_price': None, 'filled_qty': 0.0, 'complete': False, 'slippage_bps': None}
+        if quantity <= 0 or not len(prices) or not len(bid_prices) or not len(ask_prices):
+            return result
+        
+        cum_qty = np.cumsum(qtys)
+        cum_notional = np.cumsum(prices * qtys)
+        filled = min(quantity, float(cum_qty[-1]))
+        
+        # 第一个累计数量达到目标的档位
+        level = int(np.searchsorted(cum_qty, filled, side='left'))
+        level = min(level, len(cum_qty) - 1)
+        prev_qty = cum_qty[level - 1] if level > 0 else 0.0
+        prev_notional = cum_notional[level - 1] if level > 0 else 0.0
+        notional = prev_notional + (filled - prev_qty) * prices[level]
+        
+        avg_price = notional / filled
+        mid = (bid_prices[-1] + ask_prices[0]) / 2
+        direction = 1 if side.upper() == 'BUY' else -1
+        
+        result.update({
+            'avg_price': float(avg_price),
+            'filled_qty': filled,
+            'complete': filled >= quantity,
+            'slippage_bps': float(direction * (avg_price - mid) / mid * 10000)
+        })
+        return result
+    
+    def snapshot(self, limit: int = 100) -> Dict:
+        """导出前limit档（格式与REST订单簿一致，买盘价格降序）"""
+        bid_prices, bid_qtys, ask_prices, ask_qtys = self._sides()
+        bids = np.column_stack([bid_prices[::-1][:limit], bid_qtys[::-1][:limit]])
+        asks = np.column_stack([ask_prices[:limit], ask_qtys[:limit]])
+        return {
+            'lastUpdateId': self.last_update_id,
+            'E': self.last_event_time,
+            'bids': [[f"{p:.8f}", f"{q:.8f}"] for p, q in bids],
+            'asks': [[f"{p:.8f}", f"{q:.8f}"] for p, q in asks],
+        }
+
+
+def replay_order_book(symbol: str, snapshot: Dict, events: Iterable[Dict],
+                      futures: bool = False, max_levels: int = 1000) -> Tuple[LocalOrderBook, Dict]:
+    """
+    本地回放：用快照和一串增量事件重建订单簿（用于测试和排查）
+    
+    Returns:
+        (订单簿, 统计 {'applied', 'skipped', 'gaps', 'elapsed_ms'})
+    """
+    book = LocalOrderBook(symbol, futures=futures, max_levels=max_levels)
+    book.load_snapshot(snapshot)
+    stats = {'applied': 0, 'skipped': 0, 'gaps': 0}
+    
+    start = time.perf_counter()
+    for event in events:
+        try:
+            if book.apply_diff(event):
+                stats['applied'] += 1
+            else:
+                stats['skipped'] += 1
+        except OrderBookOutOfSync:
+            stats['gaps'] += 1
+            break
+    stats['elapsed_ms'] = (time.perf_counter() - start) * 1000
+    return book, stats
+
+
+def load_recorded_depth(path: str) -> Tuple[Dict[str, Dict], Dict[str, List[Dict]]]:
+    """
+    读取OrderBookManager录制的JSONL文件
+    
+    Returns:
+        ({symbol: 快照}, {symbol: [增量事件, ...]})，每个交易对只保留最后一个快照及其之后的事件
+    """
+    snapshots: Dict[str, Dict] = {}
+    events: Dict[str, List[Dict]] = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            symbol = record['symbol']
+            if record['type'] == 'snapshot':
+                snapshots[symbol] = record['data']
+                events[symbol] = []
+            elif symbol in snapshots:
+                events[symbol].append(record['data'])
+    return snapshots, events
+
+
+class OrderBookManager:
+    """按交易对维护本地订单簿（一个组合流连接）"""
+    
+    def __init__(self, binance_client, ws_url: str = None, max_levels: int = None,
+                 record_path: str = None):
+        """
+        Args:
+            binance_client: BinanceClient实例（用于获取REST快照）
+            ws_url: 组合流地址前缀，默认按交易模式选择（测试时可指向本地模拟服务）
+            record_path: 录制快照和增量事件的JSONL文件，可用replay_order_book回放
+        """
+        config = Config()
+        self.binance_client = binance_client
+        self.trading_mode = binance_client.trading_mode
+        self.futures = self.trading_mode == 'FUTURES'
+        self.ws_base_url = ws_url or DEPTH_STREAM_URLS[(self.trading_mode, config.BINANCE_TESTNET)]
+        self.max_levels = max_levels or config.ORDER_BOOK_MAX_LEVELS
+        self.record_path = record_path
+        self.logger = logging.getLogger(__name__)
+        
+        self.books: Dict[str, LocalOrderBook] = {}
+        self._buffers: Dict[str, deque] = {}
+        self._last_resync: Dict[str, float] = {}
+        self._symbols: List[str] = []
+        # 当前连接已订阅的交易对（连接地址中的 + 连接后SUBSCRIBE的）
+        self._subscribed: set = set()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._ws = None
+        self._thread = None
+        self.connected = False
+        
+        # 录制文件保持打开，按时间或积压条数刷盘
+        self._record_file = None
+        self._record_pending = 0
+        self._record_flushed_at = 0.0
+        self._record_lock = threading.Lock()
+    
+    # ---------- 对外接口 ----------
+    
+    def track(self, symbols: Iterable[str]) -> bool:
+        """开始跟踪交易对（首次调用时建立连接），返回推送是否可用"""
+        if websocket is None:
+            self.logger.warning("未安装websocket-client，本地订单簿不可用")
+            return False
+        
+        # 与连接建立（_on_open）互斥：未连接时新增的交易对由_on_open补订阅
+        with self._lock:
+            new_symbols = [s.upper() for s in symbols if s.upper() not in self._symbols]
+            self._symbols.extend(new_symbols)
+            if not new_symbols:
+                return True
+            
+            if self._thread is None or not self._thread.is_alive():
+                self._stop_event.clear()
+                self._thread = threading.Thread(target=self._run_socket, name='order-book-stream', daemon=True)
+                self._thread.start()
+            elif self.connected:
+                self._subscribe_missing()
+        return True
+    
+    def get_book(self, symbol: str) -> Optional[LocalOrderBook]:
+        """已同步的本地订单簿，未同步时返回None（调用方回退到REST）"""
+        book = self.books.get(symbol.upper())
+        if book is not None and book.synced and self.connected:
+            return book
+        return None
+    
+    def stop(self):
+        self._stop_event.set()
+        if self._ws is not None:
+            self._ws.close()
+        self._close_record_file()
+    
+    def get_status(self) -> Dict:
+        return {
+            'connected': self.connected,
+            'symbols': {
+                symbol: {
+                    'synced': book.synced,
+                    'last_update_id': book.last_update_id,
+                    'updates_applied': book.updates_applied,
+                    'spread_percent': book.spread_percent(),
+                }
+                for symbol, book in self.books.items()
+            }
+        }
+    
+    # ---------- 推送处理 ----------
+    
+    @staticmethod
+    def _stream_name(symbol: str) -> str:
+        return f"{symbol.lower()}@depth@100ms"
+    
+    def handle_message(self, message: str):
+        """处理一条组合流消息"""
+        try:
+            payload = json.loads(message)
+        except (TypeError, ValueError):
+            return
+        event = payload.get('data', payload)
+        if event.get('e') != 'depthUpdate':
+            return
+        
+        symbol = event['s']
+        self._record('event', symbol, event)
+        
+        book = self.books.get(symbol)
+        if book is None or not book.synced:
+            # 未同步时先缓存事件，再获取快照
+            self._buffers.setdefault(symbol, deque(maxlen=MAX_BUFFERED_EVENTS)).append(event)
+            self._resync(symbol)
+            return
+        
+        try:
+            book.apply_diff(event)
+        except OrderBookOutOfSync as e:
+            self.logger.warning(f"{e}，重新获取快照")
+            self._buffers[symbol] = deque(maxlen=MAX_BUFFERED_EVENTS)
+            self._resync(symbol)
+    
+    def _resync(self, symbol: str):
+        """获取REST快照，并应用快照之后缓存的增量"""
+        # 同一交易对至少间隔1秒再请求快照
+        now = time.time()
+        if now - self._last_resync.get(symbol, 0.0) < 1.0:
+            return
+        self._last_resync[symbol] = now
+        
+        book = self.books.get(symbol)
+        if book is None:
+            book = LocalOrderBook(symbol, futures=self.futures, max_levels=self.max_levels)
+            self.books[symbol] = book
+        
+        try:
+            client = self.binance_client.client
+            order_book_func = client.futures_order_book if self.futures else client.get_order_book
+            snapshot = self.binance_client.throttled_call(
+                order_book_func, symbol=symbol, limit=min(self.max_levels, 1000)
+            )
+        except Exception as e:
+            self.logger.error(f"获取 {symbol} 订单簿快照失败: {e}")
+            return
+        
+        book.load_snapshot(snapshot)
+        self._record('snapshot', symbol, snapshot)
+        
+        buffered = self._buffers.get(symbol, ())
+        self._buffers[symbol] = deque(maxlen=MAX_BUFFERED_EVENTS)
+        try:
+            for event in buffered:
+                book.apply_diff(event)
+        except OrderBookOutOfSync as e:
+            # 快照比缓存的事件还新，等待后续推送时再次同步
+            self.logger.warning(f"{e}，等待下一次同步")
+    
+    def _record(self, record_type: str, symbol: str, data: Dict):
+        if not self.record_path:
+            return
+        try:
+            line = json.dumps({'type': record_type, 'symbol': symbol, 'data': data}) + '\n'
+            with self._record_lock:
+                if self._record_file is None:
+                    self._record_file = open(self.record_path, 'a', encoding='utf-8')
+                    self._record_flushed_at = time.monotonic()
+                self._record_file.write(line)
+                self._record_pending += 1
+                
+                now = time.monotonic()
+                if (self._record_pending >= RECORD_MAX_PENDING
+                        or now - self._record_flushed_at >= RECORD_FLUSH_INTERVAL):
+                    self._record_file.flush()
+                    self._record_pending = 0
+                    self._record_flushed_at = now
+        except Exception as e:
+            self.logger.warning(f"录制订单簿数据失败: {e}")
+    
+    def _close_record_file(self):
+        """刷盘并关闭录制文件"""
+        with self._record_lock:
+            if self._record_file is None:
+                return
+            try:
+                self._record_file.close()
+            except Exception as e:
+                self.logger.warning(f"关闭订单簿录制文件失败: {e}")
+            self._record_file = None
+            self._record_pending = 0
+    
+    def _run_socket(self):
+        """连接组合流，断线后重连（重连后所有订单簿重新同步）"""
+        backoff = 1.0
+        while not self._stop_event.is_set():
+            with self._lock:
+                streams = '/'.join(self._stream_name(s) for s in self._symbols)
+                self._subscribed = set(self._symbols)
+            self._ws = websocket.WebSocketApp(
+                f"{self.ws_base_url}{streams}",
+                on_open=lambda ws: self._on_open(),
+                on_message=lambda ws, message: self.handle_message(message),
+                on_error=lambda ws, error: self.logger.warning(f"订单簿推送错误: {error}"),
+                on_close=lambda ws, *args: setattr(self, 'connected', False)
+            )
+            self._ws.run_forever(ping_interval=180, ping_timeout=10)
+            self.connected = False
+            for book in self.books.values():
+                book.synced = False
+            
+            if self._stop_event.wait(backoff):
+                break
+            backoff = min(backoff * 2, 60.0)
+    
+    def _on_open(self):
+        with self._lock:
+            self.connected = True
+            # 建立连接期间新增的交易对不在连接地址中，连接后补订阅
+            self._subscribe_missing()
+        self.logger.info(f"{self.trading_mode}订单簿推送已连接: {len(self._symbols)} 个交易对")
+    
+    def _subscribe_missing(self):
+        """订阅已跟踪但当前连接尚未订阅的交易对（需持有_lock）"""
+        missing = [s for s in self._symbols if s not in self._subscribed]
+        if not missing or self._ws is None:
+            return
+        try:
+            self._ws.send(json.dumps({
+                'method': 'SUBSCRIBE',
+                'params': [self._stream_name(s) for s in missing],
+                'id': int(time.time() * 1000)
+            }))
+        except Exception as e:
+            # 发送失败时保持未订阅状态，重连后连接地址会包含全部交易对
+            self.logger.warning(f"订阅订单簿推送失败: {e}")
+            return
+        self._subscribed.update(missing)
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+订单执行模块
+策略循环只提交下单意图，由后台线程按顺序提交订单（带幂等的客户端订单ID），
+跟踪成交状态（用户数据流推送或轮询），成交后回调通知策略更新持仓
+"""
+
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Union
+
+# 订单终态
+FINAL_STATUSES = {'FILLED', 'CANCELED', 'REJECTED', 'EXPIRED', 'EXPIRED_IN_MATCH'}
+
+
+def new_client_order_id(prefix: str = 'bnb') -> str:
+    """生成客户端订单ID（币安要求不超过36个字符）"""
+    return f"{prefix}_{uuid.uuid4().hex[:28]}"
+
+
+@dataclass
+class OrderIntent:
+    """下单意图"""
+    symbol: str
+    side: str
+    quantity: float
+    order_type: str = 'MARKET'
+    price: Optional[float] = None
+    position_side: str = 'BOTH'
+    reduce_only: bool = False
+    leverage: Optional[int] = None
+    strategy: str = ''
+    reason: str = ''
+    callback: Optional[Callable[['OrderResult'], None]] = None
+    client_order_id: str = field(default_factory=new_client_order_id)
+    created_at: float = field(default_factory=time.time)
+
+
+@dataclass
+class OrderResult:
+    """订单执行结果"""
+    intent: OrderIntent
+    status: str
+    order_id: Optional[int] = None
+    executed_qty: float = 0.0
+    avg_price: float = 0.0
+    error: str = ''
+    order: Dict = field(default_factory=dict)
+    
+    @property
+    def filled(self) -> bool:
+        return self.executed_qty > 0 and self.status in ('FILLED', 'PARTIALLY_FILLED', 'EXPIRED', 'CANCELED')
+
+
+def _parse_fill(order: Dict):
+    """从订单响应中解析成交数量和均价"""
+    executed_qty = float(order.get('executedQty', 0) or 0)
+    avg_price = float(order.get('avgPrice', 0) or 0)
+    if not avg_price and executed_qty > 0:
+        # 现货没有avgPrice，用成交额/成交量计算
+        quote_qty = float(order.get('cummulativeQuoteQty', 0) or 0)
+        if quote_qty > 0:
+            avg_price = quote_qty / executed_qty
+        elif order.get('fills'):
+            fills = order['fills']
+            total_qty = sum(float(f['qty']) for f in fills)
+            if total_qty > 0:
+                avg_price = sum(float(f['price']) * float(f['qty']) for f in fills) / total_qty
+    return executed_qty, avg_price
+
+
+@dataclass
+class _FinishRequest:
+    """推送线程请求执行线程完成的订单"""
+    client_order_id: str
+
+
+class OrderExecutor:
+    """订单执行队列"""
+    
+    def __init__(self, binance_client, poll_interval: float = 1.0, fill_timeout: float = 60.0,
+                 max_submit_attempts: int = 3):
+        """
+        Args:
+            binance_client: BinanceClient实例
+            poll_interval: 轮询未完成订单的间隔（秒）
+            fill_timeout: 等待订单进入终态的最长时间（秒），超时后撤单并按撤单后的成交结果回调
+            max_submit_attempts: 提交失败且交易所查无此单时的最大重试次数
+        """
+        self.binance_client = binance_client
+        self.poll_interval = poll_interval
+        self.fill_timeout = fill_timeout
+        self.max_submit_attempts = max_submit_attempts
+        self.logger = logging.getLogger(__name__)
+        
+        # 待提交的意图和推送触发的完成请求，都由执行线程处理（订单回调只在执行线程中运行）
+        self._queue: 'queue.Queue[Union[OrderIntent, _FinishRequest]]' = queue.Queue()
+        self._tracking: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._results = deque(maxlen=500)
+        self._stop_event = threading.Event()
+        self._worker = None
+    
+    # ---------- 对外接口 ----------
+    
+    def start(self):
+        """启动后台执行线程"""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._stop_event.clear()
+        self._worker = threading.Thread(target=self._run, name='order-executor', daemon=True)
+        self._worker.start()
+    
+    def stop(self):
+        """处理完已提交的意图后停止"""
+        self._stop_event.set()
+    
+    def submit(self, intent: OrderIntent) -> str:
+        """提交下单意图（立即返回），返回客户端订单ID"""
+        self.start()
+        with self._lock:
+            self._tracking[intent.client_order_id] = {
+                'intent': intent,
+                'state': 'QUEUED',
+                'attempts': 0,
+                'order': {},
+                'submitted_at': None,
+                'next_poll': 0.0,
+            }
+        self._queue.put(intent)
+        self.logger.info(f"下单意图已入队: {intent.symbol} {intent.side} {intent.quantity} ({intent.client_order_id})")
+        return intent.client_order_id
+    
+    def pending_symbols(self) -> set:
+        """有未完成订单的交易对"""
+        with self._lock:
+            return {item['intent'].symbol for item in self._tracking.values()}
+    
+    def has_pending(self, symbol: str = None) -> bool:
+        with self._lock:
+            if symbol is None:
+                return bool(self._tracking)
+            return any(item['intent'].symbol == symbol for item in self._tracking.values())
+    
+    def drain(self, timeout: float = 30.0) -> bool:
+        """等待所有意图处理完成，返回是否在超时前完成"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if not self.has_pending():
+                return True
+            time.sleep(0.05)
+        return not self.has_pending()
+    
+    def on_order_update(self, order: Dict):
+        """
+        处理用户数据流推送的订单更新（字段与REST订单响应一致，已转换好）
+        
+        在推送线程中调用：只更新订单状态，订单进入终态时交给执行线程立即完成并回调，不必等待轮询
+        """
+        client_order_id = order.get('clientOrderId')
+        with self._lock:
+            item = self._tracking.get(client_order_id)
+            if item is None:
+                return
+            item['order'] = {**item['order'], **order}
+        if order.get('status') in FINAL_STATUSES:
+            self._queue.put(_FinishRequest(client_order_id))
+    
+    def attach_user_stream(self, user_stream, fallback_poll_interval: float = 10.0):
+        """接入用户数据流：订单状态以推送为准，轮询降频为兜底"""
+        user_stream.add_order_listener(self.on_order_update)
+        self.poll_interval = max(self.poll_interval, fallback_poll_interval)
+    
+    def get_recent_results(self, limit: int = 50) -> List[OrderResult]:
+        return list(self._results)[-limit:]
+    
+    def get_status(self) -> Dict:
+        with self._lock:
+            states = [item['state'] for item in self._tracking.values()]
+        return {
+            'running': self._worker is not None and self._worker.is_alive(),
+            'queued': states.count('QUEUED'),
+            'working': states.count('WORKING'),
+            'completed': len(self._results),
+        }
+    
+    # ---------- 后台线程 ----------
+    
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.poll_interval)
+            except queue.Empty:
+                item = None
+            
+            if isinstance(item, _FinishRequest):
+                self._finish(item.client_order_id)
+            elif item is not None:
+                self._submit(item)
+            
+            self._poll_working_orders()
+            
+            if self._stop_event.is_set() and self._queue.empty() and not self.has_pending():
+                break
+        
+        self.logger.info("订单执行线程已停止")
+    
+    def _submit(self, intent: OrderIntent):
+        """提交订单；失败时先查询交易所是否已收到该订单，避免重复下单"""
+        client_order_id = intent.client_order_id
+        with self._lock:
+            item = self._tracking.get(client_order_id)
+            if item is None:
+                return
+            item['attempts'] += 1
+            attempt = item['attempts']
+        
+        order = self.binance_client.place_order(
+            symbol=intent.symbol,
+            side=intent.side,
+            quantity=intent.quantity,
+            order_type=intent.order_type,
+            price=intent.price,
+            leverage=intent.leverage,
+            position_side=intent.position_side,
+            reduce_only=intent.reduce_only,
+            client_order_id=client_order_id
+        )
+        
+        if not order:
+            # 可能是超时，交易所实际已收到订单
+            try:
+                order = self.binance_client.get_order(intent.symbol, client_order_id=client_order_id)
+            except Exception as e:
+                # 查询也失败，状态未知，转为轮询跟踪，不重复提交
+                self.logger.warning(f"下单结果未知，转为轮询 {client_order_id}: {e}")
+                order = {'status': 'UNKNOWN', 'clientOrderId': client_order_id}
+        
+        if not order:
+            if attempt < self.max_submit_attempts:
+                self.logger.warning(f"订单未被交易所接收，重新提交({attempt}/{self.max_submit_attempts}): {client_order_id}")
+                self._queue.put(intent)
+            else:
+                self._finish(client_order_id, status='REJECTED', error='下单失败')
+            return
+        
+        with self._lock:
+            item['order'] = order
+            item['state'] = 'WORKING'
+            item['submitted_at'] = time.time()
+            item['next_poll'] = time.time() + self.poll_interval
+        
+        if order.get('status') in FINAL_STATUSES:
+            self._finish(client_order_id)
+    
+    def _poll_working_orders(self):
+        """轮询未进入终态的订单"""
+        now = time.time()
+        with self._lock:
+            due = [
+                (cid, item) for cid, item in self._tracking.items()
+                if item['state'] == 'WORKING' and item['next_poll'] <= now
+            ]
+        
+        for client_order_id, item in due:
+            intent = item['intent']
+            try:
+                order = self.binance_client.get_order(intent.symbol, client_order_id=client_order_id)
+            except Exception as e:
+                self.logger.warning(f"查询订单失败 {client_order_id}: {e}")
+                order = None
+            
+            with self._lock:
+                if order:
+                    item['order'] = {**item['order'], **order}
+                item['next_poll'] = time.time() + self.poll_interval
+                timed_out = time.time() - item['submitted_at'] > self.fill_timeout
+            
+            status = item['order'].get('status')
+            if status in FINAL_STATUSES:
+                self._finish(client_order_id)
+            elif timed_out:
+                self.logger.warning(f"订单在{self.fill_timeout}秒内未完成，撤单: {client_order_id} ({status})")
+                order = self._cancel_timed_out(item)
+                with self._lock:
+                    item['order'] = {**item['order'], **order}
+                status = item['order'].get('status')
+                self._finish(client_order_id, status=status or 'UNKNOWN', error='等待成交超时')
+    
+    def _cancel_timed_out(self, item: Dict) -> Dict:
+        """
+        撤销超时未完成的订单，返回撤单后的订单状态（含最终成交数量）
+        
+        撤单失败时（如撤单前已成交）重新查询订单；都失败时返回空字典，按已知的成交结果处理
+        """
+        intent = item['intent']
+        order_id = item['order'].get('orderId')
+        if order_id is not None:
+            try:
+                cancelled = self.binance_client.cancel_order(intent.symbol, order_id)
+                if cancelled:
+                    return cancelled
+            except Exception as e:
+                self.logger.warning(f"撤销超时订单失败 {intent.client_order_id}: {e}")
+        try:
+            return self.binance_client.get_order(intent.symbol, client_order_id=intent.client_order_id) or {}
+        except Exception as e:
+            self.logger.warning(f"查询超时订单失败 {intent.client_order_id}: {e}")
+            return {}
+    
+    def _finish(self, client_order_id: str, status: str = None, error: str = ''):
+        """订单完成：移出跟踪列表并回调"""
+        with self._lock:
+            item = self._tracking.pop(client_order_id, None)
+        if item is None:
+            return
+        
+        order = item['order'] or {}
+        executed_qty, avg_price = _parse_fill(order)
+        result = OrderResult(
+            intent=item['intent'],
+            status=status or order.get('status', 'UNKNOWN'),
+            order_id=order.get('orderId'),
+            executed_qty=executed_qty,
+            avg_price=avg_price,
+            error=error,
+            order=order
+        )
+        self._results.append(result)
+        
+        self.logger.info(
+            f"订单完成 {result.intent.symbol} {result.intent.side}: {result.status}, "
+            f"成交 {result.executed_qty} @ {result.avg_price} ({client_order_id})"
+        )
+        
+        if result.intent.callback is not None:
+            try:
+                result.intent.callback(result)
+            except Exception as e:
+                self.logger.error(f"订单回调执行失败 {client_order_id}: {e}")
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+订单簿快照归档模块
+按 (symbol, 日期) 分区保存订单簿快照，替代 orderbook_data 表中的JSON文本：
+当天数据以float64二进制记录追加写入（.bin），过去的日期在后台线程中压缩为列式文件（.npz），
+价格和数量换算为 1e-8 精度的整数，价格按档位差分编码后再压缩；读取直接返回NumPy数组
+"""
+
+import os
+import struct
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+# 追加记录头: 时间戳(毫秒), 买盘档数, 卖盘档数
+RECORD_HEADER = struct.Struct('<qHH')
+
+# 正在压缩的追加分区：压缩开始时把.bin改名为该后缀，之后的写入进入新的.bin
+COMPACTING_SUFFIX = '.bin.compacting'
+
+# 币安价格和数量最多8位小数，压缩时换算为整数
+SCALE = 10 ** 8
+
+ARRAY_FIELDS = ('bid_prices', 'bid_qtys', 'ask_prices', 'ask_qtys')
+
+
+def _utc_timestamp(timestamp) -> pd.Timestamp:
+    """统一为无时区的UTC时间（带时区的先转换），日分区和毫秒时间戳都按UTC计算"""
+    ts = pd.Timestamp(timestamp)
+    if ts.tz is not None:
+        ts = ts.tz_convert('UTC').tz_localize(None)
+    return ts
+
+
+def _levels_to_arrays(levels) -> Tuple[np.ndarray, np.ndarray]:
+    if not levels:
+        return np.empty(0), np.empty(0)
+    data = np.asarray(levels, dtype=np.float64).reshape(-1, 2)
+    return data[:, 0], data[:, 1]
+
+
+def _empty_day() -> Dict[str, np.ndarray]:
+    return {
+        'timestamp': np.empty(0, dtype='<i8'),
+        **{field: np.empty((0, 0)) for field in ARRAY_FIELDS}
+    }
+
+
+def _pad_rows(rows: List[np.ndarray], width: int) -> np.ndarray:
+    """不等长的档位数组填充为 (N, width) 矩阵，缺失档位为NaN"""
+    matrix = np.full((len(rows), width), np.nan)
+    for i, row in enumerate(rows):
+        matrix[i, :len(row)] = row
+    return matrix
+
+
+def _encode_prices(prices: np.ndarray) -> np.ndarray:
+    """价格矩阵编码：换算为整数后沿档位方向差分（相邻档位差值很小，压缩率高）"""
+    ticks = np.where(np.isnan(prices), 0, np.rint(np.nan_to_num(prices) * SCALE)).astype('<i8')
+    if ticks.shape[1] > 1:
+        ticks[:, 1:] = np.diff(ticks, axis=1)
+    return ticks
+
+
+def _decode_prices(encoded: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    prices = np.cumsum(encoded, axis=1).astype(np.float64) / SCALE
+    prices[np.arange(prices.shape[1])[None, :] >= counts[:, None]] = np.nan
+    return prices
+
+
+def _encode_qtys(qtys: np.ndarray) -> np.ndarray:
+    return np.rint(np.nan_to_num(qtys) * SCALE).astype('<i8')
+
+
+def _decode_qtys(encoded: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    qtys = encoded.astype(np.float64) / SCALE
+    qtys[np.arange(qtys.shape[1])[None, :] >= counts[:, None]] = np.nan
+    return qtys
+
+
+class OrderBookArchive:
+    """订单簿快照归档（每个交易对每天一个分区）"""
+    
+    def __init__(self, root_dir: str, retention_days: int = 30):
+        """
+        Args:
+            root_dir: 归档根目录
+            retention_days: 保留天数，超过的分区在压缩时删除（0表示永久保留）
+        """
+        self.root_dir = root_dir
+        self.retention_days = retention_days
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._last_maintenance_day = None
+        self._maintenance_thread: Optional[threading.Thread] = None
+        os.makedirs(self.root_dir, exist_ok=True)
+    
+    # ---------- 分区 ----------
+    
+    def _partition_path(self, symbol: str, day: str, suffix: str) -> str:
+        return os.path.join(self.root_dir, symbol.upper(), f"{day}{suffix}")
+    
+    def list_days(self, symbol: str) -> List[str]:
+        """已归档的日期（YYYY-MM-DD，升序）"""
+        directory = os.path.join(self.root_dir, symbol.upper())
+        if not os.path.isdir(directory):
+            return []
+        days = {name.split('.')[0] for name in os.listdir(directory)
+                if name.endswith(('.bin', '.npz', COMPACTING_SUFFIX))}
+        return sorted(days)
+    
+    @staticmethod
+    def _day_key(timestamp) -> str:
+        return pd.Timestamp(timestamp).strftime('%Y-%m-%d')
+    
+    # ---------- 写入 ----------
+    
+    def write_snapshot(self, symbol: str, timestamp, bids, asks):
+        """
+        追加一个快照到当天分区
+        
+        Args:
+            timestamp: 快照时间
+            bids/asks: [[price, qty], ...]（字符串或数字）
+        """
+        ts = _utc_timestamp(timestamp)
+        bid_prices, bid_qtys = _levels_to_arrays(bids)
+        ask_prices, ask_qtys = _levels_to_arrays(asks)
+        payload = RECORD_HEADER.pack(int(ts.value // 1_000_000), len(bid_prices), len(ask_prices))
+        payload += np.concatenate([bid_prices, bid_qtys, ask_prices, ask_qtys]).astype('<f8').tobytes()
+        
+        day = self._day_key(ts)
+        path = self._partition_path(symbol, day, '.bin')
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'ab') as f:
+                f.write(payload)
+        
+        # 每天第一次写入时在后台压缩前一天的数据并清理过期分区（调用方可能在事件循环中）
+        if self._last_maintenance_day != day:
+            self._last_maintenance_day = day
+            self._start_maintenance(day)
+    
+    def _start_maintenance(self, day: str):
+        if self._maintenance_thread is not None and self._maintenance_thread.is_alive():
+            return
+        self._maintenance_thread = threading.Thread(
+            target=self.compact, kwargs={'before_day': day}, name='orderbook-archive-compact', daemon=True
+        )
+        self._maintenance_thread.start()
+    
+    # ---------- 读取 ----------
+    
+    def _read_segment(self, path: str) -> Dict[str, np.ndarray]:
+        """读取追加写入的二进制分区"""
+        with open(path, 'rb') as f:
+            buffer = f.read()
+        
+        timestamps, rows = [], {field: [] for field in ARRAY_FIELDS}
+        offset = 0
+        while offset + RECORD_HEADER.size <= len(buffer):
+            ts, n_bids, n_asks = RECORD_HEADER.unpack_from(buffer, offset)
+            offset += RECORD_HEADER.size
+            size = 2 * (n_bids + n_asks)
+            if offset + size * 8 > len(buffer):
+                break  # 最后一条写了一半
+            values = np.frombuffer(buffer, dtype='<f8', count=size, offset=offset)
+            offset += size * 8
+            
+            timestamps.append(ts)
+            rows['bid_prices'].append(values[:n_bids])
+            rows['bid_qtys'].append(values[n_bids:2 * n_bids])
+            rows['ask_prices'].append(values[2 * n_bids:2 * n_bids + n_asks])
+            rows['ask_qtys'].append(values[2 * n_bids + n_asks:])
+        
+        if not timestamps:
+            return _empty_day()
+        
+        width = max(max(len(r) for r in rows['bid_prices']), max(len(r) for r in rows['ask_prices']))
+        day = {'timestamp': np.asarray(timestamps, dtype='<i8')}
+        for field in ARRAY_FIELDS:
+            day[field] = _pad_rows(rows[field], width)
+        return day
+    
+    def _read_compacted(self, path: str) -> Dict[str, np.ndarray]:
+        with np.load(path, allow_pickle=False) as data:
+            bid_counts, ask_counts = data['bid_counts'], data['ask_counts']
+            return {
+                'timestamp': data['timestamp'],
+                'bid_prices': _decode_prices(data['bid_prices'], bid_counts),
+                'bid_qtys': _decode_qtys(data['bid_qtys'], bid_counts),
+                'ask_prices': _decode_prices(data['ask_prices'], ask_counts),
+                'ask_qtys': _decode_qtys(data['ask_qtys'], ask_counts),
+            }
+    
+    def read_day(self, symbol: str, day: str) -> Dict[str, np.ndarray]:
+        """
+        读取一天的快照
+        
+        Returns:
+            {'timestamp': (N,) 毫秒时间戳, 'bid_prices'/'bid_qtys'/'ask_prices'/'ask_qtys': (N, 档数)}，
+            买盘价格降序、卖盘价格升序，缺失档位为NaN
+        """
+        compacted = self._partition_path(symbol, day, '.npz')
+        parts = []
+        if os.path.exists(compacted):
+            parts.append(self._read_compacted(compacted))
+        for suffix in (COMPACTING_SUFFIX, '.bin'):
+            segment = self._partition_path(symbol, day, suffix)
+            if os.path.exists(segment):
+                parts.append(self._read_segment(segment))
+        return self._concat(parts)
+    
+    def read_range(self, symbol: str, start=None, end=None) -> Dict[str, np.ndarray]:
+        """读取时间范围内的快照（格式同read_day）"""
+        start_ts = _utc_timestamp(start) if start is not None else None
+        end_ts = _utc_timestamp(end) if end is not None else None
+        
+        parts = []
+        for day in self.list_days(symbol):
+            if start_ts is not None and day < self._day_key(start_ts):
+                continue
+            if end_ts is not None and day > self._day_key(end_ts):
+                continue
+            parts.append(self.read_day(symbol, day))
+        data = self._concat(parts)
+        
+        mask = np.ones(len(data['timestamp']), dtype=bool)
+        if start_ts is not None:
+            mask &= data['timestamp'] >= start_ts.value // 1_000_000
+        if end_ts is not None:
+            mask &= data['timestamp'] <= end_ts.value // 1_000_000
+        if mask.all():
+            return data
+        return {key: value[mask] for key, value in data.items()}
+    
+    @staticmethod
+    def _concat(parts: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+        parts = [p for p in parts if len(p['timestamp'])]
+        if not parts:
+            return _empty_day()
+        if len(parts) == 1:
+            return parts[0]
+        
+        width = max(p['bid_prices'].shape[1] for p in parts)
+        result = {'timestamp': np.concatenate([p['timestamp'] for p in parts])}
+        for field in ARRAY_FIELDS:
+            padded = []
+            for p in parts:
+                matrix = p[field]
+                if matrix.shape[1] < width:
+                    matrix = np.hstack([matrix, np.full((len(matrix), width - matrix.shape[1]), np.nan)])
+                padded.append(matrix)
+            result[field] = np.vstack(padded)
+        
+        order = np.argsort(result['timestamp'], kind='stable')
+        return {key: value[order] for key, value in result.items()}
+    
+    # ---------- 压缩与保留 ----------
+    
+    def compact_day(self, symbol: str, day: str) -> bool:
+        """
+        把一天的追加分区压缩为列式文件
+        
+        持锁把.bin改名为正在压缩的分区后再压缩，压缩期间新写入的快照进入新的.bin，不会丢失
+        """
+        segment = self._partition_path(symbol, day, '.bin')
+        pending = self._partition_path(symbol, day, COMPACTING_SUFFIX)
+        with self._lock:
+            if os.path.exists(segment):
+                if os.path.exists(pending):
+                    # 上次压缩中断留下的分区，把新数据追加进去一起压缩
+                    with open(segment, 'rb') as src, open(pending, 'ab') as dst:
+                        dst.write(src.read())
+                    os.remove(segment)
+                else:
+                    os.replace(segment, pending)
+            elif not os.path.exists(pending):
+                return False
+        
+        compacted = self._partition_path(symbol, day, '.npz')
+        parts = [self._read_segment(pending)]
+        if os.path.exists(compacted):
+            parts.insert(0, self._read_compacted(compacted))
+        data = self._concat(parts)
+        tmp_path = f"{compacted}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            timestamp=data['timestamp'],
+            bid_counts=(~np.isnan(data['bid_prices'])).sum(axis=1).astype('<i2'),
+            ask_counts=(~np.isnan(data['ask_prices'])).sum(axis=1).astype('<i2'),
+            bid_prices=_encode_prices(data['bid_prices']),
+            bid_qtys=_encode_qtys(data['bid_qtys']),
+            ask_prices=_encode_prices(data['ask_prices']),
+            ask_qtys=_encode_qtys(data['ask_qtys'])
+        )
+        with self._lock:
+            os.replace(tmp_path, compacted)
+            os.remove(pending)
+        return True
+    
+    def compact(self, before_day: str = None) -> Dict[str, int]:
+        """
+        压缩before_day之前的所有追加分区，并删除超过保留天数的分区
+        
+        Returns:
+            {'compacted': 压缩的分区数, 'deleted': 删除的分区数}
+        """
+        before_day = before_day or self._day_key(datetime.utcnow())
+        cutoff = None
+        if self.retention_days:
+            cutoff = (pd.Timestamp(before_day) - timedelta(days=self.retention_days)).strftime('%Y-%m-%d')
+        
+        stats = {'compacted': 0, 'deleted': 0}
+        if not os.path.isdir(self.root_dir):
+            return stats
+        
+        for symbol in os.listdir(self.root_dir):
+            for day in self.list_days(symbol):
+                try:
+                    if cutoff and day < cutoff:
+                        for suffix in ('.bin', COMPACTING_SUFFIX, '.npz'):
+                            path = self._partition_path(symbol, day, suffix)
+                            if os.path.exists(path):
+                                os.remove(path)
+                        stats['deleted'] += 1
+                    elif day < before_day and self.compact_day(symbol, day):
+                        stats['compacted'] += 1
+                except Exception as e:
+                    self.logger.error(f"压缩订单簿分区失败 {symbol} {day}: {e}")
+        
+        if stats['compacted'] or stats['deleted']:
+            self.logger.info(f"订单簿归档维护完成: 压缩 {stats['compacted']} 个分区, 删除 {stats['deleted']} 个分区")
+        return stats
+
+
+def create_orderbook_archive(root_dir: str = None, retention_days: int = None) -> Optional[OrderBookArchive]:
+    """
+    根据配置创建订单簿归档
+    
+    Returns:
+        归档实例；未启用时返回None（继续写入orderbook_data表）
+    """
+    from config.config import Config
+    config = Config()
+    if not config.ORDERBOOK_ARCHIVE_ENABLED:
+        return None
+    return OrderBookArchive(
+        root_dir or config.ORDERBOOK_ARCHIVE_DIR,
+        config.ORDERBOOK_RETENTION_DAYS if retention_days is None else retention_days
+    )
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+参数搜索后端
+在策略优化器的离散参数空间（range或列表）上生成下一批待测参数：
+随机搜索，以及TPE（Tree-structured Parzen Estimator）代理模型搜索。
+支持一次生成多组参数供并行回测，并可用历史结果恢复搜索状态
+"""
+
+import json
+import logging
+import random
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+
+def _params_key(params: Dict[str, Any]) -> str:
+    return json.dumps(params, sort_keys=True, default=str)
+
+
+class ParamSearch:
+    """搜索后端基类：均匀随机采样"""
+    
+    name = 'random'
+    
+    def __init__(self, param_ranges: Dict[str, Any], seed: int = None):
+        """
+        Args:
+            param_ranges: {参数名: range / 列表 / 固定值}，与StrategyOptimizer.strategy_param_ranges格式一致
+        """
+        self.param_ranges = param_ranges
+        self.rng = random.Random(seed)
+        self.logger = logging.getLogger(__name__)
+        self.observations: List[Tuple[Dict[str, Any], float]] = []
+        self._seen = set()
+        
+        # 每个参数的候选值列表；固定值不参与搜索
+        self.choices: Dict[str, List[Any]] = {}
+        self.fixed: Dict[str, Any] = {}
+        for name, values in param_ranges.items():
+            if isinstance(values, (range, list, tuple)):
+                self.choices[name] = list(values)
+            else:
+                self.fixed[name] = values
+    
+    @property
+    def space_size(self) -> int:
+        size = 1
+        for values in self.choices.values():
+            size *= len(values)
+        return size
+    
+    def observe(self, params: Dict[str, Any], score: float):
+        """记录一组参数的得分（越大越好）"""
+        if score is None or not np.isfinite(score):
+            return
+        self.observations.append((dict(params), float(score)))
+        self._seen.add(_params_key(params))
+    
+    def observe_many(self, history: List[Tuple[Dict[str, Any], float]]):
+        for params, score in history:
+            self.observe(params, score)
+    
+    def best(self) -> Optional[Tuple[Dict[str, Any], float]]:
+        if not self.observations:
+            return None
+        return max(self.observations, key=lambda item: item[1])
+    
+    def suggest(self, n: int = 1) -> List[Dict[str, Any]]:
+        """生成n组互不相同、且未测试过的参数"""
+        suggestions = []
+        pending = set()
+        for _ in range(n):
+            params = self._suggest_one(pending)
+            pending.add(_params_key(params))
+            suggestions.append(params)
+        return suggestions
+    
+    def _suggest_one(self, pending: set) -> Dict[str, Any]:
+        return self._sample_unseen(lambda: self._random_params(), pending)
+    
+    def _random_params(self) -> Dict[str, Any]:
+        params = {name: self.rng.choice(values) for name, values in self.choices.items()}
+        params.update(self.fixed)
+        return params
+    
+    def _sample_unseen(self, sampler, pending: set, attempts: int = 50) -> Dict[str, Any]:
+        """采样直到得到未测试过的参数；空间基本测完时允许重复"""
+        params = sampler()
+        for _ in range(attempts):
+            key = _params_key(params)
+            if key not in self._seen and key not in pending:
+                break
+            params = sampler()
+        return params
+
+
+class TPESearch(ParamSearch):
+    """
+    TPE代理模型搜索
+    
+    按得分把已测参数分成"好"（前gamma）和"差"两组，每个参数分别用带平滑的
+    Parzen估计得到两组的概率分布l(x)和g(x)；从l(x)采样若干候选，选l(x)/g(x)最大的。
+    有序参数（数值）在相邻取值间做核平滑，类别参数（字符串）按计数加先验。
+    批量生成时对已给出的参数假定一个差的得分（constant liar），使同一批参数分散开
+    """
+    
+    name = 'tpe'
+    
+    def __init__(self, param_ranges: Dict[str, Any], seed: int = None, n_startup: int = 10,
+                 gamma: float = 0.25, n_candidates: int = 24, prior_weight: float = 1.0):
+        """
+        Args:
+            n_startup: 观测数少于该值时随机采样
+            gamma: "好"组所占比例
+            n_candidates: 每次从l(x)采样的候选数量
+            prior_weight: 均匀先验的权重（防止未观测到的取值概率为0）
+        """
+        super().__init__(param_ranges, seed)
+        self.n_startup = n_startup
+        self.gamma = gamma
+        self.n_candidates = n_candidates
+        self.prior_weight = prior_weight
+        self.np_rng = np.random.default_rng(seed)
+        self.ordered = {
+            name: all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values)
+            for name, values in self.choices.items()
+        }
+    
+    def suggest(self, n: int = 1) -> List[Dict[str, Any]]:
+        suggestions = []
+        pending = set()
+        liars: List[Tuple[Dict[str, Any], float]] = []
+        worst = min((score for _, score in self.observations), default=0.0)
+        for _ in range(n):
+            params = self._suggest_one(pending, liars)
+            pending.add(_params_key(params))
+            suggestions.append(params)
+            liars.append((params, worst))
+        return suggestions
+    
+    def _suggest_one(self, pending: set, liars: List = None) -> Dict[str, Any]:
+        observations = self.observations + (liars or [])
+        if len(self.observations) < self.n_startup:
+            return self._sample_unseen(self._random_params, pending)
+        
+        scores = np.array([score for _, score in observations])
+        n_good = max(1, int(np.ceil(self.gamma * len(observations))))
+        order = np.argsort(-scores, kind='stable')
+        good = [observations[i][0] for i in order[:n_good]]
+        bad = [observations[i][0] for i in order[n_good:]]
+        
+        # 每个参数独立建模：l(x)、g(x)
+        densities = {}
+        for name, values in self.choices.items():
+            densities[name] = (self._density(name, good), self._density(name, bad))
+        
+        excluded = self._seen | pending
+        
+        def sampler():
+            best_params, best_ratio = None, -np.inf
+            for _ in range(self.n_candidates):
+                params = dict(self.fixed)
+                log_ratio = 0.0
+                for name, values in self.choices.items():
+                    l, g = densities[name]
+                    index = self.np_rng.choice(len(values), p=l)
+                    params[name] = values[index]
+                    log_ratio += np.log(l[index]) - np.log(g[index])
+                if log_ratio > best_ratio and _params_key(params) not in excluded:
+                    best_params, best_ratio = params, log_ratio
+            return best_params or self._random_params()
+        
+        return self._sample_unseen(sampler, pending, attempts=5)
+    
+    def _density(self, name: str, group: List[Dict[str, Any]]) -> np.ndarray:
+        """某参数在一组观测中的平滑概率分布（与choices[name]一一对应）"""
+        values = self.choices[name]
+        k = len(values)
+        index = {self._value_key(v): i for i, v in enumerate(values)}
+        counts = np.zeros(k)
+        for params in group:
+            i = index.get(self._value_key(params.get(name)))
+            if i is not None:
+                counts[i] += 1
+        
+        if self.ordered[name] and k > 2:
+            # 在取值序号上做高斯核平滑，相邻取值共享概率
+            bandwidth = max(1.0, k / 10)
+            positions = np.arange(k)
+            kernel = np.exp(-0.5 * ((positions[:, None] - positions[None, :]) / bandwidth) ** 2)
+            counts = kernel @ counts
+        
+        density = counts + self.prior_weight / k * max(1, len(group)) ** 0.5
+        return density / density.sum()
+    
+    @staticmethod
+    def _value_key(value):
+        return json.dumps(value, default=str)
+
+
+PARAM_SEARCHES = {
+    'random': ParamSearch,
+    'tpe': TPESearch,
+}
+
+
+def create_param_search(name: str, param_ranges: Dict[str, Any], **kwargs) -> ParamSearch:
+    """
+    按名称创建参数搜索后端
+    
+    Args:
+        name: 'random' 或 'tpe'
+        kwargs: 传给后端构造函数的参数
+    """
+    search_class = PARAM_SEARCHES.get((name or 'random').lower())
+    if search_class is None:
+        raise ValueError(f"不支持的参数搜索后端: {name}")
+    return search_class(param_ranges, **kwargs)
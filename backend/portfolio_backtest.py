@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+组合回测
+多个交易对、多个策略共用一份资金，在统一的时间轴上同步推进：
+K线按时间戳对齐成NumPy矩阵，信号一次性批量生成，逐根K线只处理有信号的策略，
+开仓时按与实盘RiskManager相同的单资产权重和相关性限制分配资金
+"""
+
+import copy
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List
+import numpy as np
+import pandas as pd
+
+from backend.backtesting import BacktestEngine, BacktestResult
+
+
+@dataclass
+class PortfolioBacktestResult:
+    """组合回测结果"""
+    portfolio: BacktestResult
+    pair_stats: pd.DataFrame
+    symbol_weights: pd.DataFrame
+    rejected: Dict[str, int] = field(default_factory=dict)
+
+
+class PortfolioBacktestEngine(BacktestEngine):
+    """组合回测引擎（共享资金）"""
+    
+    def __init__(self, initial_capital: float = 10000.0, commission: float = 0.001,
+                 fill_model=None, max_position_weight: float = 0.3,
+                 max_correlation: float = 0.8, correlation_window: int = 720):
+        """
+        Args:
+            max_position_weight: 单个交易对持仓市值占组合权益的上限（与RiskManager一致）
+            max_correlation: 新开仓交易对与已持仓交易对收益率相关性的上限
+            correlation_window: 计算相关性使用的K线数量
+        """
+        super().__init__(initial_capital, commission, fill_model)
+        self.max_position_weight = max_position_weight
+        self.max_correlation = max_correlation
+        self.correlation_window = correlation_window
+        self.logger = logging.getLogger(__name__)
+    
+    def run_portfolio_backtest(self, strategies: List, start_date: str, end_date: str,
+                               interval: str = '1h',
+                               data: Dict[str, pd.DataFrame] = None) -> PortfolioBacktestResult:
+        """
+        运行组合回测
+        
+        Args:
+            strategies: 策略实例列表，交易对取自 strategy.symbol，同一交易对可以有多个策略
+            data: 可选，预先加载好的 {symbol: K线DataFrame}，缺少的交易对从数据库读取
+        """
+        try:
+            symbols = sorted({strategy.symbol for strategy in strategies})
+            frames = self._load_symbol_data(symbols, start_date, end_date, interval, data or {})
+            symbols = [symbol for symbol in symbols if symbol in frames]
+            strategies = [strategy for strategy in strategies if strategy.symbol in frames]
+            if not strategies:
+                raise ValueError("无法获取任何交易对的历史数据")
+            
+            timestamps, closes, volumes, active = self._align(symbols, frames)
+            signals = self._build_signal_matrix(strategies, symbols, frames, timestamps)
+            return self._simulate(strategies, symbols, timestamps, closes, volumes, active, signals)
+        
+        except Exception as e:
+            self.logger.error(f"组合回测失败: {e}")
+            raise
+    
+    # ---------- 数据准备 ----------
+    
+    def _load_symbol_data(self, symbols: List[str], start_date: str, end_date: str, interval: str,
+                          preloaded: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+        """每个交易对只读取并计算一次指标"""
+        frames = {}
+        self._symbol_fill_models = {}
+        for symbol in symbols:
+            frame = preloaded.get(symbol)
+            if frame is None:
+                frame = self._get_historical_data(symbol, start_date, end_date, interval)
+                if frame.empty:
+                    self.logger.warning(f"{symbol} 无历史数据，跳过")
+                    continue
+                frame = self.data_collector.calculate_technical_indicators(frame, symbol)
+            frame = frame.sort_values('timestamp').reset_index(drop=True)
+            frames[symbol] = frame
+            
+            # 订单簿回放等成交模型按交易对加载数据，每个交易对一份
+            fill_model = copy.copy(self.fill_model)
+            fill_model.prepare(symbol, frame['timestamp'].iloc[0], frame['timestamp'].iloc[-1], interval)
+            self._symbol_fill_models[symbol] = fill_model
+        return frames
+    
+    def _align(self, symbols: List[str], frames: Dict[str, pd.DataFrame]):
+        """
+        按所有交易对时间戳的并集对齐
+        
+        Returns:
+            timestamps (T,)、closes (T, S)（缺失处向前填充）、volumes (T, S)、
+            active (T, S)（该时间点该交易对有K线）
+        """
+        timestamps = pd.DatetimeIndex(sorted(set().union(*(frames[s]['timestamp'] for s in symbols))))
+        closes = np.full((len(timestamps), len(symbols)), np.nan)
+        volumes = np.zeros((len(timestamps), len(symbols)))
+        active = np.zeros((len(timestamps), len(symbols)), dtype=bool)
+        
+        for j, symbol in enumerate(symbols):
+            frame = frames[symbol]
+            rows = timestamps.get_indexer(pd.DatetimeIndex(frame['timestamp']))
+            closes[rows, j] = frame['close'].to_numpy(dtype=np.float64)
+            volumes[rows, j] = frame['volume'].to_numpy(dtype=np.float64)
+            active[rows, j] = True
+        
+        # 交易对上市前用首个收盘价回填（该段active为False，不会交易，收益率为0）
+        closes = pd.DataFrame(closes).ffill().bfill().to_numpy()
+        return timestamps, closes, volumes, active
+    
+    def _build_signal_matrix(self, strategies: List, symbols: List[str],
+                             frames: Dict[str, pd.DataFrame], timestamps: pd.DatetimeIndex) -> np.ndarray:
+        """批量生成每个策略的信号，映射到统一时间轴 (T, P)"""
+        signals = np.zeros((len(timestamps), len(strategies)), dtype=np.int8)
+        for k, strategy in enumerate(strategies):
+            frame = frames[strategy.symbol]
+            strategy_signals = np.asarray(strategy.generate_signals(frame), dtype=np.int8)
+            # 与单策略回测一致：数据不足时不交易
+            min_data_required = getattr(strategy, 'min_training_samples', 50)
+            strategy_signals[:min_data_required - 1] = 0
+            rows = timestamps.get_indexer(pd.DatetimeIndex(frame['timestamp']))
+            signals[rows, k] = strategy_signals
+        return signals
+    
+    # ---------- 逐根K线模拟 ----------
+    
+    def _simulate(self, strategies: List, symbols: List[str], timestamps: pd.DatetimeIndex,
+                  closes: np.ndarray, volumes: np.ndarray, active: np.ndarray,
+                  signals: np.ndarray) -> PortfolioBacktestResult:
+        n_pairs = len(strategies)
+        symbol_index = {symbol: j for j, symbol in enumerate(symbols)}
+        pair_symbol = np.array([symbol_index[s.symbol] for s in strategies])
+        allow_short = np.array([bool(getattr(s, 'allow_short', False)) for s in strategies])
+        stop_loss = np.array([s.parameters.get('stop_loss', 0.02) for s in strategies])
+        take_profit = np.array([s.parameters.get('take_profit', 0.05) for s in strategies])
+        
+        # 对数收益率矩阵，用于相关性限制
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = np.zeros_like(closes)
+            returns[1:] = np.nan_to_num(np.diff(np.log(closes), axis=0))
+        
+        cash = self.initial_capital
+        positions = np.zeros(n_pairs)
+        entry_prices = np.zeros(n_pairs)
+        realized = np.zeros(n_pairs)
+        trade_counts = np.zeros(n_pairs, dtype=int)
+        trades = []
+        equity_curve = np.empty(len(timestamps))
+        weights = np.zeros((len(timestamps), len(symbols)))
+        rejected = {'position_weight': 0, 'correlation': 0, 'cash': 0}
+        
+        for i in range(len(timestamps)):
+            prices = closes[i]
+            pair_prices = prices[pair_symbol]
+            pair_active = active[i, pair_symbol]
+            
+            # 止损止盈（向量化检查所有持仓）
+            held = (positions != 0) & pair_active
+            if held.any():
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    move = np.where(positions > 0, pair_prices / entry_prices - 1, 1 - pair_prices / entry_prices)
+                for k in np.flatnonzero(held & (move < -stop_loss)):
+                    cash = self._exit(k, 'STOP_LOSS', strategies, pair_symbol, positions, entry_prices,
+                                      realized, trade_counts, trades, cash, i, timestamps, prices, volumes)
+                for k in np.flatnonzero(held & (move > take_profit) & (positions != 0)):
+                    cash = self._exit(k, 'TAKE_PROFIT', strategies, pair_symbol, positions, entry_prices,
+                                      realized, trade_counts, trades, cash, i, timestamps, prices, volumes)
+            
+            # 只处理本根K线有信号的策略
+            for k in np.flatnonzero((signals[i] != 0) & pair_active):
+                signal = signals[i, k]
+                if (signal > 0 and positions[k] > 0) or (signal < 0 and positions[k] < 0):
+                    continue
+                if positions[k] != 0:
+                    action = 'COVER' if positions[k] < 0 else 'SELL'
+                    cash = self._exit(k, action, strategies, pair_symbol, positions, entry_prices,
+                                      realized, trade_counts, trades, cash, i, timestamps, prices, volumes)
+                if signal < 0 and not allow_short[k]:
+                    continue
+                
+                equity = cash + positions @ closes[i, pair_symbol]
+                cash = self._enter(k, int(signal), strategies, pair_symbol, positions, entry_prices,
+                                   trade_counts, trades, cash, equity, i, timestamps, prices, volumes,
+                                   returns, rejected)
+            
+            exposure = np.bincount(pair_symbol, weights=positions * pair_prices, minlength=len(symbols))
+            equity_curve[i] = cash + exposure.sum()
+            if equity_curve[i] > 0:
+                weights[i] = exposure / equity_curve[i]
+        
+        # 最后平仓
+        last = len(timestamps) - 1
+        for k in np.flatnonzero(positions != 0):
+            cash = self._exit(k, 'FINAL_CLOSE', strategies, pair_symbol, positions, entry_prices,
+                              realized, trade_counts, trades, cash, last, timestamps, closes[last], volumes)
+        equity_curve[last] = cash
+        
+        portfolio = self._calculate_backtest_metrics(
+            list(equity_curve), trades, timestamps[0], timestamps[-1]
+        )
+        portfolio.equity_curve.index = timestamps
+        portfolio.drawdown_curve.index = timestamps
+        
+        pair_stats = pd.DataFrame({
+            'symbol': [s.symbol for s in strategies],
+            'strategy': [s.__class__.__name__ for s in strategies],
+            'trades': trade_counts,
+            'realized_pnl': realized,
+        })
+        symbol_weights = pd.DataFrame(weights, index=timestamps, columns=symbols)
+        
+        self.logger.info(
+            f"组合回测完成: {len(symbols)} 个交易对, {n_pairs} 个策略, {len(timestamps)} 根K线, "
+            f"{len(trades)} 笔交易, 被限制拒绝 {sum(rejected.values())} 次"
+        )
+        return PortfolioBacktestResult(portfolio, pair_stats, symbol_weights, rejected)
+    
+    def _enter(self, k: int, direction: int, strategies, pair_symbol, positions, entry_prices,
+               trade_counts, trades, cash: float, equity: float, i: int, timestamps, prices,
+               volumes, returns, rejected) -> float:
+        """开仓：策略给出建议数量，再按现金、单资产权重和相关性限制裁剪"""
+        strategy = strategies[k]
+        j = pair_symbol[k]
+        price = prices[j]
+        quantity = strategy.calculate_position_size(price, cash)
+        if not quantity or quantity <= 0 or not np.isfinite(price):
+            return cash
+        
+        # 单资产权重限制（同一交易对的所有策略合计）
+        same_symbol = pair_symbol == j
+        symbol_value = abs(positions[same_symbol].sum()) * price
+        room = self.max_position_weight * equity - symbol_value
+        if room <= 0:
+            rejected['position_weight'] += 1
+            return cash
+        quantity = min(quantity, room / price)
+        
+        # 相关性限制：与其他已持仓交易对的近期收益率相关性
+        held_symbols = np.unique(pair_symbol[(positions != 0) & ~same_symbol])
+        if len(held_symbols) and i >= 2:
+            window = returns[max(1, i - self.correlation_window + 1):i + 1]
+            if len(window) > 2:
+                target = window[:, j]
+                others = window[:, held_symbols]
+                target_std = target.std()
+                others_std = others.std(axis=0)
+                if target_std > 0:
+                    with np.errstate(divide='ignore', invalid='ignore'):
+                        corr = ((target - target.mean()) @ (others - others.mean(axis=0))) / (
+                            len(target) * target_std * others_std)
+                    if np.any(np.abs(np.nan_to_num(corr)) > self.max_correlation):
+                        rejected['correlation'] += 1
+                        return cash
+        
+        side = 'BUY' if direction > 0 else 'SELL'
+        fill_price = self._symbol_fill_models[strategy.symbol].fill_price(
+            side, quantity, price, volumes[i, j], timestamps[i]
+        )
+        if direction > 0:
+            cost = quantity * fill_price * (1 + self.commission)
+            if cost > cash:
+                quantity = cash / (fill_price * (1 + self.commission))
+                if quantity <= 0:
+                    rejected['cash'] += 1
+                    return cash
+                cost = cash
+            cash -= cost
+        else:
+            cash += quantity * fill_price * (1 - self.commission)
+        
+        positions[k] = direction * quantity
+        entry_prices[k] = fill_price
+        trade_counts[k] += 1
+        trades.append({
+            'timestamp': timestamps[i],
+            'symbol': strategy.symbol,
+            'strategy': strategy.__class__.__name__,
+            'action': 'BUY' if direction > 0 else 'SHORT',
+            'price': fill_price,
+            'quantity': quantity,
+            'profit': 0,
+            'capital': cash
+        })
+        return cash
+    
+    def _exit(self, k: int, action: str, strategies, pair_symbol, positions, entry_prices,
+              realized, trade_counts, trades, cash: float, i: int, timestamps, prices,
+              volumes) -> float:
+        """平掉第k个策略的持仓，返回新的现金余额"""
+        strategy = strategies[k]
+        j = pair_symbol[k]
+        position = positions[k]
+        quantity = abs(position)
+        fill_price = self._symbol_fill_models[strategy.symbol].fill_price(
+            'SELL' if position > 0 else 'BUY', quantity, prices[j], volumes[i, j], timestamps[i]
+        )
+        if position > 0:
+            cash += quantity * fill_price * (1 - self.commission)
+            profit = (fill_price - entry_prices[k]) * quantity
+        else:
+            cash -= quantity * fill_price * (1 + self.commission)
+            profit = (entry_prices[k] - fill_price) * quantity
+        profit -= quantity * fill_price * self.commission
+        
+        positions[k] = 0
+        entry_prices[k] = 0
+        realized[k] += profit
+        trade_counts[k] += 1
+        trades.append({
+            'timestamp': timestamps[i],
+            'symbol': strategy.symbol,
+            'strategy': strategy.__class__.__name__,
+            'action': action,
+            'price': fill_price,
+            'quantity': quantity,
+            'profit': profit,
+            'capital': cash
+        })
+        return cash
+    
+    def generate_portfolio_report(self, result: PortfolioBacktestResult) -> str:
+        """生成组合回测报告"""
+        try:
+            portfolio = result.portfolio
+            report = f"""
+=== 组合回测报告 ===
+交易对数量: {result.symbol_weights.shape[1]}
+策略数量: {len(result.pair_stats)}
+初始资金: ${self.initial_capital:,.2f}
+手续费率: {self.commission:.3%}
+成交模型: {self.fill_model.describe()}
+单资产最大权重: {self.max_position_weight:.0%}
+最大相关性: {self.max_correlation:.2f}
+
+=== 收益指标 ===
+总收益率: {portfolio.total_return:.2%}
+年化收益率: {portfolio.annual_return:.2%}
+最大回撤: {portfolio.max_drawdown:.2%}
+夏普比率: {portfolio.sharpe_ratio:.2f}
+总交易次数: {portfolio.total_trades}
+被限制拒绝: {result.rejected}
+
+=== 各策略已实现盈亏 ===
+"""
+            for row in result.pair_stats.sort_values('realized_pnl', ascending=False).itertuples():
+                report += f"{row.symbol} {row.strategy}: {row.trades} 笔, 盈亏 ${row.realized_pnl:.2f}\n"
+            return report
+        
+        except Exception as e:
+            self.logger.error(f"生成组合回测报告失败: {e}")
+            return ""
@@ -7,7 +7,8 @@ import logging
 import time
 from typing import Dict, List, Tuple, Optional
 from datetime import datetime
-from backend.binance_client import BinanceClient
+import numpy as np
+import pandas as pd
 from backend.risk_manager import RiskManager
 from backend.database import DatabaseManager
 
@@ -16,7 +17,9 @@ class PositionManager:
     
     def __init__(self, trading_mode='SPOT'):
         self.trading_mode = trading_mode.upper()
-        self.binance_client = BinanceClient(trading_mode=trading_mode)
+        # 使用客户端管理器避免重复初始化
+        from backend.client_manager import client_manager
+        self.binance_client = client_manager.get_client(self.trading_mode)
         self.risk_manager = RiskManager()
         self.db_manager = DatabaseManager()
         self.logger = logging.getLogger(__name__)
@@ -36,38 +39,33 @@ class PositionManager:
     
     def check_and_reduce_positions(self) -> Dict[str, Dict]:
         """检查并执行自动减仓"""
-        results = {}
-        
         try:
-            # 获取所有持仓
-            positions = self._get_all_positions()
-            portfolio_value = self.risk_manager._get_portfolio_value()
+            # 一次获取持仓和价格快照
+            positions, portfolio_value = self._get_portfolio_snapshot()
             
             self.logger.info(f"检查持仓减仓，投资组合总值: ${portfolio_value:.2f}")
             
-            for symbol, position in positions.items():
-                if position['quantity'] <= 0:
-                    continue
-                
-                # 计算持仓权重
-                position_value = position['quantity'] * position['current_price']
-                position_weight = position_value / portfolio_value if portfolio_value > 0 else 0
-                
-                self.logger.info(f"{symbol} 持仓权重: {position_weight:.1%}")
-                
-                # 检查是否需要减仓
-                if position_weight > self.reduction_threshold:
-                    reduction_result = self._reduce_position(
-                        symbol, position, position_weight, portfolio_value
-                    )
-                    results[symbol] = reduction_result
-                    
-                    if reduction_result['success']:
-                        self.logger.info(f"✅ {symbol} 自动减仓成功: {reduction_result['reduced_quantity']:.6f}")
-                    else:
-                        self.logger.warning(f"❌ {symbol} 自动减仓失败: {reduction_result['error']}")
+            plan = self.plan_reductions(positions, portfolio_value)
+            if plan.empty:
+                self.logger.info("✅ 所有持仓权重合理")
+                return {}
+            
+            for symbol, row in plan.iterrows():
+                self.logger.info(
+                    f"减仓计算 - {symbol}: 当前权重 {row['current_weight']:.1%}, "
+                    f"目标权重 {row['target_weight']:.1%}, 实际减仓 {abs(row['delta_quantity']):.6f}"
+                )
+            
+            orders = self._submit_plan(plan)
+            results = {}
+            for symbol, row in plan.iterrows():
+                position = positions[symbol]
+                if orders.get(symbol):
+                    results[symbol] = self._record_reduction(symbol, position, abs(row['delta_quantity']), portfolio_value)
+                    self.logger.info(f"✅ {symbol} 自动减仓成功: {results[symbol]['reduced_quantity']:.6f}")
                 else:
-                    self.logger.info(f"✅ {symbol} 持仓权重合理: {position_weight:.1%}")
+                    results[symbol] = {'success': False, 'error': '下单失败', 'reduced_quantity': 0}
+                    self.logger.warning(f"❌ {symbol} 自动减仓失败: 下单失败")
             
             return results
             
@@ -75,156 +73,92 @@ class PositionManager:
             self.logger.error(f"检查持仓减仓失败: {e}")
             return {}
     
-    def _reduce_position(self, symbol: str, position: Dict, current_weight: float, 
-                        portfolio_value: float) -> Dict:
-        """执行减仓操作"""
-        try:
-            current_price = position['current_price']
-            current_quantity = position['quantity']
-            
-            # 计算目标权重和需要减仓的数量
-            target_weight = self.max_position_weight
-            target_value = portfolio_value * target_weight
-            target_quantity = target_value / current_price
-            
-            # 计算需要减仓的数量
-            reduce_quantity = current_quantity - target_quantity
-            
-            # 确保减仓数量合理
-            if reduce_quantity <= 0:
-                return {
-                    'success': False,
-                    'error': '减仓数量计算错误',
-                    'reduced_quantity': 0
-                }
-            
-            # 限制单次减仓数量，避免大幅波动
-            max_reduction = current_quantity * self.reduction_step
-            actual_reduction = min(reduce_quantity, max_reduction)
-            
-            self.logger.info(f"减仓计算 - {symbol}:")
-            self.logger.info(f"  当前权重: {current_weight:.1%}")
-            self.logger.info(f"  目标权重: {target_weight:.1%}")
-            self.logger.info(f"  当前数量: {current_quantity:.6f}")
-            self.logger.info(f"  目标数量: {target_quantity:.6f}")
-            self.logger.info(f"  建议减仓: {reduce_quantity:.6f}")
-            self.logger.info(f"  实际减仓: {actual_reduction:.6f}")
-            
-            # 执行减仓交易
-            if self.trading_mode == 'FUTURES':
-                order = self.binance_client.place_order(
-                    symbol=symbol,
-                    side='SELL',
-                    quantity=actual_reduction,
-                    position_side='LONG',
-                    reduce_only=True
-                )
-            else:
-                order = self.binance_client.place_order(
-                    symbol=symbol,
-                    side='SELL',
-                    quantity=actual_reduction
-                )
-            
-            if order:
-                # 计算减仓收益
-                reduction_value = actual_reduction * current_price
-                profit_loss = (current_price - position.get('avg_price', current_price)) * actual_reduction
-                
-                # 更新数据库
-                self.db_manager.add_trade(
-                    symbol=symbol,
-                    side='SELL',
-                    quantity=actual_reduction,
-                    price=current_price,
-                    strategy='PositionManager_AutoReduce',
-                    profit_loss=profit_loss
-                )
-                
-                # 更新持仓记录
-                remaining_quantity = current_quantity - actual_reduction
-                if remaining_quantity > 0:
-                    self.db_manager.update_position(
-                        symbol=symbol,
-                        quantity=remaining_quantity,
-                        avg_price=position.get('avg_price', current_price),
-                        current_price=current_price
-                    )
-                else:
-                    # 如果全部卖出，删除持仓记录
-                    from backend.database import Position
-                    position_record = self.db_manager.session.query(Position).filter_by(symbol=symbol).first()
-                    if position_record:
-                        self.db_manager.session.delete(position_record)
-                        self.db_manager.session.commit()
-                
-                return {
-                    'success': True,
-                    'reduced_quantity': actual_reduction,
-                    'reduction_value': reduction_value,
-                    'profit_loss': profit_loss,
-                    'remaining_quantity': remaining_quantity,
-                    'new_weight': (remaining_quantity * current_price) / portfolio_value if portfolio_value > 0 else 0
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': '下单失败',
-                    'reduced_quantity': 0
-                }
-                
-        except Exception as e:
-            self.logger.error(f"减仓操作失败 {symbol}: {e}")
-            return {
-                'success': False,
-                'error': str(e),
-                'reduced_quantity': 0
-            }
+    def plan_reductions(self, positions: Dict[str, Dict], portfolio_value: float) -> pd.DataFrame:
+        """
+        计算减仓计划：权重超过阈值的持仓减到最大持仓权重，单次最多减持仓的reduction_step
+        
+        Returns:
+            以交易对为索引的DataFrame（列同plan_rebalance），无需减仓时为空
+        """
+        frame = self._positions_frame(positions, portfolio_value)
+        frame = frame[(frame['current_quantity'] > 0) & (frame['current_weight'] > self.reduction_threshold)].copy()
+        
+        frame['target_weight'] = self.max_position_weight
+        target_quantity = portfolio_value * self.max_position_weight / frame['price']
+        reduce_quantity = np.minimum(
+            frame['current_quantity'] - target_quantity,
+            frame['current_quantity'] * self.reduction_step
+        )
+        frame['delta_quantity'] = -reduce_quantity
+        frame['delta_value'] = frame['delta_quantity'] * frame['price']
+        frame['side'] = 'SELL'
+        return frame[frame['delta_quantity'] < 0]
+    
+    def plan_rebalance(self, positions: Dict[str, Dict], prices: Dict[str, float],
+                       portfolio_value: float, target_weights: Dict[str, float]) -> pd.DataFrame:
+        """
+        根据同一价格快照一次计算所有交易对的调整量
+        
+        Returns:
+            以交易对为索引的DataFrame，列为 current_quantity、price、current_weight、
+            target_weight、delta_quantity、delta_value、side；只包含需要调整的交易对
+        """
+        symbols = [symbol for symbol in target_weights if prices.get(symbol)]
+        missing = set(target_weights) - set(symbols)
+        if missing:
+            self.logger.warning(f"缺少价格，跳过再平衡: {sorted(missing)}")
+        
+        frame = pd.DataFrame(index=pd.Index(symbols, name='symbol'))
+        frame['current_quantity'] = [positions.get(symbol, {}).get('quantity', 0.0) for symbol in symbols]
+        frame['price'] = [prices[symbol] for symbol in symbols]
+        frame['target_weight'] = [target_weights[symbol] for symbol in symbols]
+        
+        value = frame['current_quantity'] * frame['price']
+        frame['current_weight'] = value / portfolio_value if portfolio_value > 0 else 0.0
+        frame['delta_quantity'] = portfolio_value * frame['target_weight'] / frame['price'] - frame['current_quantity']
+        frame['delta_value'] = frame['delta_quantity'] * frame['price']
+        frame['side'] = np.where(frame['delta_quantity'] > 0, 'BUY', 'SELL')
+        
+        needs_trade = (
+            ((frame['current_weight'] - frame['target_weight']).abs() > self.rebalance_threshold)
+            & (frame['delta_value'].abs() > self.min_rebalance_amount)
+        )
+        return frame[needs_trade]
     
     def rebalance_portfolio(self, target_weights: Dict[str, float]) -> Dict[str, Dict]:
         """投资组合再平衡"""
         results = {}
         
         try:
-            positions = self._get_all_positions()
-            portfolio_value = self.risk_manager._get_portfolio_value()
+            prices = self.binance_client.get_ticker_prices()
+            positions, portfolio_value = self._get_portfolio_snapshot(prices)
             
             self.logger.info(f"开始投资组合再平衡，总值: ${portfolio_value:.2f}")
             
-            for symbol, target_weight in target_weights.items():
-                current_position = positions.get(symbol, {'quantity': 0, 'current_price': 0})
-                current_quantity = current_position['quantity']
-                current_price = current_position['current_price']
-                
-                # 计算当前权重
-                current_value = current_quantity * current_price
-                current_weight = current_value / portfolio_value if portfolio_value > 0 else 0
-                
-                # 计算目标数量
-                target_value = portfolio_value * target_weight
-                target_quantity = target_value / current_price
-                
-                # 计算调整数量
-                adjustment_quantity = target_quantity - current_quantity
-                adjustment_value = abs(adjustment_quantity * current_price)
-                
-                # 检查是否需要调整
-                if abs(current_weight - target_weight) > self.rebalance_threshold and adjustment_value > self.min_rebalance_amount:
-                    if adjustment_quantity > 0:
-                        # 需要买入
-                        result = self._buy_position(symbol, adjustment_quantity, current_price, 'Rebalance')
-                    else:
-                        # 需要卖出
-                        result = self._sell_position(symbol, abs(adjustment_quantity), current_price, 'Rebalance')
-                    
-                    results[symbol] = result
-                    
-                    if result['success']:
-                        self.logger.info(f"✅ {symbol} 再平衡成功: {adjustment_quantity:+.6f}")
-                    else:
-                        self.logger.warning(f"❌ {symbol} 再平衡失败: {result['error']}")
-                else:
+            plan = self.plan_rebalance(positions, prices, portfolio_value, target_weights)
+            for symbol in target_weights:
+                if symbol not in plan.index:
                     self.logger.info(f"✅ {symbol} 权重合理，无需调整")
+            if plan.empty:
+                return results
+            
+            orders = self._submit_plan(plan)
+            for symbol, row in plan.iterrows():
+                quantity = abs(row['delta_quantity'])
+                if orders.get(symbol):
+                    self.db_manager.add_trade(
+                        symbol=symbol,
+                        side=row['side'],
+                        quantity=quantity,
+                        price=row['price'],
+                        strategy='PositionManager_Rebalance'
+                    )
+                    results[symbol] = {'success': True, 'quantity': quantity, 'value': quantity * row['price']}
+                    self.logger.info(f"✅ {symbol} 再平衡成功: {row['delta_quantity']:+.6f}")
+                else:
+                    error = '买入订单失败' if row['side'] == 'BUY' else '卖出订单失败'
+                    results[symbol] = {'success': False, 'error': error}
+                    self.logger.warning(f"❌ {symbol} 再平衡失败: {error}")
             
             return results
             
@@ -232,105 +166,92 @@ class PositionManager:
             self.logger.error(f"投资组合再平衡失败: {e}")
             return {}
     
-    def _buy_position(self, symbol: str, quantity: float, price: float, reason: str) -> Dict:
-        """买入持仓"""
-        try:
+    def _submit_plan(self, plan: pd.DataFrame) -> Dict[str, Optional[Dict]]:
+        """批量提交计划中的订单，返回 {交易对: 订单结果}"""
+        orders = []
+        for symbol, row in plan.iterrows():
+            order = {'symbol': symbol, 'side': row['side'], 'quantity': abs(row['delta_quantity'])}
             if self.trading_mode == 'FUTURES':
-                order = self.binance_client.place_order(
-                    symbol=symbol,
-                    side='BUY',
-                    quantity=quantity,
-                    position_side='LONG'
-                )
-            else:
-                order = self.binance_client.place_order(
-                    symbol=symbol,
-                    side='BUY',
-                    quantity=quantity
-                )
-            
-            if order:
-                # 更新数据库
-                self.db_manager.add_trade(
-                    symbol=symbol,
-                    side='BUY',
-                    quantity=quantity,
-                    price=price,
-                    strategy=f'PositionManager_{reason}'
-                )
-                
-                return {
-                    'success': True,
-                    'quantity': quantity,
-                    'value': quantity * price
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': '买入订单失败'
-                }
-                
-        except Exception as e:
-            return {
-                'success': False,
-                'error': str(e)
-            }
+                order['position_side'] = 'LONG'
+                order['reduce_only'] = row['side'] == 'SELL'
+            orders.append(order)
+        
+        responses = self.binance_client.place_batch_orders(orders)
+        return dict(zip(plan.index, responses))
     
-    def _sell_position(self, symbol: str, quantity: float, price: float, reason: str) -> Dict:
-        """卖出持仓"""
-        try:
-            if self.trading_mode == 'FUTURES':
-                order = self.binance_client.place_order(
-                    symbol=symbol,
-                    side='SELL',
-                    quantity=quantity,
-                    position_side='LONG',
-                    reduce_only=True
-                )
-            else:
-                order = self.binance_client.place_order(
-                    symbol=symbol,
-                    side='SELL',
-                    quantity=quantity
-                )
-            
-            if order:
-                # 更新数据库
-                self.db_manager.add_trade(
-                    symbol=symbol,
-                    side='SELL',
-                    quantity=quantity,
-                    price=price,
-                    strategy=f'PositionManager_{reason}'
-                )
-                
-                return {
-                    'success': True,
-                    'quantity': quantity,
-                    'value': quantity * price
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': '卖出订单失败'
-                }
-                
-        except Exception as e:
-            return {
-                'success': False,
-                'error': str(e)
-            }
+    def _record_reduction(self, symbol: str, position: Dict, quantity: float, portfolio_value: float) -> Dict:
+        """记录减仓成交并更新持仓"""
+        current_price = position['current_price']
+        current_quantity = position['quantity']
+        
+        reduction_value = quantity * current_price
+        profit_loss = (current_price - position.get('avg_price', current_price)) * quantity
+        
+        self.db_manager.add_trade(
+            symbol=symbol,
+            side='SELL',
+            quantity=quantity,
+            price=current_price,
+            strategy='PositionManager_AutoReduce',
+            profit_loss=profit_loss
+        )
+        
+        # 更新持仓记录
+        remaining_quantity = current_quantity - quantity
+        if remaining_quantity > 0:
+            self.db_manager.update_position(
+                symbol=symbol,
+                quantity=remaining_quantity,
+                avg_price=position.get('avg_price', current_price),
+                current_price=current_price
+            )
+        else:
+            # 如果全部卖出，删除持仓记录
+            from backend.database import Position
+            position_record = self.db_manager.session.query(Position).filter_by(symbol=symbol).first()
+            if position_record:
+                self.db_manager.session.delete(position_record)
+                self.db_manager.session.commit()
+        
+        return {
+            'success': True,
+            'reduced_quantity': quantity,
+            'reduction_value': reduction_value,
+            'profit_loss': profit_loss,
+            'remaining_quantity': remaining_quantity,
+            'new_weight': (remaining_quantity * current_price) / portfolio_value if portfolio_value > 0 else 0
+        }
+    
+    @staticmethod
+    def _positions_frame(positions: Dict[str, Dict], portfolio_value: float) -> pd.DataFrame:
+        """持仓转换为以交易对为索引的DataFrame"""
+        frame = pd.DataFrame.from_dict(
+            {symbol: {'current_quantity': p['quantity'], 'price': p['current_price']} for symbol, p in positions.items()},
+            orient='index', columns=['current_quantity', 'price']
+        )
+        frame.index.name = 'symbol'
+        value = frame['current_quantity'] * frame['price']
+        frame['current_weight'] = value / portfolio_value if portfolio_value > 0 else 0.0
+        return frame
+    
+    def _get_portfolio_snapshot(self, prices: Dict[str, float] = None) -> Tuple[Dict[str, Dict], float]:
+        """用同一价格快照计算持仓和投资组合总值（持仓市值 + USDT余额）"""
+        positions = self._get_all_positions(prices)
+        positions_value = sum(p['market_value'] for p in positions.values())
+        return positions, positions_value + self.binance_client.get_balance('USDT')
     
-    def _get_all_positions(self) -> Dict[str, Dict]:
-        """获取所有持仓信息"""
+    def _get_all_positions(self, prices: Dict[str, float] = None) -> Dict[str, Dict]:
+        """获取所有持仓信息（价格一次批量获取）"""
         positions = {}
         
         try:
             # 从数据库获取持仓
             db_positions = self.db_manager.get_positions()
+            if prices is None and db_positions:
+                prices = self.binance_client.get_ticker_prices([p.symbol for p in db_positions])
             
             for position in db_positions:
-                current_price = self.binance_client.get_ticker_price(position.symbol)
+                current_price = (prices or {}).get(position.symbol)
                 if current_price:
                     positions[position.symbol] = {
                         'quantity': position.quantity,
@@ -349,8 +270,7 @@ class PositionManager:
     def get_position_analysis(self) -> Dict:
         """获取持仓分析报告"""
         try:
-            positions = self._get_all_positions()
-            portfolio_value = self.risk_manager._get_portfolio_value()
+            positions, portfolio_value = self._get_portfolio_snapshot()
             
             analysis = {
                 'portfolio_value': portfolio_value,
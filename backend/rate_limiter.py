@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+币安请求权重限流模块
+按接口权重扣减令牌桶，根据响应头 X-MBX-USED-WEIGHT 校准已用权重，
+遇到 429/418 时暂停所有请求；下单请求可以使用为其保留的额度
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+# 请求优先级（数值越小越优先）
+PRIORITY_ORDER = 0  # 下单、撤单
+PRIORITY_NORMAL = 1  # 账户、持仓等
+PRIORITY_MARKET_DATA = 2  # 行情轮询、历史数据
+
+# 固定权重的接口（python-binance 方法名 -> 权重）
+SPOT_WEIGHTS = {
+    'get_account': 20,
+    'get_asset_balance': 20,
+    'get_exchange_info': 20,
+    'get_klines': 2,  # 历史K线按页调用get_klines，每页单独计权重
+    'get_order': 4,
+    'get_my_trades': 20,
+    'get_all_orders': 20,
+    'order_market': 1,
+    'order_limit': 1,
+    'create_order': 1,
+    'cancel_order': 1,
+    'stream_get_listen_key': 2,
+    'stream_keepalive': 2,
+}
+
+FUTURES_WEIGHTS = {
+    'futures_account': 5,
+    'futures_account_balance': 5,
+    'futures_position_information': 5,
+    'futures_symbol_config': 5,
+    'futures_exchange_info': 1,
+    'futures_change_leverage': 1,
+    'futures_change_margin_type': 1,
+    'futures_get_position_mode': 30,
+    'futures_change_position_mode': 1,
+    'futures_create_order': 1,
+    'futures_place_batch_order': 5,
+    'futures_cancel_order': 1,
+    'futures_get_order': 1,
+    'futures_funding_rate': 1,
+    'futures_stream_get_listen_key': 1,
+    'futures_stream_keepalive': 1,
+}
+
+# 下单类接口，使用最高优先级
+ORDER_METHODS = {
+    'order_market', 'order_limit', 'create_order', 'cancel_order',
+    'futures_create_order', 'futures_place_batch_order', 'futures_cancel_order',
+}
+
+# 行情类接口，使用最低优先级
+MARKET_DATA_METHODS = {
+    'get_klines', 'get_historical_klines', 'get_order_book', 'get_symbol_ticker',
+    'get_ticker', 'futures_klines', 'futures_order_book', 'futures_symbol_ticker',
+    'futures_ticker', 'futures_mark_price',
+}
+
+
+def _depth_weight(limit: int, futures: bool) -> int:
+    """订单簿接口权重（与limit有关）"""
+    if futures:
+        if limit <= 50:
+            return 2
+        if limit <= 100:
+            return 5
+        if limit <= 500:
+            return 10
+        return 20
+    if limit <= 100:
+        return 5
+    if limit <= 500:
+        return 25
+    if limit <= 1000:
+        return 50
+    return 250
+
+
+def estimate_weight(method: str, params: Dict = None) -> int:
+    """
+    估算一次请求的权重
+    
+    Args:
+        method: python-binance 客户端方法名
+        params: 请求参数
+    """
+    params = params or {}
+    has_symbol = bool(params.get('symbol'))
+    
+    if method in ('get_order_book', 'futures_order_book'):
+        return _depth_weight(int(params.get('limit', 100)), method.startswith('futures'))
+    if method == 'futures_klines':
+        limit = int(params.get('limit', 500))
+        if limit < 100:
+            return 1
+        if limit < 500:
+            return 2
+        return 5 if limit <= 1000 else 10
+    if method in ('get_symbol_ticker', 'futures_symbol_ticker'):
+        return (2 if has_symbol else 4) if method == 'get_symbol_ticker' else (1 if has_symbol else 2)
+    if method == 'get_ticker':
+        return 2 if has_symbol else 80
+    if method == 'futures_ticker':
+        return 1 if has_symbol else 40
+    if method == 'futures_mark_price':
+        return 1 if has_symbol else 10
+    if method == 'get_open_orders':
+        return 6 if has_symbol else 80
+    if method == 'futures_get_open_orders':
+        return 1 if has_symbol else 40
+    
+    if method in FUTURES_WEIGHTS:
+        return FUTURES_WEIGHTS[method]
+    return SPOT_WEIGHTS.get(method, 1)
+
+
+def method_priority(method: str) -> int:
+    """根据方法名确定请求优先级"""
+    if method in ORDER_METHODS:
+        return PRIORITY_ORDER
+    if method in MARKET_DATA_METHODS:
+        return PRIORITY_MARKET_DATA
+    return PRIORITY_NORMAL
+
+
+class RateLimiter:
+    """
+    请求权重令牌桶
+    
+    容量为每分钟权重上限乘以安全系数，按容量/60每秒匀速补充。
+    非下单请求不能动用保留额度，有下单请求在等待时其他请求让行
+    """
+    
+    def __init__(self, name: str, weight_limit: int, safety_margin: float = 0.9,
+                 order_reserve: float = 0.1):
+        self.name = name
+        self.weight_limit = weight_limit
+        self.capacity = weight_limit * safety_margin
+        self.reserve = self.capacity * order_reserve
+        self.refill_rate = self.capacity / 60.0
+        self.logger = logging.getLogger(__name__)
+        
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._banned_until = 0.0
+        self._priority_waiters = 0
+        self._condition = threading.Condition()
+        
+        # 统计信息
+        self._used_weight = 0
+        self._total_requests = 0
+        self._total_wait = 0.0
+        self._ban_count = 0
+    
+    def _refill(self, now: float):
+        elapsed = now - self._last_refill
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.refill_rate)
+            self._last_refill = now
+    
+    def _try_acquire(self, weight: int, priority: int) -> float:
+        """尝试扣减令牌，成功返回0，否则返回建议等待秒数（需持有锁）"""
+        now = time.monotonic()
+        if now < self._banned_until:
+            return self._banned_until - now
+        
+        self._refill(now)
+        
+        # 有下单请求等待时，其他请求让行
+        if priority != PRIORITY_ORDER and self._priority_waiters > 0:
+            return 0.05
+        
+        floor = 0.0 if priority == PRIORITY_ORDER else self.reserve
+        if self._tokens - weight >= floor:
+            self._tokens -= weight
+            self._total_requests += 1
+            return 0.0
+        
+        return max((weight + floor - self._tokens) / self.refill_rate, 0.01)
+    
+    def acquire(self, weight: int = 1, priority: int = PRIORITY_NORMAL,
+                timeout: Optional[float] = None) -> bool:
+        """
+        阻塞获取请求额度
+        
+        Returns:
+            是否在超时前获取成功
+        """
+        weight = min(weight, self.capacity)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        start = time.monotonic()
+        
+        with self._condition:
+            if priority == PRIORITY_ORDER:
+                self._priority_waiters += 1
+            try:
+                while True:
+                    wait = self._try_acquire(weight, priority)
+                    if wait == 0:
+                        self._total_wait += time.monotonic() - start
+                        return True
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return False
+                        wait = min(wait, remaining)
+                    self._condition.wait(wait)
+            finally:
+                if priority == PRIORITY_ORDER:
+                    self._priority_waiters -= 1
+                    self._condition.notify_all()
+    
+    async def acquire_async(self, weight: int = 1, priority: int = PRIORITY_NORMAL,
+                            timeout: Optional[float] = None) -> bool:
+        """异步获取请求额度，等待期间不阻塞事件循环"""
+        weight = min(weight, self.capacity)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        start = time.monotonic()
+        
+        with self._condition:
+            if priority == PRIORITY_ORDER:
+                self._priority_waiters += 1
+        try:
+            while True:
+                with self._condition:
+                    wait = self._try_acquire(weight, priority)
+                    if wait == 0:
+                        self._total_wait += time.monotonic() - start
+                        return True
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    wait = min(wait, remaining)
+                await asyncio.sleep(wait)
+        finally:
+            if priority == PRIORITY_ORDER:
+                with self._condition:
+                    self._priority_waiters -= 1
+                    self._condition.notify_all()
+    
+    def update_from_headers(self, headers) -> Optional[int]:
+        """
+        根据响应头校准已用权重
+        
+        币安按分钟窗口统计权重，响应头给出当前窗口已用权重，
+        本地令牌数不能多于 容量 - 已用权重
+        """
+        if not headers:
+            return None
+        
+        used = None
+        for key in ('X-MBX-USED-WEIGHT-1M', 'X-MBX-USED-WEIGHT-1m', 'X-MBX-USED-WEIGHT'):
+            value = headers.get(key)
+            if value is not None:
+                try:
+                    used = int(value)
+                except (TypeError, ValueError):
+                    used = None
+                break
+        
+        if used is None:
+            return None
+        
+        with self._condition:
+            self._used_weight = used
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, self.capacity - used)
+        return used
+    
+    def on_rate_limit_error(self, status_code: int, retry_after: Optional[float] = None):
+        """收到 429（超限）或 418（IP被封）时暂停所有请求"""
+        if retry_after is None:
+            retry_after = 120.0 if status_code == 418 else 60.0
+        
+        with self._condition:
+            self._banned_until = max(self._banned_until, time.monotonic() + float(retry_after))
+            self._tokens = 0.0
+            self._ban_count += 1
+            self._condition.notify_all()
+        
+        self.logger.warning(f"{self.name} 触发限流({status_code})，暂停请求 {retry_after} 秒")
+    
+    def get_stats(self) -> Dict:
+        """获取限流状态"""
+        with self._condition:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                'name': self.name,
+                'weight_limit': self.weight_limit,
+                'available_weight': round(self._tokens, 1),
+                'used_weight_1m': self._used_weight,
+                'total_requests': self._total_requests,
+                'total_wait_seconds': round(self._total_wait, 3),
+                'ban_count': self._ban_count,
+                'banned_seconds_left': round(max(self._banned_until - now, 0.0), 1),
+            }
+
+
+_rate_limiters: Dict[str, RateLimiter] = {}
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter(trading_mode: str = 'SPOT') -> RateLimiter:
+    """获取进程内共享的限流器（现货和合约分别计算权重）"""
+    trading_mode = trading_mode.upper()
+    with _rate_limiter_lock:
+        limiter = _rate_limiters.get(trading_mode)
+        if limiter is None:
+            from config.config import Config
+            config = Config()
+            weight_limit = (config.RATE_LIMIT_FUTURES_WEIGHT if trading_mode == 'FUTURES'
+                            else config.RATE_LIMIT_SPOT_WEIGHT)
+            limiter = RateLimiter(
+                name=trading_mode,
+                weight_limit=weight_limit,
+                safety_margin=config.RATE_LIMIT_SAFETY_MARGIN,
+                order_reserve=config.RATE_LIMIT_ORDER_RESERVE
+            )
+            _rate_limiters[trading_mode] = limiter
+        return limiter
@@ -0,0 +1,679 @@
+#!/usr/bin/env python3
+"""
+交易回放
+用模拟时钟和模拟币安客户端驱动真实的TradingEngine（含风险管理器、持仓管理器和订单执行队列）：
+K线和行情来自数据库中已记录的数据，订单按成交模型在当前K线上立即成交，
+逐根K线调用交易循环而不等待，可离线复现和剖析完整的交易日
+"""
+
+import copy
+import cProfile
+import io
+import logging
+import os
+import pstats
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+from backend import database
+from backend.fill_models import FillModel, create_fill_model
+from backend.order_executor import new_client_order_id
+from backend.rate_limiter import get_rate_limiter
+from backend.symbol_metadata import SymbolMeta
+from backend.user_data_stream import AccountState
+from config.config import Config
+
+
+def _to_ns(timestamps) -> np.ndarray:
+    """时间（单个或序列）转换为UTC纳秒整数；pandas 2起DatetimeIndex的单位不一定是纳秒，asi8需统一单位"""
+    index = pd.DatetimeIndex(np.atleast_1d(timestamps))
+    if index.tz is not None:
+        index = index.tz_convert('UTC').tz_localize(None)
+    return index.as_unit('ns').asi8
+
+
+def _same_database(url: str, other_url: str) -> bool:
+    """两个数据库URL是否指向同一个数据库（SQLite按文件绝对路径比较）"""
+    from sqlalchemy.engine import make_url
+    first, second = make_url(url), make_url(other_url)
+    if first.get_backend_name() != second.get_backend_name():
+        return False
+    if first.get_backend_name() == 'sqlite':
+        if not first.database or not second.database or ':memory:' in (first.database, second.database):
+            return False
+        return os.path.realpath(first.database) == os.path.realpath(second.database)
+    return (first.host, first.port, first.database) == (second.host, second.port, second.database)
+
+class SimulatedClock:
+    """模拟时钟：回放时的"当前时间"为正在处理的K线时间"""
+    
+    def __init__(self, start=None):
+        self._now = pd.Timestamp(start) if start is not None else pd.Timestamp.utcnow().tz_localize(None)
+    
+    def now(self) -> pd.Timestamp:
+        return self._now
+    
+    def now_ns(self) -> int:
+        """当前时间的纳秒整数（与K线时间比较时统一单位）"""
+        return int(_to_ns(self._now)[0])
+    
+    def utcnow(self):
+        """当前时间的naive datetime（UTC），供数据库记录时间戳"""
+        return pd.Timestamp(self.now_ns()).to_pydatetime()
+    
+    def time(self) -> float:
+        """与time.time()相同的秒级时间戳"""
+        return self.now_ns() / 1e9
+    
+    def advance_to(self, timestamp):
+        timestamp = pd.Timestamp(timestamp)
+        if timestamp < self._now:
+            raise ValueError(f"模拟时钟不能倒退: {timestamp} < {self._now}")
+        self._now = timestamp
+
+
+class ReplayMarketData:
+    """
+    回放数据源：一次性从本地存储读取回放区间（含预热期）的K线，
+    按模拟时钟只返回"当前时间"之前的数据，接口与DataCollector的读取方法一致
+    """
+    
+    def __init__(self, clock: SimulatedClock, start, end, source=None, warmup_days: int = 120):
+        """
+        Args:
+            source: 提供get_market_data和calculate_technical_indicators的对象，默认DataCollector
+            warmup_days: 回放开始前额外读取的天数（日线风险指标和策略指标预热）
+        """
+        self.clock = clock
+        self.start = pd.Timestamp(start)
+        self.end = pd.Timestamp(end)
+        self.warmup_days = warmup_days
+        self._source = source
+        self._frames: Dict[tuple, pd.DataFrame] = {}
+        self._times: Dict[tuple, np.ndarray] = {}
+        self.logger = logging.getLogger(__name__)
+    
+    @property
+    def source(self):
+        if self._source is None:
+            from backend.data_collector import DataCollector
+            self._source = DataCollector()
+        return self._source
+    
+    def load(self, symbol: str, interval: str) -> pd.DataFrame:
+        """读取（并缓存）某交易对某周期在回放区间内的全部K线"""
+        key = (symbol, interval)
+        if key not in self._frames:
+            frame = self.source.get_market_data(
+                symbol, interval, limit=None,
+                start=self.start - timedelta(days=self.warmup_days), end=self.end
+            )
+            if frame is None or frame.empty:
+                frame = pd.DataFrame(columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+            frame = frame.sort_values('timestamp').reset_index(drop=True)
+            self._frames[key] = frame
+            self._times[key] = _to_ns(frame['timestamp'])
+            self.logger.info(f"回放数据 {symbol} {interval}: {len(frame)} 根K线")
+        return self._frames[key]
+    
+    def _visible_count(self, symbol: str, interval: str) -> int:
+        """截至模拟时钟（含）可见的K线数量"""
+        self.load(symbol, interval)
+        times = self._times[(symbol, interval)]
+        now = self.clock.now_ns()
+        count = int(np.searchsorted(times, now, side='right'))
+        # 只能看到时间不晚于模拟时钟的K线，否则回放存在未来数据
+        if count and times[count - 1] > now:
+            raise RuntimeError(f"回放数据 {symbol} {interval} 出现晚于模拟时钟的K线: {self.clock.now()}")
+        return count
+    
+    def timeline(self, symbols: List[str], interval: str) -> pd.DatetimeIndex:
+        """回放区间内所有交易对K线时间的并集"""
+        times = set()
+        for symbol in symbols:
+            frame = self.load(symbol, interval)
+            in_range = frame['timestamp'][(frame['timestamp'] >= self.start) & (frame['timestamp'] <= self.end)]
+            times.update(in_range)
+        return pd.DatetimeIndex(sorted(times))
+    
+    def get_market_data(self, symbol: str, interval: str = '1h', limit: int = 100,
+                        start=None, end=None) -> pd.DataFrame:
+        frame = self.load(symbol, interval)
+        data = frame.iloc[:self._visible_count(symbol, interval)]
+        if start is not None:
+            data = data[data['timestamp'] >= pd.Timestamp(start)]
+        if end is not None:
+            data = data[data['timestamp'] <= pd.Timestamp(end)]
+        if limit is not None:
+            data = data.tail(limit) if start is None else data.head(limit)
+        return data.reset_index(drop=True)
+    
+    def get_technical_indicators(self, symbol: str, limit: int = 100,
+                                 start=None, end=None) -> pd.DataFrame:
+        """回放不读取预存的指标，调用方回退到用K线计算"""
+        return pd.DataFrame()
+    
+    def calculate_technical_indicators(self, df: pd.DataFrame, symbol: str) -> pd.DataFrame:
+        return self.source.calculate_technical_indicators(df, symbol)
+    
+    def last_bar(self, symbol: str, interval: str) -> Optional[pd.Series]:
+        count = self._visible_count(symbol, interval)
+        return self._frames[(symbol, interval)].iloc[count - 1] if count else None
+
+
+class _ReplayRestClient:
+    """模拟python-binance Client中被直接调用的行情接口"""
+    
+    def __init__(self, replay_client: 'ReplayBinanceClient'):
+        self._replay = replay_client
+    
+    def get_ticker(self, symbol: str) -> Dict:
+        """24小时行情（由回放K线汇总）"""
+        return self._replay.ticker_24h(symbol)
+    
+    def futures_order_book(self, symbol: str, limit: int = 5) -> Dict:
+        """以当前价格为中心、固定价差的合成订单簿"""
+        price = self._replay.get_ticker_price(symbol)
+        half_spread = price * self._replay.spread_bps / 20000
+        return {
+            'bids': [[str(price - half_spread), '1000']],
+            'asks': [[str(price + half_spread), '1000']],
+        }
+
+
+class ReplayBinanceClient:
+    """
+    模拟币安客户端：接口与BinanceClient一致，行情来自ReplayMarketData，
+    市价单按成交模型在当前K线上立即成交，账户余额和持仓在本地维护
+    """
+    
+    def __init__(self, market: ReplayMarketData, trading_mode: str = 'SPOT',
+                 initial_balance: float = 10000.0, commission: float = 0.001,
+                 fill_model: FillModel = None, spread_bps: float = 2.0, interval: str = None):
+        self.market = market
+        self.trading_mode = trading_mode.upper()
+        self.commission = commission
+        self.fill_model = fill_model or create_fill_model(Config().BACKTEST_FILL_MODEL)
+        self.spread_bps = spread_bps
+        self.interval = interval or Config().DEFAULT_TIMEFRAME
+        self.client = _ReplayRestClient(self)
+        self.rate_limiter = get_rate_limiter(self.trading_mode)
+        self.logger = logging.getLogger(__name__)
+        
+        # 账户：现货 {资产: 数量}；合约 钱包余额 + {(symbol, positionSide): 持仓}
+        self.balances: Dict[str, float] = {'USDT': initial_balance}
+        self.wallet_balance = initial_balance
+        self.positions: Dict[tuple, Dict] = {}
+        self.leverages: Dict[str, int] = {}
+        self.margin_types: Dict[str, str] = {}
+        self.dual_side_position = False
+        self.orders: Dict[str, Dict] = {}
+        self.fills: List[Dict] = []
+        self._next_order_id = 1
+        self._symbol_fill_models: Dict[str, FillModel] = {}
+        
+        # 读取接口复用用户数据流的账户状态，返回格式与REST一致
+        self.account_state = AccountState(self.trading_mode)
+        self._publish()
+    
+    # ---------- 行情 ----------
+    
+    def throttled_call(self, api_func, *args, priority: int = None, **kwargs):
+        return api_func(*args, **kwargs)
+    
+    def get_klines(self, symbol, interval='1h', limit=500):
+        return self.market.get_market_data(symbol, interval, limit=limit)
+    
+    def get_ticker_price(self, symbol):
+        bar = self.market.last_bar(symbol, self.interval)
+        return float(bar['close']) if bar is not None else None
+    
+    def get_ticker_prices(self, symbols=None) -> Dict[str, float]:
+        symbols = symbols or sorted({key[0] for key in self.market._frames if key[1] == self.interval})
+        prices = {symbol: self.get_ticker_price(symbol) for symbol in symbols}
+        return {symbol: price for symbol, price in prices.items() if price is not None}
+    
+    def ticker_24h(self, symbol: str) -> Dict:
+        now = self.market.clock.now()
+        bars = self.market.get_market_data(symbol, self.interval, limit=None, start=now - timedelta(hours=24), end=now)
+        last = float(bars['close'].iloc[-1]) if len(bars) else 0.0
+        volume = float(bars['volume'].sum()) if len(bars) else 0.0
+        quote_volume = float((bars['close'] * bars['volume']).sum()) if len(bars) else 0.0
+        return {'symbol': symbol, 'lastPrice': str(last), 'volume': str(volume), 'quoteVolume': str(quote_volume)}
+    
+    def _is_valid_symbol(self, symbol: str) -> bool:
+        return not self.market.load(symbol, self.interval).empty
+    
+    def get_symbol_meta(self, symbol) -> Optional[SymbolMeta]:
+        """回放不做数量精度调整"""
+        if not self._is_valid_symbol(symbol):
+            return None
+        quote = 'USDT' if symbol.endswith('USDT') else symbol[-3:]
+        return SymbolMeta(symbol=symbol, status='TRADING', base_asset=symbol[:-len(quote)], quote_asset=quote)
+    
+    # ---------- 账户 ----------
+    
+    def attach_account_state(self, account_state, health_check=None):
+        pass
+    
+    def get_account_info(self):
+        return self.account_state.get_account_balance() if self.trading_mode == 'SPOT' else None
+    
+    def get_balance(self, asset='USDT'):
+        return self.account_state.get_balance(asset)
+    
+    def get_positions(self):
+        if self.trading_mode != 'FUTURES':
+            return []
+        return self.account_state.get_positions()
+    
+    def get_account_balance(self):
+        return self.account_state.get_account_balance()
+    
+    def equity(self) -> float:
+        """按当前价格计算的账户总权益（USDT）"""
+        if self.trading_mode == 'FUTURES':
+            return self.wallet_balance + sum(self._unrealized(pos) for pos in self.positions.values())
+        total = self.balances.get('USDT', 0.0)
+        for asset, amount in self.balances.items():
+            if asset != 'USDT' and amount:
+                total += amount * (self.get_ticker_price(f"{asset}USDT") or 0.0)
+        return total
+    
+    def mark_to_market(self):
+        """模拟时钟前进后按新价格刷新账户状态"""
+        self._publish()
+    
+    def _unrealized(self, pos: Dict) -> float:
+        price = self.get_ticker_price(pos['symbol']) or pos['entryPrice']
+        return (price - pos['entryPrice']) * pos['positionAmt']
+    
+    def _publish(self):
+        """把本地账户写入AccountState（与用户数据流快照格式相同）"""
+        if self.trading_mode == 'FUTURES':
+            margin = sum(
+                abs(pos['positionAmt']) * pos['entryPrice'] / self.leverages.get(pos['symbol'], 1)
+                for pos in self.positions.values()
+            )
+            unrealized = sum(self._unrealized(pos) for pos in self.positions.values())
+            available = self.wallet_balance + min(unrealized, 0.0) - margin
+            positions = [
+                {**pos, 'unRealizedProfit': self._unrealized(pos), 'leverage': self.leverages.get(pos['symbol'], 1),
+                 'marginType': self.margin_types.get(pos['symbol'], 'CROSSED').lower()}
+                for pos in self.positions.values()
+            ]
+            self.account_state.load_futures_snapshot({
+                'assets': [{'asset': 'USDT', 'walletBalance': self.wallet_balance,
+                            'availableBalance': available}],
+                'availableBalance': available,
+                'totalPositionInitialMargin': margin,
+            }, positions)
+        else:
+            self.account_state.load_spot_snapshot({
+                'balances': [{'asset': asset, 'free': amount, 'locked': 0.0} for asset, amount in self.balances.items()],
+            })
+    
+    # ---------- 交易 ----------
+    
+    def place_order(self, symbol, side, quantity, order_type='MARKET', price=None,
+                    leverage=None, position_side='BOTH', reduce_only=False, client_order_id=None):
+        """市价单立即按成交模型成交；限价单按限价成交（不模拟挂单）"""
+        try:
+            client_order_id = client_order_id or new_client_order_id()
+            if client_order_id in self.orders:
+                return self.orders[client_order_id]
+            
+            bar = self.market.last_bar(symbol, self.interval)
+            if bar is None or quantity <= 0:
+                self.logger.error(f"回放下单失败 {symbol}: 无行情或数量无效")
+                return None
+            if leverage:
+                self.leverages[symbol] = leverage
+            
+            if order_type == 'LIMIT' and price:
+                fill_price = float(price)
+            else:
+                fill_price = self._fill_model_for(symbol).fill_price(
+                    side, quantity, float(bar['close']), float(bar.get('volume', 0) or 0), self.market.clock.now()
+                )
+            
+            if self.trading_mode == 'FUTURES':
+                quantity = self._fill_futures(symbol, side, quantity, fill_price, position_side, reduce_only)
+            else:
+                quantity = self._fill_spot(symbol, side, quantity, fill_price)
+            if not quantity:
+                return None
+            
+            order = {
+                'symbol': symbol,
+                'orderId': self._next_order_id,
+                'clientOrderId': client_order_id,
+                'side': side,
+                'type': order_type,
+                'positionSide': position_side,
+                'status': 'FILLED',
+                'origQty': str(quantity),
+                'executedQty': str(quantity),
+                'avgPrice': str(fill_price),
+                'cummulativeQuoteQty': str(quantity * fill_price),
+                'transactTime': int(self.market.clock.time() * 1000),
+            }
+            self._next_order_id += 1
+            self.orders[client_order_id] = order
+            self.fills.append({
+                'timestamp': self.market.clock.now(), 'symbol': symbol, 'side': side,
+                'quantity': quantity, 'price': fill_price, 'position_side': position_side
+            })
+            self._publish()
+            return order
+        
+        except Exception as e:
+            self.logger.error(f"回放下单异常: {e}")
+            return None
+    
+    def _fill_model_for(self, symbol: str) -> FillModel:
+        """订单簿回放等成交模型按交易对加载数据，每个交易对一份（订单时间为K线开盘时间）"""
+        if symbol not in self._symbol_fill_models:
+            fill_model = copy.copy(self.fill_model)
+            fill_model.prepare(symbol, self.market.start, self.market.end, self.interval)
+            self._symbol_fill_models[symbol] = fill_model
+        return self._symbol_fill_models[symbol]
+    
+    def _fill_spot(self, symbol: str, side: str, quantity: float, fill_price: float) -> float:
+        base = self.get_symbol_meta(symbol).base_asset
+        notional = quantity * fill_price
+        if side == 'BUY':
+            cost = notional * (1 + self.commission)
+            if cost > self.balances.get('USDT', 0.0) + 1e-9:
+                self.logger.error(f"回放下单失败 {symbol}: 余额不足")
+                return 0.0
+            self.balances['USDT'] -= cost
+            self.balances[base] = self.balances.get(base, 0.0) + quantity
+        else:
+            if quantity > self.balances.get(base, 0.0) + 1e-12:
+                self.logger.error(f"回放下单失败 {symbol}: {base} 余额不足")
+                return 0.0
+            self.balances[base] -= quantity
+            self.balances['USDT'] = self.balances.get('USDT', 0.0) + notional * (1 - self.commission)
+        return quantity
+    
+    def _fill_futures(self, symbol: str, side: str, quantity: float, fill_price: float,
+                      position_side: str, reduce_only: bool) -> float:
+        key = (symbol, position_side if self.dual_side_position else 'BOTH')
+        pos = self.positions.get(key) or {
+            'symbol': symbol, 'positionSide': key[1], 'positionAmt': 0.0, 'entryPrice': 0.0
+        }
+        amount = pos['positionAmt']
+        delta = quantity if side == 'BUY' else -quantity
+        
+        if reduce_only and (amount == 0 or np.sign(delta) == np.sign(amount)):
+            self.logger.error(f"回放下单失败 {symbol}: reduceOnly订单会增加持仓")
+            return 0.0
+        if reduce_only:
+            delta = np.sign(delta) * min(abs(delta), abs(amount))
+            quantity = abs(delta)
+        
+        if amount == 0 or np.sign(delta) == np.sign(amount):
+            # 开仓/加仓：检查保证金
+            margin = quantity * fill_price / self.leverages.get(symbol, 1)
+            if margin > self.account_state.get_balance('USDT') + 1e-9:
+                self.logger.error(f"回放下单失败 {symbol}: 保证金不足")
+                return 0.0
+            new_amount = amount + delta
+            pos['entryPrice'] = (abs(amount) * pos['entryPrice'] + quantity * fill_price) / abs(new_amount)
+            pos['positionAmt'] = new_amount
+        else:
+            # 减仓/平仓（反向部分按新开仓处理）
+            closed = min(abs(delta), abs(amount))
+            self.wallet_balance += (fill_price - pos['entryPrice']) * closed * np.sign(amount)
+            new_amount = amount + delta
+            if abs(new_amount) < 1e-12:
+                new_amount = 0.0
+            elif np.sign(new_amount) != np.sign(amount):
+                pos['entryPrice'] = fill_price
+            pos['positionAmt'] = new_amount
+        
+        self.wallet_balance -= quantity * fill_price * self.commission
+        if pos['positionAmt'] == 0:
+            self.positions.pop(key, None)
+        else:
+            self.positions[key] = pos
+        return quantity
+    
+    def place_batch_orders(self, orders: List[Dict]) -> List[Optional[Dict]]:
+        return [self.place_order(**order) for order in orders]
+    
+    def get_order(self, symbol, order_id=None, client_order_id=None):
+        if client_order_id is not None:
+            return self.orders.get(client_order_id)
+        return next((o for o in self.orders.values() if o['orderId'] == order_id), None)
+    
+    def get_open_orders(self, symbol=None):
+        return []
+    
+    def cancel_order(self, symbol, order_id):
+        return None
+    
+    # ---------- 合约设置 ----------
+    
+    def get_position_mode(self, refresh: bool = False):
+        return self.dual_side_position if self.trading_mode == 'FUTURES' else None
+    
+    def set_position_mode(self, dual_side_position: bool = True):
+        self.dual_side_position = dual_side_position
+        return True
+    
+    def get_position_settings(self) -> Dict[str, Dict]:
+        return {
+            symbol: {'leverage': leverage, 'margin_type': self.margin_types.get(symbol, 'CROSSED')}
+            for symbol, leverage in self.leverages.items()
+        }
+    
+    def set_leverage(self, symbol: str, leverage: int, current_leverage: int = None):
+        self.leverages[symbol] = leverage
+        return True
+    
+    def set_margin_type(self, symbol: str, margin_type: str = 'ISOLATED', current_margin_type: str = None):
+        self.margin_types[symbol] = margin_type
+        return True
+
+
+@dataclass
+class ReplayReport:
+    """回放结果"""
+    cycles: int
+    start: pd.Timestamp
+    end: pd.Timestamp
+    initial_equity: float
+    final_equity: float
+    elapsed_seconds: float
+    equity_curve: pd.Series
+    fills: pd.DataFrame
+    order_results: List = field(default_factory=list)
+    profile: str = ''
+    
+    @property
+    def cycles_per_second(self) -> float:
+        return self.cycles / self.elapsed_seconds if self.elapsed_seconds > 0 else 0.0
+    
+    def summary(self) -> str:
+        total_return = self.final_equity / self.initial_equity - 1 if self.initial_equity else 0.0
+        return (
+            f"回放 {self.start} ~ {self.end}: {self.cycles} 个交易循环, 耗时 {self.elapsed_seconds:.1f} 秒 "
+            f"({self.cycles_per_second:.1f} 循环/秒), 成交 {len(self.fills)} 笔, "
+            f"权益 {self.initial_equity:,.2f} -> {self.final_equity:,.2f} ({total_return:.2%})"
+        )
+
+
+class ReplayHarness:
+    """
+    回放驱动：注册模拟客户端后创建真实的TradingEngine，按K线时间推进模拟时钟，
+    每根K线执行一次交易循环并等待订单执行队列处理完毕
+    
+    引擎写入的交易、持仓和权益快照使用单独的回放数据库，避免污染实盘数据库，时间戳为模拟时钟时间：
+    未指定database_url时每次运行使用新的临时SQLite文件，结束后删除；指定时运行前清空其中的表。
+    K线从当前配置的存储中读取
+    """
+    
+    def __init__(self, symbols: List[str], start, end, trading_mode: str = 'SPOT',
+                 enabled_strategies: List[str] = None, initial_balance: float = 10000.0,
+                 commission: float = 0.001, fill_model: FillModel = None, leverage: int = 10,
+                 interval: str = None, database_url: str = None,
+                 source=None):
+        self.symbols = symbols
+        self.start = pd.Timestamp(start)
+        self.end = pd.Timestamp(end)
+        self.trading_mode = trading_mode.upper()
+        self.enabled_strategies = enabled_strategies
+        self.initial_balance = initial_balance
+        self.commission = commission
+        self.fill_model = fill_model
+        self.leverage = leverage
+        self.interval = interval or Config().DEFAULT_TIMEFRAME
+        self.database_url = database_url
+        self.source = source
+        self.logger = logging.getLogger(__name__)
+        
+        self.clock = SimulatedClock(self.start)
+        self.market = None
+        self.client = None
+        self.engine = None
+    
+    def _setup(self):
+        from backend.client_manager import client_manager
+        
+        self.market = ReplayMarketData(self.clock, self.start, self.end, source=self.source)
+        self.client = ReplayBinanceClient(
+            self.market, self.trading_mode, self.initial_balance, self.commission,
+            self.fill_model, interval=self.interval
+        )
+        # 风险管理器固定读取现货客户端，回放时两种模式都指向同一个模拟账户
+        client_manager.clear_clients()
+        client_manager.register_client('SPOT', self.client)
+        client_manager.register_client('FUTURES', self.client)
+        
+        # 先从配置的存储读取全部回放数据，再把引擎的写入切换到回放数据库
+        timeline = self.market.timeline(self.symbols, self.interval)
+        for symbol in self.symbols:
+            self.market.load(symbol, '1d')
+        if len(timeline) == 0:
+            raise ValueError(f"回放区间 {self.start} ~ {self.end} 内没有 {self.interval} K线数据")
+        self.clock.advance_to(max(timeline[0], self.clock.now()))
+        
+        self._original_database_url = Config.DATABASE_URL
+        Config.DATABASE_URL = self._prepare_database()
+        database.set_clock(self.clock.utcnow)
+        
+        from backend.trading_engine import TradingEngine
+        self.engine = TradingEngine(
+            trading_mode=self.trading_mode,
+            leverage=self.leverage,
+            selected_symbols=self.symbols,
+            enabled_strategies=self.enabled_strategies,
+            start_data_collection=False
+        )
+        self.engine.data_collector = self.market
+        for risk_manager in (self.engine.risk_manager, self.engine.position_manager.risk_manager):
+            risk_manager.data_collector = self.market
+            risk_manager.clock = self.clock.time
+        return timeline
+    
+    def _prepare_database(self) -> str:
+        """准备本次回放的数据库，返回其URL（上一次回放的交易和持仓不会带入本次）"""
+        if self.database_url:
+            # 回放会清空该数据库中的全部表，不能指向实盘数据库
+            if _same_database(self.database_url, self._original_database_url):
+                raise ValueError(f"回放数据库不能与实盘数据库相同: {self.database_url}")
+            engine = database.get_engine(self.database_url)
+            database.Base.metadata.drop_all(engine)
+            database.Base.metadata.create_all(engine)
+            return self.database_url
+        
+        fd, self._temp_database = tempfile.mkstemp(prefix='replay_', suffix='.db')
+        os.close(fd)
+        return f"sqlite:///{self._temp_database}"
+    
+    def _teardown(self):
+        from backend.client_manager import client_manager
+        if self.engine is not None:
+            self.engine.stop_trading()
+        database.set_clock(None)
+        replay_url = Config.DATABASE_URL
+        Config.DATABASE_URL = getattr(self, '_original_database_url', Config.DATABASE_URL)
+        client_manager.clear_clients()
+        
+        temp_database = getattr(self, '_temp_database', None)
+        if temp_database:
+            database.dispose_engine(replay_url)
+            for path in (temp_database, temp_database + '-wal', temp_database + '-shm'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._temp_database = None
+    
+    def run(self, max_cycles: int = None, profile: bool = False, drain_timeout: float = 30.0) -> ReplayReport:
+        """
+        运行回放
+        
+        Args:
+            max_cycles: 最多执行的交易循环数
+            profile: 是否用cProfile剖析交易循环，结果放在ReplayReport.profile中
+            drain_timeout: 每个循环等待订单执行队列处理完毕的最长时间（秒）
+        """
+        profiler = cProfile.Profile() if profile else None
+        try:
+            timeline = self._setup()
+            if max_cycles is not None:
+                timeline = timeline[:max_cycles]
+            
+            initial_equity = self.client.equity()
+            equity = np.empty(len(timeline))
+            started = time.perf_counter()
+            
+            for i, timestamp in enumerate(timeline):
+                self.clock.advance_to(timestamp)
+                self.client.mark_to_market()
+                
+                if profiler:
+                    profiler.enable()
+                try:
+                    self.engine._execute_trading_cycle()
+                    if not self.engine.order_executor.drain(timeout=drain_timeout):
+                        self.logger.warning(f"{timestamp} 订单执行队列在{drain_timeout}秒内未处理完")
+                finally:
+                    if profiler:
+                        profiler.disable()
+                
+                equity[i] = self.client.equity()
+            
+            elapsed = time.perf_counter() - started
+            
+            profile_text = ''
+            if profiler:
+                stream = io.StringIO()
+                pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(30)
+                profile_text = stream.getvalue()
+            
+            report = ReplayReport(
+                cycles=len(timeline),
+                start=timeline[0],
+                end=timeline[-1],
+                initial_equity=initial_equity,
+                final_equity=float(equity[-1]) if len(equity) else initial_equity,
+                elapsed_seconds=elapsed,
+                equity_curve=pd.Series(equity, index=timeline),
+                fills=pd.DataFrame(self.client.fills),
+                order_results=self.engine.order_executor.get_recent_results(limit=500),
+                profile=profile_text
+            )
+            self.logger.info(report.summary())
+            return report
+        
+        finally:
+            self._teardown()
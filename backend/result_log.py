@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+优化结果日志
+每条回测结果以一行JSON追加写入日志文件（.jsonl），写入开销与已有结果数量无关；
+定期把日志合并进快照文件（JSON数组，每行一条记录）并清空日志。
+读取时逐行流式解析快照和日志，不需要一次性加载整个文件
+"""
+
+import os
+import json
+import logging
+from typing import Any, Dict, Iterator, Optional
+
+
+def _json_default(value):
+    """numpy标量等对象转换为JSON可序列化的值"""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def default_log_file(snapshot_file: str) -> str:
+    """快照文件对应的追加日志文件：optimization_results.json -> optimization_results.jsonl"""
+    root, _ = os.path.splitext(snapshot_file)
+    return root + '.jsonl'
+
+
+def _iter_snapshot(snapshot_file: str) -> Iterator[Dict[str, Any]]:
+    """流式读取快照；旧版本写出的缩进格式快照无法逐行解析时整体加载"""
+    with open(snapshot_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip().rstrip(',')
+            if line in ('', '[', ']', '[]'):
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            if not isinstance(record, dict):
+                break
+            yield record
+        else:
+            return
+    
+    with open(snapshot_file, 'r', encoding='utf-8') as f:
+        for record in json.load(f):
+            yield record
+
+
+def _iter_log(log_file: str) -> Iterator[Dict[str, Any]]:
+    with open(log_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # 进程中断时最后一行可能不完整
+                logging.getLogger(__name__).warning("跳过不完整的结果日志行")
+
+
+def iter_results(snapshot_file: str = 'optimization_results.json',
+                 log_file: str = None) -> Iterator[Dict[str, Any]]:
+    """
+    按写入顺序逐条读取所有优化结果（快照 + 尚未合并的日志）
+    
+    相同test_id的记录只返回一次（合并过程中断时快照和日志可能有重复）
+    """
+    log_file = log_file or default_log_file(snapshot_file)
+    seen = set()
+    for path, reader in ((snapshot_file, _iter_snapshot), (log_file, _iter_log)):
+        if not os.path.exists(path):
+            continue
+        for record in reader(path):
+            test_id = record.get('test_id')
+            if test_id is not None:
+                if test_id in seen:
+                    continue
+                seen.add(test_id)
+            yield record
+
+
+class ResultLog:
+    """追加写入的优化结果日志，定期合并为快照"""
+    
+    def __init__(self, snapshot_file: str = 'optimization_results.json', log_file: str = None,
+                 snapshot_every: int = 500):
+        """
+        Args:
+            snapshot_file: 快照文件（JSON数组）
+            log_file: 追加日志文件，默认与快照同名的.jsonl
+            snapshot_every: 每追加多少条结果合并一次快照，0表示只在手动调用compact时合并
+        """
+        self.snapshot_file = snapshot_file
+        self.log_file = log_file or default_log_file(snapshot_file)
+        self.snapshot_every = snapshot_every
+        self.logger = logging.getLogger(__name__)
+        self._file = None
+        self._pending = 0
+    
+    def append(self, record: Dict[str, Any]):
+        """追加一条结果"""
+        if self._file is None:
+            self._file = open(self.log_file, 'a', encoding='utf-8')
+        self._file.write(json.dumps(record, ensure_ascii=False, default=_json_default) + '\n')
+        self._file.flush()
+        self._pending += 1
+        
+        if self.snapshot_every and self._pending >= self.snapshot_every:
+            self.compact()
+    
+    def compact(self) -> Optional[int]:
+        """
+        把日志合并进快照：写入临时文件后原子替换快照，再清空日志
+        
+        Returns:
+            快照中的结果数量，失败时返回None
+        """
+        try:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            
+            temp_file = self.snapshot_file + '.tmp'
+            count = 0
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                f.write('[')
+                for record in iter_results(self.snapshot_file, self.log_file):
+                    f.write(',\n' if count else '\n')
+                    f.write(json.dumps(record, ensure_ascii=False, default=_json_default))
+                    count += 1
+                f.write('\n]\n')
+            os.replace(temp_file, self.snapshot_file)
+            
+            # 快照已包含日志中的全部记录
+            open(self.log_file, 'w', encoding='utf-8').close()
+            self._pending = 0
+            return count
+        
+        except Exception as e:
+            self.logger.error(f"合并优化结果快照失败: {e}")
+            return None
+    
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -3,7 +3,8 @@ import numpy as np
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 import logging
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, field
 from backend.database import DatabaseManager
 from backend.binance_client import BinanceClient
 
@@ -33,9 +34,77 @@ class PositionRisk:
     beta: float
     correlation: float
 
+@dataclass
+class RuleResult:
+    """单条交易前检查规则的结果"""
+    name: str
+    passed: bool
+    message: str = ''
+    elapsed_ms: float = 0.0
+
+@dataclass
+class PreTradeCheckResult:
+    """交易前检查结果（失败时记录失败规则，供日志直接复用）"""
+    symbol: str
+    quantity: float
+    price: float
+    passed: bool = True
+    message: str = '风险检查通过'
+    failed_rule: Optional[str] = None
+    portfolio_value: float = 0.0
+    rules: List[RuleResult] = field(default_factory=list)
+    
+    @property
+    def elapsed_ms(self) -> float:
+        return sum(rule.elapsed_ms for rule in self.rules)
+    
+    def timing_summary(self) -> str:
+        return ', '.join(f"{rule.name}={rule.elapsed_ms:.1f}ms" for rule in self.rules)
+
+class PreTradeContext:
+    """单次交易前检查的输入，按需计算且只计算一次"""
+    
+    def __init__(self, risk_manager: 'RiskManager', symbol: str, quantity: float, price: float,
+                 portfolio_value: Optional[float] = None):
+        self.risk_manager = risk_manager
+        self.symbol = symbol
+        self.quantity = quantity
+        self.price = price
+        self._portfolio_value = portfolio_value
+        self._volatility = None
+    
+    @property
+    def position_value(self) -> float:
+        return self.quantity * self.price
+    
+    @property
+    def portfolio_value(self) -> float:
+        if self._portfolio_value is None:
+            self._portfolio_value = self.risk_manager._get_portfolio_value()
+        return self._portfolio_value
+    
+    @property
+    def volatility(self) -> float:
+        if self._volatility is None:
+            self._volatility = self.risk_manager._calculate_volatility(self.symbol)
+        return self._volatility
+
 class RiskManager:
     """风险管理器"""
     
+    # 交易前检查规则，按计算成本从低到高排列，遇到第一条失败即停止
+    PRE_TRADE_RULES = [
+        ('position_weight', '_rule_position_weight'),   # 纯计算
+        ('daily_loss', '_rule_daily_loss'),             # 一次数据库聚合
+        ('projected_var', '_rule_projected_var'),       # 本地日线
+        ('liquidity', '_rule_liquidity'),               # 24小时行情（带缓存）
+        ('correlation', '_rule_correlation'),           # 每个持仓的日线收益率（带缓存）
+    ]
+    
+    # 交易前检查输入的缓存时间（秒）
+    RETURNS_CACHE_SECONDS = 300
+    TICKER_CACHE_SECONDS = 30
+    
     def __init__(self):
         self.db_manager = DatabaseManager()
         # 使用客户端管理器避免重复初始化
@@ -53,6 +122,29 @@ class RiskManager:
         # 相关性阈值
         self.max_correlation = 0.8      # 最大相关性0.8
         
+        # 交易前检查输入缓存 {key: (时间, 值)}
+        self._returns_cache: Dict[str, Tuple[float, pd.Series]] = {}
+        self._ticker_cache: Dict[str, Tuple[float, Dict]] = {}
+        
+        # 时间来源（回放时替换为模拟时钟）和K线数据来源（首次使用时创建）
+        self.clock = time.time
+        self._data_collector = None
+    
+    @property
+    def data_collector(self):
+        """读取本地K线的DataCollector（回放时替换为回放数据源）"""
+        if self._data_collector is None:
+            from backend.data_collector import DataCollector
+            self._data_collector = DataCollector()
+        return self._data_collector
+    
+    @data_collector.setter
+    def data_collector(self, value):
+        self._data_collector = value
+    
+    def _utcnow(self) -> datetime:
+        return datetime.utcfromtimestamp(self.clock())
+        
     def check_available_balance(self, symbol: str, quantity: float, price: float) -> bool:
         """检查可用余额是否足够"""
         try:
@@ -234,44 +326,77 @@ class RiskManager:
             self.logger.error(f"计算仓位大小失败: {e}")
             return 0.0
     
-    def check_risk_limits(self, symbol: str, quantity: float, price: float) -> Tuple[bool, str]:
+    def check_risk_limits(self, symbol: str, quantity: float, price: float,
+                          portfolio_value: Optional[float] = None) -> Tuple[bool, str]:
         """检查风险限制"""
-        try:
-            portfolio_value = self._get_portfolio_value()
-            position_value = quantity * price
-            
-            # 检查单个资产权重限制
-            weight = position_value / portfolio_value if portfolio_value > 0 else 0
-            if weight > self.max_position_weight:
-                return False, f"超过单个资产最大权重限制 {self.max_position_weight:.1%}"
-            
-            # 检查流动性
-            if not self._check_liquidity(symbol, quantity):
-                return False, "流动性不足"
-            
-            # 检查相关性
-            if not self._check_correlation_limit(symbol):
-                return False, "与现有持仓相关性过高"
-            
-            # 检查VaR限制 - 暂时放宽限制
-            projected_var = self._calculate_projected_var(symbol, quantity, price)
-            portfolio_value = self._get_portfolio_value()
-            var_limit = self.max_portfolio_var * portfolio_value
-            
-            # 如果是测试网络或初始阶段，放宽VaR限制
-            if projected_var > var_limit * 3:  # 放宽3倍限制
-                return False, f"超过投资组合VaR限制 {var_limit * 3:.2f}"
-            
-            # 检查日损失限制
-            current_daily_loss = self._get_current_daily_loss()
-            if current_daily_loss > self.max_daily_loss:
-                return False, f"超过日损失限制 {self.max_daily_loss:.1%}"
-            
-            return True, "风险检查通过"
-            
-        except Exception as e:
-            self.logger.error(f"风险检查失败: {e}")
-            return False, f"风险检查错误: {str(e)}"
+        result = self.run_pre_trade_checks(symbol, quantity, price, portfolio_value)
+        return result.passed, result.message
+    
+    def run_pre_trade_checks(self, symbol: str, quantity: float, price: float,
+                             portfolio_value: Optional[float] = None) -> PreTradeCheckResult:
+        """
+        交易前检查流水线
+        
+        输入（投资组合价值、波动率等）只计算一次，规则按成本从低到高执行，
+        第一条失败即返回，结果中包含每条规则的耗时
+        
+        Args:
+            portfolio_value: 调用方已计算的投资组合价值，传入可避免重复查询
+        """
+        context = PreTradeContext(self, symbol, quantity, price, portfolio_value)
+        result = PreTradeCheckResult(symbol=symbol, quantity=quantity, price=price)
+        
+        for name, method_name in self.PRE_TRADE_RULES:
+            start = time.perf_counter()
+            try:
+                passed, message = getattr(self, method_name)(context)
+            except Exception as e:
+                self.logger.error(f"风险检查失败: {e}")
+                passed, message = False, f"风险检查错误: {str(e)}"
+            result.rules.append(RuleResult(name, passed, message, (time.perf_counter() - start) * 1000))
+            
+            if not passed:
+                result.passed = False
+                result.message = message
+                result.failed_rule = name
+                break
+        
+        result.portfolio_value = context._portfolio_value or 0.0
+        return result
+    
+    def _rule_position_weight(self, context: PreTradeContext) -> Tuple[bool, str]:
+        """单个资产权重限制"""
+        portfolio_value = context.portfolio_value
+        weight = context.position_value / portfolio_value if portfolio_value > 0 else 0
+        if weight > self.max_position_weight:
+            return False, f"超过单个资产最大权重限制 {self.max_position_weight:.1%}"
+        return True, ''
+    
+    def _rule_daily_loss(self, context: PreTradeContext) -> Tuple[bool, str]:
+        """日损失限制"""
+        if self._get_current_daily_loss(context.portfolio_value) > self.max_daily_loss:
+            return False, f"超过日损失限制 {self.max_daily_loss:.1%}"
+        return True, ''
+    
+    def _rule_projected_var(self, context: PreTradeContext) -> Tuple[bool, str]:
+        """VaR限制（测试网络或初始阶段放宽3倍）"""
+        projected_var = self._calculate_projected_var(
+            context.symbol, context.quantity, context.price, volatility=context.volatility
+        )
+        var_limit = self.max_portfolio_var * context.portfolio_value
+        if projected_var > var_limit * 3:
+            return False, f"超过投资组合VaR限制 {var_limit * 3:.2f}"
+        return True, ''
+    
+    def _rule_liquidity(self, context: PreTradeContext) -> Tuple[bool, str]:
+        if not self._check_liquidity(context.symbol, context.quantity, context.price):
+            return False, "流动性不足"
+        return True, ''
+    
+    def _rule_correlation(self, context: PreTradeContext) -> Tuple[bool, str]:
+        if not self._check_correlation_limit(context.symbol):
+            return False, "与现有持仓相关性过高"
+        return True, ''
     
     def calculate_stop_loss(self, symbol: str, entry_price: float, 
                           position_size: float, method: str = 'atr') -> float:
@@ -343,26 +468,26 @@ class RiskManager:
             # 获取投资组合价值
             portfolio_value = self._get_portfolio_value()
             
-            # 计算日收益率
-            daily_returns = self._get_portfolio_daily_returns()
+            # 从每日权益汇总计算日收益率
+            daily_equity = self.db_manager.get_daily_equity(days=100)
+            daily_returns = self._get_portfolio_daily_returns(daily_equity)
             
             if len(daily_returns) < 2:
                 return RiskMetrics(portfolio_value, 0, 0, 0, 0, 0, 0, 0, 0, 0)
             
             # 计算风险指标
-            daily_pnl = daily_returns.iloc[-1] if len(daily_returns) > 0 else 0
-            daily_return = daily_pnl / portfolio_value if portfolio_value > 0 else 0
+            latest = daily_equity[-1]
+            previous_close = daily_equity[-2].close_value
+            daily_pnl = latest.close_value - previous_close
+            daily_return = daily_returns.iloc[-1]
             volatility = daily_returns.std() * np.sqrt(252)  # 年化波动率
             
-            # VaR计算
-            var_95 = np.percentile(daily_returns, 5)
-            var_99 = np.percentile(daily_returns, 1)
+            # VaR计算（金额）
+            var_95 = np.percentile(daily_returns, 5) * portfolio_value
+            var_99 = np.percentile(daily_returns, 1) * portfolio_value
             
-            # 最大回撤
-            cumulative_returns = (1 + daily_returns).cumprod()
-            peak = cumulative_returns.expanding().max()
-            drawdown = (cumulative_returns - peak) / peak
-            max_drawdown = drawdown.min()
+            # 最大回撤 - 基于每日汇总中维护的历史峰值（峰值必须出现在低点之前）
+            max_drawdown = self._max_drawdown_from_daily(daily_equity)
             
             # 夏普比率
             risk_free_rate = 0.02 / 252  # 日无风险利率
@@ -553,30 +678,60 @@ Beta (vs BTC): {portfolio_risk.beta:.2f}
     # 辅助方法
     def _get_portfolio_value(self) -> float:
         """获取投资组合总价值"""
+        return self._get_portfolio_breakdown()['total_value']
+    
+    def _get_portfolio_breakdown(self) -> Dict[str, float]:
+        """获取投资组合价值构成"""
+        breakdown = {
+            'total_value': 0.0,
+            'cash_balance': 0.0,
+            'positions_value': 0.0,
+            'unrealized_pnl': 0.0
+        }
         try:
             positions = self.db_manager.get_positions()
-            total_value = 0
             
             for position in positions:
                 current_price = self.binance_client.get_ticker_price(position.symbol)
                 if current_price:
-                    total_value += position.quantity * current_price
+                    breakdown['positions_value'] += position.quantity * current_price
+                    breakdown['unrealized_pnl'] += (current_price - position.avg_price) * position.quantity
             
             # 加上现金余额
-            cash_balance = self.binance_client.get_balance('USDT')
-            total_value += cash_balance
+            breakdown['cash_balance'] = self.binance_client.get_balance('USDT')
+            breakdown['total_value'] = breakdown['positions_value'] + breakdown['cash_balance']
             
-            return total_value
+            return breakdown
             
         except Exception as e:
             self.logger.error(f"获取投资组合价值失败: {e}")
-            return 0.0
+            return breakdown
+    
+    def record_equity_snapshot(self) -> Optional[float]:
+        """记录当前权益快照（每个交易循环调用一次）"""
+        try:
+            breakdown = self._get_portfolio_breakdown()
+            if breakdown['total_value'] <= 0:
+                return None
+            
+            self.db_manager.record_equity_snapshot(
+                total_value=breakdown['total_value'],
+                cash_balance=breakdown['cash_balance'],
+                positions_value=breakdown['positions_value'],
+                unrealized_pnl=breakdown['unrealized_pnl'],
+                timestamp=self._utcnow()
+            )
+            return breakdown['total_value']
+            
+        except Exception as e:
+            self.logger.error(f"记录权益快照失败: {e}")
+            self.db_manager.session.rollback()
+            return None
     
     def _calculate_volatility(self, symbol: str, days: int = 30) -> float:
         """计算资产波动率"""
         try:
-            from backend.data_collector import DataCollector
-            data_collector = DataCollector()
+            data_collector = self.data_collector
             data = data_collector.get_market_data(symbol, '1d', limit=days)
             
             if len(data) < 2:
@@ -653,15 +808,20 @@ Beta (vs BTC): {portfolio_risk.beta:.2f}
         
         return self.max_position_weight * volatility_adjustment
     
-    def _check_liquidity(self, symbol: str, quantity: float) -> bool:
+    def _check_liquidity(self, symbol: str, quantity: float, price: Optional[float] = None) -> bool:
         """检查流动性"""
         try:
-            # 获取24小时成交量
-            ticker = self.binance_client.client.get_ticker(symbol=symbol)
+            # 获取24小时成交量（短时间内复用）
+            cached = self._ticker_cache.get(symbol)
+            if cached and self.clock() - cached[0] < self.TICKER_CACHE_SECONDS:
+                ticker = cached[1]
+            else:
+                ticker = self.binance_client.throttled_call(self.binance_client.client.get_ticker, symbol=symbol)
+                self._ticker_cache[symbol] = (self.clock(), ticker)
             volume_24h = float(ticker['volume'])
             
             # 检查交易量是否足够
-            current_price = self.binance_client.get_ticker_price(symbol)
+            current_price = price or float(ticker['lastPrice'])
             trade_value = quantity * current_price
             
             # 交易量不应超过24小时成交量的1%
@@ -703,11 +863,13 @@ Beta (vs BTC): {portfolio_risk.beta:.2f}
             self.logger.error(f"检查相关性失败: {e}")
             return True
     
-    def _calculate_projected_var(self, symbol: str, quantity: float, price: float) -> float:
+    def _calculate_projected_var(self, symbol: str, quantity: float, price: float,
+                                 volatility: Optional[float] = None) -> float:
         """计算预期VaR"""
         try:
             # 简化计算：基于历史波动率
-            volatility = self._calculate_volatility(symbol)
+            if volatility is None:
+                volatility = self._calculate_volatility(symbol)
             position_value = quantity * price
             
             # 95% VaR = 1.65 * 波动率 * 头寸价值
@@ -719,17 +881,27 @@ Beta (vs BTC): {portfolio_risk.beta:.2f}
             self.logger.error(f"计算预期VaR失败: {e}")
             return 0.0
     
-    def _get_current_daily_loss(self) -> float:
-        """获取当前日损失"""
+    def _get_current_daily_loss(self, portfolio_value: Optional[float] = None) -> float:
+        """获取当前日损失（基于当日权益汇总）"""
         try:
-            from backend.database import Trade
-            today = datetime.now().date()
-            trades_today = self.db_manager.session.query(Trade).filter(
-                Trade.timestamp >= today
-            ).all()
+            today = self.db_manager.get_daily_equity_for(self._utcnow().date())
+            if today and today.open_value > 0:
+                # 当日开盘权益到当前权益的回落比例
+                loss = (today.open_value - today.close_value) / today.open_value
+                return max(loss, 0.0)
             
-            total_loss = sum(t.profit_loss for t in trades_today if t.profit_loss < 0)
-            portfolio_value = self._get_portfolio_value()
+            # 尚无当日快照时回退到交易记录
+            from backend.database import Trade
+            from sqlalchemy import func
+            start_of_day = self._utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+            total_loss = self.db_manager.session.query(
+                func.coalesce(func.sum(Trade.profit_loss), 0.0)
+            ).filter(
+                Trade.timestamp >= start_of_day,
+                Trade.profit_loss < 0
+            ).scalar()
+            if portfolio_value is None:
+                portfolio_value = self._get_portfolio_value()
             
             return abs(total_loss) / portfolio_value if portfolio_value > 0 else 0
             
@@ -740,8 +912,7 @@ Beta (vs BTC): {portfolio_risk.beta:.2f}
     def _get_atr(self, symbol: str, period: int = 14) -> float:
         """获取ATR指标"""
         try:
-            from backend.data_collector import DataCollector
-            data_collector = DataCollector()
+            data_collector = self.data_collector
             indicators = data_collector.get_technical_indicators(symbol, limit=period + 5)
             
             if not indicators.empty and 'atr' in indicators.columns:
@@ -768,8 +939,7 @@ Beta (vs BTC): {portfolio_risk.beta:.2f}
     def _find_support_level(self, symbol: str) -> float:
         """寻找支撑位"""
         try:
-            from backend.data_collector import DataCollector
-            data_collector = DataCollector()
+            data_collector = self.data_collector
             data = data_collector.get_market_data(symbol, '1d', limit=50)
             
             if len(data) < 10:
@@ -786,8 +956,7 @@ Beta (vs BTC): {portfolio_risk.beta:.2f}
     def _find_resistance_level(self, symbol: str) -> float:
         """寻找阻力位"""
         try:
-            from backend.data_collector import DataCollector
-            data_collector = DataCollector()
+            data_collector = self.data_collector
             data = data_collector.get_market_data(symbol, '1d', limit=50)
             
             if len(data) < 10:
@@ -801,38 +970,72 @@ Beta (vs BTC): {portfolio_risk.beta:.2f}
             self.logger.error(f"寻找阻力位失败: {e}")
             return 0
     
-    def _get_portfolio_daily_returns(self) -> pd.Series:
-        """获取投资组合日收益率"""
+    def _max_drawdown_from_daily(self, daily_equity: List) -> float:
+        """
+        由每日权益汇总计算最大回撤
+        
+        当日最高值低于历史峰值时，峰值一定出现在当日之前，回撤 = (当日最低 - 峰值) / 峰值；
+        当日创出（或持平）新高时，高点可能出现在低点之后，按时间顺序读取当日的权益快照，
+        以截至前一日的峰值为起点逐个计算回撤
+        """
+        max_drawdown = 0.0
+        for i, row in enumerate(daily_equity):
+            if row.peak_value <= 0:
+                continue
+            if row.high_value < row.peak_value:
+                max_drawdown = min(max_drawdown, (row.low_value - row.peak_value) / row.peak_value)
+                continue
+            
+            if i > 0:
+                previous_peak = daily_equity[i - 1].peak_value
+            else:
+                previous = self.db_manager.get_daily_equity(days=1, end_date=row.date - timedelta(days=1))
+                previous_peak = previous[-1].peak_value if previous else 0.0
+            max_drawdown = min(max_drawdown, self._intraday_drawdown(row, previous_peak))
+        return max_drawdown
+    
+    def _intraday_drawdown(self, row, previous_peak: float) -> float:
+        """按时间顺序用当日权益快照计算回撤，快照已清理时只计算相对前一日峰值的回撤"""
+        day_start = datetime.combine(row.date, datetime.min.time())
+        snapshots = self.db_manager.get_equity_snapshots(
+            start=day_start, end=day_start + timedelta(days=1) - timedelta(microseconds=1)
+        )
+        if not snapshots:
+            return (row.low_value - previous_peak) / previous_peak if previous_peak > 0 else 0.0
+        
+        peak = previous_peak
+        drawdown = 0.0
+        for snapshot in snapshots:
+            peak = max(peak, snapshot.total_value)
+            if peak > 0:
+                drawdown = min(drawdown, (snapshot.total_value - peak) / peak)
+        return drawdown
+    
+    def _get_portfolio_daily_returns(self, daily_equity: List = None) -> pd.Series:
+        """获取投资组合日收益率（基于每日权益汇总）"""
         try:
-            # 这里需要实现投资组合历史价值的计算
-            # 简化实现：基于交易记录计算
-            trades = self.db_manager.get_trades(limit=100)
+            if daily_equity is None:
+                daily_equity = self.db_manager.get_daily_equity(days=100)
             
-            if not trades:
-                return pd.Series()
-            
-            # 按日期分组计算日收益
-            daily_pnl = {}
-            for trade in trades:
-                date = trade.timestamp.date()
-                if date not in daily_pnl:
-                    daily_pnl[date] = 0
-                daily_pnl[date] += trade.profit_loss
+            if len(daily_equity) < 2:
+                return pd.Series(dtype=float)
             
-            dates = sorted(daily_pnl.keys())
-            returns = [daily_pnl[date] for date in dates]
+            closes = pd.Series(
+                [row.close_value for row in daily_equity],
+                index=[row.date for row in daily_equity],
+                dtype=float
+            )
             
-            return pd.Series(returns, index=dates)
+            return closes.pct_change().dropna()
             
         except Exception as e:
             self.logger.error(f"获取投资组合日收益率失败: {e}")
-            return pd.Series()
+            return pd.Series(dtype=float)
     
     def _get_btc_returns(self) -> pd.Series:
         """获取BTC收益率"""
         try:
-            from backend.data_collector import DataCollector
-            data_collector = DataCollector()
+            data_collector = self.data_collector
             data = data_collector.get_market_data('BTCUSDT', '1d', limit=100)
             
             if data.empty:
@@ -848,10 +1051,20 @@ Beta (vs BTC): {portfolio_risk.beta:.2f}
             return pd.Series()
     
     def _get_asset_returns(self, symbol: str) -> pd.Series:
-        """获取资产收益率"""
+        """获取资产收益率（日线收益率变化慢，短时间内复用）"""
+        cached = self._returns_cache.get(symbol)
+        if cached and self.clock() - cached[0] < self.RETURNS_CACHE_SECONDS:
+            return cached[1]
+        
+        returns = self._load_asset_returns(symbol)
+        if not returns.empty:
+            self._returns_cache[symbol] = (self.clock(), returns)
+        return returns
+    
+    def _load_asset_returns(self, symbol: str) -> pd.Series:
+        """从本地日线数据计算资产收益率"""
         try:
-            from backend.data_collector import DataCollector
-            data_collector = DataCollector()
+            data_collector = self.data_collector
             data = data_collector.get_market_data(symbol, '1d', limit=100)
             
             if data.empty:
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+共享内存K线数据
+参数优化时每个交易对的K线和技术指标只加载、计算一次，发布到共享内存中；
+工作进程按描述信息（SharedFrameSpec）直接映射同一块内存，得到零拷贝的只读DataFrame。
+float64列（价格、指标）存为一个二维块，其余定长列（时间戳、整数）各占一段；
+时间列统一存为int64纳秒，带时区的列按UTC存储，映射时还原时区；
+字符串、分类等列按分类编码存储（类别放在描述信息中），工作进程得到与原DataFrame相同的列
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+import numpy as np
+import pandas as pd
+
+try:
+    from multiprocessing import shared_memory
+    SHARED_MEMORY_AVAILABLE = True
+except ImportError:
+    shared_memory = None
+    SHARED_MEMORY_AVAILABLE = False
+
+# 各段按8字节对齐
+ALIGNMENT = 8
+
+# 工作进程中已映射的共享内存 {名称: SharedMemory}，对象必须保持引用，否则内存视图失效
+_attached: Dict[str, 'shared_memory.SharedMemory'] = {}
+# 工作进程中已构建的DataFrame {名称: DataFrame}，每个回测直接复用
+_frames: Dict[str, pd.DataFrame] = {}
+
+
+@dataclass
+class SharedFrameSpec:
+    """共享内存中一个DataFrame的布局（可pickle，传给工作进程）"""
+    shm_name: str
+    length: int
+    float_columns: List[str]
+    # (列名, dtype字符串, 字节偏移)
+    other_columns: List[Tuple[str, str, int]] = field(default_factory=list)
+    # 带时区的时间列 {列名: 时区名}
+    timezones: Dict[str, str] = field(default_factory=dict)
+    # 分类编码的列 {列名: (类别列表, 原dtype字符串)}
+    categories: Dict[str, Tuple[list, str]] = field(default_factory=dict)
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _open_shared_memory(name: str):
+    """映射已存在的共享内存；Python 3.13+ 不注册到resource_tracker，避免工作进程退出时误删"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def attach_frame(spec: SharedFrameSpec) -> pd.DataFrame:
+    """按布局把共享内存映射为只读DataFrame（float64列不拷贝，同一进程内只构建一次）"""
+    if spec.shm_name in _frames:
+        return _frames[spec.shm_name]
+    
+    shm = _attached.get(spec.shm_name)
+    if shm is None:
+        shm = _open_shared_memory(spec.shm_name)
+        _attached[spec.shm_name] = shm
+    
+    floats = np.ndarray((len(spec.float_columns), spec.length), dtype=np.float64, buffer=shm.buf)
+    floats.flags.writeable = False
+    # (列数, 行数)的C连续数组转置后正好是pandas内部的块布局，copy=False时不会复制
+    frame = pd.DataFrame(floats.T, columns=spec.float_columns, copy=False)
+    
+    for name, dtype, offset in spec.other_columns:
+        column = np.ndarray(spec.length, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+        column.flags.writeable = False
+        if name in spec.timezones:
+            frame[name] = pd.DatetimeIndex(column).tz_localize('UTC').tz_convert(spec.timezones[name])
+        elif name in spec.categories:
+            values, dtype = spec.categories[name]
+            decoded = pd.Series(pd.Categorical.from_codes(column, categories=values), index=frame.index)
+            frame[name] = decoded if dtype == 'category' else decoded.astype(dtype)
+        else:
+            frame[name] = column
+    _frames[spec.shm_name] = frame
+    return frame
+
+
+def _fixed_width_column(series: pd.Series):
+    """
+    把一列转换为可以放进共享内存的定长numpy数组
+    
+    Returns:
+        (数组, 时区名)；时间列转为datetime64[ns]（即int64纳秒），带时区的按UTC转换；
+        不支持的列返回(None, None)
+    """
+    dtype = series.dtype
+    if isinstance(dtype, pd.DatetimeTZDtype):
+        values = series.dt.tz_convert('UTC').dt.tz_localize(None).dt.as_unit('ns')
+        return values.to_numpy(), str(dtype.tz)
+    if isinstance(dtype, np.dtype) and dtype.kind == 'M':
+        return series.dt.as_unit('ns').to_numpy(), None
+    if isinstance(dtype, np.dtype) and dtype.kind in 'iub':
+        return series.to_numpy(), None
+    return None, None
+
+
+def _encode_categorical(series: pd.Series) -> Tuple[np.ndarray, list, str]:
+    """
+    非定长列按分类编码
+    
+    Returns:
+        (int32编码，缺失值为-1, 类别列表, 原dtype字符串)
+    
+    Raises:
+        ValueError: 列中的值无法编码（如不可哈希的对象）
+    """
+    try:
+        categorical = series.astype('category').array
+    except TypeError as e:
+        raise ValueError(f"列 {series.name} ({series.dtype}) 无法发布到共享内存: {e}")
+    dtype = 'category' if isinstance(series.dtype, pd.CategoricalDtype) else str(series.dtype)
+    return categorical.codes.astype('<i4'), list(categorical.categories), dtype
+
+
+def detach_all():
+    """关闭当前进程中映射的共享内存（不删除）"""
+    _frames.clear()
+    for shm in _attached.values():
+        try:
+            shm.close()
+        except Exception:
+            pass
+    _attached.clear()
+
+
+class SharedMarketData:
+    """在主进程中发布K线数据到共享内存，并负责释放"""
+    
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._blocks: Dict[str, 'shared_memory.SharedMemory'] = {}
+        self._specs: Dict[str, SharedFrameSpec] = {}
+    
+    def publish(self, key: str, data: pd.DataFrame) -> SharedFrameSpec:
+        """
+        把DataFrame复制到一块共享内存中（每个key只发布一次）
+        
+        时间列（含带时区的列）转为int64纳秒存储；非定长列（字符串、分类等）按分类编码存储
+        
+        Raises:
+            ValueError: 有无法编码的列（调用方应改为在主进程中回测）
+        """
+        if key in self._specs:
+            return self._specs[key]
+        if not SHARED_MEMORY_AVAILABLE:
+            raise RuntimeError("当前Python不支持multiprocessing.shared_memory")
+        
+        length = len(data)
+        float_columns, other_columns, timezones, categories = [], {}, {}, {}
+        for name in data.columns:
+            dtype = data[name].dtype
+            if dtype == np.float64:
+                float_columns.append(name)
+                continue
+            values, tz = _fixed_width_column(data[name])
+            if values is None:
+                values, labels, original_dtype = _encode_categorical(data[name])
+                categories[name] = (labels, original_dtype)
+            other_columns[name] = values
+            if tz is not None:
+                timezones[name] = tz
+        
+        offset = _align(len(float_columns) * length * 8)
+        layout = []
+        for name, values in other_columns.items():
+            layout.append((name, values.dtype.str, offset))
+            offset = _align(offset + length * values.dtype.itemsize)
+        
+        shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        floats = np.ndarray((len(float_columns), length), dtype=np.float64, buffer=shm.buf)
+        for i, name in enumerate(float_columns):
+            floats[i] = data[name].to_numpy()
+        for name, dtype, column_offset in layout:
+            column = np.ndarray(length, dtype=np.dtype(dtype), buffer=shm.buf, offset=column_offset)
+            column[:] = other_columns[name]
+        
+        spec = SharedFrameSpec(shm.name, length, float_columns, layout, timezones, categories)
+        self._blocks[key] = shm
+        self._specs[key] = spec
+        self.logger.info(f"{key} 已发布到共享内存: {length} 行, {offset / 1024 / 1024:.1f} MB")
+        return spec
+    
+    def get_spec(self, key: str) -> SharedFrameSpec:
+        return self._specs.get(key)
+    
+    def close(self):
+        """释放所有共享内存"""
+        for key, shm in self._blocks.items():
+            try:
+                shm.close()
+                shm.unlink()
+            except Exception as e:
+                self.logger.warning(f"释放共享内存失败 {key}: {e}")
+        self._blocks.clear()
+        self._specs.clear()
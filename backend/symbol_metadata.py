@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+交易对元数据索引
+从交易所信息中预先解析每个交易对的步长、最小价格变动、最小名义价值和精度，
+按交易对名称建立字典索引，并保存到磁盘以便启动时直接加载
+"""
+
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, asdict
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+
+
+@dataclass
+class SymbolMeta:
+    """单个交易对的交易规则"""
+    symbol: str
+    status: str
+    base_asset: str = ''
+    quote_asset: str = ''
+    step_size: float = 0.0
+    min_qty: float = 0.0
+    max_qty: float = float('inf')
+    tick_size: float = 0.0
+    min_price: float = 0.0
+    max_price: float = float('inf')
+    min_notional: float = 0.0
+    quantity_precision: int = 6
+    price_precision: int = 2
+    
+    @property
+    def is_trading(self) -> bool:
+        return self.status == 'TRADING'
+
+
+def decimal_places(value) -> int:
+    """计算步长的小数位数（正确处理科学计数法和尾部0）"""
+    text = f"{Decimal(str(value)):.10f}".rstrip('0').rstrip('.')
+    return len(text.split('.')[-1]) if '.' in text else 0
+
+
+def format_decimal(value, precision: int = None) -> str:
+    """把数量/价格格式化为定点小数字符串（不会出现1e-05这样的科学计数法）"""
+    value = Decimal(str(value))
+    if precision is None:
+        return f"{value:f}"
+    return f"{value:.{precision}f}"
+
+
+def build_symbol_meta(symbol_info: Dict) -> SymbolMeta:
+    """从exchange_info中的单个交易对解析元数据"""
+    meta = SymbolMeta(
+        symbol=symbol_info['symbol'],
+        status=symbol_info.get('status', ''),
+        base_asset=symbol_info.get('baseAsset', ''),
+        quote_asset=symbol_info.get('quoteAsset', '')
+    )
+    
+    for f in symbol_info.get('filters', []):
+        filter_type = f.get('filterType')
+        if filter_type == 'LOT_SIZE':
+            meta.step_size = float(f['stepSize'])
+            meta.min_qty = float(f['minQty'])
+            meta.max_qty = float(f.get('maxQty', float('inf')))
+            meta.quantity_precision = decimal_places(f['stepSize'])
+        elif filter_type == 'PRICE_FILTER':
+            meta.tick_size = float(f['tickSize'])
+            meta.min_price = float(f.get('minPrice', 0))
+            meta.max_price = float(f.get('maxPrice', 0)) or float('inf')
+            meta.price_precision = decimal_places(f['tickSize'])
+        elif filter_type in ('MIN_NOTIONAL', 'NOTIONAL'):
+            # 现货为minNotional，合约为notional
+            meta.min_notional = float(f.get('minNotional', f.get('notional', 0)))
+    
+    return meta
+
+
+def build_symbol_index(exchange_info: Dict) -> Dict[str, SymbolMeta]:
+    """为exchange_info中所有交易对建立索引"""
+    if not exchange_info or 'symbols' not in exchange_info:
+        return {}
+    return {s['symbol']: build_symbol_meta(s) for s in exchange_info['symbols']}
+
+
+def save_symbol_index(index: Dict[str, SymbolMeta], path: str):
+    """保存索引到磁盘（先写临时文件再替换）"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    payload = {
+        'saved_at': time.time(),
+        'symbols': [asdict(meta) for meta in index.values()]
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+
+def load_symbol_index(path: str) -> Optional[Tuple[Dict[str, SymbolMeta], float]]:
+    """
+    从磁盘加载索引
+    
+    Returns:
+        (索引, 保存时间)；文件不存在或损坏时返回None
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+        index = {item['symbol']: SymbolMeta(**item) for item in payload['symbols']}
+        return index, float(payload.get('saved_at', 0))
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"加载交易对元数据缓存失败: {e}")
+        return None
@@ -2,13 +2,15 @@ import logging
 import time
 import asyncio
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Dict, List
 from backend.binance_client import BinanceClient
 from backend.database import DatabaseManager
 from backend.data_collector import DataCollector
-from backend.risk_manager import RiskManager
+from backend.risk_manager import RiskManager, PreTradeCheckResult
 from backend.position_manager import PositionManager
+from backend.order_executor import OrderExecutor, OrderIntent, OrderResult
 from strategies.ma_strategy import MovingAverageStrategy
 from strategies.rsi_strategy import RSIStrategy
 from strategies.ml_strategy import MLStrategy, LSTMStrategy
@@ -18,7 +20,8 @@ from config.config import Config
 class TradingEngine:
     """增强版交易引擎 - 支持现货和合约交易"""
     
-    def __init__(self, trading_mode='SPOT', leverage=10, selected_symbols=None, enabled_strategies=None):
+    def __init__(self, trading_mode='SPOT', leverage=10, selected_symbols=None, enabled_strategies=None,
+                 start_data_collection=True):
         """
         初始化交易引擎
         
@@ -27,6 +30,7 @@ class TradingEngine:
             leverage: 合约交易杠杆倍数 (仅合约模式有效)
             selected_symbols: 用户选择的币种列表，如果为None则使用默认配置
             enabled_strategies: 启用的策略列表，如果为None则使用所有策略
+            start_data_collection: 是否启动后台实时数据收集（回放模式为False）
         """
         self.config = Config()
         self.trading_mode = trading_mode.upper()
@@ -43,6 +47,16 @@ class TradingEngine:
         self.data_collector = DataCollector()
         self.risk_manager = RiskManager()
         self.position_manager = PositionManager(trading_mode=self.trading_mode)
+        # 订单执行队列：策略循环只提交意图，由后台线程下单并跟踪成交
+        self.order_executor = OrderExecutor(self.binance_client)
+        # 用户数据流：余额、持仓和成交实时推送，启动失败时回退到REST轮询
+        self.user_stream = client_manager.get_user_data_stream(self.trading_mode)
+        if self.user_stream:
+            self.order_executor.attach_user_stream(self.user_stream)
+        # 本地订单簿：流动性检查直接读取，不再每次请求订单簿接口
+        self.order_books = client_manager.get_order_book_manager(self.trading_mode)
+        if self.order_books:
+            self.order_books.track(self.selected_symbols)
         
         self.strategies = {}
         self.is_running = False
@@ -62,7 +76,8 @@ class TradingEngine:
         self._initialize_strategies()
         
         # 启动数据收集
-        self._start_data_collection()
+        if start_data_collection:
+            self._start_data_collection()
     
     def _initialize_futures_settings(self):
         """初始化合约交易设置"""
@@ -70,14 +85,22 @@ class TradingEngine:
             # 设置持仓模式为双向持仓
             self.binance_client.set_position_mode(dual_side_position=True)
             
-            # 只为用户选择的币种设置合约参数
-            for symbol in self.selected_symbols:
+            # 一次性获取当前杠杆和保证金模式，已是目标设置的交易对不再调用接口
+            current_settings = self.binance_client.get_position_settings()
+            
+            def configure_symbol(symbol):
                 try:
+                    current = current_settings.get(symbol, {})
+                    
                     # 设置保证金模式为逐仓（静默处理已设置的情况）
-                    margin_result = self.binance_client.set_margin_type(symbol, 'ISOLATED')
+                    margin_result = self.binance_client.set_margin_type(
+                        symbol, 'ISOLATED', current_margin_type=current.get('margin_type')
+                    )
                     
                     # 设置杠杆
-                    leverage_result = self.binance_client.set_leverage(symbol, self.leverage)
+                    leverage_result = self.binance_client.set_leverage(
+                        symbol, self.leverage, current_leverage=current.get('leverage')
+                    )
                     
                     if margin_result and leverage_result:
                         self.logger.info(f"合约设置完成 {symbol}: {self.leverage}x 逐仓")
@@ -87,6 +110,10 @@ class TradingEngine:
                 except Exception as e:
                     self.logger.warning(f"设置合约参数失败 {symbol}: {e}")
             
+            # 只为用户选择的币种设置合约参数（并发执行，请求权重由限流器控制）
+            with ThreadPoolExecutor(max_workers=self.config.STARTUP_WORKERS) as executor:
+                list(executor.map(configure_symbol, self.selected_symbols))
+            
             self.logger.info("合约交易设置初始化完成")
             
         except Exception as e:
@@ -95,11 +122,16 @@ class TradingEngine:
     def _check_liquidity(self, symbol: str) -> bool:
         """检查交易对流动性"""
         try:
-            order_book = self.binance_client.client.futures_order_book(symbol=symbol, limit=5)
-            bid_price = float(order_book['bids'][0][0])
-            ask_price = float(order_book['asks'][0][0])
-            spread = ask_price - bid_price
-            spread_percent = (spread / bid_price) * 100
+            book = self.order_books.get_book(symbol) if self.order_books else None
+            spread_percent = book.spread_percent() if book else None
+            if spread_percent is None:
+                order_book = self.binance_client.throttled_call(
+                    self.binance_client.client.futures_order_book, symbol=symbol, limit=5
+                )
+                bid_price = float(order_book['bids'][0][0])
+                ask_price = float(order_book['asks'][0][0])
+                spread = ask_price - bid_price
+                spread_percent = (spread / bid_price) * 100
             
             # 如果价差超过5%，认为流动性不足
             if spread_percent > 5:
@@ -121,15 +153,11 @@ class TradingEngine:
             # 计算仓位价值
             position_value = available_balance * position_size
             
-            # 获取交易对信息
-            symbol_info = self.binance_client._get_symbol_info(symbol)
-            if symbol_info:
+            # 获取交易对元数据
+            symbol_meta = self.binance_client.get_symbol_meta(symbol)
+            if symbol_meta:
                 # 获取最小数量
-                min_qty = None
-                for f in symbol_info['filters']:
-                    if f['filterType'] == 'LOT_SIZE':
-                        min_qty = float(f['minQty'])
-                        break
+                min_qty = symbol_meta.min_qty
                 
                 if min_qty:
                     # 计算订单数量
@@ -153,23 +181,32 @@ class TradingEngine:
     
     def _initialize_strategies(self):
         """初始化交易策略 - 只为用户选择的币种创建策略"""
-        # 验证用户选择的交易对有效性
-        valid_symbols = []
+        # 验证用户选择的交易对有效性（使用交易对元数据索引，无需请求接口）
+        candidates = []
         for symbol in self.selected_symbols:
             if self.binance_client._is_valid_symbol(symbol):
-                # 进一步验证是否能获取数据
-                try:
-                    test_data = self.binance_client.get_klines(symbol, '1h', 1)
-                    if test_data is not None and not test_data.empty:
-                        valid_symbols.append(symbol)
-                        self.logger.info(f"验证交易对 {symbol}: 有效")
-                    else:
-                        self.logger.warning(f"验证交易对 {symbol}: 无法获取数据")
-                except Exception as e:
-                    self.logger.warning(f"验证交易对 {symbol} 失败: {e}")
+                candidates.append(symbol)
             else:
                 self.logger.warning(f"交易对格式无效: {symbol}")
         
+        # 进一步验证是否能获取数据（并发预热）
+        def warm_up(symbol):
+            try:
+                test_data = self.binance_client.get_klines(symbol, '1h', 1)
+                if test_data is not None and not test_data.empty:
+                    self.logger.info(f"验证交易对 {symbol}: 有效")
+                    return True
+                self.logger.warning(f"验证交易对 {symbol}: 无法获取数据")
+            except Exception as e:
+                self.logger.warning(f"验证交易对 {symbol} 失败: {e}")
+            return False
+        
+        valid_symbols = []
+        if candidates:
+            with ThreadPoolExecutor(max_workers=self.config.STARTUP_WORKERS) as executor:
+                results = list(executor.map(warm_up, candidates))
+            valid_symbols = [symbol for symbol, ok in zip(candidates, results) if ok]
+        
         if not valid_symbols:
             self.logger.error("没有找到有效的交易对，使用默认配置")
             valid_symbols = ['BTCUSDT', 'ETHUSDT']  # 最基本的交易对
@@ -324,7 +361,11 @@ class TradingEngine:
         except Exception as e:
             self.logger.error(f"数据收集循环错误: {e}")
         finally:
+            # 关闭该事件循环上的异步连接池
+            loop.run_until_complete(self.data_collector.async_client.close())
             loop.close()
+            # 释放数据收集线程的数据库会话
+            self.data_collector.db_manager.remove_session()
     
     def start_trading(self):
         """启动交易"""
@@ -342,6 +383,8 @@ class TradingEngine:
     def stop_trading(self):
         """停止交易"""
         self.is_running = False
+        # 已提交的订单处理完后停止执行线程
+        self.order_executor.stop()
         self.logger.info("交易引擎停止")
     
     def _execute_trading_cycle(self):
@@ -349,6 +392,9 @@ class TradingEngine:
         # 首先执行自动持仓管理
         self._execute_position_management()
         
+        # 记录权益快照，供回撤、夏普、日损失等风险指标使用
+        self.risk_manager.record_equity_snapshot()
+        
         # 检查整体风险状况
         portfolio_risk = self.risk_manager.calculate_portfolio_risk()
         
@@ -386,11 +432,12 @@ class TradingEngine:
                 
                 if signal in ['BUY', 'SELL']:
                     # 风险检查
-                    if self._risk_check_passed(strategy, signal, current_price):
+                    risk_check = self._run_risk_check(strategy, current_price)
+                    if risk_check.passed:
                         self._execute_enhanced_trade(strategy, signal, current_price, 'SIGNAL')
                     else:
-                        # 记录风险检查失败的原因
-                        self._log_risk_check_failure(strategy_name, strategy, signal, current_price)
+                        # 记录风险检查失败的原因（复用本次检查结果）
+                        self._log_risk_check_failure(strategy_name, strategy, signal, current_price, risk_check)
                     
             except Exception as e:
                 self.logger.error(f"策略 {strategy_name} 执行错误: {e}")
@@ -475,8 +522,8 @@ class TradingEngine:
             self.logger.error(f"检查平仓条件失败: {e}")
             return False
     
-    def _risk_check_passed(self, strategy, signal: str, current_price: float) -> bool:
-        """风险检查"""
+    def _run_risk_check(self, strategy, current_price: float) -> PreTradeCheckResult:
+        """风险检查（计算建议仓位后运行交易前检查流水线）"""
         try:
             # 计算建议仓位大小
             portfolio_value = self.risk_manager._get_portfolio_value()
@@ -485,22 +532,28 @@ class TradingEngine:
             )
             
             if suggested_quantity <= 0:
-                return False
+                return PreTradeCheckResult(
+                    symbol=strategy.symbol, quantity=suggested_quantity, price=current_price,
+                    passed=False, message='风险计算建议仓位为0', failed_rule='position_size',
+                    portfolio_value=portfolio_value
+                )
             
             # 风险限制检查
-            passed, message = self.risk_manager.check_risk_limits(
-                strategy.symbol, suggested_quantity, current_price
+            result = self.risk_manager.run_pre_trade_checks(
+                strategy.symbol, suggested_quantity, current_price, portfolio_value
             )
             
-            if not passed:
-                self.logger.warning(f"风险检查未通过 {strategy.symbol}: {message}")
-                return False
+            if not result.passed:
+                self.logger.warning(f"风险检查未通过 {strategy.symbol}: {result.message}")
             
-            return True
+            return result
             
         except Exception as e:
             self.logger.error(f"风险检查失败: {e}")
-            return False
+            return PreTradeCheckResult(
+                symbol=strategy.symbol, quantity=0.0, price=current_price,
+                passed=False, message=f"风险检查错误: {str(e)}", failed_rule='error'
+            )
     
     def _log_strategy_signal(self, strategy_name: str, strategy, signal: str, current_price: float, data):
         """记录策略信号详细信息"""
@@ -532,14 +585,12 @@ class TradingEngine:
         except Exception as e:
             self.logger.error(f"记录策略信号信息失败: {e}")
     
-    def _log_risk_check_failure(self, strategy_name: str, strategy, signal: str, current_price: float):
+    def _log_risk_check_failure(self, strategy_name: str, strategy, signal: str, current_price: float,
+                                risk_check: PreTradeCheckResult):
         """记录风险检查失败的详细原因"""
         try:
-            # 获取风险检查的详细信息
-            portfolio_value = self.risk_manager._get_portfolio_value()
-            suggested_quantity = self.risk_manager.calculate_position_size(
-                strategy.symbol, 1.0, current_price, portfolio_value
-            )
+            suggested_quantity = risk_check.quantity
+            portfolio_value = risk_check.portfolio_value
             
             # 构建失败原因信息
             failure_info = f"❌ 策略: {strategy_name}"
@@ -549,7 +600,7 @@ class TradingEngine:
             failure_info += f" | 投资组合价值: ${portfolio_value:.2f}"
             
             # 根据建议仓位确定失败原因
-            if suggested_quantity <= 0:
+            if risk_check.failed_rule == 'position_size':
                 # 检查是否是因为现有持仓权重过高
                 existing_position = self.risk_manager.check_existing_position(strategy.symbol)
                 if existing_position > 0:
@@ -563,16 +614,14 @@ class TradingEngine:
                 else:
                     failure_info += f" | 失败原因: 风险计算建议仓位为0"
             else:
-                # 执行详细的风险检查以获取失败原因
-                passed, message = self.risk_manager.check_risk_limits(
-                    strategy.symbol, suggested_quantity, current_price
-                )
-                failure_info += f" | 失败原因: {message}"
+                failure_info += f" | 失败原因: {risk_check.message} ({risk_check.failed_rule})"
+                if risk_check.rules:
+                    failure_info += f" | 检查耗时: {risk_check.timing_summary()}"
             
             self.logger.warning(failure_info)
             
             # 如果是仓位大小为0的情况，提供更详细的解释
-            if suggested_quantity <= 0:
+            if risk_check.failed_rule == 'position_size':
                 self._log_position_size_analysis(strategy_name, strategy, current_price, portfolio_value)
                 
         except Exception as e:
@@ -646,8 +695,17 @@ class TradingEngine:
             self.logger.error(f"分析仓位大小失败: {e}")
     
     def _execute_enhanced_trade(self, strategy, action: str, price: float, reason: str):
-        """执行增强版交易（添加余额检查）"""
+        """
+        执行增强版交易（添加余额检查）
+        
+        订单以意图形式提交到执行队列，不等待下单往返；成交后在回调中更新策略持仓和数据库
+        """
         try:
+            # 该交易对已有未完成订单时不再重复下单
+            if self.order_executor.has_pending(strategy.symbol):
+                self.logger.info(f"{strategy.symbol} 有未完成订单，跳过本次 {action} 信号")
+                return
+            
             # 在执行交易前同步位置
             self.sync_strategy_positions()
             
@@ -680,170 +738,210 @@ class TradingEngine:
                 if suggested_quantity > 0:
                     # 再次风险检查
                     passed, message = self.risk_manager.check_risk_limits(
-                        strategy.symbol, suggested_quantity, price
+                        strategy.symbol, suggested_quantity, price, portfolio_value
                     )
                     
                     if not passed:
                         self.logger.warning(f"交易前风险检查失败: {message}")
                         return
                     
-                    # 根据交易模式执行订单
+                    # 根据交易模式提交订单
+                    intent = OrderIntent(
+                        symbol=strategy.symbol,
+                        side='BUY',
+                        quantity=suggested_quantity,
+                        strategy=strategy.__class__.__name__,
+                        reason=reason,
+                        callback=lambda result: self._on_buy_filled(strategy, result, price)
+                    )
                     if self.trading_mode == 'FUTURES':
-                        order = self.binance_client.place_order(
-                            symbol=strategy.symbol,
-                            side='BUY',
-                            quantity=suggested_quantity,
-                            leverage=self.leverage,
-                            position_side='LONG'
-                        )
-                    else:
-                        order = self.binance_client.place_order(
-                            symbol=strategy.symbol,
-                            side='BUY',
-                            quantity=suggested_quantity
-                        )
-                    
-                    if order:
-                        strategy.update_position('BUY', suggested_quantity, price)
-                        
-                        # 计算止损止盈价格
-                        stop_loss = self.risk_manager.calculate_stop_loss(
-                            strategy.symbol, price, suggested_quantity, method='atr'
-                        )
-                        take_profit = self.risk_manager.calculate_take_profit(
-                            strategy.symbol, price, stop_loss, risk_reward_ratio=2.5
-                        )
-                        
-                        # 更新数据库中的持仓记录
-                        current_price = self.binance_client.get_ticker_price(strategy.symbol)
-                        if current_price:
-                            self.db_manager.update_position(
-                                symbol=strategy.symbol,
-                                quantity=suggested_quantity,
-                                avg_price=price,
-                                current_price=current_price
-                            )
-                        
-                        self.db_manager.add_trade(
-                            symbol=strategy.symbol,
-                            side='BUY',
-                            quantity=suggested_quantity,
-                            price=price,
-                            strategy=strategy.__class__.__name__
-                        )
-                        
-                        # 详细的交易执行信息
-                        trade_type = "合约做多" if self.trading_mode == 'FUTURES' else "现货买入"
-                        trade_info = f"✅ 交易执行成功 - {trade_type}"
-                        trade_info += f" | 交易对: {strategy.symbol}"
-                        trade_info += f" | 数量: {suggested_quantity:.6f}"
-                        trade_info += f" | 价格: ${price:.4f}"
-                        trade_info += f" | 价值: ${suggested_quantity * price:.2f}"
-                        
-                        if self.trading_mode == 'FUTURES':
-                            trade_info += f" | 杠杆: {self.leverage}x"
-                        
-                        trade_info += f" | 止损: ${stop_loss:.4f}"
-                        trade_info += f" | 止盈: ${take_profit:.4f}"
-                        trade_info += f" | 风险回报比: {((take_profit - price) / (price - stop_loss)):.2f}"
-                        
-                        self.logger.info(trade_info)
-                        self.logger.info(f"📊 持仓已更新到数据库")
+                        intent.leverage = self.leverage
+                        intent.position_side = 'LONG'
+                    self.order_executor.submit(intent)
             
             elif action == 'SELL' and current_position > 0:
                 quantity = current_position  # 使用实际持仓数量
                 
-                # 根据交易模式执行订单
+                # 根据交易模式提交订单
+                intent = OrderIntent(
+                    symbol=strategy.symbol,
+                    side='SELL',
+                    quantity=quantity,
+                    strategy=strategy.__class__.__name__,
+                    reason=reason,
+                    callback=lambda result: self._on_sell_filled(strategy, result, price)
+                )
                 if self.trading_mode == 'FUTURES':
-                        # 合约模式：可以开空仓或平多仓
-                        order = self.binance_client.place_order(
-                            symbol=strategy.symbol,
-                            side='SELL',
-                            quantity=quantity,
-                            position_side='LONG',
-                            reduce_only=True  # 平仓操作
-                        )
-                else:
-                    # 现货模式：卖出持仓
-                    order = self.binance_client.place_order(
-                        symbol=strategy.symbol,
-                        side='SELL',
-                        quantity=quantity
-                    )
-                    
-                if order:
-                    profit_loss = (price - strategy.entry_price) * quantity
-                    strategy.close_position()
-                    
-                    # 从数据库中移除持仓记录（卖出全部）
-                    from backend.database import Position
-                    position = self.db_manager.session.query(Position).filter_by(symbol=strategy.symbol).first()
-                    if position:
-                        self.db_manager.session.delete(position)
-                        self.db_manager.session.commit()
-                    
-                    self.db_manager.add_trade(
-                        symbol=strategy.symbol,
-                        side='SELL',
-                        quantity=quantity,
-                        price=price,
-                        strategy=strategy.__class__.__name__,
-                        profit_loss=profit_loss
-                    )
-                    
-                    # 详细的卖出交易信息
-                    trade_type = "合约平多" if self.trading_mode == 'FUTURES' else "现货卖出"
-                    trade_info = f"💰 交易执行成功 - {trade_type}"
-                    trade_info += f" | 交易对: {strategy.symbol}"
-                    trade_info += f" | 数量: {quantity:.6f}"
-                    trade_info += f" | 价格: ${price:.4f}"
-                    trade_info += f" | 价值: ${quantity * price:.2f}"
-                    trade_info += f" | 入场价: ${strategy.entry_price:.4f}"
-                    trade_info += f" | 盈亏: ${profit_loss:.2f}"
-                    trade_info += f" | 收益率: {(profit_loss / (strategy.entry_price * quantity)) * 100:+.2f}%"
-                    
-                    self.logger.info(trade_info)
-                    self.logger.info(f"📊 持仓已从数据库移除")
+                    # 合约模式：平多仓
+                    intent.position_side = 'LONG'
+                    intent.reduce_only = True
+                self.order_executor.submit(intent)
             
             elif action == 'CLOSE':
                 if strategy.position != 0:
                     side = 'SELL' if strategy.position > 0 else 'BUY'
                     quantity = abs(strategy.position)
                     
-                    order = self.binance_client.place_order(
+                    self.order_executor.submit(OrderIntent(
                         symbol=strategy.symbol,
                         side=side,
-                        quantity=quantity
-                    )
-                    
-                    if order:
-                        profit_loss = (price - strategy.entry_price) * strategy.position
-                        strategy.close_position()
-                        
-                        self.db_manager.add_trade(
-                            symbol=strategy.symbol,
-                            side=side,
-                            quantity=quantity,
-                            price=price,
-                            strategy=strategy.__class__.__name__,
-                            profit_loss=profit_loss
-                        )
-                        
-                        # 详细的平仓交易信息
-                        close_info = f"🔄 {reason} 平仓执行成功"
-                        close_info += f" | 交易对: {strategy.symbol}"
-                        close_info += f" | 数量: {quantity:.6f}"
-                        close_info += f" | 价格: ${price:.4f}"
-                        close_info += f" | 价值: ${quantity * price:.2f}"
-                        close_info += f" | 入场价: ${strategy.entry_price:.4f}"
-                        close_info += f" | 盈亏: ${profit_loss:.2f}"
-                        close_info += f" | 收益率: {(profit_loss / (strategy.entry_price * abs(strategy.position))) * 100:+.2f}%"
-                        
-                        self.logger.info(close_info)
+                        quantity=quantity,
+                        strategy=strategy.__class__.__name__,
+                        reason=reason,
+                        callback=lambda result: self._on_close_filled(strategy, result, price, reason)
+                    ))
                         
         except Exception as e:
             self.logger.error(f"执行增强交易失败: {e}")
     
+    def _on_buy_filled(self, strategy, result: OrderResult, signal_price: float):
+        """买入订单完成回调（在订单执行线程中运行）"""
+        if not result.filled:
+            self.logger.warning(f"买入订单未成交 {strategy.symbol}: {result.status} {result.error}")
+            return
+        
+        quantity = result.executed_qty
+        price = result.avg_price or signal_price
+        strategy.update_position('BUY', quantity, price)
+        
+        # 计算止损止盈价格
+        stop_loss = self.risk_manager.calculate_stop_loss(
+            strategy.symbol, price, quantity, method='atr'
+        )
+        take_profit = self.risk_manager.calculate_take_profit(
+            strategy.symbol, price, stop_loss, risk_reward_ratio=2.5
+        )
+        
+        # 更新数据库中的持仓记录
+        current_price = self.binance_client.get_ticker_price(strategy.symbol)
+        if current_price:
+            self.db_manager.update_position(
+                symbol=strategy.symbol,
+                quantity=quantity,
+                avg_price=price,
+                current_price=current_price
+            )
+        
+        self.db_manager.add_trade(
+            symbol=strategy.symbol,
+            side='BUY',
+            quantity=quantity,
+            price=price,
+            strategy=strategy.__class__.__name__
+        )
+        
+        # 详细的交易执行信息
+        trade_type = "合约做多" if self.trading_mode == 'FUTURES' else "现货买入"
+        trade_info = f"✅ 交易执行成功 - {trade_type}"
+        trade_info += f" | 交易对: {strategy.symbol}"
+        trade_info += f" | 数量: {quantity:.6f}"
+        trade_info += f" | 价格: ${price:.4f}"
+        trade_info += f" | 价值: ${quantity * price:.2f}"
+        
+        if self.trading_mode == 'FUTURES':
+            trade_info += f" | 杠杆: {self.leverage}x"
+        
+        trade_info += f" | 止损: ${stop_loss:.4f}"
+        trade_info += f" | 止盈: ${take_profit:.4f}"
+        trade_info += f" | 风险回报比: {((take_profit - price) / (price - stop_loss)):.2f}"
+        
+        self.logger.info(trade_info)
+        self.logger.info("📊 持仓已更新到数据库")
+    
+    def _on_sell_filled(self, strategy, result: OrderResult, signal_price: float):
+        """卖出订单完成回调（在订单执行线程中运行）"""
+        if not result.filled:
+            self.logger.warning(f"卖出订单未成交 {strategy.symbol}: {result.status} {result.error}")
+            return
+        
+        quantity = result.executed_qty
+        price = result.avg_price or signal_price
+        entry_price = strategy.entry_price
+        profit_loss = (price - entry_price) * quantity
+        # 部分成交（如超时撤单）只减少已成交的数量
+        remaining = strategy.reduce_position(quantity)
+        
+        from backend.database import Position
+        if remaining > 0:
+            # 更新数据库中的剩余持仓
+            self.db_manager.update_position(
+                symbol=strategy.symbol,
+                quantity=remaining,
+                avg_price=entry_price,
+                current_price=self.binance_client.get_ticker_price(strategy.symbol) or price
+            )
+        else:
+            # 从数据库中移除持仓记录（卖出全部）
+            position = self.db_manager.session.query(Position).filter_by(symbol=strategy.symbol).first()
+            if position:
+                self.db_manager.session.delete(position)
+                self.db_manager.session.commit()
+        
+        self.db_manager.add_trade(
+            symbol=strategy.symbol,
+            side='SELL',
+            quantity=quantity,
+            price=price,
+            strategy=strategy.__class__.__name__,
+            profit_loss=profit_loss
+        )
+        
+        # 详细的卖出交易信息
+        trade_type = "合约平多" if self.trading_mode == 'FUTURES' else "现货卖出"
+        trade_info = f"💰 交易执行成功 - {trade_type}"
+        trade_info += f" | 交易对: {strategy.symbol}"
+        trade_info += f" | 数量: {quantity:.6f}"
+        trade_info += f" | 价格: ${price:.4f}"
+        trade_info += f" | 价值: ${quantity * price:.2f}"
+        trade_info += f" | 入场价: ${entry_price:.4f}"
+        trade_info += f" | 盈亏: ${profit_loss:.2f}"
+        if entry_price:
+            trade_info += f" | 收益率: {(profit_loss / (entry_price * quantity)) * 100:+.2f}%"
+        
+        if remaining > 0:
+            trade_info += f" | 部分成交, 剩余持仓: {remaining:.6f}"
+        
+        self.logger.info(trade_info)
+        self.logger.info("📊 持仓已更新到数据库" if remaining > 0 else "📊 持仓已从数据库移除")
+    
+    def _on_close_filled(self, strategy, result: OrderResult, signal_price: float, reason: str):
+        """平仓订单完成回调（在订单执行线程中运行）"""
+        if not result.filled:
+            self.logger.warning(f"{reason} 平仓订单未成交 {strategy.symbol}: {result.status} {result.error}")
+            return
+        
+        quantity = result.executed_qty
+        price = result.avg_price or signal_price
+        entry_price = strategy.entry_price
+        position = strategy.position
+        # 按实际成交数量计算盈亏，部分成交时保留剩余持仓
+        profit_loss = (price - entry_price) * quantity * (1 if position > 0 else -1)
+        remaining = strategy.reduce_position(quantity)
+        
+        self.db_manager.add_trade(
+            symbol=strategy.symbol,
+            side=result.intent.side,
+            quantity=quantity,
+            price=price,
+            strategy=strategy.__class__.__name__,
+            profit_loss=profit_loss
+        )
+        
+        # 详细的平仓交易信息
+        close_info = f"🔄 {reason} 平仓执行成功"
+        close_info += f" | 交易对: {strategy.symbol}"
+        close_info += f" | 数量: {quantity:.6f}"
+        close_info += f" | 价格: ${price:.4f}"
+        close_info += f" | 价值: ${quantity * price:.2f}"
+        close_info += f" | 入场价: ${entry_price:.4f}"
+        close_info += f" | 盈亏: ${profit_loss:.2f}"
+        if entry_price and quantity:
+            close_info += f" | 收益率: {(profit_loss / (entry_price * quantity)) * 100:+.2f}%"
+        if remaining > 0:
+            close_info += f" | 部分成交, 剩余持仓: {remaining:.6f}"
+        
+        self.logger.info(close_info)
+    
     def _execute_position_management(self):
         """执行持仓管理 - 自动减仓和再平衡"""
         try:
@@ -0,0 +1,549 @@
+#!/usr/bin/env python3
+"""
+用户数据流模块
+通过币安用户数据流（listenKey + 定时keepalive）实时维护本地账户余额和持仓状态，
+其他模块直接读取本地状态，不再轮询账户接口；订单更新推送给订单执行队列
+"""
+
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+try:
+    import websocket
+except ImportError:
+    websocket = None
+
+from config.config import Config
+
+# listenKey有效期（秒）：超过该时间未成功续期即视为失效
+LISTEN_KEY_VALIDITY_SECONDS = 3600
+
+# 合约保证金变化后两次REST刷新的最小间隔（秒）
+MARGIN_REFRESH_MIN_INTERVAL = 1.0
+
+# 用户数据流地址（后接listenKey）
+STREAM_URLS = {
+    ('SPOT', False): 'wss://stream.binance.com:9443/ws/',
+    ('SPOT', True): 'wss://testnet.binance.vision/ws/',
+    ('FUTURES', False): 'wss://fstream.binance.com/ws/',
+    ('FUTURES', True): 'wss://stream.binancefuture.com/ws/',
+}
+
+
+class AccountState:
+    """本地账户状态（余额、持仓），由REST快照初始化，由推送事件增量更新"""
+    
+    def __init__(self, trading_mode: str = 'SPOT'):
+        self.trading_mode = trading_mode.upper()
+        self.ready = False
+        self.last_update = 0.0
+        self._balances: Dict[str, Dict[str, float]] = {}
+        self._positions: Dict[tuple, Dict] = {}
+        self._account: Dict = {}
+        # 合约可用余额是否过期：下单/成交会占用或释放保证金，推送中没有可用余额，需要REST刷新
+        self.margin_stale = False
+        self._margin_version = 0
+        # 已应用的推送事件数，快照请求期间有事件应用时该快照可能比本地状态旧
+        self.event_count = 0
+        self._lock = threading.RLock()
+    
+    # ---------- 快照 ----------
+    
+    def load_spot_snapshot(self, account: Dict):
+        """用现货账户信息（get_account）初始化"""
+        with self._lock:
+            self._account = dict(account)
+            self._balances = {
+                b['asset']: {'free': float(b['free']), 'locked': float(b['locked'])}
+                for b in account.get('balances', [])
+            }
+            self._mark_updated()
+    
+    def load_futures_snapshot(self, account: Dict, positions: List[Dict] = None):
+        """用合约账户信息（futures_account）和持仓信息初始化"""
+        with self._lock:
+            self._account = dict(account)
+            self._balances = {}
+            for asset in account.get('assets', []):
+                self._balances[asset['asset']] = {
+                    'wallet_balance': float(asset.get('walletBalance', 0)),
+                    'cross_wallet_balance': float(asset.get('crossWalletBalance', asset.get('walletBalance', 0))),
+                    'available': float(asset.get('availableBalance', 0)),
+                }
+            if 'availableBalance' in account and 'USDT' in self._balances:
+                self._balances['USDT']['available'] = float(account['availableBalance'])
+            
+            self._positions = {}
+            for pos in positions if positions is not None else account.get('positions', []):
+                key = (pos['symbol'], pos.get('positionSide', 'BOTH'))
+                self._positions[key] = {
+                    'symbol': pos['symbol'],
+                    'positionSide': pos.get('positionSide', 'BOTH'),
+                    'positionAmt': float(pos.get('positionAmt', 0)),
+                    'entryPrice': float(pos.get('entryPrice', 0)),
+                    'unRealizedProfit': float(pos.get('unRealizedProfit', pos.get('unrealizedProfit', 0))),
+                    'marginType': pos.get('marginType', ''),
+                    'leverage': int(float(pos.get('leverage', 0) or 0)),
+                }
+            self._mark_updated()
+    
+    def _mark_updated(self):
+        self.ready = True
+        self.last_update = time.time()
+    
+    @property
+    def margin_version(self) -> int:
+        """保证金变化事件的计数，刷新前记录，用于判断刷新期间是否又有新变化"""
+        return self._margin_version
+    
+    def clear_margin_stale(self, version: int):
+        """快照加载后清除过期标记（快照请求期间又有保证金变化时保持过期）"""
+        with self._lock:
+            if self._margin_version == version:
+                self.margin_stale = False
+    
+    def _mark_margin_stale(self):
+        self.margin_stale = True
+        self._margin_version += 1
+    
+    # ---------- 事件 ----------
+    
+    def apply_event(self, event: Dict) -> Optional[Dict]:
+        """
+        应用一条推送事件
+        
+        Returns:
+            订单更新事件转换后的订单字典（字段与REST订单响应一致），其他事件返回None
+        """
+        event_type = event.get('e')
+        with self._lock:
+            if event_type == 'outboundAccountPosition':
+                for b in event.get('B', []):
+                    self._balances[b['a']] = {'free': float(b['f']), 'locked': float(b['l'])}
+            elif event_type == 'balanceUpdate':
+                balance = self._balances.setdefault(event['a'], {'free': 0.0, 'locked': 0.0})
+                balance['free'] += float(event['d'])
+            elif event_type == 'ACCOUNT_UPDATE':
+                self._apply_futures_account_update(event.get('a', {}))
+                if event.get('a', {}).get('m') == 'ORDER':
+                    self._mark_margin_stale()
+            elif event_type == 'ACCOUNT_CONFIG_UPDATE':
+                config = event.get('ac')
+                if config:
+                    for key, pos in self._positions.items():
+                        if key[0] == config.get('s'):
+                            pos['leverage'] = int(config.get('l', pos['leverage']))
+            elif event_type == 'executionReport':
+                self.event_count += 1
+                self.last_update = time.time()
+                return self._spot_order_update(event)
+            elif event_type == 'ORDER_TRADE_UPDATE':
+                # 挂单、撤单和成交都会改变占用的保证金
+                self._mark_margin_stale()
+                self.event_count += 1
+                self.last_update = time.time()
+                return self._futures_order_update(event.get('o', {}))
+            else:
+                return None
+            self.event_count += 1
+            self.last_update = time.time()
+        return None
+    
+    def _apply_futures_account_update(self, data: Dict):
+        for b in data.get('B', []):
+            balance = self._balances.setdefault(
+                b['a'], {'wallet_balance': 0.0, 'cross_wallet_balance': 0.0, 'available': 0.0}
+            )
+            new_cross = float(b.get('cw', b['wb']))
+            # 推送不含可用余额，按全仓钱包余额的变化量调整；
+            # 开仓占用的保证金不体现在钱包余额中，订单引起的变化会标记过期并由REST刷新
+            balance['available'] += new_cross - balance['cross_wallet_balance']
+            balance['wallet_balance'] = float(b['wb'])
+            balance['cross_wallet_balance'] = new_cross
+        
+        for p in data.get('P', []):
+            key = (p['s'], p.get('ps', 'BOTH'))
+            pos = self._positions.setdefault(key, {
+                'symbol': p['s'], 'positionSide': p.get('ps', 'BOTH'), 'leverage': 0
+            })
+            pos['positionAmt'] = float(p['pa'])
+            pos['entryPrice'] = float(p['ep'])
+            pos['unRealizedProfit'] = float(p.get('up', 0))
+            pos['marginType'] = p.get('mt', pos.get('marginType', ''))
+    
+    @staticmethod
+    def _spot_order_update(event: Dict) -> Dict:
+        return {
+            'symbol': event['s'],
+            'orderId': event.get('i'),
+            'clientOrderId': event.get('c'),
+            'side': event.get('S'),
+            'type': event.get('o'),
+            'status': event.get('X'),
+            'executedQty': event.get('z', '0'),
+            'cummulativeQuoteQty': event.get('Z', '0'),
+            'updateTime': event.get('T'),
+        }
+    
+    @staticmethod
+    def _futures_order_update(order: Dict) -> Dict:
+        return {
+            'symbol': order.get('s'),
+            'orderId': order.get('i'),
+            'clientOrderId': order.get('c'),
+            'side': order.get('S'),
+            'type': order.get('o'),
+            'positionSide': order.get('ps'),
+            'status': order.get('X'),
+            'executedQty': order.get('z', '0'),
+            'avgPrice': order.get('ap', '0'),
+            'updateTime': order.get('T'),
+        }
+    
+    # ---------- 读取（格式与BinanceClient一致） ----------
+    
+    def get_balance(self, asset: str = 'USDT') -> float:
+        with self._lock:
+            balance = self._balances.get(asset)
+            if not balance:
+                return 0.0
+            return balance['available'] if self.trading_mode == 'FUTURES' else balance['free']
+    
+    def get_positions(self) -> List[Dict]:
+        """有持仓的合约（字段与futures_position_information一致，数值为字符串）"""
+        with self._lock:
+            return [
+                {
+                    'symbol': pos['symbol'],
+                    'positionSide': pos['positionSide'],
+                    'positionAmt': str(pos['positionAmt']),
+                    'entryPrice': str(pos['entryPrice']),
+                    'unRealizedProfit': str(pos['unRealizedProfit']),
+                    'marginType': pos.get('marginType', ''),
+                    'leverage': str(pos.get('leverage', 0)),
+                }
+                for pos in self._positions.values() if pos.get('positionAmt', 0) != 0
+            ]
+    
+    def get_account_balance(self) -> Dict:
+        """账户余额详情（格式与BinanceClient.get_account_balance一致）"""
+        with self._lock:
+            if self.trading_mode == 'FUTURES':
+                usdt = self._balances.get('USDT', {})
+                unrealized = sum(pos.get('unRealizedProfit', 0) for pos in self._positions.values())
+                wallet = usdt.get('wallet_balance', 0.0)
+                return {
+                    'totalWalletBalance': wallet,
+                    'totalUnrealizedProfit': unrealized,
+                    'totalMarginBalance': wallet + unrealized,
+                    'totalPositionInitialMargin': float(self._account.get('totalPositionInitialMargin', 0)),
+                    'totalOpenOrderInitialMargin': float(self._account.get('totalOpenOrderInitialMargin', 0)),
+                    'availableBalance': usdt.get('available', 0.0),
+                    'maxWithdrawAmount': usdt.get('available', 0.0),
+                    'assets': self._account.get('assets', []),
+                    'positions': self.get_positions()
+                }
+            
+            balances = [
+                {'asset': asset, 'free': str(b['free']), 'locked': str(b['locked'])}
+                for asset, b in self._balances.items() if b['free'] > 0 or b['locked'] > 0
+            ]
+            return {
+                'totalAssetOfBtc': float(self._account.get('totalAssetOfBtc', 0)),
+                'balances': balances
+            }
+
+
+class UserDataStream:
+    """用户数据流监听器"""
+    
+    def __init__(self, binance_client, state: AccountState = None, ws_url: str = None,
+                 listen_key: str = None, keepalive_interval: float = None,
+                 resync_interval: float = None):
+        """
+        Args:
+            binance_client: BinanceClient实例（用于listenKey和REST快照）
+            ws_url: 推送地址前缀，默认按交易模式选择（测试时可指向本地模拟服务）
+            listen_key: 指定listenKey时不再通过REST申请（用于本地模拟）
+            keepalive_interval: listenKey续期间隔（秒），币安要求60分钟内续期
+            resync_interval: REST快照校正间隔（秒）
+        """
+        config = Config()
+        self.binance_client = binance_client
+        self.trading_mode = binance_client.trading_mode
+        self.state = state or AccountState(self.trading_mode)
+        self.ws_base_url = ws_url or STREAM_URLS[(self.trading_mode, config.BINANCE_TESTNET)]
+        self.listen_key = listen_key
+        self._fixed_listen_key = listen_key is not None
+        self.keepalive_interval = keepalive_interval or config.USER_STREAM_KEEPALIVE_SECONDS
+        self.resync_interval = resync_interval or config.USER_STREAM_RESYNC_SECONDS
+        self.logger = logging.getLogger(__name__)
+        
+        self.connected = False
+        # listenKey最近一次申请或续期成功的时间（monotonic），收到过期事件后为None
+        self._listen_key_renewed_at: Optional[float] = None
+        self._order_listeners: List[Callable[[Dict], None]] = []
+        self._stop_event = threading.Event()
+        self._ws = None
+        self._threads: List[threading.Thread] = []
+        # 合约保证金变化后唤醒维护线程立即刷新
+        self._refresh_event = threading.Event()
+        # 连接建立后、快照加载完成前的推送先缓存，快照加载后只重放比快照新的事件
+        self._syncing = False
+        self._buffer: List[Dict] = []
+        self._sync_lock = threading.Lock()
+    
+    # ---------- 生命周期 ----------
+    
+    def start(self) -> bool:
+        """
+        申请listenKey并启动监听线程，失败时返回False（调用方继续使用REST轮询）
+        
+        连接建立后才加载REST快照，快照加载完成前is_healthy为False
+        """
+        if websocket is None:
+            self.logger.warning("未安装websocket-client，用户数据流不可用")
+            return False
+        
+        try:
+            if not self._fixed_listen_key:
+                self.listen_key = self._create_listen_key()
+            if not self.listen_key:
+                self.logger.warning("获取listenKey失败，用户数据流不可用")
+                return False
+            self._listen_key_renewed_at = time.monotonic()
+            
+            self._stop_event.clear()
+            for target, name in ((self._run_socket, 'user-stream'), (self._run_maintenance, 'user-stream-keepalive')):
+                thread = threading.Thread(target=target, name=name, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            
+            self.logger.info(f"{self.trading_mode}用户数据流已启动")
+            return True
+        
+        except Exception as e:
+            self.logger.error(f"启动用户数据流失败: {e}")
+            return False
+    
+    def stop(self):
+        self._stop_event.set()
+        self._refresh_event.set()
+        if self._ws is not None:
+            self._ws.close()
+    
+    def add_order_listener(self, listener: Callable[[Dict], None]):
+        """注册订单更新回调（如 OrderExecutor.on_order_update）"""
+        self._order_listeners.append(listener)
+    
+    def is_healthy(self) -> bool:
+        """推送已连接、状态已加载且listenKey有效时，本地账户状态才可信"""
+        return self.connected and not self._syncing and self.state.ready and self.listen_key_alive()
+    
+    def listen_key_alive(self) -> bool:
+        """listenKey是否有效：没有收到过期事件，且在有效期内申请或续期成功过"""
+        if not self.listen_key or self._listen_key_renewed_at is None:
+            return False
+        if self._fixed_listen_key:
+            return True
+        return time.monotonic() - self._listen_key_renewed_at < LISTEN_KEY_VALIDITY_SECONDS
+    
+    # ---------- REST ----------
+    
+    def _create_listen_key(self) -> Optional[str]:
+        client = self.binance_client.client
+        if self.trading_mode == 'FUTURES':
+            return self.binance_client.throttled_call(client.futures_stream_get_listen_key)
+        return self.binance_client.throttled_call(client.stream_get_listen_key)
+    
+    def _keepalive(self):
+        if self._fixed_listen_key:
+            return
+        client = self.binance_client.client
+        if self.trading_mode == 'FUTURES':
+            self.binance_client.throttled_call(client.futures_stream_keepalive, listenKey=self.listen_key)
+        else:
+            self.binance_client.throttled_call(client.stream_keepalive, listenKey=self.listen_key)
+        self._listen_key_renewed_at = time.monotonic()
+    
+    def resync(self, force: bool = True) -> Optional[Dict]:
+        """
+        用REST快照校正本地状态
+        
+        Args:
+            force: 为False时，如果请求快照期间已有推送事件应用到本地状态，放弃这个可能更旧的快照
+        
+        Returns:
+            加载了快照时返回 {'time': 快照中最新的更新时间（毫秒，可能为None）}，放弃时返回None
+        """
+        client = self.binance_client.client
+        event_count = self.state.event_count
+        if self.trading_mode == 'FUTURES':
+            margin_version = self.state.margin_version
+            account = self.binance_client.throttled_call(client.futures_account)
+            positions = self.binance_client.throttled_call(client.futures_position_information)
+            records = [account] + list(account.get('assets', [])) + list(positions or [])
+        else:
+            account = self.binance_client.throttled_call(client.get_account)
+            records = [account]
+        
+        if not force and self.state.event_count != event_count:
+            self.logger.debug("快照请求期间收到新的推送，放弃本次校正")
+            return None
+        
+        if self.trading_mode == 'FUTURES':
+            self.state.load_futures_snapshot(account, positions)
+            self.state.clear_margin_stale(margin_version)
+        else:
+            self.state.load_spot_snapshot(account)
+        
+        update_times = [int(r.get('updateTime') or 0) for r in records if isinstance(r, dict)]
+        return {'time': max(update_times) or None}
+    
+    # ---------- 推送处理 ----------
+    
+    def handle_message(self, message: str):
+        """处理一条推送消息"""
+        try:
+            event = json.loads(message)
+        except (TypeError, ValueError):
+            self.logger.warning(f"无法解析用户数据流消息: {message!r}")
+            return
+        
+        # 组合流格式 {"stream": ..., "data": {...}}
+        if 'data' in event and 'e' not in event:
+            event = event['data']
+        
+        if event.get('e') == 'listenKeyExpired':
+            self.logger.warning("listenKey已过期，重新申请")
+            self._listen_key_renewed_at = None
+            self._reconnect_with_new_key()
+            return
+        
+        with self._sync_lock:
+            if self._syncing:
+                self._buffer.append(event)
+                return
+        self._dispatch(event)
+    
+    def _dispatch(self, event: Dict):
+        """把事件应用到本地状态，并通知订单回调"""
+        order = self.state.apply_event(event)
+        if self.state.margin_stale:
+            self._refresh_event.set()
+        if order:
+            for listener in list(self._order_listeners):
+                try:
+                    listener(order)
+                except Exception as e:
+                    self.logger.error(f"订单更新回调失败: {e}")
+    
+    def _reconnect_with_new_key(self):
+        if not self._fixed_listen_key:
+            try:
+                self.listen_key = self._create_listen_key()
+                if self.listen_key:
+                    self._listen_key_renewed_at = time.monotonic()
+            except Exception as e:
+                self.logger.error(f"重新申请listenKey失败: {e}")
+        if self._ws is not None:
+            self._ws.close()
+    
+    def _run_socket(self):
+        """连接推送，断线后重连（每次连接建立后用REST快照补齐断线期间的变化）"""
+        backoff = 1.0
+        while not self._stop_event.is_set():
+            with self._sync_lock:
+                self._syncing = True
+                self._buffer = []
+            self._ws = websocket.WebSocketApp(
+                f"{self.ws_base_url}{self.listen_key}",
+                on_open=lambda ws: self._on_open(),
+                on_message=lambda ws, message: self.handle_message(message),
+                on_error=lambda ws, error: self.logger.warning(f"用户数据流错误: {error}"),
+                on_close=lambda ws, *args: setattr(self, 'connected', False)
+            )
+            self._ws.run_forever(ping_interval=180, ping_timeout=10)
+            self.connected = False
+            
+            if self._stop_event.wait(backoff):
+                break
+            backoff = min(backoff * 2, 60.0)
+    
+    def _on_open(self):
+        self.connected = True
+        self.logger.info(f"{self.trading_mode}用户数据流已连接")
+        # 在单独线程中加载快照，推送线程继续接收并缓存事件
+        threading.Thread(target=self._sync_after_connect, name='user-stream-sync', daemon=True).start()
+    
+    def _sync_after_connect(self):
+        """连接建立后加载快照，再重放缓存中比快照新的事件"""
+        backoff = 1.0
+        while self.connected and not self._stop_event.is_set():
+            with self._sync_lock:
+                buffered_before = len(self._buffer)
+            try:
+                snapshot = self.resync()
+            except Exception as e:
+                self.logger.warning(f"用户数据流同步快照失败: {e}")
+                if self._stop_event.wait(backoff):
+                    return
+                backoff = min(backoff * 2, 30.0)
+                continue
+            
+            with self._sync_lock:
+                buffered, self._buffer = self._buffer, []
+                replayed = 0
+                for index, event in enumerate(buffered):
+                    if self._is_after_snapshot(event, index, buffered_before, snapshot['time']):
+                        self._dispatch(event)
+                        replayed += 1
+                self._syncing = False
+            self.logger.info(f"{self.trading_mode}用户数据流快照已加载，重放 {replayed}/{len(buffered)} 条缓存事件")
+            return
+    
+    @staticmethod
+    def _is_after_snapshot(event: Dict, index: int, buffered_before: int, snapshot_time: Optional[int]) -> bool:
+        """
+        缓存的事件是否发生在快照之后
+        
+        有快照更新时间时按事件时间E比较；否则只重放请求快照之后才收到的事件。
+        订单更新不改变余额，总是转发给订单回调
+        """
+        if event.get('e') in ('executionReport', 'ORDER_TRADE_UPDATE'):
+            return True
+        if snapshot_time and event.get('E'):
+            return int(event['E']) > snapshot_time
+        return index >= buffered_before
+    
+    def _run_maintenance(self):
+        """定时续期listenKey并用REST快照校正；合约保证金变化后尽快刷新可用余额"""
+        last_keepalive = last_resync = time.time()
+        while not self._stop_event.is_set():
+            self._refresh_event.wait(5.0)
+            self._refresh_event.clear()
+            if self._stop_event.is_set():
+                break
+            now = time.time()
+            try:
+                if now - last_keepalive >= self.keepalive_interval:
+                    self._keepalive()
+                    last_keepalive = now
+                margin_refresh_due = (self.state.margin_stale
+                                      and now - last_resync >= MARGIN_REFRESH_MIN_INTERVAL)
+                if self._syncing:
+                    # 连接建立后的同步由_sync_after_connect负责
+                    pass
+                elif margin_refresh_due or now - last_resync >= self.resync_interval:
+                    # 快照请求期间有新事件时放弃该快照，保证金仍过期时稍后重试
+                    self.resync(force=False)
+                    last_resync = now
+                elif self.state.margin_stale:
+                    # 刷新过于频繁，稍后再刷新
+                    self._stop_event.wait(MARGIN_REFRESH_MIN_INTERVAL - (now - last_resync))
+                    self._refresh_event.set()
+            except Exception as e:
+                self.logger.warning(f"用户数据流维护失败: {e}")
@@ -11,32 +11,6 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 import asyncio
 from backend.data_collector import DataCollector
-from datetime import datetime, timedelta
-import pandas as pd
-
-async def collect_historical_data_for_symbol(symbol: str, days: int = 90):
-    """为指定币种收集历史数据"""
-    print(f"📊 开始收集 {symbol} 的历史数据...")
-    
-    try:
-        dc = DataCollector()
-        
-        # 收集历史数据
-        print(f"  正在收集最近 {days} 天的数据...")
-        data = await dc.collect_historical_data(symbol, '1h', days)
-        
-        if not data.empty:
-            print(f"  ✅ {symbol} 数据收集成功，获得 {len(data)} 条记录")
-            print(f"  数据范围: {data['timestamp'].min()} 到 {data['timestamp'].max()}")
-            print(f"  最新价格: {data.iloc[-1]['close']:.4f}")
-            return True
-        else:
-            print(f"  ❌ {symbol} 数据收集失败")
-            return False
-            
-    except Exception as e:
-        print(f"  ❌ {symbol} 数据收集异常: {e}")
-        return False
 
 async def collect_data_for_all_symbols():
     """为所有币种收集数据"""
@@ -45,19 +19,25 @@ async def collect_data_for_all_symbols():
     print("🚀 开始收集历史数据...")
     print("=" * 50)
     
+    # 所有币种并发补齐，共享同一请求预算
+    dc = DataCollector()
+    summary = await dc.backfill_symbols(symbols, ['1h'], days=90)
+    
     success_count = 0
     for symbol in symbols:
-        success = await collect_historical_data_for_symbol(symbol, days=90)
-        if success:
+        count = summary.get(symbol, {}).get('1h', 0)
+        if count > 0:
+            print(f"  ✅ {symbol} 数据收集成功，共 {count} 条记录")
             success_count += 1
-        print()  # 空行分隔
+        else:
+            print(f"  ❌ {symbol} 数据收集失败")
+    print()
     
     print("=" * 50)
     print(f"📈 数据收集完成: {success_count}/{len(symbols)} 个币种成功")
     
     # 检查收集后的数据情况
     print("\n🔍 检查收集后的数据情况...")
-    dc = DataCollector()
     
     for symbol in symbols:
         market_data = dc.get_market_data(symbol, '1h', limit=1000)
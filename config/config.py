@@ -13,6 +13,51 @@ class Config:
     
     # 数据库配置
     DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///trading.db')
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))  # 连接池大小
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))  # 连接池溢出上限
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30'))  # 获取连接超时（秒）
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '3600'))  # 连接回收周期（秒）
+    DB_BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', '30000'))  # SQLite锁等待（毫秒）
+    
+    # K线存储配置: sql（market_data表）、npy（内存映射NumPy分区）、parquet
+    MARKET_DATA_BACKEND = os.getenv('MARKET_DATA_BACKEND', 'sql')
+    MARKET_DATA_DIR = os.getenv('MARKET_DATA_DIR', 'data/market')
+    
+    # 订单簿快照归档（按日分区的二进制/列式文件，替代orderbook_data表）
+    ORDERBOOK_ARCHIVE_ENABLED = os.getenv('ORDERBOOK_ARCHIVE_ENABLED', 'True').lower() == 'true'
+    ORDERBOOK_ARCHIVE_DIR = os.getenv('ORDERBOOK_ARCHIVE_DIR', 'data/orderbook')
+    ORDERBOOK_RETENTION_DAYS = int(os.getenv('ORDERBOOK_RETENTION_DAYS', '30'))  # 0表示永久保留
+    
+    # 回测成交模型: close（收盘价成交）、fixed_bps、volume_participation、orderbook（回放订单簿快照）
+    BACKTEST_FILL_MODEL = os.getenv('BACKTEST_FILL_MODEL', 'close')
+    
+    # 历史数据补齐配置
+    BACKFILL_CONCURRENCY = int(os.getenv('BACKFILL_CONCURRENCY', '4'))  # 同时进行的K线请求数
+    BACKFILL_REQUESTS_PER_MINUTE = int(os.getenv('BACKFILL_REQUESTS_PER_MINUTE', '300'))  # K线请求预算
+    
+    # 交易对元数据索引的磁盘缓存目录
+    SYMBOL_META_CACHE_DIR = os.getenv('SYMBOL_META_CACHE_DIR', 'data')
+    
+    # 异步HTTP连接池
+    ASYNC_HTTP_POOL_SIZE = int(os.getenv('ASYNC_HTTP_POOL_SIZE', '100'))  # 最大连接数
+    ASYNC_HTTP_KEEPALIVE = float(os.getenv('ASYNC_HTTP_KEEPALIVE', '30'))  # 空闲连接保持（秒）
+    ASYNC_HTTP_DNS_CACHE_TTL = int(os.getenv('ASYNC_HTTP_DNS_CACHE_TTL', '300'))  # DNS缓存（秒）
+    ASYNC_HTTP_TIMEOUT = float(os.getenv('ASYNC_HTTP_TIMEOUT', '30'))  # 请求超时（秒）
+    
+    # 请求权重限流（币安每分钟IP权重上限）
+    RATE_LIMIT_SPOT_WEIGHT = int(os.getenv('RATE_LIMIT_SPOT_WEIGHT', '6000'))
+    RATE_LIMIT_FUTURES_WEIGHT = int(os.getenv('RATE_LIMIT_FUTURES_WEIGHT', '2400'))
+    RATE_LIMIT_SAFETY_MARGIN = float(os.getenv('RATE_LIMIT_SAFETY_MARGIN', '0.9'))  # 只使用上限的90%
+    RATE_LIMIT_ORDER_RESERVE = float(os.getenv('RATE_LIMIT_ORDER_RESERVE', '0.1'))  # 为下单保留的额度比例
+    
+    # 用户数据流（实时余额/持仓/订单推送，启动失败时回退到REST轮询）
+    USER_DATA_STREAM_ENABLED = os.getenv('USER_DATA_STREAM_ENABLED', 'True').lower() == 'true'
+    USER_STREAM_KEEPALIVE_SECONDS = float(os.getenv('USER_STREAM_KEEPALIVE_SECONDS', '1800'))  # listenKey续期间隔
+    USER_STREAM_RESYNC_SECONDS = float(os.getenv('USER_STREAM_RESYNC_SECONDS', '300'))  # REST快照校正间隔
+    
+    # 本地订单簿（深度增量推送维护，未同步时回退到REST）
+    ORDER_BOOK_STREAM_ENABLED = os.getenv('ORDER_BOOK_STREAM_ENABLED', 'True').lower() == 'true'
+    ORDER_BOOK_MAX_LEVELS = int(os.getenv('ORDER_BOOK_MAX_LEVELS', '1000'))  # 每侧保留档位数
     
     # Redis配置
     REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
@@ -20,6 +65,7 @@ class Config:
     # 交易配置
     DEFAULT_SYMBOLS = ['BTCUSDT', 'ETHUSDT', 'BNBUSDT', 'ADAUSDT']
     DEFAULT_TIMEFRAME = '1h'
+    STARTUP_WORKERS = int(os.getenv('STARTUP_WORKERS', '8'))  # 启动时并发验证/设置交易对的线程数
     MAX_POSITION_SIZE = 0.1  # 最大仓位比例
     STOP_LOSS_PERCENT = 0.02  # 止损比例
     TAKE_PROFIT_PERCENT = 0.05  # 止盈比例
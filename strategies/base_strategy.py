@@ -3,6 +3,9 @@ import pandas as pd
 import numpy as np
 from typing import Dict, Any, Optional
 
+# 批量信号编码：买入+1，卖出-1，持有0
+SIGNAL_CODES = {'BUY': 1, 'SELL': -1, 'HOLD': 0}
+
 class BaseStrategy(ABC):
     """交易策略基类"""
     
@@ -21,6 +24,18 @@ class BaseStrategy(ABC):
         """
         pass
     
+    def generate_signals(self, data: pd.DataFrame) -> np.ndarray:
+        """
+        对整段历史数据批量生成信号（组合回测使用）
+        返回: 与data等长的int8数组，第i个元素等于 generate_signal(data.iloc[:i+1]) 的编码
+        
+        默认逐根K线调用generate_signal，子类可覆盖为向量化实现
+        """
+        signals = np.zeros(len(data), dtype=np.int8)
+        for i in range(len(data)):
+            signals[i] = SIGNAL_CODES.get(self.generate_signal(data.iloc[:i+1]), 0)
+        return signals
+    
     @abstractmethod
     def calculate_position_size(self, current_price: float, balance: float) -> float:
         """计算仓位大小"""
@@ -74,4 +89,13 @@ class BaseStrategy(ABC):
     def close_position(self):
         """平仓"""
         self.position = 0
-        self.entry_price = 0
\ No newline at end of file
+        self.entry_price = 0
+    
+    def reduce_position(self, quantity: float) -> float:
+        """部分平仓：持仓数量减少quantity，入场价不变，减完时平仓；返回剩余持仓数量（绝对值）"""
+        remaining = abs(self.position) - quantity
+        if remaining <= abs(self.position) * 1e-9:
+            self.close_position()
+            return 0.0
+        self.position = remaining if self.position > 0 else -remaining
+        return remaining
\ No newline at end of file
@@ -40,6 +40,24 @@ class MovingAverageStrategy(BaseStrategy):
         
         return 'HOLD'
     
+    def generate_signals(self, data: pd.DataFrame) -> np.ndarray:
+        """向量化生成整段数据的金叉/死叉信号，结果与逐根调用generate_signal一致"""
+        short_ma = data['close'].rolling(window=self.parameters['short_window']).mean().to_numpy()
+        long_ma = data['close'].rolling(window=self.parameters['long_window']).mean().to_numpy()
+        
+        signals = np.zeros(len(data), dtype=np.int8)
+        if len(data) < max(self.parameters['long_window'], 2):
+            return signals
+        
+        prev_short, prev_long = short_ma[:-1], long_ma[:-1]
+        curr_short, curr_long = short_ma[1:], long_ma[1:]
+        with np.errstate(invalid='ignore'):
+            golden = (prev_short <= prev_long) & (curr_short > curr_long)
+            death = (prev_short >= prev_long) & (curr_short < curr_long)
+        signals[1:] = np.where(golden, 1, np.where(death, -1, 0))
+        signals[:self.parameters['long_window'] - 1] = 0
+        return signals
+    
     def calculate_position_size(self, current_price: float, balance: float) -> float:
         """计算仓位大小"""
         max_position_value = balance * self.parameters['position_size']
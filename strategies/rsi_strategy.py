@@ -44,6 +44,15 @@ class RSIStrategy(BaseStrategy):
         
         return 'HOLD'
     
+    def generate_signals(self, data: pd.DataFrame) -> np.ndarray:
+        """向量化生成整段数据的超买超卖信号，结果与逐根调用generate_signal一致"""
+        rsi = self.calculate_rsi(data).to_numpy()
+        with np.errstate(invalid='ignore'):
+            signals = np.where(rsi < self.parameters['oversold'], 1,
+                               np.where(rsi > self.parameters['overbought'], -1, 0)).astype(np.int8)
+        signals[:self.parameters['rsi_period']] = 0
+        return signals
+    
     def calculate_position_size(self, current_price: float, balance: float) -> float:
         """计算仓位大小"""
         max_position_value = balance * self.parameters['position_size']
@@ -5,11 +5,13 @@
 支持随机参数组合测试、自动分析结果、持续优化
 """
 
+import hashlib
 import json
 import random
 import time
 import threading
 import signal
+import uuid
 import sys
 import asyncio
 from datetime import datetime, timedelta
@@ -19,12 +21,19 @@ import numpy as np
 from dataclasses import dataclass, asdict
 import sqlite3
 import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 # 导入项目模块
 from backend.trading_engine import TradingEngine
 from backend.backtesting import BacktestEngine
 from backend.data_collector import DataCollector
+from backend.ma_grid_sweep import MAGridSweep
+from backend.param_search import ParamSearch, create_param_search
+from backend.result_log import ResultLog
+from backend.shared_market_data import (
+    SHARED_MEMORY_AVAILABLE, SharedFrameSpec, SharedMarketData, attach_frame
+)
 from strategies.ma_strategy import MovingAverageStrategy
 from strategies.rsi_strategy import RSIStrategy
 from strategies.ml_strategy import MLStrategy
@@ -50,9 +59,32 @@ class OptimizationConfig:
     # 测试间隔
     test_interval: int = 5  # 秒
     
+    # 优化模式: random（整个区间随机搜索）或 walk_forward（滚动样本外验证 + 逐轮淘汰）
+    optimization_mode: str = 'random'
+    walk_forward_folds: int = 4  # 将回测区间按时间顺序切成的段数
+    walk_forward_warmup_bars: int = 120  # 每段前附带的指标预热K线数（取自上一段）
+    halving_eta: float = 2.0  # 每轮淘汰后保留 1/eta 的参数组合
+    halving_min_folds: int = 1  # 至少评估这么多段后才开始淘汰
+    walk_forward_metric: str = 'sharpe_ratio'  # 排名使用的指标
+    
+    # 参数搜索后端: mutation（随机 + 最佳结果变异）、random 或 tpe（代理模型搜索）
+    search_backend: str = 'mutation'
+    search_batch_size: int = 1  # 每次生成的参数组数（供并行回测）
+    search_metric: str = 'sharpe_ratio'  # 搜索优化的目标指标
+    
+    # 回测结果缓存：相同策略、参数和数据切片的回测直接复用数据库中的结果
+    use_backtest_cache: bool = True
+    
+    # 并行回测的工作进程数（0表示在主进程中回测）；K线和指标通过共享内存提供给工作进程
+    optimizer_workers: int = 0
+    
+    # MA策略快速路径：每次迭代向量化回测 short_window × long_window 的整个网格
+    ma_grid_fast_path: bool = False
+    
     # 结果保存
     save_results: bool = True
-    results_file: str = 'optimization_results.json'
+    results_file: str = 'optimization_results.json'  # 快照文件，结果先追加到同名的.jsonl日志
+    snapshot_every: int = 500  # 每追加多少条结果合并一次快照
     database_file: str = 'optimization_results.db'
     
     def __post_init__(self):
@@ -60,6 +92,12 @@ class OptimizationConfig:
             self.symbols = [ 'ETHUSDT']  #['BTCUSDT', 'ETHUSDT', 'BNBUSDT']
 
 
+def new_test_id(strategy_type: str, symbol: str, tag: str = None) -> str:
+    """生成唯一的测试ID（同一秒内生成的多组参数也不会重复）"""
+    prefix = f"{strategy_type}_{symbol}_{tag}" if tag else f"{strategy_type}_{symbol}"
+    return f"{prefix}_{uuid.uuid4().hex}"
+
+
 @dataclass
 class StrategyParams:
     """策略参数"""
@@ -70,7 +108,7 @@ class StrategyParams:
     
     def __post_init__(self):
         if self.test_id is None:
-            self.test_id = f"{self.strategy_type}_{self.symbol}_{int(time.time())}"
+            self.test_id = new_test_id(self.strategy_type, self.symbol)
 
 
 @dataclass
@@ -103,6 +141,22 @@ class StrategyOptimizer:
         self.db_conn = None
         self.backtest_engine = BacktestEngine(initial_capital=10000.0)
         self.data_collector = DataCollector()
+        # 走步优化的数据缓存：{symbol: 含指标的完整K线}、{(symbol, 段序号): 数据切片}
+        self._symbol_data: Dict[str, pd.DataFrame] = {}
+        self._fold_cache: Dict[Tuple[str, int], pd.DataFrame] = {}
+        # 参数搜索后端 {策略类型_币种: ParamSearch}
+        self._searches: Dict[str, ParamSearch] = {}
+        # 回测结果缓存：{(symbol, 段序号): 数据指纹}，段序号为None表示整个回测区间
+        self._data_fingerprints: Dict[Tuple[str, Optional[int]], str] = {}
+        # MA网格快速路径已扫描的 (symbol, position_size, 段序号)
+        self._ma_grid_swept = set()
+        self.cache_hits = 0
+        self.cache_lookups = 0
+        # 结果追加日志（替代每次保存都重写整个JSON文件）
+        self.result_log = ResultLog(self.config.results_file, snapshot_every=self.config.snapshot_every)
+        # 并行回测：工作进程池和共享内存中的K线数据（首次使用时创建）
+        self._worker_pool: Optional[ProcessPoolExecutor] = None
+        self._shared_data = SharedMarketData()
         
         # 策略参数范围定义
         self.strategy_param_ranges = {
@@ -262,6 +316,19 @@ class StrategyOptimizer:
                 )
             ''')
             
+            # 创建回测结果缓存表（按策略、参数和数据指纹的哈希寻址）
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS backtest_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    strategy_type TEXT,
+                    symbol TEXT,
+                    params TEXT,
+                    data_fingerprint TEXT,
+                    metrics TEXT,
+                    created_at TEXT
+                )
+            ''')
+            
             # 创建最佳结果表
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS best_results (
@@ -312,33 +379,30 @@ class StrategyOptimizer:
     
     def run_backtest(self, strategy_params: StrategyParams) -> Optional[TestResult]:
         """运行回测"""
+        return self.run_backtests([strategy_params])[0]
+    
+    def run_backtests(self, params_list: List[StrategyParams]) -> List[Optional[TestResult]]:
+        """批量运行回测（配置了工作进程时并行），失败的参数对应None"""
         try:
-            print(f"🔄 测试 {strategy_params.strategy_type} 策略 - {strategy_params.symbol}")
-            print(f"   参数: {strategy_params.params}")
-            
-            # 创建策略实例
-            strategy = self._create_strategy(strategy_params)
-            if not strategy:
-                return None
+            for strategy_params in params_list:
+                print(f"🔄 测试 {strategy_params.strategy_type} 策略 - {strategy_params.symbol}")
+                print(f"   参数: {strategy_params.params}")
             
-            # 运行回测
-            results = self.backtest_engine.run_backtest(
-                strategy=strategy,
-                symbol=strategy_params.symbol,
-                start_date=self.config.start_date,
-                end_date=self.config.end_date,
-                interval='1h'
-            )
-            
-            if not results:
+            # 运行回测（相同参数和数据命中缓存时直接返回）
+            metrics_list = self._backtest_metrics_batch(params_list)
+        except Exception as e:
+            print(f"❌ 回测异常: {e}")
+            return [None] * len(params_list)
+        
+        results = []
+        for strategy_params, metrics in zip(params_list, metrics_list):
+            if metrics is None:
                 print(f"❌ 回测失败: {strategy_params.test_id}")
-                return None
-            
-            # 计算指标
-            metrics = self._calculate_metrics(results)
+                results.append(None)
+                continue
             
             # 创建测试结果
-            test_result = TestResult(
+            results.append(TestResult(
                 test_id=strategy_params.test_id,
                 strategy_type=strategy_params.strategy_type,
                 symbol=strategy_params.symbol,
@@ -348,18 +412,15 @@ class StrategyOptimizer:
                 trading_mode=self.config.trading_mode,
                 start_date=self.config.start_date,
                 end_date=self.config.end_date
-            )
+            ))
             
-            print(f"✅ 测试完成 - 总收益: {metrics.get('total_return', 0):.2f}%, "
+            print(f"✅ 测试完成 {strategy_params.test_id} - 总收益: {metrics.get('total_return', 0):.2f}%, "
                   f"夏普比率: {metrics.get('sharpe_ratio', 0):.2f}")
-            
-            return test_result
-            
-        except Exception as e:
-            print(f"❌ 回测异常: {e}")
-            return None
+        
+        return results
     
-    def _create_strategy(self, strategy_params: StrategyParams):
+    @staticmethod
+    def _create_strategy(strategy_params: StrategyParams):
         """创建策略实例"""
         try:
             if strategy_params.strategy_type == 'MA':
@@ -390,7 +451,8 @@ class StrategyOptimizer:
             print(f"❌ 创建策略失败: {e}")
             return None
     
-    def _calculate_metrics(self, results) -> Dict[str, float]:
+    @staticmethod
+    def _calculate_metrics(results) -> Dict[str, float]:
         """计算回测指标"""
         try:
             trades = results.trades
@@ -449,22 +511,26 @@ class StrategyOptimizer:
     
     def save_result(self, result: TestResult):
         """保存测试结果"""
+        self.save_results([result])
+    
+    def save_results(self, results: List[TestResult]):
+        """批量保存测试结果（数据库一次提交）"""
         try:
             # 保存到内存
-            self.results.append(result)
+            self.results.extend(results)
             
             # 保存到数据库
             if self.db_conn:
                 cursor = self.db_conn.cursor()
                 
                 # 插入结果
-                cursor.execute('''
+                cursor.executemany('''
                     INSERT OR REPLACE INTO optimization_results 
                     (test_id, strategy_type, symbol, params, total_return, sharpe_ratio, 
                      max_drawdown, win_rate, profit_factor, total_trades, avg_trade_duration,
                      timestamp, trading_mode, start_date, end_date)
                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
+                ''', [(
                     result.test_id,
                     result.strategy_type,
                     result.symbol,
@@ -480,29 +546,27 @@ class StrategyOptimizer:
                     result.trading_mode,
                     result.start_date,
                     result.end_date
-                ))
+                ) for result in results])
                 
                 self.db_conn.commit()
             
-            # 保存到JSON文件
-            if self.config.save_results:
-                self._save_to_json()
+            for result in results:
+                # 反馈给参数搜索后端
+                self._observe_result(result)
+                
+                # 追加到结果日志
+                if self.config.save_results:
+                    self.result_log.append(asdict(result))
                 
         except Exception as e:
             print(f"❌ 保存结果失败: {e}")
     
     def _save_to_json(self):
-        """保存结果到JSON文件"""
-        try:
-            results_data = []
-            for result in self.results:
-                results_data.append(asdict(result))
-            
-            with open(self.config.results_file, 'w', encoding='utf-8') as f:
-                json.dump(results_data, f, ensure_ascii=False, indent=2)
-                
-        except Exception as e:
-            print(f"❌ 保存JSON文件失败: {e}")
+        """把结果日志合并为JSON快照"""
+        count = self.result_log.compact()
+        if count is None:
+            print(f"❌ 保存JSON文件失败: {self.config.results_file}")
+        return count
     
     def analyze_results(self):
         """分析结果并找出最佳参数"""
@@ -573,8 +637,511 @@ class StrategyOptimizer:
         except Exception as e:
             print(f"❌ 分析结果失败: {e}")
     
+    # ---------- 走步优化（walk-forward + successive halving） ----------
+    
+    def _get_symbol_data(self, symbol: str) -> pd.DataFrame:
+        """读取整个回测区间的K线并计算指标（每个交易对只做一次）"""
+        if symbol not in self._symbol_data:
+            data = self.backtest_engine._get_historical_data(
+                symbol, self.config.start_date, self.config.end_date, '1h'
+            )
+            if not data.empty:
+                data = self.data_collector.calculate_technical_indicators(data, symbol)
+            self._symbol_data[symbol] = data
+        return self._symbol_data[symbol]
+    
+    def get_fold_data(self, symbol: str, fold: int) -> pd.DataFrame:
+        """
+        获取第fold段的数据切片（带缓存）
+        
+        区间按时间顺序等分为walk_forward_folds段，每段前面附带上一段末尾的
+        walk_forward_warmup_bars根K线，只用于指标预热（回测时从段起点开始交易和统计，见_data_bounds）
+        """
+        key = (symbol, fold)
+        if key not in self._fold_cache:
+            start, end, _ = self._data_bounds(symbol, fold)
+            self._fold_cache[key] = self._get_symbol_data(symbol).iloc[start:end]
+        return self._fold_cache[key]
+    
+    def _data_bounds(self, symbol: str, fold: int = None) -> Tuple[int, int, int]:
+        """
+        回测数据在整段K线中的行号范围[start, end)，fold为None表示整个回测区间
+        
+        Returns:
+            (start, end, warmup)：切片开头的warmup根K线只用于指标预热，不交易也不计入指标
+        """
+        length = len(self._get_symbol_data(symbol))
+        if fold is None:
+            return 0, length, 0
+        fold_len = length // self.config.walk_forward_folds
+        fold_start = fold * fold_len
+        end = length if fold == self.config.walk_forward_folds - 1 else fold_start + fold_len
+        start = max(0, fold_start - self.config.walk_forward_warmup_bars)
+        return start, end, fold_start - start
+    
+    def _evaluate_folds(self, candidates: List[StrategyParams], fold: int) -> List[Optional[Dict[str, float]]]:
+        """在单个数据段上回测一批参数"""
+        try:
+            return self._backtest_metrics_batch(candidates, fold)
+        except Exception as e:
+            print(f"❌ 第{fold + 1}段回测失败: {e}")
+            return [None] * len(candidates)
+    
+    def run_walk_forward(self, strategy_type: str, symbol: str,
+                         candidates: List[StrategyParams] = None) -> List[TestResult]:
+        """
+        走步优化：候选参数按时间顺序逐段评估，每评估完一段按累计的样本外平均得分
+        淘汰较差的参数（successive halving），只有存活的参数继续评估后面的数据段
+        
+        每段开始前按之前各段得分选出的领先参数在该段上的表现即为走步（样本外）表现
+        
+        Returns:
+            评估完全部数据段的存活参数的汇总结果（指标为各段的平均值）；
+            中途被淘汰的参数只评估了前几段，平均值与存活参数不可比，不返回
+        """
+        folds = self.config.walk_forward_folds
+        metric = self.config.walk_forward_metric
+        data = self._get_symbol_data(symbol)
+        if data.empty or len(data) // folds < 50:
+            print(f"❌ {symbol} 数据不足，无法进行{folds}段走步优化")
+            return []
+        
+        if candidates is None:
+            candidates = []
+            for _ in range(self.config.population_size):
+                candidates.append(StrategyParams(
+                    strategy_type=strategy_type,
+                    symbol=symbol,
+                    params=self.generate_random_params(strategy_type),
+                    test_id=new_test_id(strategy_type, symbol, 'wf')
+                ))
+        
+        print(f"\n🚶 走步优化 {strategy_type} - {symbol}: {len(candidates)} 组参数, {folds} 段")
+        fold_metrics: Dict[str, List[Dict[str, float]]] = {c.test_id: [] for c in candidates}
+        survivors = list(candidates)
+        walk_forward_scores = []
+        backtests = 0
+        
+        for fold in range(folds):
+            # 上一轮领先的参数在本段上的表现（真正的样本外）
+            leader = None
+            if fold > 0:
+                leader = max(survivors, key=lambda c: self._mean_metric(fold_metrics[c.test_id], metric))
+            
+            for candidate, metrics in zip(survivors, self._evaluate_folds(survivors, fold)):
+                backtests += 1
+                fold_metrics[candidate.test_id].append(metrics or self._empty_metrics())
+            
+            if leader is not None:
+                walk_forward_scores.append(fold_metrics[leader.test_id][-1].get(metric, 0.0))
+            
+            # 按累计平均得分淘汰
+            if fold + 1 >= self.config.halving_min_folds and fold < folds - 1:
+                keep = max(1, int(np.ceil(len(survivors) / self.config.halving_eta)))
+                survivors = sorted(
+                    survivors, key=lambda c: self._mean_metric(fold_metrics[c.test_id], metric), reverse=True
+                )[:keep]
+            
+            best = max(survivors, key=lambda c: self._mean_metric(fold_metrics[c.test_id], metric))
+            print(f"   第{fold + 1}/{folds}段完成: 存活 {len(survivors)} 组, "
+                  f"领先 {metric}={self._mean_metric(fold_metrics[best.test_id], metric):.2f}")
+        
+        full_cost = len(candidates) * folds
+        print(f"✅ 走步优化完成: 回测 {backtests} 次（完整评估需 {full_cost} 次）, "
+              f"缓存命中率 {self.cache_hit_rate:.0%}")
+        if walk_forward_scores:
+            print(f"   走步样本外平均 {metric}: {np.mean(walk_forward_scores):.2f}")
+        
+        results = []
+        for candidate in survivors:
+            evaluated = fold_metrics[candidate.test_id]
+            if len(evaluated) < folds:
+                continue
+            metrics = {
+                name: float(np.mean([m.get(name, 0.0) for m in evaluated]))
+                for name in evaluated[0]
+            }
+            metrics['folds_evaluated'] = len(evaluated)
+            metrics[f'{metric}_std'] = float(np.std([m.get(metric, 0.0) for m in evaluated]))
+            results.append(TestResult(
+                test_id=candidate.test_id,
+                strategy_type=strategy_type,
+                symbol=symbol,
+                params=candidate.params,
+                metrics=metrics,
+                timestamp=datetime.now().isoformat(),
+                trading_mode=self.config.trading_mode,
+                start_date=self.config.start_date,
+                end_date=self.config.end_date
+            ))
+        return results
+    
+    @staticmethod
+    def _empty_metrics() -> Dict[str, float]:
+        return {
+            'total_return': 0.0,
+            'sharpe_ratio': 0.0,
+            'max_drawdown': 0.0,
+            'win_rate': 0.0,
+            'profit_factor': 0.0,
+            'total_trades': 0,
+            'avg_trade_duration': 0.0
+        }
+    
+    @staticmethod
+    def _mean_metric(metrics_list: List[Dict[str, float]], metric: str) -> float:
+        if not metrics_list:
+            return float('-inf')
+        return float(np.mean([m.get(metric, 0.0) for m in metrics_list]))
+    
+    # ---------- 回测结果缓存 ----------
+    
+    # 回测逻辑或指标计算变化时递增，使旧缓存失效
+    BACKTEST_CACHE_VERSION = 5
+    
+    @property
+    def cache_hit_rate(self) -> float:
+        return self.cache_hits / self.cache_lookups if self.cache_lookups else 0.0
+    
+    def _data_fingerprint(self, symbol: str, fold: int = None) -> str:
+        """回测数据切片的指纹：K线原始列逐行哈希后再整体取SHA-256"""
+        key = (symbol, fold)
+        if key not in self._data_fingerprints:
+            data = self._get_symbol_data(symbol) if fold is None else self.get_fold_data(symbol, fold)
+            columns = [c for c in ('timestamp', 'open', 'high', 'low', 'close', 'volume') if c in data.columns]
+            row_hashes = pd.util.hash_pandas_object(data[columns], index=False).values
+            self._data_fingerprints[key] = hashlib.sha256(row_hashes.tobytes()).hexdigest()
+        return self._data_fingerprints[key]
+    
+    def _backtest_cache_key(self, strategy_params: StrategyParams, fingerprint: str) -> str:
+        """缓存键：策略、参数、数据指纹和回测引擎设置的哈希（与test_id无关）"""
+        payload = json.dumps({
+            'version': self.BACKTEST_CACHE_VERSION,
+            'strategy_type': strategy_params.strategy_type,
+            'symbol': strategy_params.symbol,
+            'params': strategy_params.params,
+            'data': fingerprint,
+            'engine': [
+                self.backtest_engine.initial_capital,
+                self.backtest_engine.commission,
+                self.backtest_engine.fill_model.describe()
+            ]
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def _cache_get(self, cache_key: str) -> Optional[Dict[str, float]]:
+        if not self.config.use_backtest_cache or not self.db_conn:
+            return None
+        self.cache_lookups += 1
+        try:
+            cursor = self.db_conn.cursor()
+            cursor.execute('SELECT metrics FROM backtest_cache WHERE cache_key = ?', (cache_key,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            self.cache_hits += 1
+            return json.loads(row[0])
+        except Exception as e:
+            print(f"❌ 读取回测缓存失败: {e}")
+            return None
+    
+    def _cache_put(self, cache_key: str, strategy_params: StrategyParams, fingerprint: str,
+                   metrics: Dict[str, float], commit: bool = True):
+        if not self.config.use_backtest_cache or not self.db_conn:
+            return
+        try:
+            cursor = self.db_conn.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO backtest_cache
+                (cache_key, strategy_type, symbol, params, data_fingerprint, metrics, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                cache_key,
+                strategy_params.strategy_type,
+                strategy_params.symbol,
+                json.dumps(strategy_params.params, sort_keys=True, default=str),
+                fingerprint,
+                json.dumps(metrics, default=float),
+                datetime.now().isoformat()
+            ))
+            if commit:
+                self.db_conn.commit()
+        except Exception as e:
+            print(f"❌ 写入回测缓存失败: {e}")
+    
+    def _backtest_metrics_batch(self, params_list: List[StrategyParams],
+                                fold: int = None) -> List[Optional[Dict[str, float]]]:
+        """
+        回测一批参数并返回各自的指标，先按内容哈希查缓存，未命中的在工作进程中并行回测
+        
+        Args:
+            fold: 走步优化的数据段序号，None表示整个回测区间
+        """
+        metrics_list: List[Optional[Dict[str, float]]] = [None] * len(params_list)
+        misses = []
+        for i, strategy_params in enumerate(params_list):
+            fingerprint = self._data_fingerprint(strategy_params.symbol, fold)
+            cache_key = self._backtest_cache_key(strategy_params, fingerprint)
+            metrics = self._cache_get(cache_key)
+            if metrics is not None:
+                print(f"⚡ 命中回测缓存 {cache_key[:12]}")
+                metrics_list[i] = metrics
+            else:
+                misses.append((i, cache_key, fingerprint))
+        
+        pool = self._get_worker_pool() if len(misses) > 1 else None
+        if pool is not None:
+            futures = []
+            for i, cache_key, fingerprint in misses:
+                symbol = params_list[i].symbol
+                start, end, warmup = self._data_bounds(symbol, fold)
+                try:
+                    spec = self._shared_spec(symbol)
+                except ValueError as e:
+                    # 数据无法完整发布到共享内存时在主进程中回测，保证结果与本地回测一致
+                    print(f"⚠️ {e}，改为在主进程中回测")
+                    futures.append(None)
+                    continue
+                futures.append(pool.submit(
+                    _run_backtest_worker, params_list[i], spec, start, end, warmup
+                ))
+            computed = []
+            for (i, _, _), future in zip(misses, futures):
+                if future is None:
+                    computed.append(self._run_local_backtest(params_list[i], fold))
+                    continue
+                try:
+                    computed.append(future.result())
+                except Exception as e:
+                    print(f"❌ 工作进程回测异常: {e}")
+                    computed.append(None)
+        else:
+            computed = [self._run_local_backtest(params_list[i], fold) for i, _, _ in misses]
+        
+        for (i, cache_key, fingerprint), metrics in zip(misses, computed):
+            if metrics is not None:
+                self._cache_put(cache_key, params_list[i], fingerprint, metrics)
+            metrics_list[i] = metrics
+        return metrics_list
+    
+    def _backtest_metrics(self, strategy_params: StrategyParams, fold: int = None) -> Optional[Dict[str, float]]:
+        """回测一组参数并返回指标"""
+        return self._backtest_metrics_batch([strategy_params], fold)[0]
+    
+    def _run_local_backtest(self, strategy_params: StrategyParams, fold: int = None) -> Optional[Dict[str, float]]:
+        """在主进程中回测"""
+        strategy = self._create_strategy(strategy_params)
+        if not strategy:
+            return None
+        symbol = strategy_params.symbol
+        data = self._get_symbol_data(symbol) if fold is None else self.get_fold_data(symbol, fold)
+        warmup = self._data_bounds(symbol, fold)[2]
+        results = self.backtest_engine.run_backtest(
+            strategy=strategy, symbol=symbol, data=data, trade_start=warmup
+        )
+        if not results:
+            return None
+        return self._calculate_metrics(results)
+    
+    # ---------- MA网格快速路径 ----------
+    
+    def _pending_ma_grid_position_size(self, symbol: str, fold: int = None) -> Optional[float]:
+        """下一个还没有扫描过的position_size，全部扫描过时返回None"""
+        for position_size in self.strategy_param_ranges['MA']['position_size']:
+            if (symbol, position_size, fold) not in self._ma_grid_swept:
+                return position_size
+        return None
+    
+    def run_ma_grid_sweep(self, symbol: str, position_size: float = None,
+                          fold: int = None) -> List[TestResult]:
+        """
+        一次向量化回测MA策略 short_window × long_window 的整个参数网格
+        
+        网格参数只包含short_window、long_window和position_size：BacktestEngine不更新策略持仓，
+        止损止盈不会触发，不参与扫描（使用策略默认值）。回测缓存中已有的组合不再返回，
+        全部命中时不运行扫描
+        
+        Args:
+            position_size: 开仓资金比例，默认取下一个还没有扫描过的取值
+            fold: 走步优化的数据段序号，None表示整个回测区间
+        
+        Returns:
+            网格中新回测的参数组合的测试结果（同时写入回测缓存）
+        """
+        if position_size is None:
+            position_size = self._pending_ma_grid_position_size(symbol, fold)
+            if position_size is None:
+                return []
+        self._ma_grid_swept.add((symbol, position_size, fold))
+        
+        ranges = self.strategy_param_ranges['MA']
+        data = self._get_symbol_data(symbol) if fold is None else self.get_fold_data(symbol, fold)
+        if data.empty:
+            print(f"❌ {symbol} 没有数据，无法进行MA网格扫描")
+            return []
+        
+        # 先查缓存：之前扫描过的组合（本次或以前的运行）已经保存过结果
+        fingerprint = self._data_fingerprint(symbol, fold)
+        pending = {}
+        for short_window in ranges['short_window']:
+            for long_window in ranges['long_window']:
+                strategy_params = StrategyParams(
+                    strategy_type='MA', symbol=symbol,
+                    params={'short_window': short_window, 'long_window': long_window,
+                            'position_size': position_size},
+                    test_id=new_test_id('MA', symbol, 'grid')
+                )
+                cache_key = self._backtest_cache_key(strategy_params, fingerprint)
+                if self._cache_get(cache_key) is None:
+                    pending[(short_window, long_window)] = (strategy_params, cache_key)
+        if not pending:
+            print(f"⚡ MA网格 {symbol} position_size={position_size} 已全部在回测缓存中，跳过扫描")
+            return []
+        
+        started = time.time()
+        sweep = MAGridSweep(
+            initial_capital=self.backtest_engine.initial_capital,
+            commission=self.backtest_engine.commission,
+            fill_model=self.backtest_engine.fill_model
+        )
+        try:
+            grid = sweep.run(
+                data, sorted({s for s, _ in pending}), sorted({l for _, l in pending}),
+                position_size=position_size, symbol=symbol,
+                trade_start=self._data_bounds(symbol, fold)[2]
+            )
+        except Exception as e:
+            print(f"❌ MA网格扫描失败 {symbol}: {e}")
+            return []
+        
+        metric_names = [name for name in grid.columns if name not in ('short_window', 'long_window')]
+        results = []
+        for row in grid.itertuples(index=False):
+            entry = pending.get((int(row.short_window), int(row.long_window)))
+            if entry is None:
+                continue
+            strategy_params, cache_key = entry
+            metrics = {name: float(getattr(row, name)) for name in metric_names}
+            metrics['total_trades'] = int(metrics['total_trades'])
+            
+            self._cache_put(cache_key, strategy_params, fingerprint, metrics, commit=False)
+            results.append(TestResult(
+                test_id=strategy_params.test_id,
+                strategy_type='MA',
+                symbol=symbol,
+                params=strategy_params.params,
+                metrics=metrics,
+                timestamp=datetime.now().isoformat(),
+                trading_mode=self.config.trading_mode,
+                start_date=self.config.start_date,
+                end_date=self.config.end_date
+            ))
+        if self.db_conn:
+            self.db_conn.commit()
+        
+        print(f"⚡ MA网格扫描 {symbol} position_size={position_size}: {len(results)} 组参数, "
+              f"用时 {time.time() - started:.1f}s")
+        return results
+    
+    # ---------- 并行回测 ----------
+    
+    def _get_worker_pool(self) -> Optional[ProcessPoolExecutor]:
+        """获取回测工作进程池，未配置工作进程或不支持共享内存时返回None"""
+        if self.config.optimizer_workers <= 0 or not SHARED_MEMORY_AVAILABLE:
+            return None
+        if self._worker_pool is None:
+            self._worker_pool = ProcessPoolExecutor(
+                max_workers=self.config.optimizer_workers,
+                initializer=_init_backtest_worker,
+                initargs=(
+                    self.backtest_engine.initial_capital,
+                    self.backtest_engine.commission,
+                    self.backtest_engine.fill_model
+                )
+            )
+            print(f"🧵 启动 {self.config.optimizer_workers} 个回测工作进程")
+        return self._worker_pool
+    
+    def _shared_spec(self, symbol: str) -> SharedFrameSpec:
+        """交易对整段K线（含指标）在共享内存中的布局，首次调用时发布"""
+        spec = self._shared_data.get_spec(symbol)
+        if spec is None:
+            spec = self._shared_data.publish(symbol, self._get_symbol_data(symbol))
+        return spec
+    
+    def _shutdown_workers(self):
+        if self._worker_pool is not None:
+            self._worker_pool.shutdown(wait=True, cancel_futures=True)
+            self._worker_pool = None
+        self._shared_data.close()
+    
+    # ---------- 参数搜索后端 ----------
+    
+    SEARCH_METRICS = ('total_return', 'sharpe_ratio', 'max_drawdown', 'win_rate', 'profit_factor')
+    
+    def _get_search(self, strategy_type: str, symbol: str) -> ParamSearch:
+        """获取（首次使用时创建并用数据库中的历史结果恢复）参数搜索后端"""
+        group_key = f"{strategy_type}_{symbol}"
+        if group_key not in self._searches:
+            search = create_param_search(
+                self.config.search_backend, self.strategy_param_ranges.get(strategy_type, {})
+            )
+            history = self._load_search_history(strategy_type, symbol)
+            search.observe_many(history)
+            if search.observations:
+                best_params, best_score = search.best()
+                print(f"📚 {group_key} 从历史结果恢复 {len(history)} 组参数, "
+                      f"最佳 {self.config.search_metric}={best_score:.2f}")
+            self._searches[group_key] = search
+        return self._searches[group_key]
+    
+    def _load_search_history(self, strategy_type: str, symbol: str) -> List[Tuple[Dict[str, Any], float]]:
+        """读取相同回测区间和交易模式下已测试过的参数及得分"""
+        metric = self.config.search_metric
+        if not self.db_conn or metric not in self.SEARCH_METRICS:
+            return []
+        try:
+            cursor = self.db_conn.cursor()
+            cursor.execute(f'''
+                SELECT params, {metric} FROM optimization_results
+                WHERE strategy_type = ? AND symbol = ? AND trading_mode = ?
+                  AND start_date = ? AND end_date = ?
+            ''', (strategy_type, symbol, self.config.trading_mode,
+                  self.config.start_date, self.config.end_date))
+            return [(json.loads(params), score) for params, score in cursor.fetchall() if score is not None]
+        except Exception as e:
+            print(f"❌ 读取历史结果失败: {e}")
+            return []
+    
+    def _observe_result(self, result: TestResult):
+        """把回测结果反馈给对应的搜索后端"""
+        search = self._searches.get(f"{result.strategy_type}_{result.symbol}")
+        if search is not None:
+            search.observe(result.params, result.metrics.get(self.config.search_metric, 0.0))
+    
+    def generate_param_batch(self, strategy_type: str, symbol: str, n: int = None) -> List[StrategyParams]:
+        """一次生成n组参数（TPE后端保证同一批参数互不相同且分散）"""
+        n = n or self.config.search_batch_size
+        if self.config.search_backend == 'mutation':
+            return [self.generate_next_params(strategy_type, symbol) for _ in range(n)]
+        
+        suggestions = self._get_search(strategy_type, symbol).suggest(n)
+        print(f"🧭 {self.config.search_backend} 生成 {len(suggestions)} 组参数")
+        return [
+            StrategyParams(
+                strategy_type=strategy_type,
+                symbol=symbol,
+                params=params,
+                test_id=new_test_id(strategy_type, symbol)
+            )
+            for params in suggestions
+        ]
+    
     def generate_next_params(self, strategy_type: str, symbol: str) -> StrategyParams:
-        """生成下一组参数（基于遗传算法）"""
+        """生成下一组参数（基于遗传算法；配置了搜索后端时由后端生成）"""
+        if self.config.search_backend != 'mutation':
+            return self.generate_param_batch(strategy_type, symbol, 1)[0]
+        
         try:
             # 获取当前策略组的最佳结果
             group_key = f"{strategy_type}_{symbol}"
@@ -621,6 +1188,11 @@ class StrategyOptimizer:
         print(f"   回测时间: {self.config.start_date} 到 {self.config.end_date}")
         print(f"   最大迭代次数: {self.config.max_iterations}")
         print(f"   测试间隔: {self.config.test_interval}秒")
+        print(f"   优化模式: {self.config.optimization_mode}")
+        print(f"   搜索后端: {self.config.search_backend} (每批 {self.config.search_batch_size} 组)")
+        print(f"   回测缓存: {'启用' if self.config.use_backtest_cache else '关闭'}")
+        print(f"   回测工作进程: {self.config.optimizer_workers or '主进程'}")
+        print(f"   MA网格快速路径: {'启用' if self.config.ma_grid_fast_path else '关闭'}")
         
         # 检查数据可用性
         print("\n" + "=" * 50)
@@ -647,10 +1219,26 @@ class StrategyOptimizer:
         self.running = True
         self.current_iteration = 0
         
+        if self.config.optimization_mode == 'walk_forward':
+            try:
+                for strategy_type in ['MA', 'RSI', 'ML', 'Chanlun']:
+                    for symbol in self.config.symbols:
+                        if not self.running:
+                            break
+                        self.save_results(self.run_walk_forward(strategy_type, symbol))
+            except KeyboardInterrupt:
+                print("\n🛑 用户中断优化过程")
+            except Exception as e:
+                print(f"❌ 走步优化异常: {e}")
+            finally:
+                self.stop()
+            return
+        
         try:
             while self.running and self.current_iteration < self.config.max_iterations:
                 self.current_iteration += 1
-                print(f"\n🔄 第 {self.current_iteration} 次迭代")
+                print(f"\n🔄 第 {self.current_iteration} 次迭代 "
+                      f"(回测缓存命中率 {self.cache_hit_rate:.0%}, {self.cache_hits}/{self.cache_lookups})")
                 
                 # 为每个策略类型和币种生成参数
                 for strategy_type in ['MA', 'RSI', 'ML', 'Chanlun']:
@@ -658,26 +1246,31 @@ class StrategyOptimizer:
                         if not self.running:
                             break
                         
-                        # 生成参数
-                        strategy_params = self.generate_next_params(strategy_type, symbol)
-                        
-                        # 运行测试
-                        result = self.run_backtest(strategy_params)
-                        
-                        if result:
-                            # 保存结果
-                            self.save_result(result)
-                            
-                            # 每10次迭代分析一次结果
-                            if len(self.results) % 10 == 0:
+                        if strategy_type == 'MA' and self.config.ma_grid_fast_path:
+                            # MA快速路径：每个position_size的整个窗口网格只回测一次，全部扫描过后不再重复
+                            results = self.run_ma_grid_sweep(symbol)
+                            if results:
+                                self.save_results(results)
                                 self.analyze_results()
+                        else:
+                            # 生成参数（一批），运行测试
+                            batch = self.generate_param_batch(strategy_type, symbol)
+                            results = [result for result in self.run_backtests(batch) if result]
+                            if results:
+                                # 保存结果（一批一次提交）
+                                previous_count = len(self.results)
+                                self.save_results(results)
+                                
+                                # 每10个结果分析一次
+                                if len(self.results) // 10 > previous_count // 10:
+                                    self.analyze_results()
                         
                         # 等待间隔
                         if self.config.test_interval > 0:
                             time.sleep(self.config.test_interval)
                 
                 # 定期保存结果
-                if self.current_iteration % 50 == 0:
+                if self.current_iteration % 50 == 0 and self.config.save_results:
                     self._save_to_json()
                     print(f"💾 已保存 {len(self.results)} 个测试结果")
         
@@ -695,18 +1288,59 @@ class StrategyOptimizer:
         
         # 最终分析
         self.analyze_results()
+        if self.cache_lookups:
+            print(f"⚡ 回测缓存命中 {self.cache_hits}/{self.cache_lookups} ({self.cache_hit_rate:.0%})")
         
         # 保存最终结果
         if self.config.save_results:
             self._save_to_json()
+            self.result_log.close()
             print(f"💾 最终结果已保存到 {self.config.results_file}")
         
+        # 停止工作进程并释放共享内存
+        self._shutdown_workers()
+        
         # 关闭数据库连接
         if self.db_conn:
             self.db_conn.close()
             print("🔒 数据库连接已关闭")
 
 
+# ---------- 回测工作进程 ----------
+
+# 工作进程内复用的回测引擎
+_worker_engine: Optional[BacktestEngine] = None
+
+
+def _init_backtest_worker(initial_capital: float, commission: float, fill_model):
+    """工作进程初始化：创建回测引擎；停止信号由主进程处理"""
+    global _worker_engine
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    _worker_engine = BacktestEngine(
+        initial_capital=initial_capital, commission=commission, fill_model=fill_model
+    )
+
+
+def _run_backtest_worker(strategy_params: StrategyParams, spec: SharedFrameSpec,
+                         start: int, end: int, warmup: int = 0) -> Optional[Dict[str, float]]:
+    """在工作进程中回测一组参数：K线和指标直接映射主进程发布的共享内存，前warmup根K线只用于预热"""
+    try:
+        data = attach_frame(spec).iloc[start:end]
+        strategy = StrategyOptimizer._create_strategy(strategy_params)
+        if not strategy:
+            return None
+        results = _worker_engine.run_backtest(
+            strategy=strategy, symbol=strategy_params.symbol, data=data, trade_start=warmup
+        )
+        if not results:
+            return None
+        return StrategyOptimizer._calculate_metrics(results)
+    except Exception as e:
+        print(f"❌ 工作进程回测失败 {strategy_params.test_id}: {e}")
+        return None
+
+
 def load_config(config_file: str = 'optimization_config.json') -> OptimizationConfig:
     """加载配置文件"""
     try:
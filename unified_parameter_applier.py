@@ -11,6 +11,7 @@ import sqlite3
 import os
 import re
 from datetime import datetime
+from backend.result_log import iter_results
 
 def get_unified_results():
     """获取统一的优化结果（优先使用数据库）"""
@@ -34,30 +35,27 @@ def get_unified_results():
     except Exception as e:
         print(f"  ⚠️  数据库读取失败: {e}")
     
-    # 如果数据库读取失败，从JSON读取
+    # 如果数据库读取失败，流式读取JSON快照和追加日志
     try:
-        with open('optimization_results.json', 'r', encoding='utf-8') as f:
-            results = json.load(f)
+        # 转换为DataFrame格式
+        df_data = []
+        for result in iter_results('optimization_results.json'):
+            df_data.append({
+                'test_id': result['test_id'],
+                'strategy_type': result['strategy_type'],
+                'symbol': result['symbol'],
+                'params': json.dumps(result['params']),
+                'total_return': result['metrics'].get('total_return', 0),
+                'sharpe_ratio': result['metrics'].get('sharpe_ratio', 0),
+                'win_rate': result['metrics'].get('win_rate', 0),
+                'max_drawdown': result['metrics'].get('max_drawdown', 0),
+                'profit_factor': result['metrics'].get('profit_factor', 0),
+                'total_trades': result['metrics'].get('total_trades', 0),
+                'avg_trade_duration': result['metrics'].get('avg_trade_duration', 0),
+                'timestamp': result['timestamp']
+            })
         
-        if results:
-            # 转换为DataFrame格式
-            df_data = []
-            for result in results:
-                df_data.append({
-                    'test_id': result['test_id'],
-                    'strategy_type': result['strategy_type'],
-                    'symbol': result['symbol'],
-                    'params': json.dumps(result['params']),
-                    'total_return': result['metrics'].get('total_return', 0),
-                    'sharpe_ratio': result['metrics'].get('sharpe_ratio', 0),
-                    'win_rate': result['metrics'].get('win_rate', 0),
-                    'max_drawdown': result['metrics'].get('max_drawdown', 0),
-                    'profit_factor': result['metrics'].get('profit_factor', 0),
-                    'total_trades': result['metrics'].get('total_trades', 0),
-                    'avg_trade_duration': result['metrics'].get('avg_trade_duration', 0),
-                    'timestamp': result['timestamp']
-                })
-            
+        if df_data:
             df = pd.DataFrame(df_data)
             print(f"  ✅ 从JSON读取了 {len(df)} 条记录")
             return df
@@ -8,43 +8,43 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+import heapq
 import json
 import sqlite3
 import pandas as pd
 from datetime import datetime
+from backend.result_log import iter_results
 
 def view_json_results():
     """查看JSON格式的优化结果"""
     print("📄 查看JSON格式的优化结果...")
     
     try:
-        with open('optimization_results.json', 'r', encoding='utf-8') as f:
-            results = json.load(f)
+        # 流式读取（快照 + 追加日志），每个策略组只保留前3个最佳结果
+        total = 0
+        strategy_groups = {}
+        for result in iter_results('optimization_results.json'):
+            total += 1
+            key = f"{result['strategy_type']}_{result['symbol']}"
+            top = strategy_groups.setdefault(key, [])
+            item = (result.get('metrics', {}).get('total_return', 0), total, result)
+            if len(top) < 3:
+                heapq.heappush(top, item)
+            else:
+                heapq.heappushpop(top, item)
         
-        if not results:
+        if not total:
             print("  ⚠️  暂无优化结果")
             return
         
-        print(f"  📊 共有 {len(results)} 个测试结果")
-        
-        # 按策略类型分组
-        strategy_groups = {}
-        for result in results:
-            key = f"{result['strategy_type']}_{result['symbol']}"
-            if key not in strategy_groups:
-                strategy_groups[key] = []
-            strategy_groups[key].append(result)
+        print(f"  📊 共有 {total} 个测试结果")
         
         # 显示每个策略组的最佳结果
-        for group_key, group_results in strategy_groups.items():
+        for group_key, top in strategy_groups.items():
             print(f"\n🔍 {group_key}:")
             
             # 按总收益排序
-            sorted_results = sorted(
-                group_results, 
-                key=lambda x: x.get('metrics', {}).get('total_return', 0), 
-                reverse=True
-            )
+            sorted_results = [result for _, _, result in sorted(top, key=lambda x: x[0], reverse=True)]
             
             # 显示前3个最佳结果
             print("  🏆 前3个最佳结果:")
@@ -200,30 +200,27 @@ def get_unified_results():
     except Exception as e:
         print(f"  ⚠️  数据库读取失败: {e}")
     
-    # 如果数据库读取失败，从JSON读取
+    # 如果数据库读取失败，流式读取JSON快照和追加日志
     try:
-        with open('optimization_results.json', 'r', encoding='utf-8') as f:
-            results = json.load(f)
-        
-        if results:
-            # 转换为DataFrame格式
-            df_data = []
-            for result in results:
-                df_data.append({
-                    'test_id': result['test_id'],
-                    'strategy_type': result['strategy_type'],
-                    'symbol': result['symbol'],
-                    'params': json.dumps(result['params']),
-                    'total_return': result['metrics'].get('total_return', 0),
-                    'sharpe_ratio': result['metrics'].get('sharpe_ratio', 0),
-                    'win_rate': result['metrics'].get('win_rate', 0),
-                    'max_drawdown': result['metrics'].get('max_drawdown', 0),
-                    'profit_factor': result['metrics'].get('profit_factor', 0),
-                    'total_trades': result['metrics'].get('total_trades', 0),
-                    'avg_trade_duration': result['metrics'].get('avg_trade_duration', 0),
-                    'timestamp': result['timestamp']
-                })
-            
+        # 转换为DataFrame格式
+        df_data = []
+        for result in iter_results('optimization_results.json'):
+            df_data.append({
+                'test_id': result['test_id'],
+                'strategy_type': result['strategy_type'],
+                'symbol': result['symbol'],
+                'params': json.dumps(result['params']),
+                'total_return': result['metrics'].get('total_return', 0),
+                'sharpe_ratio': result['metrics'].get('sharpe_ratio', 0),
+                'win_rate': result['metrics'].get('win_rate', 0),
+                'max_drawdown': result['metrics'].get('max_drawdown', 0),
+                'profit_factor': result['metrics'].get('profit_factor', 0),
+                'total_trades': result['metrics'].get('total_trades', 0),
+                'avg_trade_duration': result['metrics'].get('avg_trade_duration', 0),
+                'timestamp': result['timestamp']
+            })
+        
+        if df_data:
             df = pd.DataFrame(df_data)
             print(f"  ✅ 从JSON读取了 {len(df)} 条记录")
             return df